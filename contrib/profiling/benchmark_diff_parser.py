@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+benchmark_diff_parser.py [--parser=base|git] [size_mb ...]
+
+Times parsing of generated diffs of the given sizes (defaulting to 5, 10, 25
+and 50MB) and prints the time taken per MB and the process's peak memory
+usage. The time per MB should stay roughly constant as the size grows.
+
+This must be run from the top of a Review Board source tree with a working
+settings_local.py.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import gc
+import os
+import resource
+import sys
+import time
+from optparse import OptionParser
+
+
+def setup_django():
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault(str('DJANGO_SETTINGS_MODULE'),
+                          str('reviewboard.settings'))
+
+
+def get_parser_cls(name):
+    if name == 'git':
+        from reviewboard.scmtools.git import GitDiffParser
+
+        return GitDiffParser
+    else:
+        from reviewboard.diffviewer.parser import DiffParser
+
+        return DiffParser
+
+
+def build_diff(parser_name, size):
+    """Build a diff of roughly the given size, in bytes.
+
+    The diff is made of files with 1000-line hunks, like a diff of generated
+    code.
+    """
+    hunk = b''.join(
+        b'-old line %d of some generated file\n'
+        b'+new line %d of some generated file\n' % (i, i)
+        for i in range(1000)
+    )
+    chunks = []
+    total = 0
+    i = 0
+
+    while total < size:
+        if parser_name == 'git':
+            header = (
+                b'diff --git a/file%d b/file%d\n'
+                b'index 1234567..89abcde 100644\n'
+                b'--- a/file%d\n'
+                b'+++ b/file%d\n'
+                % (i, i, i, i))
+        else:
+            header = (
+                b'--- file%d\t123\n'
+                b'+++ file%d\t(working copy)\n'
+                % (i, i))
+
+        header += b'@@ -1,1000 +1,1000 @@\n'
+        chunks.append(header)
+        chunks.append(hunk)
+        total += len(header) + len(hunk)
+        i += 1
+
+    return b''.join(chunks)
+
+
+def get_peak_rss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if sys.platform == 'darwin':
+        # macOS reports bytes, rather than kilobytes.
+        maxrss /= 1024
+
+    return maxrss / 1024.0
+
+
+def main():
+    option_parser = OptionParser(
+        usage='%prog [--parser=base|git] [size_mb ...]')
+    option_parser.add_option('--parser', default='base',
+                             help='The diff parser to benchmark (base or git)')
+    options, args = option_parser.parse_args()
+
+    sizes = [int(arg) for arg in args] or [5, 10, 25, 50]
+
+    setup_django()
+    parser_cls = get_parser_cls(options.parser)
+
+    print('%8s %8s %10s %10s %12s'
+          % ('Size MB', 'Files', 'Seconds', 'Sec/MB', 'Peak RSS MB'))
+
+    for size_mb in sizes:
+        diff = build_diff(options.parser, size_mb * 1024 * 1024)
+        gc.collect()
+
+        start = time.time()
+        files = parser_cls(diff).parse()
+        elapsed = time.time() - start
+
+        print('%8d %8d %10.2f %10.3f %12.1f'
+              % (size_mb, len(files), elapsed, elapsed / size_mb,
+                 get_peak_rss_mb()))
+
+        del diff, files
+
+
+if __name__ == '__main__':
+    main()
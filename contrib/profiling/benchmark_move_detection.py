@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""
+benchmark_move_detection.py [old_file new_file ...]
+
+Times moved-block detection on pairs of files, comparing the default limits
+(DiffOpcodeGenerator.MOVE_MAX_LINE_OCCURRENCES and MOVE_MAX_WORK) against
+unlimited detection, which matches the results from before those limits
+were introduced. For each pair, this prints the time taken and the number of
+moved lines found in each mode.
+
+Pairs of files from real refactoring changes give the most useful results.
+If no files are provided, a set of generated refactorings full of repeated
+lines is used instead.
+
+This must be run from the top of a Review Board source tree with a working
+settings_local.py.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import io
+import os
+import sys
+import time
+
+
+def setup_django():
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault(str('DJANGO_SETTINGS_MODULE'),
+                          str('reviewboard.settings'))
+
+
+def read_lines(filename):
+    with io.open(filename, 'r', encoding='utf-8', errors='replace') as fp:
+        return fp.read().splitlines()
+
+
+def build_refactoring(num_blocks):
+    """Build a generated refactoring with the given number of code blocks.
+
+    Each block ends in lines that are common throughout the file. The blocks
+    are moved below a new section of code.
+    """
+    blocks = []
+
+    for i in range(num_blocks):
+        blocks += [
+            'if (value == %d) {' % i,
+            '    handle_value_%d();' % i,
+            '    return None;',
+            '}',
+            '',
+        ]
+
+    header = ['unchanged line %d' % i for i in range(num_blocks)]
+
+    return blocks + header, header + blocks
+
+
+def count_moved_lines(opcodes):
+    return sum(
+        len(meta.get('moved-from', {}))
+        for tag, i1, i2, j1, j2, meta in opcodes
+    )
+
+
+def run_move_detection(old_lines, new_lines, opcodes, limited):
+    from reviewboard.diffviewer.differ import get_differ
+    from reviewboard.diffviewer.opcode_generator import DiffOpcodeGenerator
+
+    differ = get_differ(old_lines, new_lines)
+    differ.get_opcodes = lambda: iter(opcodes)
+    generator = DiffOpcodeGenerator(differ)
+
+    if not limited:
+        generator.MOVE_MAX_LINE_OCCURRENCES = None
+        generator.MOVE_MAX_WORK = None
+
+    start = time.time()
+    result = list(generator)
+
+    return time.time() - start, count_moved_lines(result)
+
+
+def main():
+    args = sys.argv[1:]
+
+    if len(args) % 2 != 0:
+        sys.stderr.write('Files must be provided in pairs.\n')
+        sys.exit(1)
+
+    setup_django()
+
+    from reviewboard.diffviewer.differ import get_differ
+
+    if args:
+        cases = [
+            ('%s -> %s' % (args[i], args[i + 1]),
+             read_lines(args[i]), read_lines(args[i + 1]))
+            for i in range(0, len(args), 2)
+        ]
+    else:
+        cases = [
+            ('generated, %d blocks' % num_blocks,) +
+            build_refactoring(num_blocks)
+            for num_blocks in (100, 500, 1000, 2000)
+        ]
+
+    print('%-40s %12s %8s %12s %8s %6s'
+          % ('Case', 'Unlimited s', 'Moved', 'Limited s', 'Moved', 'Same'))
+
+    for name, old_lines, new_lines in cases:
+        opcodes = list(get_differ(old_lines, new_lines).get_opcodes())
+
+        unlimited_time, unlimited_moved = run_move_detection(
+            old_lines, new_lines, opcodes, limited=False)
+        limited_time, limited_moved = run_move_detection(
+            old_lines, new_lines, opcodes, limited=True)
+
+        print('%-40s %12.3f %8d %12.3f %8d %6s'
+              % (name[-40:], unlimited_time, unlimited_moved, limited_time,
+                 limited_moved, unlimited_moved == limited_moved))
+
+
+if __name__ == '__main__':
+    main()
@@ -56,6 +56,7 @@ from reviewboard.admin.checks import (get_can_use_amazon_s3,
 from reviewboard.admin.siteconfig import load_site_config
 from reviewboard.admin.support import get_install_key
 from reviewboard.avatars import avatar_services
+from reviewboard.diffviewer.compression import get_compression_methods
 from reviewboard.search import search_backend_registry
 from reviewboard.ssh.client import SSHClient
 
@@ -158,6 +159,24 @@ class GeneralSettingsForm(SiteSettingsForm):
             'required': 'A valid cache host must be provided.'
         })
 
+    reviews_last_update_max_wait_secs = forms.IntegerField(
+        label=_('Update wait time (seconds)'),
+        help_text=_('The longest time that an open review request page can '
+                    'wait on the server to be told about a new update, '
+                    'rather than checking for one every few minutes. Each '
+                    'waiting page uses a server thread. Enter 0 to disable '
+                    'waiting.'),
+        min_value=0,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    webhooks_delivery_workers = forms.IntegerField(
+        label=_('Webhook threads'),
+        help_text=_('The number of threads in each server process that '
+                    'send webhook requests in the background. This limits '
+                    'how many webhook requests are sent at once.'),
+        min_value=1,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
     def load(self):
         """Load the form."""
         domain_method = self.siteconfig.get("site_domain_method")
@@ -371,6 +390,12 @@ class GeneralSettingsForm(SiteSettingsForm):
                 'title': _('Cache Settings'),
                 'fields': ('cache_type', 'cache_path', 'cache_host'),
             },
+            {
+                'classes': ('wide',),
+                'title': _('Advanced'),
+                'fields': ('reviews_last_update_max_wait_secs',
+                           'webhooks_delivery_workers'),
+            },
         )
 
 
@@ -791,6 +816,63 @@ class DiffSettingsForm(SiteSettingsForm):
                     'to disable size restrictions.'),
         widget=forms.TextInput(attrs={'size': '15'}))
 
+    diffviewer_file_cache_enabled = forms.BooleanField(
+        label=_('Cache original and patched files'),
+        help_text=_('Store normalized original files and patched files in '
+                    'the site data directory, so that re-rendering diffs '
+                    'and interdiffs can skip the repository.'),
+        required=False)
+
+    diffviewer_file_cache_max_size = forms.IntegerField(
+        label=_('Max file cache size (bytes)'),
+        help_text=_('The maximum size (in bytes) of the cache of original '
+                    'and patched files. The least recently used files are '
+                    'removed once the cache grows past this size.'),
+        min_value=0,
+        widget=forms.TextInput(attrs={'size': '15'}))
+
+    diffviewer_chunk_generation_workers = forms.IntegerField(
+        label=_('Diff generation threads'),
+        help_text=_('The maximum number of files in a diff to generate at '
+                    'once when building a page or API response. Enter 1 to '
+                    'generate one file at a time.'),
+        min_value=1,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_file_exists_workers = forms.IntegerField(
+        label=_('File check threads'),
+        help_text=_('The maximum number of files to check for at once on a '
+                    'hosting service when a diff is uploaded. Enter 1 to '
+                    'check one file at a time.'),
+        min_value=1,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_prewarm_workers = forms.IntegerField(
+        label=_('Background diff generation threads'),
+        help_text=_('The number of threads in each server process that '
+                    'generate newly published diffs in the background, so '
+                    'they load quickly for the first reviewer. Enter 0 to '
+                    'only generate diffs when they are viewed.'),
+        min_value=0,
+        widget=forms.TextInput(attrs={'size': '5'}))
+
+    diffviewer_diff_compression = forms.ChoiceField(
+        label=_('Diff compression'),
+        choices=(),
+        help_text=_('The method used to compress newly uploaded diffs. '
+                    'Existing diffs can be converted by running '
+                    '"rb-site manage /path/to/site recompressdiffs".'),
+        required=True)
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the form."""
+        super(DiffSettingsForm, self).__init__(*args, **kwargs)
+
+        self.fields['diffviewer_diff_compression'].choices = [
+            (method.name, method.label)
+            for method in get_compression_methods()
+        ]
+
     def load(self):
         """Load the form."""
         super(DiffSettingsForm, self).load()
@@ -827,7 +909,13 @@ class DiffSettingsForm(SiteSettingsForm):
                 'fields': ('diffviewer_max_diff_size',
                            'diffviewer_context_num_lines',
                            'diffviewer_paginate_by',
-                           'diffviewer_paginate_orphans')
+                           'diffviewer_paginate_orphans',
+                           'diffviewer_file_cache_enabled',
+                           'diffviewer_file_cache_max_size',
+                           'diffviewer_chunk_generation_workers',
+                           'diffviewer_file_exists_workers',
+                           'diffviewer_prewarm_workers',
+                           'diffviewer_diff_compression')
             }
         )
 
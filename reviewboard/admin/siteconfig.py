@@ -140,11 +140,17 @@ defaults.update({
     'auth_x509_autocreate_users': False,
     'company': '',
     'default_use_rich_text': True,
+    'diffviewer_chunk_generation_workers': 1,
     'diffviewer_context_num_lines': 5,
+    'diffviewer_diff_compression': 'zlib',
+    'diffviewer_file_cache_enabled': True,
+    'diffviewer_file_cache_max_size': 512 * 1024 * 1024,
+    'diffviewer_file_exists_workers': 8,
     'diffviewer_include_space_patterns': [],
     'diffviewer_max_diff_size': 0,
     'diffviewer_paginate_by': 20,
     'diffviewer_paginate_orphans': 10,
+    'diffviewer_prewarm_workers': 2,
     'diffviewer_syntax_highlighting': True,
     'diffviewer_syntax_highlighting_threshold': 0,
     'diffviewer_show_trailing_whitespace': True,
@@ -152,9 +158,11 @@ defaults.update({
     'mail_send_review_mail': False,
     'mail_send_new_user_mail': False,
     'mail_enable_autogenerated_header': True,
+    'reviews_last_update_max_wait_secs': 0,
     'search_enable': False,
     'send_support_usage_stats': True,
     'site_domain_method': 'http',
+    'webhooks_delivery_workers': 2,
 
     'search_results_per_page': 20,
     'search_backend_id': WhooshBackend.search_backend_id,
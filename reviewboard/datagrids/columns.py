@@ -1,6 +1,5 @@
 from __future__ import unicode_literals
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import NoReverseMatch
 from django.template.defaultfilters import date
 from django.utils import six
@@ -765,14 +764,20 @@ class DiffSizeColumn(Column):
             shrink=True,
             *args, **kwargs)
 
+    def augment_queryset(self, state, queryset):
+        """Add additional queries to the queryset."""
+        return queryset.prefetch_related('diffset_history__diffsets')
+
     def render_data(self, state, review_request):
         """Return the rendered contents of the column."""
-        try:
-            diffset = review_request.diffset_history.diffsets.latest()
-        except ObjectDoesNotExist:
+        # The diffsets are prefetched in revision order, so the last one is
+        # the latest.
+        diffsets = list(review_request.diffset_history.diffsets.all())
+
+        if not diffsets:
             return ''
 
-        counts = diffset.get_total_line_counts()
+        counts = diffsets[-1].get_raw_line_counts()
         insert_count = counts.get('raw_insert_count')
         delete_count = counts.get('raw_delete_count')
         result = []
@@ -10,7 +10,8 @@ from djblets.testing.decorators import add_fixtures
 
 from reviewboard.accounts.models import ReviewRequestVisit
 from reviewboard.datagrids.builtin_items import UserGroupsItem, UserProfileItem
-from reviewboard.datagrids.columns import SummaryColumn
+from reviewboard.datagrids.columns import DiffSizeColumn, SummaryColumn
+from reviewboard.diffviewer.models import DiffSet
 from reviewboard.reviews.models import (Group,
                                         ReviewRequest,
                                         ReviewRequestDraft,
@@ -704,6 +705,81 @@ class SubmitterViewTests(BaseViewTestCase):
                          review_request1)
 
 
+class DiffSizeColumnTests(BaseColumnTestCase):
+    """Testing reviewboard.datagrids.columns.DiffSizeColumn."""
+
+    column = DiffSizeColumn()
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def test_render_data(self):
+        """Testing DiffSizeColumn.render_data"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(diffset, diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+        diffset = self.create_diffset(review_request, revision=2)
+        self.create_filediff(diffset, diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+        self.create_filediff(diffset, source_file='/test-file-2',
+                             dest_file='/test-file-2',
+                             diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+
+        self.assertEqual(
+            self._render_data(review_request),
+            '<span class="diff-size-column insert">+2</span>&nbsp;'
+            '<span class="diff-size-column delete">-2</span>')
+
+    def test_render_data_with_stored_counts(self):
+        """Testing DiffSizeColumn.render_data with stored line counts
+        doesn't query files
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(diffset, diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+
+        # The first render will store the counts on the diffset.
+        self._render_data(review_request)
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+        self.assertEqual(diffset.raw_insert_count, 1)
+        self.assertEqual(diffset.raw_delete_count, 1)
+
+        review_request = self.column.augment_queryset(
+            self.stateful_column,
+            ReviewRequest.objects.filter(pk=review_request.pk)).get()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.column.render_data(self.stateful_column,
+                                        review_request),
+                '<span class="diff-size-column insert">+1</span>&nbsp;'
+                '<span class="diff-size-column delete">-1</span>')
+
+    def test_render_data_without_diffsets(self):
+        """Testing DiffSizeColumn.render_data without any diffsets"""
+        review_request = self.create_review_request(publish=True)
+
+        self.assertEqual(self._render_data(review_request), '')
+
+    def _render_data(self, review_request):
+        """Render the column for a review request fetched by the datagrid.
+
+        Args:
+            review_request (reviewboard.reviews.models.ReviewRequest):
+                The review request to render.
+
+        Returns:
+            unicode:
+            The rendered column.
+        """
+        review_request = self.column.augment_queryset(
+            self.stateful_column,
+            ReviewRequest.objects.filter(pk=review_request.pk)).get()
+
+        return self.column.render_data(self.stateful_column, review_request)
+
+
 class SummaryColumnTests(BaseColumnTestCase):
     """Testing reviewboard.datagrids.columns.SummaryColumn."""
 
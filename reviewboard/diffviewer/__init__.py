@@ -0,0 +1,21 @@
+from __future__ import unicode_literals
+
+from django.dispatch import receiver
+
+from reviewboard.signals import initializing
+
+
+@receiver(initializing)
+def _on_initializing(*args, **kwargs):
+    """Handler for when Review Board is initializing.
+
+    This will begin listening for published review requests, in order to
+    pre-generate the chunks for new diffs.
+
+    We do this during the initializing process instead of when the module
+    is loaded in order to avoid any circular imports caused by
+    reviewboard.reviews.models.
+    """
+    from reviewboard.diffviewer.prewarm import connect_signals
+
+    connect_signals()
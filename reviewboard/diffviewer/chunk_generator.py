@@ -1,22 +1,24 @@
 from __future__ import unicode_literals
 
 import fnmatch
-import functools
 import hashlib
 import re
 
 from django.utils import six
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
-from django.utils.six.moves import range
+from django.utils.six.moves import range, zip_longest
 from django.utils.translation import get_language
 from djblets.log import log_timed
 from djblets.cache.backend import cache_memoize
 from djblets.siteconfig.models import SiteConfiguration
-from pygments import highlight
+from pygments import __version__ as pygments_version, highlight
 from pygments.lexers import guess_lexer_for_filename
 from pygments.formatters import HtmlFormatter
 
+from reviewboard.diffviewer.chunk_serialization import (CHUNK_FORMAT_VERSION,
+                                                        deserialize_chunks,
+                                                        serialize_chunks)
 from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
 from reviewboard.diffviewer.diffutils import (get_line_changed_regions,
                                               get_original_file,
@@ -85,6 +87,11 @@ class RawDiffChunkGenerator(object):
         self.diff_compat = diff_compat
         self.differ = None
 
+        # Prepared content and outline state.
+        self._sources = None
+        self._markup = None
+        self._outline = None
+
         # Chunk processing state.
         self._last_header = [None, None]
         self._last_header_index = [0, 0]
@@ -102,9 +109,15 @@ class RawDiffChunkGenerator(object):
         stored in cache (given a cache key), and yielded.
         """
         if cache_key:
-            chunks = cache_memoize(cache_key,
-                                   lambda: list(self.get_chunks_uncached()),
-                                   large_data=True)
+            # The chunks are stored in a compact form, which is already
+            # compressed. The format version is part of the key, so that
+            # chunks stored in any other format are ignored.
+            data = cache_memoize(
+                '%s-v%d' % (cache_key, CHUNK_FORMAT_VERSION),
+                lambda: serialize_chunks(self.get_chunks_uncached()),
+                large_data=True,
+                compress_large_data=False)
+            chunks = deserialize_chunks(data)
         else:
             chunks = self.get_chunks_uncached()
 
@@ -116,6 +129,45 @@ class RawDiffChunkGenerator(object):
         for chunk in self.generate_chunks(self.old, self.new):
             yield chunk
 
+    def get_chunk_outlines(self):
+        """Return the chunks for the diff, without their lines.
+
+        This computes the diff and the information on each chunk (its type,
+        number of lines, headers, and other metadata), but doesn't build or
+        syntax-highlight any of the lines. Lines can then be loaded for just
+        the chunks being shown, using :py:meth:`get_chunk_lines`.
+
+        The outline and lines aren't cached separately, since they'd
+        duplicate the cached chunks from :py:meth:`get_chunks`. Callers
+        are expected to cache what they render from them.
+
+        Yields:
+            dict:
+            Each chunk, without a ``lines`` key.
+        """
+        for chunk, window in self._get_outline():
+            yield dict(chunk)
+
+    def get_chunk_lines(self, chunk_index):
+        """Return the lines for a single chunk.
+
+        Only the lines in the chunk are built.
+
+        Args:
+            chunk_index (int):
+                The index of the chunk.
+
+        Returns:
+            list of list:
+            The lines in the chunk, in the same form as the ``lines`` key in
+            the chunks from :py:meth:`get_chunks`.
+
+        Raises:
+            IndexError:
+                The chunk index was out of range.
+        """
+        return self._build_window_lines(self._get_outline()[chunk_index][1])
+
     def generate_chunks(self, old, new):
         """Generate chunks for the difference between two strings.
 
@@ -131,6 +183,38 @@ class RawDiffChunkGenerator(object):
         :py:attr:`counts` dictionary, which can then be accessed after
         yielding all chunks.
         """
+        self._prepare_sources(old, new)
+
+        for chunk, window in self._generate_outline():
+            chunk['lines'] = self._build_window_lines(window)
+            yield chunk
+
+    def _get_sources(self):
+        """Return the original and modified content to diff.
+
+        Subclasses can override this to fetch the content on demand.
+
+        Returns:
+            tuple:
+            A 2-tuple of the original and modified content, either as
+            strings or as lists of lines.
+        """
+        return self.old, self.new
+
+    def _prepare_sources(self, old, new):
+        """Normalize the content to diff.
+
+        The normalized content is stored for use when building the outline
+        and lines of the chunks. Syntax highlighting is deferred until lines
+        are first needed.
+
+        Args:
+            old (unicode or list of unicode):
+                The original content.
+
+            new (unicode or list of unicode):
+                The modified content.
+        """
         is_lists = isinstance(old, list)
         assert is_lists == isinstance(new, list)
 
@@ -145,8 +229,27 @@ class RawDiffChunkGenerator(object):
             old, a = self.normalize_source_string(old)
             new, b = self.normalize_source_string(new)
 
-        a_num_lines = len(a)
-        b_num_lines = len(b)
+        self._sources = (old, new, a, b, is_lists)
+        self._markup = None
+
+    def _get_markup(self):
+        """Return the markup for each line of the content being diffed.
+
+        The markup is computed the first time it's needed, syntax-highlighting
+        the content if enabled.
+
+        Returns:
+            tuple:
+            A 2-tuple of the lists of markup for the original and modified
+            lines.
+        """
+        if self._sources is None:
+            self._prepare_sources(*self._get_sources())
+
+        if self._markup is not None:
+            return self._markup
+
+        old, new, a, b, is_lists = self._sources
 
         if is_lists:
             markup_a = a
@@ -178,6 +281,54 @@ class RawDiffChunkGenerator(object):
             if not markup_b:
                 markup_b = self.NEWLINES_RE.split(escape(new))
 
+        self._markup = (markup_a, markup_b)
+
+        return self._markup
+
+    def _get_outline(self):
+        """Return the outline of the chunks, computing it if needed.
+
+        Returns:
+            list of tuple:
+            A list of 2-tuples of each chunk (without lines) and the window
+            of lines it covers.
+        """
+        if self._outline is None:
+            self._outline = self._get_outline_uncached()
+
+        return self._outline
+
+    def _get_outline_uncached(self):
+        """Return the outline of the chunks, bypassing the cache.
+
+        Returns:
+            list of tuple:
+            A list of 2-tuples of each chunk (without lines) and the window
+            of lines it covers.
+        """
+        self._prepare_sources(*self._get_sources())
+
+        return list(self._generate_outline())
+
+    def _generate_outline(self):
+        """Generate the outline of the chunks for the prepared content.
+
+        This diffs the content and computes everything about each chunk
+        except for its lines. Along with each chunk, this yields a window
+        describing the lines the chunk covers, which is later passed to
+        :py:meth:`_build_window_lines`.
+
+        The number of lines of each chunk type are stored in the
+        :py:attr:`counts` dictionary once all chunks have been yielded.
+
+        Yields:
+            tuple:
+            A 2-tuple of the chunk and its window.
+        """
+        old, new, a, b, is_lists = self._sources
+        a_num_lines = len(a)
+        b_num_lines = len(b)
+
         siteconfig = SiteConfiguration.objects.get_current()
         ignore_space = True
 
@@ -204,14 +355,8 @@ class RawDiffChunkGenerator(object):
         }
 
         for tag, i1, i2, j1, j2, meta in opcodes_generator:
-            old_lines = markup_a[i1:i2]
-            new_lines = markup_b[j1:j2]
-            num_lines = max(len(old_lines), len(new_lines))
-
-            lines = map(functools.partial(self._diff_line, tag, meta),
-                        range(line_num, line_num + num_lines),
-                        range(i1 + 1, i2 + 1), range(j1 + 1, j2 + 1),
-                        a[i1:i2], b[j1:j2], old_lines, new_lines)
+            num_lines = max(i2 - i1, j2 - j1)
+            opcode = (tag, i1, i2, j1, j2, line_num, meta)
 
             counts[tag] += num_lines
 
@@ -219,26 +364,62 @@ class RawDiffChunkGenerator(object):
                 last_range_start = num_lines - context_num_lines
 
                 if line_num == 1:
-                    yield self._new_chunk(lines, 0, last_range_start, True)
-                    yield self._new_chunk(lines, last_range_start, num_lines)
+                    yield self._new_chunk(opcode, 0, last_range_start, True)
+                    yield self._new_chunk(opcode, last_range_start, num_lines)
                 else:
-                    yield self._new_chunk(lines, 0, context_num_lines)
+                    yield self._new_chunk(opcode, 0, context_num_lines)
 
                     if i2 == a_num_lines and j2 == b_num_lines:
-                        yield self._new_chunk(lines, context_num_lines,
+                        yield self._new_chunk(opcode, context_num_lines,
                                               num_lines, True)
                     else:
-                        yield self._new_chunk(lines, context_num_lines,
+                        yield self._new_chunk(opcode, context_num_lines,
                                               last_range_start, True)
-                        yield self._new_chunk(lines, last_range_start,
+                        yield self._new_chunk(opcode, last_range_start,
                                               num_lines)
             else:
-                yield self._new_chunk(lines, 0, num_lines, False, tag, meta)
+                yield self._new_chunk(opcode, 0, num_lines, False, tag, meta)
 
             line_num += num_lines
 
         self.counts = counts
 
+    def _build_window_lines(self, window):
+        """Build the lines for a window of an opcode.
+
+        Args:
+            window (tuple):
+                The window of lines, as yielded by
+                :py:meth:`_generate_outline`.
+
+        Returns:
+            list of list:
+            The lines in the window.
+        """
+        tag, i1, i2, j1, j2, line_num, meta, start, end = window
+        markup_a, markup_b = self._get_markup()
+        a, b = self._sources[2:4]
+
+        num_lines = max(i2 - i1, j2 - j1)
+        old_start = i1 + start
+        old_end = min(i1 + end, i2)
+        new_start = j1 + start
+        new_end = min(j1 + end, j2)
+
+        # Lines missing on one side are filled in with None, just as with
+        # the shorter side of a replace.
+        return [
+            self._diff_line(tag, meta, *line_info)
+            for line_info in zip_longest(
+                range(line_num + start, line_num + min(end, num_lines)),
+                range(old_start + 1, old_end + 1),
+                range(new_start + 1, new_end + 1),
+                a[old_start:old_end],
+                b[new_start:new_end],
+                markup_a[old_start:old_end],
+                markup_b[new_start:new_end])
+        ]
+
     def normalize_source_string(self, s):
         """Normalize a source string of text to use for the diff.
 
@@ -543,7 +724,7 @@ class RawDiffChunkGenerator(object):
 
         return s, chars[j + 1:]
 
-    def _new_chunk(self, all_lines, start, end, collapsable=False,
+    def _new_chunk(self, opcode, start, end, collapsable=False,
                    tag='equal', meta=None):
         """Creates a chunk.
 
@@ -551,31 +732,37 @@ class RawDiffChunkGenerator(object):
         contains a bunch of metadata for things like whether or not it's
         collapsable and any header information.
 
-        This is what ends up being returned to the caller of this class.
+        The chunk covers the lines from ``start`` up to ``end`` within the
+        opcode. Its lines aren't built here. Instead, a window describing
+        them is returned along with the chunk.
         """
         if not meta:
             meta = {}
 
         left_headers = list(self._get_interesting_headers(
-            all_lines, start, end - 1, False))
+            opcode, start, end - 1, False))
         right_headers = list(self._get_interesting_headers(
-            all_lines, start, end - 1, True))
+            opcode, start, end - 1, True))
 
         meta['left_headers'] = left_headers
         meta['right_headers'] = right_headers
 
-        lines = all_lines[start:end]
-        num_lines = len(lines)
+        num_lines = min(end, self._get_opcode_num_lines(opcode)) - start
 
-        compute_chunk_last_header(lines, num_lines, meta, self._last_header)
+        compute_chunk_last_header(None, num_lines, meta, self._last_header)
 
-        if (collapsable and end < len(all_lines) and
+        if (collapsable and end < self._get_opcode_num_lines(opcode) and
                 (self._last_header[0] or self._last_header[1])):
             meta['headers'] = list(self._last_header)
 
+            # The headers are shown on collapsed chunks, which may be
+            # rendered without their lines. Their expansion offsets are
+            # based on the first line number in the original file.
+            meta['orig_first_line'] = \
+                self._get_opcode_line_num(opcode, start, False)
+
         chunk = {
             'index': self._chunk_index,
-            'lines': lines,
             'numlines': num_lines,
             'change': tag,
             'collapsable': collapsable,
@@ -584,13 +771,70 @@ class RawDiffChunkGenerator(object):
 
         self._chunk_index += 1
 
-        return chunk
+        return chunk, opcode + (start, end)
+
+    def _get_opcode_num_lines(self, opcode):
+        """Return the number of lines shown for an opcode.
+
+        Args:
+            opcode (tuple):
+                The opcode, along with its starting line number and metadata.
+
+        Returns:
+            int:
+            The number of lines.
+        """
+        tag, i1, i2, j1, j2, line_num, meta = opcode
+
+        return max(i2 - i1, j2 - j1)
+
+    def _get_opcode_line_num(self, opcode, index, is_modified_file):
+        """Return the file line number shown on a line of an opcode.
+
+        Args:
+            opcode (tuple):
+                The opcode, along with its starting line number and metadata.
+
+            index (int):
+                The index of the line within the opcode. Negative indexes
+                count back from the end, as with lists.
+
+            is_modified_file (bool):
+                Whether to return the line number in the modified file.
+
+        Returns:
+            int or unicode:
+            The line number, or an empty string if the line doesn't exist
+            on that side of the diff.
+
+        Raises:
+            IndexError:
+                The index was out of range.
+        """
+        tag, i1, i2, j1, j2, line_num, meta = opcode
+        num_lines = self._get_opcode_num_lines(opcode)
+
+        if index < 0:
+            index += num_lines
+
+        if index < 0 or index >= num_lines:
+            raise IndexError(index)
+
+        if is_modified_file:
+            first, last = j1, j2
+        else:
+            first, last = i1, i2
+
+        if index < last - first:
+            return first + index + 1
+        else:
+            return ''
 
-    def _get_interesting_headers(self, lines, start, end, is_modified_file):
+    def _get_interesting_headers(self, opcode, start, end, is_modified_file):
         """Returns all headers for a region of a diff.
 
         This scans for all headers that fall within the specified range
-        of the specified lines on both the original and modified files.
+        of lines in the opcode on both the original and modified files.
         """
         possible_functions = \
             self.differ.get_interesting_lines('header', is_modified_file)
@@ -599,17 +843,16 @@ class RawDiffChunkGenerator(object):
             raise StopIteration
 
         try:
-            if is_modified_file:
-                last_index = self._last_header_index[1]
-                i1 = lines[start][4]
-                i2 = lines[end - 1][4]
-            else:
-                last_index = self._last_header_index[0]
-                i1 = lines[start][1]
-                i2 = lines[end - 1][1]
+            i1 = self._get_opcode_line_num(opcode, start, is_modified_file)
+            i2 = self._get_opcode_line_num(opcode, end - 1, is_modified_file)
         except IndexError:
             raise StopIteration
 
+        if is_modified_file:
+            last_index = self._last_header_index[1]
+        else:
+            last_index = self._last_header_index[0]
+
         for i in range(last_index, len(possible_functions)):
             linenum, line = possible_functions[i]
             linenum += 1
@@ -629,6 +872,10 @@ class RawDiffChunkGenerator(object):
         """Applies Pygments syntax-highlighting to a file's contents.
 
         The resulting HTML will be returned as a list of lines.
+
+        The highlighted lines are cached by the SHA-1 of the contents and
+        the lexer used, so that the same file content is only highlighted
+        once, regardless of which revisions or interdiffs it appears in.
         """
         lexer = guess_lexer_for_filename(filename,
                                          data,
@@ -636,8 +883,17 @@ class RawDiffChunkGenerator(object):
                                          encoding='utf-8')
         lexer.add_filter('codetagify')
 
-        return split_line_endings(
-            highlight(data, lexer, NoWrapperHtmlFormatter()))
+        cache_key = 'diff-highlight-%s-%s.%s-%s' % (
+            pygments_version,
+            type(lexer).__module__,
+            type(lexer).__name__,
+            hashlib.sha1(data.encode('utf-8')).hexdigest())
+
+        return cache_memoize(
+            cache_key,
+            lambda: split_line_endings(
+                highlight(data, lexer, NoWrapperHtmlFormatter())),
+            large_data=True)
 
 
 class DiffChunkGenerator(RawDiffChunkGenerator):
@@ -741,14 +997,7 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         yielded. Otherwise, new chunks will be generated, stored in cache,
         and yielded.
         """
-        counts = self.filediff.get_line_counts()
-
-        if (self.filediff.binary or
-            self.filediff.source_revision == '' or
-            ((self.filediff.is_new or self.filediff.deleted or
-              self.filediff.moved or self.filediff.copied) and
-             counts['raw_insert_count'] == 0 and
-             counts['raw_delete_count'] == 0)):
+        if not self._has_chunks():
             raise StopIteration
 
         cache_key = self.make_cache_key()
@@ -756,54 +1005,142 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         for chunk in super(DiffChunkGenerator, self).get_chunks(cache_key):
             yield chunk
 
+    def get_chunk_outlines(self):
+        """Return the chunks for the diff, without their lines.
+
+        This works like :py:meth:`get_chunks`, but only computes the
+        information on each chunk. Lines can then be loaded for individual
+        chunks using :py:meth:`get_chunk_lines`.
+
+        Yields:
+            dict:
+            Each chunk, without a ``lines`` key.
+        """
+        if not self._has_chunks():
+            raise StopIteration
+
+        for chunk in super(DiffChunkGenerator, self).get_chunk_outlines():
+            yield chunk
+
+    def get_chunk_lines(self, chunk_index):
+        """Return the lines for a single chunk.
+
+        Args:
+            chunk_index (int):
+                The index of the chunk.
+
+        Returns:
+            list of list:
+            The lines in the chunk.
+
+        Raises:
+            IndexError:
+                The chunk index was out of range.
+        """
+        if not self._has_chunks():
+            raise IndexError(chunk_index)
+
+        return super(DiffChunkGenerator, self).get_chunk_lines(chunk_index)
+
     def get_chunks_uncached(self):
         """Yield the list of chunks, bypassing the cache."""
-        old = get_original_file(self.filediff, self.request,
-                                self.encoding_list)
-        new = get_patched_file(old, self.filediff, self.request)
-
-        if self.filediff.orig_sha1 is None:
-            self.filediff.extra_data.update({
-                'orig_sha1': self._get_checksum(old),
-                'patched_sha1': self._get_checksum(new),
-            })
-            self.filediff.save(update_fields=['extra_data'])
+        old, new = self._get_sources()
+        log_timer = self._log_timed('Generating diff chunks')
+
+        for chunk in self.generate_chunks(old, new):
+            yield chunk
+
+        log_timer.done()
+        self._save_line_counts()
+
+    def _get_outline_uncached(self):
+        """Return the outline of the chunks, bypassing the cache.
+
+        Returns:
+            list of tuple:
+            A list of 2-tuples of each chunk (without lines) and the window
+            of lines it covers.
+        """
+        log_timer = self._log_timed('Generating diff chunk outline')
+        outline = super(DiffChunkGenerator, self)._get_outline_uncached()
+        log_timer.done()
+        self._save_line_counts()
+
+        return outline
+
+    def _get_sources(self):
+        """Return the original and modified files to diff.
+
+        Returns:
+            tuple:
+            A 2-tuple of the original and modified file contents.
+        """
+        # Interdiffs only compare the patched files, so there's no need to
+        # fetch the original files if the patched ones are already cached.
+        old, new = self._get_original_and_patched_files(
+            self.filediff,
+            need_original=not self.interfilediff)
 
         if self.interfilediff:
             old = new
-            interdiff_orig = get_original_file(self.interfilediff,
-                                               self.request,
-                                               self.encoding_list)
-            new = get_patched_file(interdiff_orig, self.interfilediff,
-                                   self.request)
-
-            if self.interfilediff.orig_sha1 is None:
-                self.interfilediff.extra_data.update({
-                    'orig_sha1': self._get_checksum(interdiff_orig),
-                    'patched_sha1': self._get_checksum(new),
-                })
-                self.interfilediff.save(update_fields=['extra_data'])
+            new = self._get_original_and_patched_files(
+                self.interfilediff,
+                need_original=False)[1]
         elif self.force_interdiff:
             # Basically, revert the change.
             old, new = new, old
 
+        return old, new
+
+    def _has_chunks(self):
+        """Return whether there are any chunks to show for the file.
+
+        Binary files, files with no source revision, and added, deleted,
+        moved, or copied files with no changed lines don't have any chunks.
+
+        Returns:
+            bool:
+            Whether chunks can be generated for the file.
+        """
+        counts = self.filediff.get_line_counts()
+
+        return not (
+            self.filediff.binary or
+            self.filediff.source_revision == '' or
+            ((self.filediff.is_new or self.filediff.deleted or
+              self.filediff.moved or self.filediff.copied) and
+             counts['raw_insert_count'] == 0 and
+             counts['raw_delete_count'] == 0))
+
+    def _log_timed(self, action):
+        """Start timing a stage of chunk generation for logging.
+
+        Args:
+            action (unicode):
+                A description of the stage being timed.
+
+        Returns:
+            object:
+            The timer, which must be ended by calling ``done()``.
+        """
         if self.interfilediff:
-            log_timer = log_timed(
-                "Generating diff chunks for interdiff ids %s-%s (%s)" %
-                (self.filediff.id, self.interfilediff.id,
+            return log_timed(
+                "%s for interdiff ids %s-%s (%s)" %
+                (action, self.filediff.id, self.interfilediff.id,
                  self.filediff.source_file),
                 request=self.request)
         else:
-            log_timer = log_timed(
-                "Generating diff chunks for self.filediff id %s (%s)" %
-                (self.filediff.id, self.filediff.source_file),
+            return log_timed(
+                "%s for self.filediff id %s (%s)" %
+                (action, self.filediff.id, self.filediff.source_file),
                 request=self.request)
 
-        for chunk in self.generate_chunks(old, new):
-            yield chunk
-
-        log_timer.done()
+    def _save_line_counts(self):
+        """Store the line counts from the last diff on the FileDiff.
 
+        This is only done when diffing the FileDiff against its original
+        file, and not for interdiffs.
+        """
         if not self.interfilediff and not self.force_interdiff:
             insert_count = self.counts['insert']
             delete_count = self.counts['delete']
@@ -821,6 +1158,47 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
     def normalize_path_for_display(self, filename):
         return self.tool.normalize_path_for_display(filename)
 
+    def _get_original_and_patched_files(self, filediff, need_original):
+        """Return the original and patched files for a FileDiff.
+
+        If the checksums of the files haven't yet been computed, both files
+        will be fetched and the checksums stored on the FileDiff. Otherwise,
+        they'll be looked up in the file content cache, with the original
+        file only being fetched if it's needed.
+
+        Args:
+            filediff (reviewboard.diffviewer.models.FileDiff):
+                The FileDiff to return files for.
+
+            need_original (bool):
+                Whether the caller needs the original file.
+
+        Returns:
+            tuple:
+            A 2-tuple of the original file (or ``None``, if not needed) and
+            the patched file.
+        """
+        if filediff.orig_sha1 is None:
+            orig = get_original_file(filediff, self.request,
+                                     self.encoding_list)
+            patched = get_patched_file(orig, filediff, self.request)
+
+            filediff.extra_data.update({
+                'orig_sha1': self._get_checksum(orig),
+                'patched_sha1': self._get_checksum(patched),
+            })
+            filediff.save(update_fields=['extra_data'])
+        else:
+            if need_original:
+                orig = get_original_file(filediff, self.request,
+                                         self.encoding_list)
+            else:
+                orig = None
+
+            patched = get_patched_file(orig, filediff, self.request)
+
+        return orig, patched
+
     def _get_checksum(self, content):
         hasher = hashlib.sha1()
         hasher.update(content)
@@ -836,14 +1214,14 @@ def compute_chunk_last_header(lines, numlines, meta, last_header=None):
     The last_header variable, if provided, will be modified, which is
     important when processing several chunks at once. It will also be
     returned as a convenience.
+
+    Only the headers in ``meta`` are used. ``lines`` and ``numlines`` are
+    accepted for compatibility.
     """
     if last_header is None:
         last_header = [None, None]
 
-    line = lines[0]
-
-    for i, (linenum, header_key) in enumerate([(line[1], 'left_headers'),
-                                               (line[4], 'right_headers')]):
+    for i, header_key in enumerate(('left_headers', 'right_headers')):
         headers = meta[header_key]
 
         if headers:
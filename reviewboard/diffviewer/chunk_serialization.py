@@ -0,0 +1,270 @@
+"""Compact serialization of diff chunks for storage in the cache.
+
+Chunks generated by
+:py:class:`~reviewboard.diffviewer.chunk_generator.RawDiffChunkGenerator`
+hold a list for every line, with line numbers, markup, changed regions, and
+flags. Pickling these directly produces data several times the size of the
+file being diffed, which is slow to transfer from the cache and to unpickle.
+
+Instead, chunks are stored as:
+
+* A table of each distinct piece of line markup, so that repeated lines
+  (blank lines, closing braces, and so on) are only stored once.
+
+* A packed array of integers for each line, holding its line numbers, the
+  indexes of its markup in the table, and its flags.
+
+* Separate tables for the few lines that have changed regions or moved line
+  information.
+
+This is pickled and compressed once, along with a header identifying the
+format version. When reading, the lines for each chunk are only built as the
+chunk is reached.
+"""
+
+from __future__ import unicode_literals
+
+import array
+import struct
+import sys
+import zlib
+
+from django.utils import six
+from django.utils.safestring import mark_safe
+from django.utils.six.moves import cPickle as pickle, range, zip
+
+
+#: The version of the serialization format.
+#:
+#: This must be changed whenever the format changes. It's included in cache
+#: keys, so that data in an older format isn't loaded.
+CHUNK_FORMAT_VERSION = 1
+
+
+# The header at the start of all serialized data. This is followed by a
+# single byte for the version, and another for the byte order of the packed
+# line data.
+_HEADER = b'RBCHUNKS'
+
+_HEADER_FMT = str('!%dsBB' % len(_HEADER))
+_HEADER_LEN = struct.calcsize(_HEADER_FMT)
+
+_BIG_ENDIAN = 1
+_LITTLE_ENDIAN = 0
+
+if sys.byteorder == 'big':
+    _NATIVE_BYTE_ORDER = _BIG_ENDIAN
+else:
+    _NATIVE_BYTE_ORDER = _LITTLE_ENDIAN
+
+# The typecode for the packed line data. This is at least 32 bits on all
+# supported platforms.
+_ARRAY_TYPECODE = str('l')
+
+# The number of integers stored for each line.
+_LINE_FIELDS = 6
+
+# The flags stored for each line.
+_FLAG_WHITESPACE = 1 << 0
+_FLAG_OLD_LINE_NUM = 1 << 1
+_FLAG_NEW_LINE_NUM = 1 << 2
+
+
+def serialize_chunks(chunks):
+    """Serialize a list of chunks.
+
+    Args:
+        chunks (list of dict):
+            The chunks to serialize, as generated by
+            :py:meth:`RawDiffChunkGenerator.get_chunks_uncached()
+            <reviewboard.diffviewer.chunk_generator.RawDiffChunkGenerator.
+            get_chunks_uncached>`.
+
+    Returns:
+        bytes:
+        The serialized data.
+    """
+    strings = []
+    string_ids = {}
+    line_data = array.array(_ARRAY_TYPECODE)
+    regions = {}
+    moved = {}
+    chunk_infos = []
+    line_index = 0
+
+    def _get_string_id(s):
+        try:
+            return string_ids[s]
+        except KeyError:
+            string_id = len(strings)
+            strings.append(six.text_type(s))
+            string_ids[s] = string_id
+
+            return string_id
+
+    for chunk in chunks:
+        lines = chunk['lines']
+        chunk_infos.append((chunk['index'], chunk['numlines'],
+                            chunk['change'], chunk['collapsable'],
+                            chunk['meta'], len(lines)))
+
+        for line in lines:
+            (v_line_num, old_line_num, old_markup, old_region,
+             new_line_num, new_markup, new_region, whitespace) = line[:8]
+
+            flags = 0
+
+            if whitespace:
+                flags |= _FLAG_WHITESPACE
+
+            # Line numbers are an empty string when the line doesn't exist on
+            # that side of the diff.
+            if old_line_num != '':
+                flags |= _FLAG_OLD_LINE_NUM
+            else:
+                old_line_num = 0
+
+            if new_line_num != '':
+                flags |= _FLAG_NEW_LINE_NUM
+            else:
+                new_line_num = 0
+
+            line_data.extend((v_line_num,
+                              old_line_num,
+                              _get_string_id(old_markup),
+                              new_line_num,
+                              _get_string_id(new_markup),
+                              flags))
+
+            if old_region or new_region:
+                regions[line_index] = (old_region, new_region)
+
+            if len(line) > 8:
+                moved[line_index] = line[8]
+
+            line_index += 1
+
+    payload = pickle.dumps((chunk_infos, strings, line_data.tostring(),
+                            regions, moved),
+                           pickle.HIGHEST_PROTOCOL)
+
+    return (struct.pack(_HEADER_FMT, _HEADER, CHUNK_FORMAT_VERSION,
+                        _NATIVE_BYTE_ORDER) +
+            zlib.compress(payload))
+
+
+def deserialize_chunks(data):
+    """Deserialize a list of chunks.
+
+    The data is decompressed and unpickled immediately, but the lines for
+    each chunk aren't built until the chunk is reached.
+
+    Args:
+        data (bytes):
+            The data from :py:func:`serialize_chunks`.
+
+    Returns:
+        generator:
+        A generator yielding each chunk, in the same form as it was
+        serialized.
+
+    Raises:
+        ValueError:
+            The data is not in a supported format.
+    """
+    if len(data) < _HEADER_LEN:
+        raise ValueError('Serialized chunk data is truncated')
+
+    header, version, byte_order = struct.unpack(_HEADER_FMT,
+                                                data[:_HEADER_LEN])
+
+    if header != _HEADER:
+        raise ValueError('Data is not serialized chunk data')
+
+    if version != CHUNK_FORMAT_VERSION:
+        raise ValueError('Unsupported serialized chunk format version %d'
+                         % version)
+
+    try:
+        chunk_infos, strings, packed_lines, regions, moved = \
+            pickle.loads(zlib.decompress(data[_HEADER_LEN:]))
+    except Exception as e:
+        raise ValueError('Unable to load serialized chunk data: %s' % e)
+
+    line_data = array.array(_ARRAY_TYPECODE)
+    line_data.fromstring(packed_lines)
+
+    if byte_order != _NATIVE_BYTE_ORDER:
+        line_data.byteswap()
+
+    return _iter_chunks(chunk_infos, strings, line_data, regions, moved)
+
+
+def _iter_chunks(chunk_infos, strings, line_data, regions, moved):
+    """Yield each deserialized chunk.
+
+    Args:
+        chunk_infos (list of tuple):
+            The information on each chunk, other than its lines.
+
+        strings (list of unicode):
+            The table of line markup.
+
+        line_data (array.array):
+            The packed integers for each line.
+
+        regions (dict):
+            The changed regions for each line that has them, keyed by the
+            index of the line.
+
+        moved (dict):
+            The moved line information for each line that has it, keyed by
+            the index of the line.
+
+    Yields:
+        dict:
+        Each chunk.
+    """
+    strings = [mark_safe(s) for s in strings]
+    all_fields = iter(line_data)
+    line_fields = zip(*[all_fields] * _LINE_FIELDS)
+    line_index = 0
+
+    for index, numlines, change, collapsable, meta, num_lines in chunk_infos:
+        lines = []
+
+        for i, fields in zip(range(line_index, line_index + num_lines),
+                             line_fields):
+            (v_line_num, old_line_num, old_markup_id, new_line_num,
+             new_markup_id, flags) = fields
+
+            if not flags & _FLAG_OLD_LINE_NUM:
+                old_line_num = ''
+
+            if not flags & _FLAG_NEW_LINE_NUM:
+                new_line_num = ''
+
+            old_region, new_region = regions.get(i, ([], []))
+
+            line = [
+                v_line_num,
+                old_line_num, strings[old_markup_id], old_region,
+                new_line_num, strings[new_markup_id], new_region,
+                bool(flags & _FLAG_WHITESPACE),
+            ]
+
+            if i in moved:
+                line.append(moved[i])
+
+            lines.append(line)
+
+        line_index += num_lines
+
+        yield {
+            'index': index,
+            'numlines': numlines,
+            'change': change,
+            'collapsable': collapsable,
+            'meta': meta,
+            'lines': lines,
+        }
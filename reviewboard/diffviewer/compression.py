@@ -0,0 +1,310 @@
+"""Compression methods for stored diff data.
+
+Each :py:class:`~reviewboard.diffviewer.models.RawFileDiffData` records the
+method used to compress its content as a single-character flag, so content
+compressed with any of these methods can always be read back. New content is
+compressed using the method chosen by the ``diffviewer_diff_compression`` site
+configuration setting.
+
+The Zstandard and LZ4 methods require the optional ``zstandard`` and
+``lz4`` modules.
+"""
+
+from __future__ import unicode_literals
+
+import bz2
+import logging
+import zlib
+
+from django.utils.six.moves import range
+from django.utils.translation import ugettext_lazy as _
+from djblets.siteconfig.models import SiteConfiguration
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class CompressionMethod(object):
+    """A method for compressing stored diff data.
+
+    Subclasses must set :py:attr:`name`, :py:attr:`flag`, and
+    :py:attr:`label`, and implement :py:meth:`compress` and
+    :py:meth:`decompress`.
+    """
+
+    #: The name of the method, used for the site configuration setting.
+    name = None
+
+    #: The value stored in ``RawFileDiffData.compression``.
+    flag = None
+
+    #: The name of the method shown to administrators.
+    label = None
+
+    #: The number of bytes of compressed data decompressed at a time by
+    #: :py:meth:`iter_decompress`, and the largest piece of decompressed
+    #: data it yields.
+    DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+    def is_available(self):
+        """Return whether the method can be used.
+
+        Returns:
+            bool:
+            Whether any required modules are installed.
+        """
+        return True
+
+    def compress(self, data):
+        """Compress data.
+
+        Args:
+            data (bytes):
+                The data to compress.
+
+        Returns:
+            bytes:
+            The compressed data.
+        """
+        raise NotImplementedError
+
+    def decompress(self, data):
+        """Decompress data.
+
+        Args:
+            data (bytes):
+                The data to decompress.
+
+        Returns:
+            bytes:
+            The decompressed data.
+        """
+        raise NotImplementedError
+
+    def create_decompressor(self):
+        """Return an object for decompressing data incrementally.
+
+        Returns:
+            object:
+            An object with a ``decompress`` method, which takes a piece of
+            compressed data and returns the data decompressed so far.
+        """
+        raise NotImplementedError
+
+    def iter_decompress(self, data):
+        """Decompress data a piece at a time.
+
+        This avoids holding all the decompressed data in memory at once.
+        Some decompressors (such as bzip2's) only produce output once they've
+        read a whole block, so the output is also split up, in order to
+        yield pieces of at most :py:attr:`DECOMPRESS_CHUNK_SIZE` bytes.
+
+        Args:
+            data (bytes):
+                The data to decompress.
+
+        Yields:
+            bytes:
+            Each piece of decompressed data.
+        """
+        decompressor = self.create_decompressor()
+        chunk_size = self.DECOMPRESS_CHUNK_SIZE
+
+        for i in range(0, len(data), chunk_size):
+            content = decompressor.decompress(data[i:i + chunk_size])
+
+            for j in range(0, len(content), chunk_size):
+                yield content[j:j + chunk_size]
+
+
+class BZip2CompressionMethod(CompressionMethod):
+    """Compression using bzip2.
+
+    This produces the smallest data, but is by far the slowest.
+    """
+
+    name = 'bzip2'
+    flag = 'B'
+    label = _('BZip2 (smallest, slowest)')
+
+    def compress(self, data):
+        return bz2.compress(data, 9)
+
+    def decompress(self, data):
+        return bz2.decompress(data)
+
+    def create_decompressor(self):
+        return bz2.BZ2Decompressor()
+
+
+class ZlibCompressionMethod(CompressionMethod):
+    """Compression using zlib.
+
+    This is several times faster than bzip2 to compress, and many times
+    faster to decompress, at the cost of slightly larger data.
+    """
+
+    name = 'zlib'
+    flag = 'Z'
+    label = _('Zlib')
+
+    def compress(self, data):
+        return zlib.compress(data, 9)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+    def create_decompressor(self):
+        return zlib.decompressobj()
+
+
+class ZstdCompressionMethod(CompressionMethod):
+    """Compression using Zstandard.
+
+    This compresses about as well as bzip2, and decompresses faster than
+    zlib.
+    """
+
+    name = 'zstd'
+    flag = 'S'
+    label = _('Zstandard')
+
+    #: The compression level used.
+    LEVEL = 10
+
+    def is_available(self):
+        return zstandard is not None
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.LEVEL).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    def create_decompressor(self):
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+class LZ4CompressionMethod(CompressionMethod):
+    """Compression using LZ4.
+
+    This is the fastest method, but produces the largest data.
+    """
+
+    name = 'lz4'
+    flag = 'L'
+    label = _('LZ4 (largest, fastest)')
+
+    def is_available(self):
+        return lz4_frame is not None
+
+    def compress(self, data):
+        return lz4_frame.compress(data)
+
+    def decompress(self, data):
+        return lz4_frame.decompress(data)
+
+    def create_decompressor(self):
+        return lz4_frame.LZ4FrameDecompressor()
+
+
+#: The name of the method used if the configured one isn't available.
+DEFAULT_COMPRESSION_METHOD = ZlibCompressionMethod.name
+
+
+_compression_methods = [
+    BZip2CompressionMethod(),
+    ZlibCompressionMethod(),
+    ZstdCompressionMethod(),
+    LZ4CompressionMethod(),
+]
+
+
+def get_compression_methods():
+    """Return all compression methods that can be used.
+
+    Returns:
+        list of CompressionMethod:
+        The methods whose required modules are installed.
+    """
+    return [
+        method
+        for method in _compression_methods
+        if method.is_available()
+    ]
+
+
+def get_compression_method(name):
+    """Return the compression method with the given name.
+
+    Args:
+        name (unicode):
+            The name of the method.
+
+    Returns:
+        CompressionMethod:
+        The method, or ``None`` if it doesn't exist or isn't available.
+    """
+    for method in _compression_methods:
+        if method.name == name and method.is_available():
+            return method
+
+    return None
+
+
+def get_compression_method_for_flag(flag):
+    """Return the compression method for a stored compression flag.
+
+    Args:
+        flag (unicode):
+            The value of ``RawFileDiffData.compression``.
+
+    Returns:
+        CompressionMethod:
+        The method, or ``None`` if it isn't known.
+
+    Raises:
+        NotImplementedError:
+            The method is known, but its required module isn't installed.
+    """
+    for method in _compression_methods:
+        if method.flag == flag:
+            if not method.is_available():
+                raise NotImplementedError(
+                    'The %s compression method requires a module that is '
+                    'not installed'
+                    % method.name)
+
+            return method
+
+    return None
+
+
+def get_configured_compression_method():
+    """Return the compression method to use for new diff data.
+
+    This is based on the ``diffviewer_diff_compression`` site configuration
+    setting. If that method isn't available, zlib is used instead.
+
+    Returns:
+        CompressionMethod:
+        The compression method.
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+    name = siteconfig.get('diffviewer_diff_compression')
+    method = get_compression_method(name)
+
+    if method is None:
+        logging.warning('The "%s" diff compression method is not available. '
+                        'Falling back to "%s".',
+                        name, DEFAULT_COMPRESSION_METHOD)
+        method = get_compression_method(DEFAULT_COMPRESSION_METHOD)
+
+    return method
@@ -88,15 +88,16 @@ def get_differ(a, b, ignore_space=False,
                compat_version=DiffCompatVersion.DEFAULT):
     """Returns a differ for with the given settings.
 
-    By default, this will return the MyersDiffer. Older differs can be used
+    By default, this will return the FastMyersDiffer, which produces the same
+    opcodes as the MyersDiffer in less time. Older differs can be used
     by specifying a compat_version, but this is only for *really* ancient
     diffs, currently.
     """
     cls = None
 
     if compat_version in DiffCompatVersion.MYERS_VERSIONS:
-        from reviewboard.diffviewer.myersdiff import MyersDiffer
-        cls = MyersDiffer
+        from reviewboard.diffviewer.fastmyersdiff import FastMyersDiffer
+        cls = FastMyersDiffer
     elif compat_version == DiffCompatVersion.SMDIFFER:
         from reviewboard.diffviewer.smdiff import SMDiffer
         cls = SMDiffer
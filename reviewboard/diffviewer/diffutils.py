@@ -5,17 +5,25 @@ import os
 import re
 import shutil
 import subprocess
+import sys
 import tempfile
+import threading
+import time
+from bisect import bisect_right
 from difflib import SequenceMatcher
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.utils import six
+from django.db import connection
+from django.utils import six, translation
 from django.utils.translation import ugettext as _
 from djblets.log import log_timed
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.contextmanagers import controlled_subprocess
 
 from reviewboard.diffviewer.errors import PatchError
+from reviewboard.diffviewer.filecache import (cache_file_content,
+                                              get_cached_file_content)
+from reviewboard.diffviewer.patcher import UnsupportedPatchError, apply_patch
 from reviewboard.scmtools.core import PRE_CREATION, HEAD
 
 
@@ -122,8 +130,12 @@ def split_line_endings(data):
 def patch(diff, orig_file, filename, request=None):
     """Apply a diff to a file.
 
-    This delegates out to ``patch`` because noone except Larry Wall knows how
-    to patch.
+    The diff is first applied in-process, using
+    :py:mod:`reviewboard.diffviewer.patcher`, which avoids writing files to
+    disk and spawning a process for every file. If the diff isn't in a format
+    the in-process patcher understands, or any hunks fail to apply, this
+    falls back on ``patch``, because noone except Larry Wall knows how to
+    patch.
 
     Args:
         diff (bytes):
@@ -152,13 +164,59 @@ def patch(diff, orig_file, filename, request=None):
         # Someone uploaded an unchanged file. Return the one we're patching.
         return orig_file
 
-    # Prepare the temporary directory if none is available
-    tempdir = tempfile.mkdtemp(prefix='reviewboard.')
-
     try:
         orig_file = convert_line_endings(orig_file)
         diff = convert_line_endings(diff)
 
+        try:
+            return apply_patch(diff, orig_file, filename)
+        except UnsupportedPatchError as e:
+            logging.debug('Falling back on patch for %s: %s', filename, e)
+        except PatchError as e:
+            logging.debug('Unable to apply diff to %s in-process. Falling '
+                          'back on patch. Errors were: %s',
+                          filename, e.error_output)
+
+            try:
+                return _patch_with_subprocess(diff, orig_file, filename)
+            except OSError as os_error:
+                logging.error('Unable to run patch for %s: %s',
+                              filename, os_error)
+                raise e
+
+        return _patch_with_subprocess(diff, orig_file, filename)
+    finally:
+        log_timer.done()
+
+
+def _patch_with_subprocess(diff, orig_file, filename):
+    """Apply a diff to a file using the ``patch`` command.
+
+    Args:
+        diff (bytes):
+            The contents of the diff to apply, with normalized line endings.
+
+        orig_file (bytes):
+            The contents of the original file, with normalized line endings.
+
+        filename (unicode):
+            The name of the file being patched.
+
+    Returns:
+        bytes:
+        The contents of the patched file.
+
+    Raises:
+        OSError:
+            The ``patch`` command could not be run.
+
+        reviewboard.diffutils.errors.PatchError:
+            An error occurred when trying to apply the patch.
+    """
+    # Prepare the temporary directory if none is available
+    tempdir = tempfile.mkdtemp(prefix='reviewboard.')
+
+    try:
         (fd, oldfile) = tempfile.mkstemp(dir=tempdir)
         f = os.fdopen(fd, 'w+b')
         f.write(orig_file)
@@ -206,16 +264,37 @@ def patch(diff, orig_file, filename, request=None):
         return new_file
     finally:
         shutil.rmtree(tempdir)
-        log_timer.done()
 
 
 def get_original_file(filediff, request, encoding_list):
-    """
-    Get a file either from the cache or the SCM, applying the parent diff if
-    it exists.
+    """Return the original file for a FileDiff, applying any parent diff.
+
+    If the FileDiff's ``orig_sha1`` is known and the contents are in the
+    :py:mod:`file content cache <reviewboard.diffviewer.filecache>`, they'll
+    be returned from there. Otherwise, the file will be fetched from the SCM,
+    normalized, patched with the parent diff (if any), and then cached.
 
     SCM exceptions are passed back to the caller.
+
+    Args:
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff to return the original file for.
+
+        request (django.http.HttpRequest):
+            The HTTP request, for use in logging.
+
+        encoding_list (list of unicode):
+            The encodings to try when normalizing the file.
+
+    Returns:
+        bytes:
+        The contents of the original file.
     """
+    data = get_cached_file_content(filediff.orig_sha1)
+
+    if data is not None:
+        return data
+
     data = b""
 
     if not filediff.is_new:
@@ -230,15 +309,8 @@ def get_original_file(filediff, request, encoding_list):
         encoding, data = convert_to_unicode(data, encoding_list)
 
         # Repository.get_file doesn't know or care about how we need line
-        # endings to work. So, we'll just transform every time.
-        #
-        # This is mostly only a problem if the diff chunks aren't in the
-        # cache, though if several people are working off the same file,
-        # we'll be doing extra work to convert those line endings for each
-        # of those instead of once.
-        #
-        # Only other option is to cache the resulting file, but then we're
-        # duplicating the cached contents.
+        # endings to work. So, we'll just transform here, and cache the
+        # result (below) so that this only has to happen once per file.
         data = convert_line_endings(data)
 
         # Convert back to bytes using whichever encoding we used to decode.
@@ -251,14 +323,108 @@ def get_original_file(filediff, request, encoding_list):
         data = patch(filediff.parent_diff, data, filediff.source_file,
                      request)
 
+    cache_file_content(data)
+
     return data
 
 
 def get_patched_file(buffer, filediff, request):
-    tool = filediff.diffset.repository.get_scmtool()
+    """Return the patched file for a FileDiff.
+
+    If the FileDiff's ``patched_sha1`` is known and the contents are in the
+    :py:mod:`file content cache <reviewboard.diffviewer.filecache>`, they'll
+    be returned from there. Otherwise, the diff will be applied to the
+    original file and the result cached.
+
+    Args:
+        buffer (bytes):
+            The contents of the original file, as returned by
+            :py:func:`get_original_file`. If ``None``, the original file
+            will only be fetched if the patched file isn't cached.
+
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff to return the patched file for.
+
+        request (django.http.HttpRequest):
+            The HTTP request, for use in logging.
+
+    Returns:
+        bytes:
+        The contents of the patched file.
+    """
+    data = get_cached_file_content(filediff.patched_sha1)
+
+    if data is not None:
+        return data
+
+    repository = filediff.diffset.repository
+
+    if buffer is None:
+        buffer = get_original_file(filediff, request,
+                                   repository.get_encoding_list())
+
+    tool = repository.get_scmtool()
     diff = tool.normalize_patch(filediff.diff, filediff.source_file,
                                 filediff.source_revision)
-    return patch(diff, buffer, filediff.dest_file, request)
+    data = patch(diff, buffer, filediff.dest_file, request)
+
+    cache_file_content(data)
+
+    return data
+
+
+def prefetch_original_files(filediffs, request=None):
+    """Fetch the original files for several FileDiffs at once.
+
+    This fetches the files through :py:meth:`Repository.get_files()
+    <reviewboard.scmtools.models.Repository.get_files>`, which caches them,
+    so that :py:func:`get_original_file` can later read them from the cache
+    instead of fetching each one from the repository separately.
+
+    FileDiffs that have been processed before (which will have an
+    ``orig_sha1``), new files, and binary files are skipped, since their
+    original files either aren't needed or are likely to be in the
+    :py:mod:`file content cache <reviewboard.diffviewer.filecache>`.
+
+    Errors are logged and otherwise ignored. They'll be raised again when
+    the individual files are fetched.
+
+    Args:
+        filediffs (list of reviewboard.diffviewer.models.FileDiff):
+            The FileDiffs to fetch original files for.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client, for use in logging.
+    """
+    groups = {}
+
+    for filediff in filediffs:
+        if filediff.is_new or filediff.binary or filediff.orig_sha1:
+            continue
+
+        diffset = filediff.diffset
+        repository = diffset.repository
+        key = (repository.pk, diffset.base_commit_id)
+
+        if key not in groups:
+            groups[key] = (repository, [])
+
+        groups[key][1].append((filediff.source_file,
+                               filediff.source_revision))
+
+    for (repository_id, base_commit_id), (repository, files) in \
+            six.iteritems(groups):
+        if len(files) < 2:
+            continue
+
+        try:
+            repository.get_files(files,
+                                 base_commit_id=base_commit_id,
+                                 request=request)
+        except Exception as e:
+            logging.warning('Unable to prefetch %d files from repository '
+                            '%s: %s',
+                            len(files), repository_id, e)
 
 
 def get_revision_str(revision):
@@ -490,6 +656,38 @@ def get_matched_interdiff_files(tool, filediffs, interfilediffs):
         yield None, interfilediff
 
 
+def _is_interdiff_file_unchanged(filediff, interfilediff):
+    """Return whether a file is unchanged between two revisions of a diff.
+
+    This only uses information already stored on the FileDiffs, without
+    fetching any files. The checksums and IDs of the patched files are
+    compared first, followed by the hashes of the diffs. The diffs
+    themselves are only loaded and compared if they haven't yet been
+    migrated to a form with a hash.
+
+    Args:
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff from the older revision.
+
+        interfilediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff from the newer revision.
+
+    Returns:
+        bool:
+        ``True`` if the file is known to be unchanged between the revisions.
+    """
+    for attr in ('patched_sha1', 'patched_content_id'):
+        value = getattr(filediff, attr)
+
+        if value is not None and value == getattr(interfilediff, attr):
+            return True
+
+    if filediff.diff_hash_id and interfilediff.diff_hash_id:
+        return filediff.diff_hash_id == interfilediff.diff_hash_id
+
+    return filediff.diff == interfilediff.diff
+
+
 def get_diff_files(diffset, filediff=None, interdiffset=None,
                    interfilediff=None, request=None):
     """Return a list of files that will be displayed in a diff.
@@ -611,10 +809,8 @@ def get_diff_files(diffset, filediff=None, interdiffset=None,
             # absolutely sure that there's nothing interesting to show to
             # the user.
             if (filediff and interfilediff and
-                (filediff.diff == interfilediff.diff or
-                 (filediff.deleted and interfilediff.deleted) or
-                 (filediff.patched_sha1 is not None and
-                  filediff.patched_sha1 == interfilediff.patched_sha1))):
+                ((filediff.deleted and interfilediff.deleted) or
+                 _is_interdiff_file_unchanged(filediff, interfilediff))):
                 continue
 
             source_revision = _("Diff Revision %s") % diffset.revision
@@ -679,44 +875,281 @@ def get_diff_files(diffset, filediff=None, interdiffset=None,
 
 
 def populate_diff_chunks(files, enable_syntax_highlighting=True,
-                         request=None):
+                         request=None, max_workers=None):
     """Populates a list of diff files with chunk data.
 
     This accepts a list of files (generated by get_diff_files) and generates
     diff chunk data for each file in the list. The chunk data is stored in
-    the file state.
+    the file state, along with the time (in seconds) it took to generate, as
+    ``chunks_generation_time``.
+
+    When there's more than one file and more than one worker is allowed,
+    chunks are generated for several files at once on a pool of threads. Most
+    of the time spent generating chunks goes to repository round-trips and
+    syntax highlighting, so the total time approaches that of the slowest
+    file, rather than the sum of all of them.
+
+    Each file is generated independently. If one fails, the remaining files
+    are still populated, and the first error (in file order) is raised once
+    all files have been processed.
+
+    Args:
+        files (list of dict):
+            The list of files from :py:func:`get_diff_files`.
+
+        enable_syntax_highlighting (bool, optional):
+            Whether to syntax highlight the chunks.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client.
+
+        max_workers (int, optional):
+            The maximum number of files to generate chunks for at once. This
+            defaults to the ``diffviewer_chunk_generation_workers`` site
+            configuration setting.
+
+    Raises:
+        Exception:
+            Chunk generation failed for one of the files. This is the
+            exception raised for the first file that failed.
+    """
+    if len(files) > 1:
+        prefetch_original_files(
+            [
+                filediff
+                for diff_file in files
+                if not diff_file.get('chunks_loaded', False)
+                for filediff in (diff_file['filediff'],
+                                 diff_file['interfilediff'])
+                if filediff is not None
+            ],
+            request=request)
+
+    if max_workers is None:
+        siteconfig = SiteConfiguration.objects.get_current()
+        max_workers = siteconfig.get('diffviewer_chunk_generation_workers')
+
+    num_workers = min(max_workers, len(files))
+
+    if num_workers > 1:
+        errors = _populate_diff_chunks_concurrently(
+            files, enable_syntax_highlighting, request, num_workers)
+    else:
+        errors = []
+
+        for diff_file in files:
+            error = _populate_diff_file_chunks(diff_file,
+                                               enable_syntax_highlighting,
+                                               request)
+
+            if error is not None:
+                errors.append(error)
+                break
+
+    if errors:
+        six.reraise(*errors[0])
+
+
+def _populate_diff_chunks_concurrently(files, enable_syntax_highlighting,
+                                       request, num_workers):
+    """Populate diff files with chunk data using a pool of threads.
+
+    Args:
+        files (list of dict):
+            The list of files from :py:func:`get_diff_files`.
+
+        enable_syntax_highlighting (bool):
+            Whether to syntax highlight the chunks.
+
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+
+        num_workers (int):
+            The number of threads to use.
+
+    Returns:
+        list of tuple:
+        The exception info for each file that failed, in file order.
+    """
+    work_queue = six.moves.queue.Queue()
+    errors = [None] * len(files)
+    language = translation.get_language()
+
+    for i, diff_file in enumerate(files):
+        work_queue.put((i, diff_file))
+
+    def _worker():
+        if language:
+            translation.activate(language)
+
+        try:
+            while True:
+                try:
+                    i, diff_file = work_queue.get_nowait()
+                except six.moves.queue.Empty:
+                    break
+
+                errors[i] = _populate_diff_file_chunks(
+                    diff_file, enable_syntax_highlighting, request)
+        finally:
+            # Each thread has its own database connection, which would
+            # otherwise be left open.
+            connection.close()
+            translation.deactivate()
+
+    threads = [
+        threading.Thread(target=_worker)
+        for i in range(num_workers)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return [error for error in errors if error is not None]
+
+
+def _populate_diff_file_chunks(diff_file, enable_syntax_highlighting,
+                               request):
+    """Populate a single diff file with chunk data.
+
+    Args:
+        diff_file (dict):
+            The file from :py:func:`get_diff_files` to populate.
+
+        enable_syntax_highlighting (bool):
+            Whether to syntax highlight the chunks.
+
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+
+    Returns:
+        tuple:
+        The exception info if chunk generation failed, or ``None`` if it
+        succeeded.
     """
     from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
 
-    for diff_file in files:
+    filediff = diff_file['filediff']
+    start_time = time.time()
+
+    try:
         generator = get_diff_chunk_generator(request,
-                                             diff_file['filediff'],
+                                             filediff,
                                              diff_file['interfilediff'],
                                              diff_file['force_interdiff'],
                                              enable_syntax_highlighting)
         chunks = list(generator.get_chunks())
+    except Exception:
+        logging.debug('Generating chunks for filediff %s failed after '
+                      '%.3f seconds',
+                      filediff.pk, time.time() - start_time)
+
+        return sys.exc_info()
+
+    generation_time = time.time() - start_time
+    logging.debug('Generated chunks for filediff %s in %.3f seconds',
+                  filediff.pk, generation_time)
+
+    _set_diff_file_chunks(diff_file, chunks)
+    diff_file.update({
+        'chunks_generation_time': generation_time,
+        'chunks_loaded': True,
+    })
+
+    return None
+
+
+def populate_diff_chunk_outlines(diff_file, enable_syntax_highlighting=True,
+                                 chunk_indexes=None, request=None):
+    """Populate a diff file with chunks, only loading lines where needed.
+
+    This is a cheaper alternative to :py:func:`populate_diff_chunks` for
+    rendering part of a large file. Every chunk in the file is added, but
+    lines are only built (and syntax-highlighted) for the chunks that will
+    be shown.
+
+    Chunks that weren't loaded won't have a ``lines`` key, and
+    ``chunks_loaded`` will remain unset.
+
+    Args:
+        diff_file (dict):
+            The file from :py:func:`get_diff_files` to populate.
+
+        enable_syntax_highlighting (bool, optional):
+            Whether to syntax highlight the chunks.
+
+        chunk_indexes (list of int, optional):
+            The indexes of the chunks to load lines for. Indexes out of range
+            are ignored. If not provided, lines will be loaded for every
+            chunk that isn't collapsable.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client.
+    """
+    from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
+
+    filediff = diff_file['filediff']
+    start_time = time.time()
+
+    generator = get_diff_chunk_generator(request,
+                                         filediff,
+                                         diff_file['interfilediff'],
+                                         diff_file['force_interdiff'],
+                                         enable_syntax_highlighting)
+    chunks = list(generator.get_chunk_outlines())
+
+    if chunk_indexes is None:
+        chunk_indexes = [
+            chunk['index']
+            for chunk in chunks
+            if not chunk['collapsable']
+        ]
+
+    for chunk_index in chunk_indexes:
+        if 0 <= chunk_index < len(chunks):
+            chunks[chunk_index]['lines'] = \
+                generator.get_chunk_lines(chunk_index)
+
+    generation_time = time.time() - start_time
+    logging.debug('Generated %d of %d chunks for filediff %s in %.3f seconds',
+                  len(chunk_indexes), len(chunks), filediff.pk,
+                  generation_time)
+
+    _set_diff_file_chunks(diff_file, chunks)
+    diff_file['chunks_generation_time'] = generation_time
+
+
+def _set_diff_file_chunks(diff_file, chunks):
+    """Set the chunks on a diff file, along with information on them.
 
-        diff_file.update({
-            'chunks': chunks,
-            'num_chunks': len(chunks),
-            'changed_chunk_indexes': [],
-            'whitespace_only': len(chunks) > 0,
-        })
+    Args:
+        diff_file (dict):
+            The file from :py:func:`get_diff_files` to update.
+
+        chunks (list of dict):
+            The chunks for the file.
+    """
+    diff_file.update({
+        'chunks': chunks,
+        'num_chunks': len(chunks),
+        'changed_chunk_indexes': [],
+        'whitespace_only': len(chunks) > 0,
+    })
 
-        for j, chunk in enumerate(chunks):
-            chunk['index'] = j
+    for j, chunk in enumerate(chunks):
+        chunk['index'] = j
 
-            if chunk['change'] != 'equal':
-                diff_file['changed_chunk_indexes'].append(j)
-                meta = chunk.get('meta', {})
+        if chunk['change'] != 'equal':
+            diff_file['changed_chunk_indexes'].append(j)
+            meta = chunk.get('meta', {})
 
-                if not meta.get('whitespace_chunk', False):
-                    diff_file['whitespace_only'] = False
+            if not meta.get('whitespace_chunk', False):
+                diff_file['whitespace_only'] = False
 
-        diff_file.update({
-            'num_changes': len(diff_file['changed_chunk_indexes']),
-            'chunks_loaded': True,
-        })
+    diff_file['num_changes'] = len(diff_file['changed_chunk_indexes'])
 
 
 def get_file_from_filediff(context, filediff, interfilediff):
@@ -771,33 +1204,47 @@ def get_last_line_number_in_diff(context, filediff, interfilediff):
     return last_line[0]
 
 
-def _get_last_header_in_chunks_before_line(chunks, target_line):
-    """Find the last header in the list of chunks before the target line."""
-    def find_last_line_numbers(lines):
-        """Return a tuple of the last line numbers in the given list of lines.
+def _find_last_line_numbers(lines):
+    """Return a tuple of the last line numbers in the given list of lines.
 
-        The last line numbers are not always contained in the last element of
-        the ``lines`` list. This is the case when dealing with interdiffs that
-        have filtered out opcodes.
+    The last line numbers are not always contained in the last element of
+    the ``lines`` list. This is the case when dealing with interdiffs that
+    have filtered out opcodes.
 
-        See :py:func:`get_chunks_in_range` for a description of what is
-        contained in each element of ``lines``.
-        """
-        last_left = None
-        last_right = None
+    See :py:func:`get_chunks_in_range` for a description of what is
+    contained in each element of ``lines``.
+    """
+    last_left = None
+    last_right = None
 
-        for line in reversed(lines):
-            if not last_right and line[4]:
-                last_right = line[4]
+    for line in reversed(lines):
+        if not last_right and line[4]:
+            last_right = line[4]
 
-            if not last_left and line[1]:
-                last_left = line[1]
+        if not last_left and line[1]:
+            last_left = line[1]
 
-            if last_left and last_right:
-                break
+        if last_left and last_right:
+            break
 
-        return last_left, last_right
+    return last_left, last_right
 
+
+def _update_header_from_chunk(header, chunk, target_line=None):
+    """Update the last headers seen with the headers in a chunk.
+
+    Args:
+        header (dict):
+            The last ``left`` and ``right`` headers seen before the chunk.
+            This will be updated in place.
+
+        chunk (dict):
+            The chunk to look for headers in.
+
+        target_line (int, optional):
+            The virtual line number that headers must come before. If not
+            provided, all headers in the chunk are considered.
+    """
     def find_header(headers, offset, last_line):
         """Return the last header that occurs before a line.
 
@@ -810,7 +1257,10 @@ def _get_last_header_in_chunks_before_line(chunks, target_line):
         # in the chunk that don't belong to it, but were put there due to
         # chunks being merged together. We must therefore ensure that the
         # header we're looking at is actually in the chunk.
-        end_line = min(last_line, target_line)
+        if target_line is None:
+            end_line = last_line
+        else:
+            end_line = min(last_line, target_line)
 
         for header in reversed(headers):
             virtual_line = header[0] + offset
@@ -821,6 +1271,63 @@ def _get_last_header_in_chunks_before_line(chunks, target_line):
                     'text': header[1]
                 }
 
+    lines = chunk['lines']
+    virtual_first_line = lines[0][0]
+    last_left, last_right = _find_last_line_numbers(lines)
+
+    if 'left_headers' in chunk['meta'] and lines[0][1]:
+        offset = virtual_first_line - lines[0][1]
+
+        left_header = find_header(chunk['meta']['left_headers'],
+                                  offset, last_left + offset)
+
+        header['left'] = left_header or header['left']
+
+    if 'right_headers' in chunk['meta'] and lines[0][4]:
+        offset = virtual_first_line - lines[0][4]
+
+        right_header = find_header(chunk['meta']['right_headers'],
+                                   offset, last_right + offset)
+
+        header['right'] = right_header or header['right']
+
+
+def _get_last_header_in_chunks_before_line(chunks, target_line,
+                                           line_index=None):
+    """Find the last header in the list of chunks before the target line.
+
+    Args:
+        chunks (list of dict):
+            The chunks to search.
+
+        target_line (int):
+            The virtual line number to find the header before.
+
+        line_index (dict, optional):
+            The index of the chunks, from :py:func:`get_chunk_line_index`.
+            If provided, only the chunk containing the line is searched.
+
+    Returns:
+        dict:
+        The ``left`` and ``right`` headers. See
+        :py:func:`get_last_header_before_line` for details.
+    """
+    if line_index is not None:
+        i = bisect_right(line_index['first_lines'], target_line) - 1
+
+        if i < 0:
+            return {
+                'left': None,
+                'right': None,
+            }
+
+        header = dict(line_index['headers'][i])
+
+        if line_index['first_lines'][i] < target_line:
+            _update_header_from_chunk(header, chunks[i], target_line)
+
+        return header
+
     # The most up-to-date header information
     header = {
         'left': None,
@@ -828,8 +1335,7 @@ def _get_last_header_in_chunks_before_line(chunks, target_line):
     }
 
     for chunk in chunks:
-        lines = chunk['lines']
-        virtual_first_line = lines[0][0]
+        virtual_first_line = chunk['lines'][0][0]
 
         if virtual_first_line <= target_line:
             if virtual_first_line == target_line:
@@ -837,28 +1343,56 @@ def _get_last_header_in_chunks_before_line(chunks, target_line):
                 # there can't be any relevant header information here.
                 break
 
-            last_left, last_right = find_last_line_numbers(lines)
+            _update_header_from_chunk(header, chunk, target_line)
+        else:
+            # We've gone past the given line number.
+            break
 
-            if 'left_headers' in chunk['meta'] and lines[0][1]:
-                offset = virtual_first_line - lines[0][1]
+    return header
 
-                left_header = find_header(chunk['meta']['left_headers'],
-                                          offset, last_left + offset)
 
-                header['left'] = left_header or header['left']
+def get_chunk_line_index(diff_file):
+    """Return an index for looking up lines in a diff file's chunks.
 
-            if 'right_headers' in chunk['meta'] and lines[0][4]:
-                offset = virtual_first_line - lines[0][4]
+    The index contains the virtual line number of the first line of each
+    chunk, and the last headers seen before each chunk. This allows the
+    chunk containing a line, and the header before it, to be found with a
+    binary search instead of by scanning all the chunks.
 
-                right_header = find_header(chunk['meta']['right_headers'],
-                                           offset, last_right + offset)
+    The index is built the first time it's needed, and is stored in the diff
+    file along with the chunks.
 
-                header['right'] = right_header or header['right']
-        else:
-            # We've gone past the given line number.
-            break
+    Args:
+        diff_file (dict):
+            The file from :py:func:`get_diff_files`, populated with all its
+            chunks and their lines.
 
-    return header
+    Returns:
+        dict:
+        The index.
+    """
+    line_index = diff_file.get('chunk_line_index')
+
+    if line_index is None:
+        first_lines = []
+        headers = []
+        header = {
+            'left': None,
+            'right': None,
+        }
+
+        for chunk in diff_file['chunks']:
+            first_lines.append(chunk['lines'][0][0])
+            headers.append(dict(header))
+            _update_header_from_chunk(header, chunk)
+
+        line_index = {
+            'first_lines': first_lines,
+            'headers': headers,
+        }
+        diff_file['chunk_line_index'] = line_index
+
+    return line_index
 
 
 def get_last_header_before_line(context, filediff, interfilediff, target_line):
@@ -876,7 +1410,8 @@ def get_last_header_before_line(context, filediff, interfilediff, target_line):
     """
     f = get_file_from_filediff(context, filediff, interfilediff)
 
-    return _get_last_header_in_chunks_before_line(f['chunks'], target_line)
+    return _get_last_header_in_chunks_before_line(f['chunks'], target_line,
+                                                  get_chunk_line_index(f))
 
 
 def get_file_chunks_in_range(context, filediff, interfilediff,
@@ -894,12 +1429,13 @@ def get_file_chunks_in_range(context, filediff, interfilediff,
     f = get_file_from_filediff(context, filediff, interfilediff)
 
     if f:
-        return get_chunks_in_range(f['chunks'], first_line, num_lines)
+        return get_chunks_in_range(f['chunks'], first_line, num_lines,
+                                   get_chunk_line_index(f))
     else:
         return []
 
 
-def get_chunks_in_range(chunks, first_line, num_lines):
+def get_chunks_in_range(chunks, first_line, num_lines, line_index=None):
     """Generate the chunks within a range of lines of a larger list of chunks.
 
     This takes a list of chunks, computes a subset of those chunks from the
@@ -931,8 +1467,22 @@ def get_chunks_in_range(chunks, first_line, num_lines):
     6        Changed regions of the patched line (for "replace" chunks)
     7        True if line consists of only whitespace changes
     ======== =============================================================
+
+    If ``line_index`` (from :py:func:`get_chunk_line_index`) is provided,
+    ``chunks`` must be a list, and the search starts at the chunk containing
+    ``first_line`` instead of at the first chunk.
     """
-    for i, chunk in enumerate(chunks):
+    if line_index is not None:
+        start = max(bisect_right(line_index['first_lines'], first_line) - 1,
+                    0)
+        indexed_chunks = (
+            (i, chunks[i])
+            for i in range(start, len(chunks))
+        )
+    else:
+        indexed_chunks = enumerate(chunks)
+
+    for i, chunk in indexed_chunks:
         lines = chunk['lines']
 
         if lines[-1][0] >= first_line >= lines[0][0]:
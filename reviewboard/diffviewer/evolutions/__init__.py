@@ -13,4 +13,5 @@ SEQUENCE = [
     'filediffdata_extra_data',
     'all_extra_data',
     'raw_diff_file_data',
+    'diffset_line_counts',
 ]
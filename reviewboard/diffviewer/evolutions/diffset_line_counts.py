@@ -0,0 +1,10 @@
+from __future__ import unicode_literals
+
+from django_evolution.mutations import AddField
+from django.db import models
+
+
+MUTATIONS = [
+    AddField('DiffSet', 'raw_insert_count', models.IntegerField, null=True),
+    AddField('DiffSet', 'raw_delete_count', models.IntegerField, null=True),
+]
@@ -0,0 +1,310 @@
+from __future__ import unicode_literals
+
+import itertools
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial
+
+from django.utils import six
+from django.utils.six.moves import range, zip
+
+from reviewboard.diffviewer.myersdiff import MyersDiffer
+
+
+class FastMyersDiffer(MyersDiffer):
+    """A Myers differ that processes runs of lines in bulk.
+
+    This produces exactly the same opcodes as :py:class:`MyersDiffer`, but
+    avoids the per-line Python loops that dominate the time spent diffing
+    large files:
+
+    * Lines are converted to integer codes using C-level
+      :py:func:`map` and :py:class:`dict` operations. Only the first
+      occurrence of each distinct line is checked for interesting lines.
+
+    * Runs of equal lines in the middle snake search, and at the ends of
+      each range, are compared as slices of the integer-coded lines. The
+      slice size doubles while the lines keep matching, and then narrows
+      down on the first line that differs. Short runs are still walked a
+      line at a time, since slicing would cost more than it saves.
+
+    * Runs of unmodified lines are skipped in one step when generating
+      opcodes, by bisecting a sorted list of the modified lines.
+    """
+
+    #: The number of lines to compare one at a time before comparing slices.
+    LINEAR_SCAN_LINES = 4
+
+    #: The number of lines in the first slice compared.
+    MIN_SLICE_LINES = 16
+
+    def __init__(self, *args, **kwargs):
+        super(FastMyersDiffer, self).__init__(*args, **kwargs)
+
+        self._code_table = defaultdict(partial(next, itertools.count(1)))
+        self._a_modified_lines = None
+        self._b_modified_lines = None
+
+    def _gen_diff_data(self):
+        """Generate all the diff data needed to return opcodes."""
+        if self.a_data and self.b_data:
+            return
+
+        super(FastMyersDiffer, self)._gen_diff_data()
+
+        self._a_modified_lines = sorted(
+            i
+            for i, modified in six.iteritems(self.a_data.modified)
+            if modified
+        )
+        self._b_modified_lines = sorted(
+            i
+            for i, modified in six.iteritems(self.b_data.modified)
+            if modified
+        )
+
+    def _gen_diff_codes(self, lines, is_modified_file):
+        """Convert all lines of text into integer codes.
+
+        Args:
+            lines (list of unicode):
+                The lines of the file.
+
+            is_modified_file (bool):
+                Whether these are the lines of the modified file.
+
+        Returns:
+            list of int:
+            The code for each line.
+        """
+        if self.ignore_space:
+            # We still want to show lines that contain only whitespace.
+            keys = [line.lstrip() or line for line in lines]
+        else:
+            keys = lines
+
+        code_table = self._code_table
+        first_new_code = len(code_table) + 1
+        codes = list(map(code_table.__getitem__, keys))
+        self.last_code = len(code_table)
+
+        if self.interesting_line_regexes:
+            self._find_interesting_lines(lines, codes, first_new_code,
+                                         is_modified_file)
+
+        return codes
+
+    def _find_interesting_lines(self, lines, codes, first_new_code,
+                                is_modified_file):
+        """Record the interesting lines in a file.
+
+        As with :py:class:`MyersDiffer`, whether a line is interesting is
+        decided by the first line seen with its code.
+
+        Args:
+            lines (list of unicode):
+                The lines of the file.
+
+            codes (list of int):
+                The code for each line.
+
+            first_new_code (int):
+                The first code assigned to a line in this file.
+
+            is_modified_file (bool):
+                Whether these are the lines of the modified file.
+        """
+        if first_new_code <= self.last_code:
+            # Map each code to the first line it appears on, by building the
+            # map backwards.
+            num_lines = len(codes)
+            first_linenums = dict(zip(reversed(codes),
+                                      range(num_lines - 1, -1, -1)))
+
+            for code in range(first_new_code, self.last_code + 1):
+                raw_line = lines[first_linenums[code]]
+
+                if raw_line.lstrip():
+                    for name, regex in self.interesting_line_regexes:
+                        if regex.match(raw_line):
+                            self.interesting_line_table[code] = name
+                            break
+
+        if self.interesting_line_table:
+            if is_modified_file:
+                interesting_lines = self.interesting_lines[1]
+            else:
+                interesting_lines = self.interesting_lines[0]
+
+            interesting_line_table = self.interesting_line_table
+
+            for linenum, code in enumerate(codes):
+                if code in interesting_line_table:
+                    interesting_lines[interesting_line_table[code]].append(
+                        (linenum, lines[linenum]))
+
+    def _count_equal_lines(self, a_line, b_line):
+        """Return the number of unmodified lines starting at a position.
+
+        Args:
+            a_line (int):
+                The index of the line in the original file.
+
+            b_line (int):
+                The index of the line in the modified file.
+
+        Returns:
+            int:
+            The number of lines, starting at ``a_line`` and ``b_line``, that
+            are unmodified in both files.
+        """
+        return max(0, min(
+            self._get_next_modified_line(self._a_modified_lines, a_line,
+                                         self.a_data.length) - a_line,
+            self._get_next_modified_line(self._b_modified_lines, b_line,
+                                         self.b_data.length) - b_line))
+
+    def _get_next_modified_line(self, modified_lines, linenum, length):
+        """Return the first modified line at or after a line.
+
+        Args:
+            modified_lines (list of int):
+                The sorted indexes of the modified lines in the file.
+
+            linenum (int):
+                The index of the line to start at.
+
+            length (int):
+                The number of lines in the file.
+
+        Returns:
+            int:
+            The index of the first modified line, or ``length`` if there
+            aren't any.
+        """
+        i = bisect_left(modified_lines, linenum)
+
+        if i < len(modified_lines):
+            return min(modified_lines[i], length)
+
+        return length
+
+    def _find_forward_snake_end(self, x, y, a_upper, b_upper):
+        """Return where a run of equal lines starting at (x, y) ends.
+
+        Args:
+            x (int):
+                The index of the first line to compare in the original file.
+
+            y (int):
+                The index of the first line to compare in the modified file.
+
+            a_upper (int):
+                The upper bound for ``x``.
+
+            b_upper (int):
+                The upper bound for ``y``.
+
+        Returns:
+            int:
+            The index in the original file of the first line that differs
+            (or the bound that was reached).
+        """
+        a = self.a_data.undiscarded
+        b = self.b_data.undiscarded
+        max_len = min(a_upper - x, b_upper - y)
+        i = 0
+
+        while i < max_len and a[x + i] == b[y + i]:
+            i += 1
+
+            if i == self.LINEAR_SCAN_LINES:
+                break
+        else:
+            return x + i
+
+        # The run is long enough that it's worth comparing slices. Grow
+        # the slices until one doesn't match.
+        size = self.MIN_SLICE_LINES
+
+        while i < max_len:
+            end = min(i + size, max_len)
+
+            if a[x + i:x + end] != b[y + i:y + end]:
+                # There's a mismatch somewhere in [i, end). Narrow it down.
+                while end - i > self.MIN_SLICE_LINES:
+                    mid = (i + end) // 2
+
+                    if a[x + i:x + mid] == b[y + i:y + mid]:
+                        i = mid
+                    else:
+                        end = mid
+
+                while a[x + i] == b[y + i]:
+                    i += 1
+
+                return x + i
+
+            i = end
+            size *= 2
+
+        return x + max_len
+
+    def _find_backward_snake_start(self, x, y, a_lower, b_lower):
+        """Return where a run of equal lines ending at (x, y) starts.
+
+        Args:
+            x (int):
+                The index after the last line to compare in the original
+                file.
+
+            y (int):
+                The index after the last line to compare in the modified
+                file.
+
+            a_lower (int):
+                The lower bound for ``x``.
+
+            b_lower (int):
+                The lower bound for ``y``.
+
+        Returns:
+            int:
+            The index in the original file of the start of the run.
+        """
+        a = self.a_data.undiscarded
+        b = self.b_data.undiscarded
+        max_len = min(x - a_lower, y - b_lower)
+        i = 0
+
+        while i < max_len and a[x - i - 1] == b[y - i - 1]:
+            i += 1
+
+            if i == self.LINEAR_SCAN_LINES:
+                break
+        else:
+            return x - i
+
+        size = self.MIN_SLICE_LINES
+
+        while i < max_len:
+            end = min(i + size, max_len)
+
+            if a[x - end:x - i] != b[y - end:y - i]:
+                while end - i > self.MIN_SLICE_LINES:
+                    mid = (i + end) // 2
+
+                    if a[x - mid:x - i] == b[y - mid:y - i]:
+                        i = mid
+                    else:
+                        end = mid
+
+                while a[x - i - 1] == b[y - i - 1]:
+                    i += 1
+
+                return x - i
+
+            i = end
+            size *= 2
+
+        return x - max_len
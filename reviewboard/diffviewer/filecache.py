@@ -0,0 +1,308 @@
+"""A content-addressed cache for original and patched file contents.
+
+Building a diff requires fetching the original file from the repository,
+normalizing it, applying any parent diff, and then applying the diff itself.
+The results of these steps are stored here, compressed and keyed by the
+SHA-1 of their contents (the same ``orig_sha1`` and ``patched_sha1`` values
+stored on :py:class:`~reviewboard.diffviewer.models.FileDiff`), so that
+re-renders and interdiffs can skip both the repository and the patch step.
+
+The cache lives in the site's data directory. It's bounded in size, and when
+it grows too large, the least-recently-used entries are evicted.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+
+from django.conf import settings
+from djblets.siteconfig.models import SiteConfiguration
+
+
+class FileContentCache(object):
+    """A size-bounded, content-addressed store for file contents.
+
+    Each entry is stored zlib-compressed in its own file, named after the
+    SHA-1 of its uncompressed contents. Reading an entry updates its
+    modification time, which is used to evict the least-recently-used
+    entries once the cache grows past :py:attr:`max_size`.
+
+    Writes go to a temporary file that is then renamed into place, so
+    several processes can safely share the same directory.
+    """
+
+    #: The zlib compression level used for stored entries.
+    COMPRESSION_LEVEL = 6
+
+    #: The fraction of ``max_size`` that eviction reduces the cache to.
+    CULL_TARGET_RATIO = 0.9
+
+    #: The fraction of ``max_size`` that can be written between size checks.
+    CULL_CHECK_RATIO = 0.1
+
+    def __init__(self, path, max_size):
+        """Initialize the cache.
+
+        Args:
+            path (unicode):
+                The directory to store cached contents in.
+
+            max_size (int):
+                The maximum size of the cache, in bytes.
+        """
+        self.path = path
+        self.max_size = max_size
+        self._bytes_since_cull = None
+
+    def get(self, sha1):
+        """Return the contents stored for a SHA-1.
+
+        Args:
+            sha1 (unicode):
+                The SHA-1 of the contents to return.
+
+        Returns:
+            bytes:
+            The stored contents, or ``None`` if they're not in the cache.
+        """
+        filename = self._get_filename(sha1)
+
+        try:
+            with open(filename, 'rb') as fp:
+                data = zlib.decompress(fp.read())
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                logging.warning('Unable to read cached file content %s: %s',
+                                filename, e)
+
+            return None
+        except zlib.error as e:
+            logging.warning('Cached file content %s is corrupt: %s',
+                            filename, e)
+            self._remove(filename)
+
+            return None
+
+        if hashlib.sha1(data).hexdigest() != sha1:
+            logging.warning('Cached file content %s does not match its '
+                            'checksum', filename)
+            self._remove(filename)
+
+            return None
+
+        try:
+            os.utime(filename, None)
+        except OSError:
+            # It may have been evicted by another process. We still have
+            # the data, so this isn't a problem.
+            pass
+
+        return data
+
+    def set(self, data, sha1=None):
+        """Store contents in the cache.
+
+        Args:
+            data (bytes):
+                The contents to store.
+
+            sha1 (unicode, optional):
+                The SHA-1 of the contents, if already known.
+
+        Returns:
+            unicode:
+            The SHA-1 the contents were stored under.
+        """
+        if sha1 is None:
+            sha1 = hashlib.sha1(data).hexdigest()
+
+        filename = self._get_filename(sha1)
+
+        if os.path.exists(filename):
+            return sha1
+
+        dirname = os.path.dirname(filename)
+        compressed = zlib.compress(data, self.COMPRESSION_LEVEL)
+
+        try:
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname, 0o755)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+
+            fd, temp_filename = tempfile.mkstemp(dir=dirname)
+
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    fp.write(compressed)
+
+                os.rename(temp_filename, filename)
+            except Exception:
+                self._remove(temp_filename)
+                raise
+        except (IOError, OSError) as e:
+            logging.warning('Unable to write cached file content %s: %s',
+                            filename, e)
+
+            return sha1
+
+        if self._bytes_since_cull is not None:
+            self._bytes_since_cull += len(compressed)
+
+        if (self._bytes_since_cull is None or
+            self._bytes_since_cull >= self.max_size * self.CULL_CHECK_RATIO):
+            self.cull()
+
+        return sha1
+
+    def cull(self):
+        """Evict the least-recently-used entries if the cache is too large.
+
+        Entries are removed until the cache is at or below
+        :py:attr:`CULL_TARGET_RATIO` of :py:attr:`max_size`.
+        """
+        self._bytes_since_cull = 0
+        entries = []
+        total_size = 0
+
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, full_path))
+                total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        target_size = self.max_size * self.CULL_TARGET_RATIO
+        entries.sort()
+
+        for mtime, size, full_path in entries:
+            if total_size <= target_size:
+                break
+
+            self._remove(full_path)
+            total_size -= size
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                self._remove(os.path.join(dirpath, filename))
+
+        self._bytes_since_cull = None
+
+    def _get_filename(self, sha1):
+        """Return the path to the file storing contents for a SHA-1.
+
+        Args:
+            sha1 (unicode):
+                The SHA-1 of the contents.
+
+        Returns:
+            unicode:
+            The path to the file.
+        """
+        return os.path.join(self.path, sha1[:2], sha1[2:])
+
+    def _remove(self, filename):
+        """Remove a file, ignoring errors.
+
+        Args:
+            filename (unicode):
+                The file to remove.
+        """
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+
+_file_content_cache = None
+
+
+def get_file_content_cache():
+    """Return the file content cache for this server.
+
+    The cache is configured through the ``diffviewer_file_cache_enabled``
+    and ``diffviewer_file_cache_max_size`` site configuration settings.
+
+    Returns:
+        FileContentCache:
+        The cache, or ``None`` if it has been disabled.
+    """
+    global _file_content_cache
+
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    if not siteconfig.get('diffviewer_file_cache_enabled'):
+        return None
+
+    path = os.path.join(settings.SITE_DATA_DIR, 'diff-file-cache')
+    max_size = siteconfig.get('diffviewer_file_cache_max_size')
+
+    if (_file_content_cache is None or
+        _file_content_cache.path != path):
+        _file_content_cache = FileContentCache(path, max_size)
+    else:
+        _file_content_cache.max_size = max_size
+
+    return _file_content_cache
+
+
+def get_cached_file_content(sha1):
+    """Return file contents from the cache.
+
+    Args:
+        sha1 (unicode):
+            The SHA-1 of the contents. This may be ``None``, in which case
+            nothing will be looked up.
+
+    Returns:
+        bytes:
+        The cached contents, or ``None`` if they're not available.
+    """
+    if not sha1:
+        return None
+
+    cache = get_file_content_cache()
+
+    if cache is None:
+        return None
+
+    return cache.get(sha1)
+
+
+def cache_file_content(data, sha1=None):
+    """Store file contents in the cache.
+
+    Args:
+        data (bytes):
+            The contents to store.
+
+        sha1 (unicode, optional):
+            The SHA-1 of the contents, if already known.
+
+    Returns:
+        unicode:
+        The SHA-1 of the contents.
+    """
+    cache = get_file_content_cache()
+
+    if cache is None:
+        return sha1 or hashlib.sha1(data).hexdigest()
+
+    return cache.set(data, sha1)
@@ -1,11 +1,14 @@
 from __future__ import unicode_literals, division
 
+import json
+import os
 import sys
 from datetime import datetime, timedelta
+from optparse import make_option
 
 from django.conf import settings
 from django.contrib.humanize.templatetags.humanize import intcomma
-from django.core.management.base import NoArgsCommand
+from django.core.management.base import CommandError, NoArgsCommand
 from django.utils.translation import ugettext as _, ungettext_lazy as N_
 
 from reviewboard.diffviewer.models import FileDiff
@@ -15,6 +18,25 @@ class Command(NoArgsCommand):
     help = ('Condenses the diffs stored in the database, reducing space '
             'requirements')
 
+    option_list = NoArgsCommand.option_list + (
+        make_option('--workers',
+                    dest='num_workers',
+                    type='int',
+                    default=1,
+                    help='The number of processes to condense diffs in'),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=40,
+                    help='The number of diffs to condense at a time'),
+        make_option('--checkpoint-file',
+                    dest='checkpoint_file',
+                    default=None,
+                    help='A file for recording progress. If the command is '
+                         'stopped, running it again with the same file will '
+                         'resume where it left off'),
+    )
+
     DELAY_SHOW_REMAINING_SECS = 30
 
     TIME_REMAINING_CHUNKS = (
@@ -33,11 +55,21 @@ class Command(NoArgsCommand):
     CALC_TIME_REMAINING_STR = _('Calculating time remaining')
 
     def handle_noargs(self, **options):
+        if options['num_workers'] < 1:
+            raise CommandError(_('--workers must be at least 1'))
+
+        if options['batch_size'] < 1:
+            raise CommandError(_('--batch-size must be at least 1'))
+
+        self.checkpoint_file = options['checkpoint_file']
+        start_pk = self._load_checkpoint()
+
         counts = FileDiff.objects.get_migration_counts()
         total_count = counts['total_count']
 
         if total_count == 0:
             self.stdout.write(_('All diffs have already been migrated.\n'))
+            self._remove_checkpoint()
             return
 
         self.stdout.write(
@@ -49,6 +81,10 @@ class Command(NoArgsCommand):
               '\n')
             % {'count': total_count})
 
+        if start_pk is not None:
+            self.stdout.write(_('Resuming from FileDiff ID %d.\n\n')
+                              % start_pk)
+
         # Don't allow queries to be stored.
         settings.DEBUG = False
 
@@ -57,39 +93,114 @@ class Command(NoArgsCommand):
         self.prev_time_remaining_s = ''
         self.show_remaining = False
 
-        info = FileDiff.objects.migrate_all(self._on_batch_done, counts)
+        if self.checkpoint_file:
+            checkpoint_cb = self._save_checkpoint
+        else:
+            checkpoint_cb = None
+
+        info = FileDiff.objects.migrate_all(
+            self._on_batch_done,
+            counts,
+            batch_size=options['batch_size'],
+            num_workers=options['num_workers'],
+            start_pk=start_pk,
+            checkpoint_cb=checkpoint_cb)
+
+        self._remove_checkpoint()
 
         old_diff_size = info['old_diff_size']
         new_diff_size = info['new_diff_size']
+        delta_secs = self._get_elapsed_secs()
+
+        if old_diff_size:
+            savings_pct = (float(old_diff_size - new_diff_size) /
+                           float(old_diff_size) * 100)
+        else:
+            savings_pct = 0.0
 
         self.stdout.write(
             _('\n'
               '\n'
               'Condensed stored diffs from %(old_size)s bytes to '
-              '%(new_size)s bytes (%(savings_pct)0.2f%% savings)\n')
+              '%(new_size)s bytes (%(savings_pct)0.2f%% savings)\n'
+              'Processed %(count)s diffs in %(time)s '
+              '(%(rate)0.1f diffs/sec)\n')
             % {
                 'old_size': intcomma(old_diff_size),
                 'new_size': intcomma(new_diff_size),
-                'savings_pct': (float(old_diff_size - new_diff_size) /
-                                float(old_diff_size) * 100),
+                'savings_pct': savings_pct,
+                'count': intcomma(info['diffs_migrated']),
+                'time': self._time_remaining(delta_secs),
+                'rate': info['diffs_migrated'] / max(delta_secs, 1),
             })
 
-    def _on_batch_done(self, processed_count, total_count):
-        """Handler for when a batch of diffs are processed.
+    def _load_checkpoint(self):
+        """Return the FileDiff ID to resume from, if any.
 
-        This will report the progress of the operation, showing the estimated
-        amount of time remaining.
+        Returns:
+            int:
+            The ID of the next FileDiff to process, or ``None`` if there's
+            no checkpoint.
+        """
+        if (not self.checkpoint_file or
+            not os.path.exists(self.checkpoint_file)):
+            return None
+
+        try:
+            with open(self.checkpoint_file, 'r') as fp:
+                return int(json.load(fp)['next_filediff_pk'])
+        except (IOError, KeyError, TypeError, ValueError) as e:
+            raise CommandError(_('Unable to read checkpoint file %s: %s')
+                               % (self.checkpoint_file, e))
+
+    def _save_checkpoint(self, next_pk):
+        """Record the FileDiff ID to resume from.
+
+        The file is written to a temporary file first and then moved into
+        place, so that it's never left partially written.
+
+        Args:
+            next_pk (int):
+                The ID of the next FileDiff to process.
+        """
+        tmp_filename = '%s.tmp' % self.checkpoint_file
+
+        with open(tmp_filename, 'w') as fp:
+            json.dump({'next_filediff_pk': next_pk}, fp)
+
+        os.rename(tmp_filename, self.checkpoint_file)
+
+    def _remove_checkpoint(self):
+        """Remove the checkpoint file, once all diffs are processed."""
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            os.unlink(self.checkpoint_file)
+
+    def _get_elapsed_secs(self):
+        """Return the number of seconds since the command started.
+
+        Returns:
+            float:
+            The number of seconds.
         """
-        pct = processed_count * 100 / total_count
         delta = datetime.now() - self.start_time
 
         # XXX: This can be replaced with total_seconds() once we no longer have
         # to support Python 2.6
-        delta_secs = (
+        return (
             (delta.microseconds +
              (delta.seconds + delta.days * 24 * 3600) * 10 ** 6) /
             10 ** 6)
 
+    def _on_batch_done(self, processed_count, total_count, bytes_saved):
+        """Handler for when a batch of diffs are processed.
+
+        This will report the progress of the operation, showing the rate of
+        processing, the number of bytes saved, and the estimated amount of
+        time remaining.
+        """
+        pct = processed_count * 100 / total_count
+        delta_secs = self._get_elapsed_secs()
+
         if (not self.show_remaining and
             delta_secs >= self.DELAY_SHOW_REMAINING_SECS):
             self.show_remaining = True
@@ -103,7 +214,10 @@ class Command(NoArgsCommand):
         else:
             time_remaining_s = self.CALC_TIME_REMAINING_STR
 
-        prefix_s = '  [%d%%] %s/%s - ' % (pct, processed_count, total_count)
+        prefix_s = ('  [%d%%] %s/%s, %d/sec, %s bytes saved - '
+                    % (pct, processed_count, total_count,
+                       processed_count / max(delta_secs, 1),
+                       intcomma(bytes_saved)))
 
         # NOTE: We use sys.stdout here instead of self.stderr in order
         #       to control newlines. Command.stderr will force a \n for
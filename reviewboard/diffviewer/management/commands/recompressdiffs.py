@@ -0,0 +1,115 @@
+from __future__ import unicode_literals, division
+
+import sys
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.core.management.base import CommandError, NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from reviewboard.diffviewer.compression import (
+    get_compression_method,
+    get_compression_methods,
+    get_configured_compression_method)
+from reviewboard.diffviewer.models import RawFileDiffData
+
+
+class Command(NoArgsCommand):
+    help = ('Recompresses the diffs stored in the database using the '
+            'configured compression method')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--compression',
+                    dest='compression',
+                    default=None,
+                    help='The compression method to use, instead of the '
+                         'one configured for the site'),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=100,
+                    help='The number of diffs to recompress at a time'),
+    )
+
+    def handle_noargs(self, **options):
+        name = options['compression']
+
+        if name:
+            compression_method = get_compression_method(name)
+
+            if compression_method is None:
+                raise CommandError(
+                    _('Unknown or unavailable compression method "%s". '
+                      'Available methods are: %s')
+                    % (name, ', '.join(
+                        method.name
+                        for method in get_compression_methods())))
+        else:
+            compression_method = get_configured_compression_method()
+
+        if options['batch_size'] < 1:
+            raise CommandError(_('--batch-size must be at least 1'))
+
+        total_count = RawFileDiffData.objects.get_recompress_count(
+            compression_method)
+
+        if total_count == 0:
+            self.stdout.write(
+                _('All diffs are already compressed using %s.\n')
+                % compression_method.name)
+            return
+
+        self.stdout.write(
+            _('Recompressing %(count)d diffs using %(method)s...\n'
+              '\n'
+              'This may take a while. It is safe to continue using '
+              'Review Board while this is\n'
+              'processing, and it is safe to stop and re-run this command '
+              'later.\n'
+              '\n')
+            % {
+                'count': total_count,
+                'method': compression_method.name,
+            })
+
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        info = RawFileDiffData.objects.recompress_all(
+            compression_method=compression_method,
+            batch_size=options['batch_size'],
+            batch_done_cb=self._on_batch_done)
+
+        old_diff_size = info['old_diff_size']
+        new_diff_size = info['new_diff_size']
+
+        if old_diff_size:
+            savings_pct = (float(old_diff_size - new_diff_size) /
+                           float(old_diff_size) * 100)
+        else:
+            savings_pct = 0.0
+
+        self.stdout.write(
+            _('\n'
+              '\n'
+              'Recompressed %(count)d stored diffs from %(old_size)s bytes '
+              'to %(new_size)s bytes (%(savings_pct)0.2f%% savings)\n')
+            % {
+                'count': info['diffs_recompressed'],
+                'old_size': intcomma(old_diff_size),
+                'new_size': intcomma(new_diff_size),
+                'savings_pct': savings_pct,
+            })
+
+    def _on_batch_done(self, processed_count, total_count):
+        """Handler for when a batch of diffs are processed.
+
+        This will report the progress of the operation.
+        """
+        # NOTE: We use sys.stdout here instead of self.stdout in order
+        #       to control newlines.
+        sys.stdout.write('  [%d%%] %s/%s\r'
+                         % (processed_count * 100 / total_count,
+                            processed_count, total_count))
+        sys.stdout.flush()
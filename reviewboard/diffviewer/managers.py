@@ -1,19 +1,21 @@
 from __future__ import unicode_literals
 
-import bz2
 import gc
 import hashlib
+import multiprocessing
 import os
 
 from django.conf import settings
 from django.db import models, reset_queries, connection
-from django.db.models import Count, Q
+from django.db.models import Count, Max, Min, Q
 from django.db.utils import IntegrityError
 from django.utils.encoding import smart_unicode
-from django.utils.six.moves import range
+from django.utils.six.moves import range, zip
 from django.utils.translation import ugettext as _
 from djblets.siteconfig.models import SiteConfiguration
 
+from reviewboard.diffviewer.compression import \
+    get_configured_compression_method
 from reviewboard.diffviewer.differ import DiffCompatVersion
 from reviewboard.diffviewer.errors import DiffTooBigError, EmptyDiffError
 from reviewboard.scmtools.core import PRE_CREATION, UNKNOWN, FileNotFoundError
@@ -27,6 +29,9 @@ class FileDiffManager(models.Manager):
     """
     MIGRATE_OBJECT_LIMIT = 200
 
+    #: The number of FileDiff IDs in each range migrated by migrate_all().
+    MIGRATE_PK_RANGE_SIZE = 1000
+
     def unmigrated(self):
         """Queries FileDiffs that store their own diff content."""
         return self.exclude(
@@ -50,58 +55,198 @@ class FileDiffManager(models.Manager):
             'total_count': unmigrated_filediffs_count + legacy_fdd_count,
         }
 
-    def migrate_all(self, batch_done_cb=None, counts=None, batch_size=40):
+    def migrate_all(self, batch_done_cb=None, counts=None, batch_size=40,
+                    num_workers=1, start_pk=None, checkpoint_cb=None):
         """Migrates diff content in FileDiffs to use RawFileDiffData.
 
         This will run through all unmigrated FileDiffs and migrate them,
         condensing their storage needs and removing the content from
         FileDiffs.
 
-        This will return a dictionary with the result of the process.
+        FileDiffs are processed in ranges of IDs, in order. These can be
+        processed by several worker processes at once. Whenever all FileDiffs
+        before a given ID have been migrated, ``checkpoint_cb`` is called with
+        that ID, which can later be passed as ``start_pk`` to resume without
+        scanning through the FileDiffs again.
+
+        Args:
+            batch_done_cb (callable, optional):
+                A function called after each batch of diffs is migrated, with
+                the number of diffs migrated so far, the total number of
+                diffs, and the number of bytes saved so far.
+
+            counts (dict, optional):
+                The counts from :py:meth:`get_migration_counts`, if already
+                computed.
+
+            batch_size (int, optional):
+                The number of diffs to migrate at a time.
+
+            num_workers (int, optional):
+                The number of worker processes to migrate FileDiffs in. If
+                1, they're migrated in this process.
+
+            start_pk (int, optional):
+                The ID of the first FileDiff to migrate. FileDiffs with lower
+                IDs are assumed to have already been migrated.
+
+            checkpoint_cb (callable, optional):
+                A function called with the ID of the next FileDiff to
+                migrate, whenever all FileDiffs before it have been migrated.
+
+        Returns:
+            dict:
+            Information on the results, containing ``diffs_migrated``,
+            ``old_diff_size``, ``new_diff_size``, and ``bytes_saved``.
         """
         from reviewboard.diffviewer.models import LegacyFileDiffData
 
-        total_diffs_migrated = 0
-        total_diff_size = 0
-        total_bytes_saved = 0
+        totals = {
+            'diffs_migrated': 0,
+            'diff_size': 0,
+            'bytes_saved': 0,
+        }
 
-        unmigrated_filediffs = self.unmigrated()
         legacy_data_items = LegacyFileDiffData.objects.all()
 
         if counts:
-            unmigrated_filediffs_count = counts['filediffs']
             legacy_data_items_count = counts['legacy_file_diff_data']
             total_count = counts['total_count']
         else:
-            unmigrated_filediffs_count = unmigrated_filediffs.count()
             legacy_data_items_count = legacy_data_items.count()
-            total_count = legacy_data_items_count + unmigrated_filediffs_count
-
-        migration_tasks = (
-            (self._migrate_filediffs,
-             unmigrated_filediffs,
-             unmigrated_filediffs_count),
-            (self._migrate_legacy_fdd,
-             legacy_data_items,
-             legacy_data_items_count),
-        )
+            total_count = (legacy_data_items_count +
+                           self.unmigrated().count())
+
+        def _add_batch_info(num_migrated, diff_size, bytes_saved):
+            totals['diffs_migrated'] += num_migrated
+            totals['diff_size'] += diff_size
+            totals['bytes_saved'] += bytes_saved
+
+            if callable(batch_done_cb):
+                batch_done_cb(totals['diffs_migrated'], total_count,
+                              totals['bytes_saved'])
+
+        for end_pk, batch_info in self._iter_migrated_filediff_ranges(
+                start_pk, batch_size, num_workers):
+            _add_batch_info(*batch_info)
 
-        for migrate_func, queryset, count in migration_tasks:
-            for batch_info in migrate_func(queryset, count, batch_size):
-                total_diffs_migrated += batch_info[0]
-                total_diff_size += batch_info[1]
-                total_bytes_saved += batch_info[2]
+            if callable(checkpoint_cb):
+                checkpoint_cb(end_pk)
 
-                if callable(batch_done_cb):
-                    batch_done_cb(total_diffs_migrated, total_count)
+        for batch_info in self._migrate_legacy_fdd(legacy_data_items,
+                                                   legacy_data_items_count,
+                                                   batch_size):
+            _add_batch_info(*batch_info[:3])
 
         return {
-            'diffs_migrated': total_diffs_migrated,
-            'old_diff_size': total_diff_size,
-            'new_diff_size': total_diff_size - total_bytes_saved,
-            'bytes_saved': total_bytes_saved,
+            'diffs_migrated': totals['diffs_migrated'],
+            'old_diff_size': totals['diff_size'],
+            'new_diff_size': totals['diff_size'] - totals['bytes_saved'],
+            'bytes_saved': totals['bytes_saved'],
         }
 
+    def _iter_migrated_filediff_ranges(self, start_pk, batch_size,
+                                       num_workers):
+        """Migrate FileDiffs in ranges of IDs, yielding each range's results.
+
+        The ranges are yielded in order, even when migrated in parallel, so
+        that the end of each yielded range can be used as a checkpoint.
+
+        Args:
+            start_pk (int):
+                The ID of the first FileDiff to migrate, or ``None`` to start
+                from the first FileDiff.
+
+            batch_size (int):
+                The number of diffs to migrate at a time.
+
+            num_workers (int):
+                The number of worker processes to migrate FileDiffs in.
+
+        Yields:
+            tuple:
+            A 2-tuple of the ID after the end of the range, and a 3-tuple of
+            the number of FileDiffs migrated in the range, the old size of
+            their diffs, and the number of bytes saved.
+        """
+        pk_range = self.aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+
+        if pk_range['max_pk'] is None:
+            return
+
+        if start_pk is None:
+            start_pk = pk_range['min_pk']
+
+        range_size = self.MIGRATE_PK_RANGE_SIZE
+        tasks = [
+            (range_start, range_start + range_size, batch_size)
+            for range_start in range(start_pk, pk_range['max_pk'] + 1,
+                                     range_size)
+        ]
+
+        if num_workers > 1:
+            # Each worker needs its own database connection. Closing this
+            # process's connection keeps it from being shared with them.
+            connection.close()
+            pool = multiprocessing.Pool(num_workers)
+
+            completed = False
+
+            try:
+                results = pool.imap(_migrate_filediff_range, tasks)
+
+                for task, batch_info in zip(tasks, results):
+                    yield task[1], batch_info
+
+                completed = True
+            finally:
+                # If migration failed or was stopped early, the remaining
+                # tasks are abandoned.
+                if completed:
+                    pool.close()
+                else:
+                    pool.terminate()
+
+                pool.join()
+        else:
+            for task in tasks:
+                yield task[1], self._migrate_filediff_range(*task)
+
+    def _migrate_filediff_range(self, start_pk, end_pk, batch_size):
+        """Migrate the unmigrated FileDiffs in a range of IDs.
+
+        Args:
+            start_pk (int):
+                The first ID in the range.
+
+            end_pk (int):
+                The ID after the end of the range.
+
+            batch_size (int):
+                The number of diffs to migrate at a time.
+
+        Returns:
+            tuple:
+            A 3-tuple of the number of FileDiffs migrated, the old size of
+            their diffs, and the number of bytes saved.
+        """
+        queryset = (
+            self.unmigrated()
+            .filter(pk__gte=start_pk, pk__lt=end_pk)
+            .order_by('pk')
+        )
+        count = 0
+        diff_size = 0
+        bytes_saved = 0
+
+        for batch_info in self._migrate_filediffs(queryset, queryset.count(),
+                                                  batch_size):
+            count += batch_info[0]
+            diff_size += batch_info[1]
+            bytes_saved += batch_info[2]
+
+        return count, diff_size, bytes_saved
+
     def _migrate_legacy_fdd(self, legacy_data_items, count, batch_size):
         """Migrates data from LegacyFileDiffData to RawFileDiffData.
 
@@ -333,22 +478,159 @@ class RawFileDiffDataManager(models.Manager):
     """A custom manager for RawFileDiffData.
 
     This provides conveniences for creating an entry based on a
-    LegacyFileDiffData object.
+    LegacyFileDiffData object, and for recompressing stored entries.
     """
-    def process_diff_data(self, data):
+
+    #: The fraction of the size that compression must save for a diff to be
+    #: stored compressed.
+    #:
+    #: Small diffs compress poorly, and saving a few bytes isn't worth
+    #: decompressing them every time they're read.
+    MIN_COMPRESSION_SAVINGS = 0.2
+
+    def process_diff_data(self, data, compression_method=None):
         """Processes a diff, returning the resulting content and compression.
 
-        If the content would benefit from being compressed, this will
-        return the compressed content and the value for the compression
-        flag. Otherwise, it will return the raw content.
+        If the content would benefit from being compressed (saving at least
+        :py:attr:`MIN_COMPRESSION_SAVINGS` of its size), this will return the
+        compressed content and the value for the compression flag.
+        Otherwise, it will return the raw content.
+
+        Args:
+            data (bytes):
+                The diff content.
+
+            compression_method (reviewboard.diffviewer.compression.
+                                CompressionMethod, optional):
+                The compression method to use. This defaults to the one
+                configured for the site.
+
+        Returns:
+            tuple:
+            A 2-tuple of the content to store and the compression flag (or
+            ``None``, if the content isn't compressed).
         """
-        compressed_data = bz2.compress(data, 9)
+        if compression_method is None:
+            compression_method = get_configured_compression_method()
+
+        compressed_data = compression_method.compress(data)
 
-        if len(compressed_data) < len(data):
-            return compressed_data, self.model.COMPRESSION_BZIP2
+        if (len(compressed_data) <=
+            len(data) * (1 - self.MIN_COMPRESSION_SAVINGS)):
+            return compressed_data, compression_method.flag
         else:
             return data, None
 
+    def get_recompress_count(self, compression_method=None):
+        """Return the number of entries that recompress_all would process.
+
+        Args:
+            compression_method (reviewboard.diffviewer.compression.
+                                CompressionMethod, optional):
+                The compression method to convert to. This defaults to the
+                one configured for the site.
+
+        Returns:
+            int:
+            The number of compressed entries using a different method.
+        """
+        return self._get_recompress_queryset(compression_method).count()
+
+    def recompress_all(self, compression_method=None, batch_size=100,
+                       batch_done_cb=None):
+        """Recompress all stored diffs using a different compression method.
+
+        Entries are processed in batches, in order of their IDs. Entries that
+        are stored uncompressed are left alone, since they were too small to
+        benefit from compression.
+
+        Args:
+            compression_method (reviewboard.diffviewer.compression.
+                                CompressionMethod, optional):
+                The compression method to convert to. This defaults to the
+                one configured for the site.
+
+            batch_size (int, optional):
+                The number of entries to load and save at a time.
+
+            batch_done_cb (callable, optional):
+                A function called after each batch, with the number of
+                entries processed so far and the total number of entries.
+
+        Returns:
+            dict:
+            Information on the results, containing ``diffs_recompressed``,
+            ``old_diff_size``, and ``new_diff_size``.
+        """
+        if compression_method is None:
+            compression_method = get_configured_compression_method()
+
+        queryset = self._get_recompress_queryset(compression_method)
+        total_count = queryset.count()
+        total_recompressed = 0
+        total_old_size = 0
+        total_new_size = 0
+        last_pk = None
+
+        while True:
+            batch_queryset = queryset.order_by('pk')
+
+            if last_pk is not None:
+                batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+
+            batch = list(batch_queryset[:batch_size])
+
+            if not batch:
+                break
+
+            for raw_fdd in batch:
+                old_data = bytes(raw_fdd.binary)
+                new_data, compression = self.process_diff_data(
+                    raw_fdd.content, compression_method)
+
+                self.filter(pk=raw_fdd.pk).update(binary=new_data,
+                                                  compression=compression)
+
+                total_old_size += len(old_data)
+                total_new_size += len(new_data)
+
+            total_recompressed += len(batch)
+            last_pk = batch[-1].pk
+
+            # Keep memory usage down between batches, as with migrate_all().
+            reset_queries()
+            gc.collect()
+
+            if callable(batch_done_cb):
+                batch_done_cb(total_recompressed,
+                              max(total_count, total_recompressed))
+
+        return {
+            'diffs_recompressed': total_recompressed,
+            'old_diff_size': total_old_size,
+            'new_diff_size': total_new_size,
+        }
+
+    def _get_recompress_queryset(self, compression_method):
+        """Return a queryset for the entries that need recompressing.
+
+        Args:
+            compression_method (reviewboard.diffviewer.compression.
+                                CompressionMethod):
+                The compression method to convert to.
+
+        Returns:
+            django.db.models.query.QuerySet:
+            The queryset of compressed entries using a different method.
+        """
+        if compression_method is None:
+            compression_method = get_configured_compression_method()
+
+        return (
+            self.filter(compression__isnull=False)
+            .exclude(compression=compression_method.flag)
+        )
+
     def get_or_create_from_data(self, data):
         binary_hash = self._hash_hexdigest(data)
         processed_data, compression = self.process_diff_data(data)
@@ -447,13 +729,13 @@ class DiffSetManager(models.Manager):
 
         parser = tool.get_parser(diff_file_contents)
 
-        files = list(self._process_files(
+        files = self._process_files(
             parser,
             basedir,
             repository,
             base_commit_id,
             request,
-            check_existence=(not parent_diff_file_contents)))
+            check_existence=(not parent_diff_file_contents))
 
         # Parse the diff
         if len(files) == 0:
@@ -494,7 +776,9 @@ class DiffSetManager(models.Manager):
             history=diffset_history,
             repository=repository,
             diffcompat=DiffCompatVersion.DEFAULT,
-            base_commit_id=base_commit_id)
+            base_commit_id=base_commit_id,
+            raw_insert_count=sum(f.insert_count for f in files),
+            raw_delete_count=sum(f.delete_count for f in files))
 
         if save:
             diffset.save()
@@ -549,6 +833,10 @@ class DiffSetManager(models.Manager):
                 parent_file.delete_count == 0):
                 filediff.extra_data = {'parent_moved': True}
 
+            if f.patched_content_id:
+                filediff.extra_data['patched_content_id'] = \
+                    smart_unicode(f.patched_content_id)
+
             filediff.set_line_counts(raw_insert_count=f.insert_count,
                                      raw_delete_count=f.delete_count)
 
@@ -567,6 +855,8 @@ class DiffSetManager(models.Manager):
     def _process_files(self, parser, basedir, repository, base_commit_id,
                        request, check_existence=False, limit_to=None):
         tool = repository.get_scmtool()
+        files = []
+        files_to_check = []
 
         for f in parser.parse():
             source_filename, source_revision = tool.parse_diff_revision(
@@ -584,26 +874,37 @@ class DiffSetManager(models.Manager):
                 # ourselves a remote file existence check and some storage.
                 continue
 
-            # FIXME: this would be a good place to find permissions errors
-            if (source_revision != PRE_CREATION and
+            if (check_existence and
+                source_revision != PRE_CREATION and
                 source_revision != UNKNOWN and
                 not f.binary and
                 not f.deleted and
                 not f.moved and
-                not f.copied and
-                (check_existence and
-                 not repository.get_file_exists(source_filename,
-                                                source_revision,
-                                                base_commit_id=base_commit_id,
-                                                request=request))):
-                raise FileNotFoundError(source_filename, source_revision,
-                                        base_commit_id)
+                not f.copied):
+                files_to_check.append((source_filename, source_revision))
 
             f.origFile = source_filename
             f.origInfo = source_revision
             f.newFile = dest_filename
 
-            yield f
+            files.append(f)
+
+        if files_to_check:
+            # All the files are checked at once, so that repositories that
+            # support it can check them in a single operation.
+            #
+            # FIXME: this would be a good place to find permissions errors
+            exists = repository.get_files_exist(files_to_check,
+                                                base_commit_id=base_commit_id,
+                                                request=request)
+
+            for (source_filename, source_revision), file_exists in \
+                    zip(files_to_check, exists):
+                if not file_exists:
+                    raise FileNotFoundError(source_filename, source_revision,
+                                            base_commit_id)
+
+        return files
 
     def _compare_files(self, filename1, filename2):
         """
@@ -624,3 +925,20 @@ class DiffSetManager(models.Manager):
                     return 1
 
         return cmp(filename1, filename2)
+
+
+def _migrate_filediff_range(args):
+    """Migrate a range of FileDiffs in a worker process.
+
+    Args:
+        args (tuple):
+            The arguments for
+            :py:meth:`FileDiffManager._migrate_filediff_range`.
+
+    Returns:
+        tuple:
+        The result of :py:meth:`FileDiffManager._migrate_filediff_range`.
+    """
+    from reviewboard.diffviewer.models import FileDiff
+
+    return FileDiff.objects._migrate_filediff_range(*args)
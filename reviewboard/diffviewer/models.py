@@ -1,6 +1,5 @@
 from __future__ import unicode_literals
 
-import bz2
 import logging
 
 from django.db import models
@@ -10,6 +9,12 @@ from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import Base64Field, JSONField
 
+from reviewboard.diffviewer.compression import (
+    BZip2CompressionMethod,
+    LZ4CompressionMethod,
+    ZlibCompressionMethod,
+    ZstdCompressionMethod,
+    get_compression_method_for_flag)
 from reviewboard.diffviewer.errors import DiffParserError
 from reviewboard.diffviewer.managers import (RawFileDiffDataManager,
                                              FileDiffManager,
@@ -40,13 +45,20 @@ class RawFileDiffData(models.Model):
 
     This is the class used in Review Board 2.5+ to store diff content.
     Unlike in previous versions, the content is not base64-encoded. Instead,
-    it is stored either as bzip2-compressed data (if the resulting
-    compressed data is smaller than the raw data), or as the raw data itself.
+    it is stored either as compressed data (if the resulting compressed data
+    is smaller than the raw data), or as the raw data itself. The compression
+    method is configurable, and is recorded along with the data.
     """
-    COMPRESSION_BZIP2 = 'B'
+    COMPRESSION_BZIP2 = BZip2CompressionMethod.flag
+    COMPRESSION_ZLIB = ZlibCompressionMethod.flag
+    COMPRESSION_ZSTD = ZstdCompressionMethod.flag
+    COMPRESSION_LZ4 = LZ4CompressionMethod.flag
 
     COMPRESSION_CHOICES = (
         (COMPRESSION_BZIP2, _('BZip2-compressed')),
+        (COMPRESSION_ZLIB, _('Zlib-compressed')),
+        (COMPRESSION_ZSTD, _('Zstandard-compressed')),
+        (COMPRESSION_LZ4, _('LZ4-compressed')),
     )
 
     binary_hash = models.CharField(_("hash"), max_length=40, unique=True)
@@ -64,15 +76,50 @@ class RawFileDiffData(models.Model):
         The content will be uncompressed (if necessary) and returned as the
         raw set of bytes originally uploaded.
         """
-        if self.compression == self.COMPRESSION_BZIP2:
-            return bz2.decompress(self.binary)
-        elif self.compression is None:
+        if self.compression is None:
             return bytes(self.binary)
+
+        return self._get_compression_method().decompress(bytes(self.binary))
+
+    def iter_content(self):
+        """Yield the uncompressed content a piece at a time.
+
+        This avoids holding all of a large uncompressed diff in memory at
+        once.
+
+        Yields:
+            bytes:
+            Each piece of the uncompressed content.
+        """
+        if self.compression is None:
+            yield bytes(self.binary)
         else:
+            compression_method = self._get_compression_method()
+
+            for content in compression_method.iter_decompress(
+                    bytes(self.binary)):
+                yield content
+
+    def _get_compression_method(self):
+        """Return the method used to compress the content.
+
+        Returns:
+            reviewboard.diffviewer.compression.CompressionMethod:
+            The compression method.
+
+        Raises:
+            NotImplementedError:
+                The compression method isn't supported.
+        """
+        compression_method = get_compression_method_for_flag(self.compression)
+
+        if compression_method is None:
             raise NotImplementedError(
                 'Unsupported compression method %s for RawFileDiffData %s'
                 % (self.compression, self.pk))
 
+        return compression_method
+
     @property
     def insert_count(self):
         return self.extra_data.get('insert_count')
@@ -236,6 +283,21 @@ class FileDiff(models.Model):
 
     diff = property(_get_diff, _set_diff)
 
+    def iter_diff(self):
+        """Yield the diff content a piece at a time.
+
+        This returns the same content as :py:attr:`diff`, without holding
+        all of it in memory at once.
+
+        Yields:
+            bytes:
+            Each piece of the diff content.
+        """
+        if self._needs_diff_migration():
+            self._migrate_diff_data()
+
+        return self.diff_hash.iter_content()
+
     def _get_parent_diff(self):
         if self._needs_parent_diff_migration():
             self._migrate_diff_data()
@@ -266,6 +328,17 @@ class FileDiff(models.Model):
     def patched_sha1(self):
         return self.extra_data.get('patched_sha1')
 
+    @property
+    def patched_content_id(self):
+        """An ID for the patched file's content, provided by the diff.
+
+        This is set when the diff was uploaded, for diffs (such as Git's)
+        that identify the content of each modified file. Unlike
+        :py:attr:`patched_sha1`, it's known without fetching any files, but
+        it's only comparable to IDs from the same type of repository.
+        """
+        return self.extra_data.get('patched_content_id')
+
     def get_line_counts(self):
         """Returns the stored line counts for the diff.
 
@@ -578,12 +651,72 @@ class DiffSet(models.Model):
         _('commit ID'), max_length=64, blank=True, null=True, db_index=True,
         help_text=_('The ID/revision this change is built upon.'))
 
+    raw_insert_count = models.IntegerField(
+        _('raw insert count'),
+        null=True,
+        blank=True,
+        help_text=_('The total number of lines inserted in all files in '
+                    'the diff. This is computed automatically.'))
+    raw_delete_count = models.IntegerField(
+        _('raw delete count'),
+        null=True,
+        blank=True,
+        help_text=_('The total number of lines deleted in all files in '
+                    'the diff. This is computed automatically.'))
+
     extra_data = JSONField(null=True)
 
     objects = DiffSetManager()
 
+    def get_raw_line_counts(self):
+        """Return the total raw insert and delete counts for the diffset.
+
+        These are stored on the diffset when it's created. Diffsets created
+        before these were stored will have them computed from their files
+        and stored the first time this is called.
+
+        Returns:
+            dict:
+            A dictionary containing ``raw_insert_count`` and
+            ``raw_delete_count``.
+        """
+        if self.raw_insert_count is None or self.raw_delete_count is None:
+            self.recalculate_raw_line_counts()
+
+        return {
+            'raw_insert_count': self.raw_insert_count,
+            'raw_delete_count': self.raw_delete_count,
+        }
+
+    def recalculate_raw_line_counts(self):
+        """Recalculate and store the total raw line counts from the files.
+
+        This will only update the line count fields in the database, leaving
+        the rest of the diffset (and its history) untouched.
+        """
+        raw_insert_count = 0
+        raw_delete_count = 0
+
+        for filediff in self.files.all():
+            counts = filediff.get_line_counts()
+            raw_insert_count += counts['raw_insert_count'] or 0
+            raw_delete_count += counts['raw_delete_count'] or 0
+
+        self.raw_insert_count = raw_insert_count
+        self.raw_delete_count = raw_delete_count
+
+        if self.pk:
+            DiffSet.objects.filter(pk=self.pk).update(
+                raw_insert_count=raw_insert_count,
+                raw_delete_count=raw_delete_count)
+
     def get_total_line_counts(self):
-        """Returns the total line counts from all files in this diffset."""
+        """Returns the total line counts from all files in this diffset.
+
+        This needs to look up every file in the diffset. If only the raw
+        insert and delete counts are needed, use
+        :py:meth:`get_raw_line_counts` instead.
+        """
         counts = {}
 
         for filediff in self.files.all():
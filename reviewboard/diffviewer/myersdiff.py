@@ -70,16 +70,14 @@ class MyersDiffer(Differ):
         while a_line < self.a_data.length or b_line < self.b_data.length:
             a_start = a_line
             b_start = b_line
+            num_equal = self._count_equal_lines(a_line, b_line)
 
-            if a_line < self.a_data.length and \
-               not self.a_data.modified.get(a_line, False) and \
-               b_line < self.b_data.length and \
-               not self.b_data.modified.get(b_line, False):
+            if num_equal:
                 # Equal
-                a_changed = b_changed = 1
+                a_changed = b_changed = num_equal
                 tag = "equal"
-                a_line += 1
-                b_line += 1
+                a_line += num_equal
+                b_line += num_equal
             else:
                 # Deleted, inserted or replaced
 
@@ -137,6 +135,34 @@ class MyersDiffer(Differ):
 
         yield last_group
 
+    def _count_equal_lines(self, a_line, b_line):
+        """Return the number of unmodified lines starting at a position.
+
+        This only needs to look at the lines at ``a_line`` and ``b_line``.
+        Subclasses can return the length of a longer run of unmodified lines
+        in both files, in order to skip over it in one step.
+
+        Args:
+            a_line (int):
+                The index of the line in the original file.
+
+            b_line (int):
+                The index of the line in the modified file.
+
+        Returns:
+            int:
+            The number of lines, starting at ``a_line`` and ``b_line``, that
+            are unmodified in both files. If this is 0, the lines are part
+            of a change.
+        """
+        if (a_line < self.a_data.length and
+            not self.a_data.modified.get(a_line, False) and
+            b_line < self.b_data.length and
+            not self.b_data.modified.get(b_line, False)):
+            return 1
+
+        return 0
+
     def _gen_diff_data(self):
         """
         Generate all the diff data needed to return opcodes or the diff ratio.
@@ -276,11 +302,8 @@ class MyersDiffer(Differ):
 
                 # Find the end of the furthest reaching forward D-path in
                 # diagonal k
-                while (x < a_upper and y < b_upper and
-                       (self.a_data.undiscarded[x] ==
-                        self.b_data.undiscarded[y])):
-                    x += 1
-                    y += 1
+                x = self._find_forward_snake_end(x, y, a_upper, b_upper)
+                y = x - k
 
                 if odd_delta and up_min <= k <= up_max and \
                    up_vector[self.upoff + k] <= x:
@@ -316,11 +339,8 @@ class MyersDiffer(Differ):
                 y = x - k
                 old_x = x
 
-                while (x > a_lower and y > b_lower and
-                       (self.a_data.undiscarded[x - 1] ==
-                        self.b_data.undiscarded[y - 1])):
-                    x -= 1
-                    y -= 1
+                x = self._find_backward_snake_start(x, y, a_lower, b_lower)
+                y = x - k
 
                 if (not odd_delta and down_min <= k <= down_max and
                         x <= down_vector[self.downoff + k]):
@@ -443,17 +463,14 @@ class MyersDiffer(Differ):
         Subsequence (LCS) algorithm.
         """
         # Fast walkthrough equal lines at the start
-        while (a_lower < a_upper and b_lower < b_upper and
-               (self.a_data.undiscarded[a_lower] ==
-                self.b_data.undiscarded[b_lower])):
-            a_lower += 1
-            b_lower += 1
-
-        while (a_upper > a_lower and b_upper > b_lower and
-               (self.a_data.undiscarded[a_upper - 1] ==
-                self.b_data.undiscarded[b_upper - 1])):
-            a_upper -= 1
-            b_upper -= 1
+        x = self._find_forward_snake_end(a_lower, b_lower, a_upper, b_upper)
+        b_lower += x - a_lower
+        a_lower = x
+
+        x = self._find_backward_snake_start(a_upper, b_upper,
+                                            a_lower, b_lower)
+        b_upper -= a_upper - x
+        a_upper = x
 
         if a_lower == a_upper:
             # Inserted lines.
@@ -474,6 +491,77 @@ class MyersDiffer(Differ):
             self._lcs(a_lower, x, b_lower, y, low_minimal)
             self._lcs(x, a_upper, y, b_upper, high_minimal)
 
+    def _find_forward_snake_end(self, x, y, a_upper, b_upper):
+        """Return where a run of equal lines starting at (x, y) ends.
+
+        This walks forward through the undiscarded lines of both files while
+        they're equal, stopping at ``a_upper`` or ``b_upper``.
+
+        Args:
+            x (int):
+                The index of the first line to compare in the original file.
+
+            y (int):
+                The index of the first line to compare in the modified file.
+
+            a_upper (int):
+                The upper bound for ``x``.
+
+            b_upper (int):
+                The upper bound for ``y``.
+
+        Returns:
+            int:
+            The index in the original file of the first line that differs
+            (or the bound that was reached). The index in the modified file
+            is offset from this by the same amount as ``x`` and ``y``.
+        """
+        a = self.a_data.undiscarded
+        b = self.b_data.undiscarded
+
+        while x < a_upper and y < b_upper and a[x] == b[y]:
+            x += 1
+            y += 1
+
+        return x
+
+    def _find_backward_snake_start(self, x, y, a_lower, b_lower):
+        """Return where a run of equal lines ending at (x, y) starts.
+
+        This walks backward through the undiscarded lines of both files while
+        the lines before ``x`` and ``y`` are equal, stopping at ``a_lower``
+        or ``b_lower``.
+
+        Args:
+            x (int):
+                The index after the last line to compare in the original
+                file.
+
+            y (int):
+                The index after the last line to compare in the modified
+                file.
+
+            a_lower (int):
+                The lower bound for ``x``.
+
+            b_lower (int):
+                The lower bound for ``y``.
+
+        Returns:
+            int:
+            The index in the original file of the start of the run. The index
+            in the modified file is offset from this by the same amount as
+            ``x`` and ``y``.
+        """
+        a = self.a_data.undiscarded
+        b = self.b_data.undiscarded
+
+        while x > a_lower and y > b_lower and a[x - 1] == b[y - 1]:
+            x -= 1
+            y -= 1
+
+        return x
+
     def _shift_chunks(self, data, other_data):
         """
         Shifts the inserts/deletes of identical lines in order to join
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import logging
 import os
 import re
 
@@ -26,7 +27,7 @@ class MoveRange(object):
         return self.groups[-1]
 
     def add_group(self, group, group_index):
-        if self.groups[-1] != group:
+        if self.groups[-1][1] != group_index:
             self.groups.append((group, group_index))
 
     def __repr__(self):
@@ -40,6 +41,18 @@ class DiffOpcodeGenerator(object):
     MOVE_PREFERRED_MIN_LINES = 2
     MOVE_MIN_LINE_LENGTH = 20
 
+    #: The number of times a line can be removed before it's considered too
+    #: common to start a move range. Lines like ``}`` or ``return None`` can
+    #: still extend a move range, but won't be searched for new ones. This
+    #: can be set to ``None`` to search all lines.
+    MOVE_MAX_LINE_OCCURRENCES = 50
+
+    #: The maximum number of removed lines compared against inserted lines
+    #: when looking for moves in a file. If this is exceeded, no move
+    #: information is provided for the file. This can be set to ``None`` to
+    #: remove the limit.
+    MOVE_MAX_WORK = 500000
+
     TAB_SIZE = 8
 
     def __init__(self, differ, diff=None, interdiff=None):
@@ -61,6 +74,12 @@ class DiffOpcodeGenerator(object):
         self.removes = {}
         self.inserts = []
 
+        # Stripped lines are converted to integer IDs for move detection.
+        # The IDs for removed lines are stored by line index.
+        self._line_ids = {}
+        self._removed_line_ids = {}
+        self._move_work = 0
+
         # Run the opcodes through the chain.
         opcodes = self.differ.get_opcodes()
         opcodes = self._apply_processors(opcodes)
@@ -153,13 +172,18 @@ class DiffOpcodeGenerator(object):
             if tag in ('delete', 'replace'):
                 i1 = group[1]
                 i2 = group[2]
+                move_key = '%s-%s-%s-%s' % group[1:5]
 
                 for i in range(i1, i2):
                     line = self.differ.a[i].strip()
 
                     if line:
-                        self.removes.setdefault(line, []).append(
-                            (i, group, group_index))
+                        line_id = self._line_ids.setdefault(
+                            line, len(self._line_ids))
+                        self._removed_line_ids[i] = (line_id, group,
+                                                     group_index)
+                        self.removes.setdefault(line_id, []).append(
+                            (i, group, group_index, move_key))
 
             if tag in ('insert', 'replace'):
                 self.inserts.append(group)
@@ -295,9 +319,31 @@ class DiffOpcodeGenerator(object):
         #
         # We start by looping through all the inserted groups.
         for insert in self.inserts:
-            self._compute_move_for_insert(*insert)
+            if not self._compute_move_for_insert(*insert):
+                # We've done as much work as we're willing to for this file.
+                # Rather than show partial results, show no moves at all.
+                logging.debug('Move detection exceeded %d comparisons. '
+                              'No moves will be shown.',
+                              self.MOVE_MAX_WORK)
+
+                for group in self.groups:
+                    meta = group[-1]
+                    meta.pop('moved-to', None)
+                    meta.pop('moved-from', None)
+
+                break
 
     def _compute_move_for_insert(self, itag, ii1, ii2, ij1, ij2, imeta):
+        """Compute the moves for an insert group.
+
+        Any moves found will be stored in the metadata for the insert and
+        remove groups.
+
+        Returns:
+            bool:
+            ``False`` if :py:attr:`MOVE_MAX_WORK` was exceeded, or ``True``
+            otherwise.
+        """
         # Store some state on the range we'll be working with inside this
         # insert group.
         #
@@ -310,7 +356,8 @@ class DiffOpcodeGenerator(object):
         #
         # r_move_ranges represents deleted move ranges. The key is a
         # string in the form of "{i1}-{i2}-{j1}-{j2}", with those
-        # positions taken from the remove group for the line. The value
+        # positions taken from the remove group for the line (computed
+        # once per group in _group_opcodes). The value
         # is an instance of MoveRange. The values in MoveRange are used to
         # quickly locate deleted lines we've found that match the inserted
         # lines, so we can assemble ranges later.
@@ -331,7 +378,35 @@ class DiffOpcodeGenerator(object):
 
             updated_range = False
 
-            if iline and iline in self.removes:
+            if iline:
+                iline_id = self._line_ids.get(iline)
+                removes = self.removes.get(iline_id)
+            else:
+                removes = None
+
+            if (removes and
+                self.MOVE_MAX_LINE_OCCURRENCES is not None and
+                len(removes) > self.MOVE_MAX_LINE_OCCURRENCES):
+                # This line is too common to search for new move ranges.
+                # It can only extend the range being worked on, if the
+                # removed line immediately following that range matches.
+                r_move_range = r_move_ranges.get(move_key)
+
+                if r_move_range:
+                    ri = r_move_range.end + 1
+                    rinfo = self._removed_line_ids.get(ri)
+
+                    if rinfo and rinfo[0] == iline_id:
+                        r_move_range.end = ri
+                        r_move_range.add_group(rinfo[1], rinfo[2])
+                        updated_range = True
+
+                if not updated_range and r_move_ranges:
+                    # As below, finish the current move ranges and then
+                    # re-check this line.
+                    i_move_cur -= 1
+                    move_key = None
+            elif removes:
                 # The inserted line at this location has a corresponding
                 # removed line.
                 #
@@ -347,14 +422,20 @@ class DiffOpcodeGenerator(object):
                 #
                 # If there isn't any move information for this line, we'll
                 # simply add it to the move ranges.
-                for ri, rgroup, rgroup_index in self.removes.get(iline, []):
+                self._move_work += len(removes)
+
+                if (self.MOVE_MAX_WORK is not None and
+                    self._move_work > self.MOVE_MAX_WORK):
+                    return False
+
+                for ri, rgroup, rgroup_index, rmove_key in removes:
                     r_move_range = r_move_ranges.get(move_key)
 
                     if not r_move_range or ri != r_move_range.end + 1:
                         # We either didn't have a previous range, or this
                         # group didn't immediately follow it, so we need
                         # to start a new one.
-                        move_key = '%s-%s-%s-%s' % rgroup[1:5]
+                        move_key = rmove_key
                         r_move_range = r_move_ranges.get(move_key)
 
                     if r_move_range:
@@ -486,6 +567,8 @@ class DiffOpcodeGenerator(object):
                 i_move_range = MoveRange(i_move_cur, i_move_cur)
                 r_move_ranges = {}
 
+        return True
+
     def _find_longest_move_range(self, r_move_ranges):
         # Go through every range of lines we've found and find the longest.
         #
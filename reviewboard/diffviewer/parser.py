@@ -24,6 +24,64 @@ class File(object):
         self.insert_count = 0
         self.delete_count = 0
 
+        # An ID for the content of the file after the change, if the diff
+        # provides one. Files with the same ID have the same content.
+        self.patched_content_id = None
+
+    @property
+    def data(self):
+        """The raw diff content for the file.
+
+        Content added through :py:meth:`append_data` and
+        :py:meth:`prepend_data` is joined together the first time this is
+        read after a change.
+        """
+        if self._data_chunks is None:
+            return None
+        elif len(self._data_chunks) == 1:
+            return self._data_chunks[0]
+        else:
+            data = b''.join(self._data_chunks)
+            self._data_chunks = [data]
+
+            return data
+
+    @data.setter
+    def data(self, data):
+        if data is None:
+            self._data_chunks = None
+        else:
+            self._data_chunks = [data]
+
+    def append_data(self, data):
+        """Append content to the end of the file's diff.
+
+        Content is stored in a list and only joined once :py:attr:`data` is
+        read. Building up a file's diff one line at a time with ``+=`` would
+        copy everything collected so far on every line, which is quadratic
+        in the size of the diff.
+
+        Args:
+            data (bytes):
+                The content to append.
+        """
+        if self._data_chunks is None:
+            self._data_chunks = [data]
+        else:
+            self._data_chunks.append(data)
+
+    def prepend_data(self, data):
+        """Insert content at the start of the file's diff.
+
+        Args:
+            data (bytes):
+                The content to insert.
+        """
+        if self._data_chunks is None:
+            self._data_chunks = [data]
+        else:
+            self._data_chunks.insert(0, data)
+
 
 class DiffParser(object):
     """
@@ -49,7 +107,7 @@ class DiffParser(object):
         logging.debug("DiffParser.parse: Beginning parse of diff, size = %s",
                       len(self.data))
 
-        preamble = b''
+        preamble = []
         self.files = []
         file = None
         i = 0
@@ -61,15 +119,18 @@ class DiffParser(object):
             if new_file:
                 # This line is the start of a new file diff.
                 file = new_file
-                file.data = preamble + file.data
-                preamble = b''
+
+                if preamble:
+                    file.prepend_data(b''.join(preamble))
+                    preamble = []
+
                 self.files.append(file)
                 i = next_linenum
             else:
                 if file:
                     i = self.parse_diff_line(i, file)
                 else:
-                    preamble += self.lines[i] + b'\n'
+                    preamble.append(self.lines[i] + b'\n')
                     i += 1
 
         logging.debug("DiffParser.parse: Finished parsing diff.")
@@ -85,7 +146,7 @@ class DiffParser(object):
             elif line.startswith(b'+'):
                 info.insert_count += 1
 
-        info.data += line + b'\n'
+        info.append_data(line + b'\n')
 
         return linenum + 1
 
@@ -229,7 +290,28 @@ class DiffParser(object):
 
         The returned diff as composed of all FileDiffs in the provided diffset.
         """
-        return b''.join([filediff.diff for filediff in diffset.files.all()])
+        return b''.join(self.iter_raw_diff(diffset))
+
+    def iter_raw_diff(self, diffset):
+        """Yield a raw diff a piece at a time.
+
+        This returns the same content as :py:meth:`raw_diff`, but only loads
+        and decompresses one FileDiff's diff at a time, so that large
+        diffsets can be streamed to the client.
+
+        Args:
+            diffset (reviewboard.diffviewer.models.DiffSet):
+                The diffset to return the diff for.
+
+        Yields:
+            bytes:
+            Each piece of the raw diff.
+        """
+        filediffs = diffset.files.defer('diff64', 'parent_diff64')
+
+        for filediff in filediffs.iterator():
+            for content in filediff.iter_diff():
+                yield content
 
     def get_orig_commit_id(self):
         """Returns the commit ID of the original revision for the diff.
@@ -0,0 +1,560 @@
+"""An in-process applier for unified diffs.
+
+This is used by :py:func:`reviewboard.diffviewer.diffutils.patch` to apply
+diffs to files without having to write them to disk and spawn the ``patch``
+command. It understands the unified diff format, handles hunks that have
+shifted position in the file (offsets) and hunks with slightly mismatched
+context (fuzz), and reports rejected hunks the same way ``patch`` does.
+
+Anything that isn't a unified diff (context diffs, "normal" diffs, binary
+patches) will result in a :py:class:`UnsupportedPatchError`, which tells the
+caller to fall back on the ``patch`` command.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import re
+
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.errors import PatchError
+
+
+HUNK_HEADER_RE = re.compile(
+    br'^@@ -(?P<orig_start>\d+)(?:,(?P<orig_len>\d+))? '
+    br'\+(?P<new_start>\d+)(?:,(?P<new_len>\d+))? @@')
+
+CONTEXT_DIFF_RE = re.compile(br'^(\*{15}|\*\*\* \d+(,\d+)? \*\*\*\*)')
+
+NO_NEWLINE_MARKER = b'\\'
+
+
+class UnsupportedPatchError(ValueError):
+    """The diff cannot be applied by the in-process patcher.
+
+    Callers should fall back on the ``patch`` command when this is raised.
+    """
+
+
+class Hunk(object):
+    """A single hunk from a unified diff.
+
+    Attributes:
+        orig_start (int):
+            The 1-based line number in the original file where the hunk
+            starts.
+
+        orig_len (int):
+            The number of lines from the original file covered by the hunk.
+
+        new_start (int):
+            The 1-based line number in the new file where the hunk starts.
+
+        new_len (int):
+            The number of lines in the new file covered by the hunk.
+
+        old_lines (list of bytes):
+            The context and removed lines, including trailing newlines.
+
+        new_lines (list of bytes):
+            The context and inserted lines, including trailing newlines.
+
+        leading_context (int):
+            The number of context lines at the start of the hunk.
+
+        trailing_context (int):
+            The number of context lines at the end of the hunk.
+
+        raw_lines (list of bytes):
+            The lines of the hunk as found in the diff, including the header.
+    """
+
+    def __init__(self, orig_start, orig_len, new_start, new_len):
+        """Initialize the hunk.
+
+        Args:
+            orig_start (int):
+                The line number in the original file.
+
+            orig_len (int):
+                The number of lines in the original file.
+
+            new_start (int):
+                The line number in the new file.
+
+            new_len (int):
+                The number of lines in the new file.
+        """
+        self.orig_start = orig_start
+        self.orig_len = orig_len
+        self.new_start = new_start
+        self.new_len = new_len
+        self.old_lines = []
+        self.new_lines = []
+        self.leading_context = 0
+        self.trailing_context = 0
+        self.raw_lines = []
+
+    def reverse(self):
+        """Return a reversed version of the hunk.
+
+        Returns:
+            Hunk:
+            A new hunk that undoes the changes made by this one.
+        """
+        hunk = Hunk(orig_start=self.new_start,
+                    orig_len=self.new_len,
+                    new_start=self.orig_start,
+                    new_len=self.orig_len)
+        hunk.old_lines = self.new_lines
+        hunk.new_lines = self.old_lines
+        hunk.leading_context = self.leading_context
+        hunk.trailing_context = self.trailing_context
+
+        return hunk
+
+    @property
+    def context(self):
+        """The larger of the leading and trailing context line counts."""
+        return max(self.leading_context, self.trailing_context)
+
+    @property
+    def expected_index(self):
+        """The 0-based index into the original file where the hunk applies.
+
+        A hunk that doesn't consume any lines from the original file inserts
+        its lines after ``orig_start``, rather than at it.
+        """
+        if self.orig_len == 0:
+            return self.orig_start
+        else:
+            return max(self.orig_start - 1, 0)
+
+
+def split_lines(data):
+    """Split data into lines, keeping the trailing newline on each.
+
+    The data is expected to have already been normalized by
+    :py:func:`~reviewboard.diffviewer.diffutils.convert_line_endings`.
+
+    Args:
+        data (bytes):
+            The data to split.
+
+    Returns:
+        list of bytes:
+        The lines in the data. The last line will lack a trailing newline if
+        the data did not end with one.
+    """
+    if not data:
+        return []
+
+    lines = data.split(b'\n')
+
+    if lines[-1]:
+        last_line = lines.pop()
+    else:
+        lines.pop()
+        last_line = None
+
+    lines = [line + b'\n' for line in lines]
+
+    if last_line is not None:
+        lines.append(last_line)
+
+    return lines
+
+
+def parse_hunks(diff):
+    """Parse the hunks out of a unified diff for a single file.
+
+    Any content before the first hunk (such as ``---``/``+++`` headers,
+    ``Index:`` lines, or Git extended headers) is skipped.
+
+    Args:
+        diff (bytes):
+            The diff, with normalized line endings.
+
+    Returns:
+        list of Hunk:
+        The parsed hunks.
+
+    Raises:
+        UnsupportedPatchError:
+            The diff isn't a unified diff that this module knows how to apply.
+    """
+    lines = diff.split(b'\n')
+    num_lines = len(lines)
+    hunks = []
+    i = 0
+
+    while i < num_lines:
+        line = lines[i]
+        m = HUNK_HEADER_RE.match(line)
+
+        if not m:
+            if CONTEXT_DIFF_RE.match(line):
+                raise UnsupportedPatchError('Context diffs are not supported')
+            elif line.startswith(b'GIT binary patch'):
+                raise UnsupportedPatchError('Binary diffs are not supported')
+
+            i += 1
+            continue
+
+        orig_len = m.group('orig_len')
+        new_len = m.group('new_len')
+        hunk = Hunk(orig_start=int(m.group('orig_start')),
+                    orig_len=int(orig_len if orig_len is not None else 1),
+                    new_start=int(m.group('new_start')),
+                    new_len=int(new_len if new_len is not None else 1))
+        hunk.raw_lines.append(line + b'\n')
+
+        orig_remaining = hunk.orig_len
+        new_remaining = hunk.new_len
+        seen_change = False
+        last_prefix = None
+        i += 1
+
+        while i < num_lines and (orig_remaining > 0 or new_remaining > 0):
+            line = lines[i]
+            prefix = line[:1]
+
+            if i == num_lines - 1 and not line:
+                # We've hit the end of the diff. The hunk is truncated.
+                break
+
+            if prefix == NO_NEWLINE_MARKER:
+                _strip_newline(hunk, last_prefix)
+                hunk.raw_lines.append(line + b'\n')
+                i += 1
+                continue
+
+            content = line[1:] + b'\n'
+
+            if prefix == b' ' or not line:
+                # Some editors strip the leading space from empty context
+                # lines. patch accepts these, so we do as well.
+                if not line:
+                    content = b'\n'
+
+                if orig_remaining == 0 or new_remaining == 0:
+                    break
+
+                hunk.old_lines.append(content)
+                hunk.new_lines.append(content)
+                orig_remaining -= 1
+                new_remaining -= 1
+
+                if seen_change:
+                    hunk.trailing_context += 1
+                else:
+                    hunk.leading_context += 1
+            elif prefix == b'-':
+                if orig_remaining == 0:
+                    break
+
+                hunk.old_lines.append(content)
+                orig_remaining -= 1
+                seen_change = True
+                hunk.trailing_context = 0
+            elif prefix == b'+':
+                if new_remaining == 0:
+                    break
+
+                hunk.new_lines.append(content)
+                new_remaining -= 1
+                seen_change = True
+                hunk.trailing_context = 0
+            else:
+                break
+
+            hunk.raw_lines.append(line + b'\n')
+            last_prefix = prefix
+            i += 1
+
+        if orig_remaining > 0 or new_remaining > 0:
+            raise UnsupportedPatchError(
+                'Hunk at line %d of the diff is truncated or malformed'
+                % hunk.orig_start)
+
+        # A "\ No newline at end of file" marker directly follows the
+        # last line it applies to, which may be the last line of the hunk.
+        if i < num_lines and lines[i][:1] == NO_NEWLINE_MARKER:
+            _strip_newline(hunk, last_prefix)
+            hunk.raw_lines.append(lines[i] + b'\n')
+            i += 1
+
+        hunks.append(hunk)
+
+    return hunks
+
+
+def _strip_newline(hunk, prefix):
+    """Strip the trailing newline from the last line of a hunk.
+
+    Args:
+        hunk (Hunk):
+            The hunk being parsed.
+
+        prefix (bytes):
+            The prefix of the line the "No newline" marker applies to.
+    """
+    if prefix in (b' ', b''):
+        targets = (hunk.old_lines, hunk.new_lines)
+    elif prefix == b'-':
+        targets = (hunk.old_lines,)
+    elif prefix == b'+':
+        targets = (hunk.new_lines,)
+    else:
+        targets = ()
+
+    for target in targets:
+        if target and target[-1].endswith(b'\n'):
+            target[-1] = target[-1][:-1]
+
+
+def _lines_match(orig_lines, index, lines, start, end):
+    """Return whether a range of hunk lines matches the file at an index.
+
+    Args:
+        orig_lines (list of bytes):
+            The lines of the file being patched.
+
+        index (int):
+            The index in ``orig_lines`` to compare against.
+
+        lines (list of bytes):
+            The lines from the hunk.
+
+        start (int):
+            The first index in ``lines`` to compare.
+
+        end (int):
+            The index in ``lines`` to stop comparing at.
+
+    Returns:
+        bool:
+        Whether the lines match.
+    """
+    if index < 0 or index + (end - start) > len(orig_lines):
+        return False
+
+    for i in range(start, end):
+        if orig_lines[index + i - start] != lines[i]:
+            return False
+
+    return True
+
+
+def _find_hunk(orig_lines, hunk, expected, pos, fuzz):
+    """Locate where a hunk applies in the file.
+
+    This mimics the search ``patch`` performs. The hunk is first looked for
+    at the expected location, then at increasing distances after and before
+    it.
+
+    As with ``patch``, a hunk with less leading context than trailing context
+    is assumed to be anchored to the start of the file, and a hunk with less
+    trailing context than leading context is assumed to be anchored to the
+    end of the file, unless enough fuzz is applied to even them out.
+
+    Args:
+        orig_lines (list of bytes):
+            The lines of the file being patched.
+
+        hunk (Hunk):
+            The hunk to locate.
+
+        expected (int):
+            The index at which the hunk is expected to apply, adjusted for
+            the offsets of previously-applied hunks.
+
+        pos (int):
+            The number of lines already consumed by previously-applied hunks.
+            The hunk cannot apply before this point, though it may overlap
+            the trailing context of the previous hunk.
+
+        fuzz (int):
+            The number of context lines to ignore.
+
+    Returns:
+        tuple:
+        A 3-tuple of ``(index, prefix_fuzz, suffix_fuzz)``, where ``index``
+        is the location of the first matched (non-fuzzed) line, or ``None``
+        if the hunk could not be located.
+    """
+    num_orig = len(orig_lines)
+    old_lines = hunk.old_lines
+    num_old = len(old_lines)
+
+    if num_old == 0:
+        # There's nothing to match against, so the lines go where the hunk
+        # says they go.
+        return max(min(expected, num_orig), pos), 0, 0
+
+    prefix_fuzz = fuzz + hunk.leading_context - hunk.context
+    suffix_fuzz = fuzz + hunk.trailing_context - hunk.context
+
+    if prefix_fuzz < 0 and hunk.orig_start <= 1:
+        # This can only match the start of the file.
+        if suffix_fuzz < 0 and num_old != num_orig:
+            # This can only match the entire file.
+            return None, 0, 0
+
+        suffix_fuzz = max(suffix_fuzz, 0)
+
+        if (pos == 0 and
+            _lines_match(orig_lines, 0, old_lines, 0,
+                         num_old - suffix_fuzz)):
+            return 0, 0, suffix_fuzz
+
+        return None, 0, 0
+
+    prefix_fuzz = max(prefix_fuzz, 0)
+    end = num_old - max(suffix_fuzz, 0)
+    max_index = num_orig - (end - prefix_fuzz)
+    min_index = pos + prefix_fuzz
+
+    if suffix_fuzz < 0:
+        # This can only match the end of the file.
+        if (max_index >= min_index and
+            _lines_match(orig_lines, max_index, old_lines, prefix_fuzz,
+                         end)):
+            return max_index, prefix_fuzz, 0
+
+        return None, 0, 0
+
+    base = expected + prefix_fuzz
+    max_distance = max(abs(base - min_index), abs(max_index - base))
+
+    for distance in range(max_distance + 1):
+        for index in (base + distance, base - distance):
+            if (min_index <= index <= max_index and
+                _lines_match(orig_lines, index, old_lines, prefix_fuzz,
+                             end)):
+                return index, prefix_fuzz, suffix_fuzz
+
+            if distance == 0:
+                break
+
+    return None, 0, 0
+
+
+def apply_patch(diff, orig_file, filename, max_fuzz=2):
+    """Apply a unified diff to a file in memory.
+
+    Both the diff and the original file must already have had their line
+    endings normalized.
+
+    Args:
+        diff (bytes):
+            The unified diff to apply.
+
+        orig_file (bytes):
+            The contents of the original file.
+
+        filename (unicode):
+            The name of the file being patched. This is used for error
+            reporting.
+
+        max_fuzz (int, optional):
+            The maximum number of context lines that may be ignored when
+            locating a hunk. This matches the default for ``patch``.
+
+    Returns:
+        bytes:
+        The contents of the patched file.
+
+    Raises:
+        UnsupportedPatchError:
+            The diff is not in a format understood by this module.
+
+        reviewboard.diffviewer.errors.PatchError:
+            One or more hunks could not be applied.
+    """
+    hunks = parse_hunks(diff)
+
+    if not hunks:
+        raise UnsupportedPatchError('No unified diff hunks were found')
+
+    orig_lines = split_lines(orig_file)
+    result = []
+    rejected = []
+    pos = 0
+    offset = 0
+
+    for hunk_num, hunk in enumerate(hunks, start=1):
+        expected = hunk.expected_index + offset
+
+        for fuzz in range(min(max_fuzz, hunk.context) + 1):
+            index, prefix_fuzz, suffix_fuzz = _find_hunk(
+                orig_lines, hunk, expected, pos, fuzz)
+
+            if index is not None:
+                break
+
+            if (hunk_num == 1 and
+                _find_hunk(orig_lines, hunk.reverse(), expected, pos,
+                           fuzz)[0] is not None):
+                # Like patch, refuse to apply a diff that looks like it's
+                # already been applied.
+                raise PatchError(
+                    filename,
+                    'patching file %s\n'
+                    'Reversed (or previously applied) patch detected! '
+                    'Skipping patch.'
+                    % os.path.basename(filename),
+                    orig_file, None, diff, None)
+
+        if index is None:
+            rejected.append((hunk_num, hunk))
+            continue
+
+        offset = index - prefix_fuzz - hunk.expected_index
+
+        # As with patch, the trailing context isn't consumed, since the next
+        # hunk's leading context may overlap it. Any leading context lines
+        # ignored due to fuzz are kept as they appear in the file.
+        result.extend(orig_lines[pos:index])
+        result.extend(hunk.new_lines[prefix_fuzz:
+                                     len(hunk.new_lines) -
+                                     hunk.trailing_context])
+        pos = (index - prefix_fuzz + len(hunk.old_lines) -
+               hunk.trailing_context)
+
+    result.extend(orig_lines[pos:])
+
+    # A hunk may have removed the trailing newline from what was the last
+    # line of the file, but which no longer is (due to an offset). Only the
+    # final line may lack a newline.
+    for i in range(len(result) - 1):
+        if not result[i].endswith(b'\n'):
+            result[i] += b'\n'
+
+    new_file = b''.join(result)
+
+    if rejected:
+        base_filename = os.path.basename(filename)
+        error_lines = ['patching file %s' % base_filename]
+        error_lines += [
+            'Hunk #%d FAILED at %d.' % (hunk_num, hunk.orig_start)
+            for hunk_num, hunk in rejected
+        ]
+        error_lines.append(
+            '%d out of %d hunk%s FAILED -- saving rejects to file %s.rej'
+            % (len(rejected), len(hunks), 's' if len(hunks) != 1 else '',
+               base_filename))
+
+        rejects = b''.join(
+            [b'--- %s\n' % filename.encode('utf-8'),
+             b'+++ %s\n' % filename.encode('utf-8')] +
+            [
+                b''.join(hunk.raw_lines)
+                for hunk_num, hunk in rejected
+            ])
+
+        raise PatchError(filename, '\n'.join(error_lines), orig_file,
+                         new_file, diff, rejects)
+
+    return new_file
@@ -0,0 +1,462 @@
+"""Background pre-warming of the diff chunk cache.
+
+Chunks for a diff are normally generated the first time someone views it,
+which means the first reviewer waits for every file to be fetched, diffed,
+and highlighted. When a review request is published with a new diff, the
+files in the diff (and the interdiff against the previous revision) are
+instead queued here and generated on a pool of background threads, filling
+the same cache the diff viewer reads from.
+
+Jobs are deduplicated while they're queued or running. Files that are being
+viewed are moved to the front of the queue, and a file that a viewer asks for
+while it's being generated in the background is waited on, rather than being
+generated twice.
+"""
+
+from __future__ import unicode_literals
+
+import heapq
+import itertools
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import connection
+from django.utils import translation
+from djblets.siteconfig.models import SiteConfiguration
+
+
+#: The priority for files that are being viewed.
+PRIORITY_VIEWING = 0
+
+#: The priority for files in newly-published diffs.
+PRIORITY_PUBLISHED = 1
+
+
+def get_file_job_key(diff_file):
+    """Return the job key for generating a file's chunks.
+
+    Args:
+        diff_file (dict):
+            The file from
+            :py:func:`~reviewboard.diffviewer.diffutils.get_diff_files`.
+
+    Returns:
+        tuple:
+        The key identifying the job.
+    """
+    interfilediff = diff_file['interfilediff']
+
+    return ('file',
+            diff_file['filediff'].pk,
+            interfilediff and interfilediff.pk,
+            diff_file['force_interdiff'])
+
+
+class ChunkPrewarmQueue(object):
+    """A queue of jobs for filling the diff chunk cache in the background.
+
+    Each job has a key, which is used to avoid queuing the same job twice,
+    and a priority. Jobs with a lower priority value are run first, and jobs
+    with the same priority are run in the order they were queued.
+
+    Worker threads are started when the first job is queued, and wait for
+    more jobs once the queue is empty.
+    """
+
+    #: The longest time, in seconds, to wait for a running job in
+    #: :py:meth:`claim_file`.
+    CLAIM_TIMEOUT_SECS = 30
+
+    def __init__(self, max_workers=None):
+        """Initialize the queue.
+
+        Args:
+            max_workers (int, optional):
+                The number of worker threads to run. This defaults to the
+                ``diffviewer_prewarm_workers`` site configuration setting. If
+                this is 0, jobs will be queued but not run until
+                :py:meth:`run_pending` is called.
+        """
+        self.max_workers = max_workers
+
+        self._cond = threading.Condition()
+        self._heap = []
+        self._queued = {}
+        self._running = {}
+        self._counter = itertools.count()
+        self._num_workers = 0
+
+    def add_job(self, key, func, priority=PRIORITY_PUBLISHED):
+        """Add a job to the queue.
+
+        If a job with the same key is already queued, it will be moved up to
+        the new priority, if higher. If it's already running, it won't be
+        queued again.
+
+        Args:
+            key (tuple):
+                The key identifying the job.
+
+            func (callable):
+                The function to call to run the job.
+
+            priority (int, optional):
+                The priority of the job.
+
+        Returns:
+            bool:
+            Whether the job was newly queued.
+        """
+        with self._cond:
+            if key in self._running:
+                return False
+
+            entry = self._queued.get(key)
+
+            if entry is not None:
+                if priority < entry[0]:
+                    self._push(key, entry[3], priority)
+
+                return False
+
+            self._push(key, func, priority)
+            self._start_workers()
+
+            return True
+
+    def prioritize(self, keys):
+        """Move queued jobs to the front of the queue.
+
+        Jobs that aren't queued are ignored.
+
+        Args:
+            keys (list of tuple):
+                The keys of the jobs to move.
+        """
+        with self._cond:
+            for key in keys:
+                entry = self._queued.get(key)
+
+                if entry is not None and entry[0] > PRIORITY_VIEWING:
+                    self._push(key, entry[3], PRIORITY_VIEWING)
+
+    def queue_diffset(self, diffset, interdiffset=None,
+                      priority=PRIORITY_PUBLISHED):
+        """Queue generating chunks for all files in a diff.
+
+        Finding the files in the diff happens as its own job, which will then
+        queue a job for each file.
+
+        Args:
+            diffset (reviewboard.diffviewer.models.DiffSet):
+                The diffset to generate chunks for.
+
+            interdiffset (reviewboard.diffviewer.models.DiffSet, optional):
+                A second diffset, for generating chunks for an interdiff.
+
+            priority (int, optional):
+                The priority of the jobs.
+
+        Returns:
+            bool:
+            Whether the job was newly queued.
+        """
+        interdiffset_id = interdiffset and interdiffset.pk
+
+        return self.add_job(
+            ('diffset', diffset.pk, interdiffset_id),
+            partial(self._queue_diffset_files, diffset.pk, interdiffset_id,
+                    priority),
+            priority)
+
+    def prioritize_files(self, diff_files):
+        """Move queued jobs for files that are being viewed to the front.
+
+        Args:
+            diff_files (list of dict):
+                The files from
+                :py:func:`~reviewboard.diffviewer.diffutils.get_diff_files`.
+        """
+        self.prioritize([
+            get_file_job_key(diff_file)
+            for diff_file in diff_files
+        ])
+
+    def claim_file(self, diff_file):
+        """Claim a file that's about to be generated for a viewer.
+
+        If the file is queued, it's removed from the queue, since the viewer
+        will generate it. If it's being generated in the background, this
+        waits for that to finish (up to :py:attr:`CLAIM_TIMEOUT_SECS`), so
+        that the viewer can use the cached result.
+
+        Args:
+            diff_file (dict):
+                The file from
+                :py:func:`~reviewboard.diffviewer.diffutils.get_diff_files`.
+        """
+        key = get_file_job_key(diff_file)
+
+        with self._cond:
+            self._queued.pop(key, None)
+            event = self._running.get(key)
+
+        if event is not None:
+            event.wait(self.CLAIM_TIMEOUT_SECS)
+
+    def run_pending(self):
+        """Run all queued jobs in the current thread.
+
+        This returns once the queue is empty, including any jobs queued by
+        the jobs that were run.
+        """
+        while True:
+            with self._cond:
+                job = self._pop()
+
+            if job is None:
+                break
+
+            self._run_job(*job)
+
+    def clear(self):
+        """Remove all queued jobs."""
+        with self._cond:
+            self._heap = []
+            self._queued = {}
+
+    def _push(self, key, func, priority):
+        """Push a job onto the heap.
+
+        Any existing entry for the key is left on the heap, but is skipped
+        when popped.
+
+        This must be called with the lock held.
+
+        Args:
+            key (tuple):
+                The key identifying the job.
+
+            func (callable):
+                The function to call to run the job.
+
+            priority (int):
+                The priority of the job.
+        """
+        entry = [priority, next(self._counter), key, func]
+        self._queued[key] = entry
+        heapq.heappush(self._heap, entry)
+        self._cond.notify()
+
+    def _pop(self):
+        """Pop the next job from the heap and mark it as running.
+
+        This must be called with the lock held.
+
+        Returns:
+            tuple:
+            A 3-tuple of the key, the function to call, and the event to set
+            once the job is finished, or ``None`` if there aren't any jobs.
+        """
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            key = entry[2]
+
+            if self._queued.get(key) is entry:
+                del self._queued[key]
+                event = threading.Event()
+                self._running[key] = event
+
+                return key, entry[3], event
+
+        return None
+
+    def _run_job(self, key, func, event):
+        """Run a job.
+
+        Errors are logged, rather than raised, so that one failed job doesn't
+        stop the others.
+
+        Args:
+            key (tuple):
+                The key identifying the job.
+
+            func (callable):
+                The function to call to run the job.
+
+            event (threading.Event):
+                The event to set once the job is finished.
+        """
+        try:
+            with translation.override(settings.LANGUAGE_CODE):
+                func()
+        except Exception as e:
+            logging.exception('Failed to pre-generate diff chunks for %r: %s',
+                              key, e)
+        finally:
+            with self._cond:
+                self._running.pop(key, None)
+
+            event.set()
+
+    def _start_workers(self):
+        """Start any worker threads that aren't yet running.
+
+        This must be called with the lock held.
+        """
+        if getattr(settings, 'RUNNING_TEST', False):
+            # Jobs are run explicitly through run_pending() in tests.
+            return
+
+        max_workers = self.max_workers
+
+        if max_workers is None:
+            siteconfig = SiteConfiguration.objects.get_current()
+            max_workers = siteconfig.get('diffviewer_prewarm_workers')
+
+        while self._num_workers < max_workers:
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self._num_workers += 1
+
+    def _worker(self):
+        """Run jobs from the queue, waiting for more when it's empty."""
+        while True:
+            with self._cond:
+                job = self._pop()
+
+                while job is None:
+                    self._cond.wait()
+                    job = self._pop()
+
+            try:
+                self._run_job(*job)
+            finally:
+                # Each thread has its own database connection, which would
+                # otherwise be left open between jobs.
+                connection.close()
+
+    def _queue_diffset_files(self, diffset_id, interdiffset_id, priority):
+        """Queue a job for each file in a diff.
+
+        Args:
+            diffset_id (int):
+                The ID of the diffset.
+
+            interdiffset_id (int):
+                The ID of the diffset for the interdiff, if any.
+
+            priority (int):
+                The priority of the jobs.
+        """
+        from reviewboard.diffviewer.diffutils import get_diff_files
+        from reviewboard.diffviewer.models import DiffSet
+
+        diffset = DiffSet.objects.get(pk=diffset_id)
+
+        if interdiffset_id is None:
+            interdiffset = None
+        else:
+            interdiffset = DiffSet.objects.get(pk=interdiffset_id)
+
+        for diff_file in get_diff_files(diffset=diffset,
+                                        interdiffset=interdiffset):
+            if diff_file['binary'] or diff_file['deleted']:
+                continue
+
+            key = get_file_job_key(diff_file)
+            self.add_job(key, partial(_generate_file_chunks, *key[1:]),
+                         priority)
+
+
+def _generate_file_chunks(filediff_id, interfilediff_id, force_interdiff):
+    """Generate and cache the chunks for a file.
+
+    The chunks are generated the same way the diff viewer would for a user
+    with syntax highlighting enabled, so that they're stored under the same
+    cache key.
+
+    Args:
+        filediff_id (int):
+            The ID of the file's FileDiff.
+
+        interfilediff_id (int):
+            The ID of the FileDiff for the interdiff, if any.
+
+        force_interdiff (bool):
+            Whether this is part of an interdiff, even without an
+            interfilediff.
+    """
+    from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
+    from reviewboard.diffviewer.models import FileDiff
+
+    filediff = FileDiff.objects.get(pk=filediff_id)
+
+    if interfilediff_id is None:
+        interfilediff = None
+    else:
+        interfilediff = FileDiff.objects.get(pk=interfilediff_id)
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    generator = get_diff_chunk_generator(
+        None, filediff, interfilediff, force_interdiff,
+        siteconfig.get('diffviewer_syntax_highlighting'))
+
+    for chunk in generator.get_chunks():
+        pass
+
+
+def review_request_published_cb(review_request, changedesc, **kwargs):
+    """Queue pre-generating chunks for a newly published diff.
+
+    This will queue the latest diff, along with the interdiff against the
+    previous revision, if the diff changed as part of the publish.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request that was published.
+
+        changedesc (reviewboard.changedescs.models.ChangeDescription):
+            The change description for the publish, if any.
+
+        **kwargs (dict):
+            Unused keyword arguments provided by the signal.
+    """
+    if changedesc is not None and 'diff' not in changedesc.fields_changed:
+        return
+
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    if not siteconfig.get('diffviewer_prewarm_workers'):
+        return
+
+    from reviewboard.diffviewer.models import DiffSet
+
+    diffsets = list(
+        DiffSet.objects
+        .filter(history=review_request.diffset_history_id)
+        .order_by('-revision')[:2])
+
+    if not diffsets:
+        return
+
+    prewarm_queue.queue_diffset(diffsets[0])
+
+    if len(diffsets) == 2:
+        prewarm_queue.queue_diffset(diffsets[1], diffsets[0])
+
+
+def connect_signals():
+    """Connect the pre-warming callbacks to signals."""
+    from reviewboard.reviews.models import ReviewRequest
+    from reviewboard.reviews.signals import review_request_published
+
+    review_request_published.connect(review_request_published_cb,
+                                     sender=ReviewRequest)
+
+
+#: The queue used for pre-warming chunks.
+prewarm_queue = ChunkPrewarmQueue()
@@ -9,7 +9,8 @@ from django.utils.translation import ugettext as _, get_language
 from djblets.cache.backend import cache_memoize
 
 from reviewboard.diffviewer.chunk_generator import compute_chunk_last_header
-from reviewboard.diffviewer.diffutils import populate_diff_chunks
+from reviewboard.diffviewer.diffutils import (populate_diff_chunk_outlines,
+                                              populate_diff_chunks)
 from reviewboard.diffviewer.errors import UserVisibleError
 
 
@@ -83,10 +84,23 @@ class DiffRenderer(object):
         This is a potentially expensive operation, and so is meant to be called
         only as often as necessary. render_to_string will call this if it's
         not already in the cache.
+
+        When rendering a single chunk, or a file with all collapsable chunks
+        collapsed, only the lines that will be shown are loaded.
         """
         if not self.diff_file.get('chunks_loaded', False):
-            populate_diff_chunks([self.diff_file], self.highlighting,
-                                 request=request)
+            if self.chunk_index is not None:
+                populate_diff_chunk_outlines(self.diff_file,
+                                             self.highlighting,
+                                             chunk_indexes=[self.chunk_index],
+                                             request=request)
+            elif self.collapse_all:
+                populate_diff_chunk_outlines(self.diff_file,
+                                             self.highlighting,
+                                             request=request)
+            else:
+                populate_diff_chunks([self.diff_file], self.highlighting,
+                                     request=request)
 
         if self.chunk_index is not None:
             assert not self.lines_of_context or self.collapse_all
@@ -164,10 +164,14 @@ def diff_chunk_header(context, header):
     lines_of_context = context['lines_of_context']
     chunk = context['chunk']
 
-    line = chunk['lines'][0]
+    if 'lines' in chunk:
+        first_line = chunk['lines'][0][1]
+    else:
+        # Collapsed chunks may be rendered without their lines.
+        first_line = chunk['meta']['orig_first_line']
 
-    if header['line'] >= line[1]:
-        expand_offset = line[1] + chunk['numlines'] - header['line']
+    if header['line'] >= first_line:
+        expand_offset = first_line + chunk['numlines'] - header['line']
         expandable = True
     else:
         expand_offset = 0
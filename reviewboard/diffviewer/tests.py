@@ -1,32 +1,57 @@
 from __future__ import unicode_literals
 
 import bz2
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import zlib
+from functools import partial
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpResponse
 from django.test import RequestFactory
+from django.utils import six
+from django.utils.safestring import SafeText, mark_safe
 from django.utils.six.moves import zip_longest
 from djblets.cache.backend import cache_memoize
 from djblets.db.fields import Base64DecodedValue
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
+from pygments import highlight
 import nose
 
 import reviewboard.diffviewer.diffutils as diffutils
 import reviewboard.diffviewer.parser as diffparser
+import reviewboard.diffviewer.prewarm as prewarm
 from reviewboard.admin.import_utils import has_module
+from reviewboard.changedescs.models import ChangeDescription
 from reviewboard.diffviewer.chunk_generator import (DiffChunkGenerator,
-                                                    RawDiffChunkGenerator)
+                                                    RawDiffChunkGenerator,
+                                                    get_diff_chunk_generator)
+from reviewboard.diffviewer.chunk_serialization import (deserialize_chunks,
+                                                        serialize_chunks)
+from reviewboard.diffviewer.compression import (get_compression_method,
+                                                get_compression_methods)
+from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
 from reviewboard.diffviewer.diffutils import (get_displayed_diff_line_ranges,
                                               get_matched_interdiff_files)
-from reviewboard.diffviewer.errors import UserVisibleError
+from reviewboard.diffviewer.errors import PatchError, UserVisibleError
+from reviewboard.diffviewer.fastmyersdiff import FastMyersDiffer
+from reviewboard.diffviewer.filecache import (FileContentCache,
+                                              cache_file_content,
+                                              get_cached_file_content)
 from reviewboard.diffviewer.forms import UploadDiffForm
 from reviewboard.diffviewer.models import (DiffSet, DiffSetHistory, FileDiff,
                                            LegacyFileDiffData,
                                            RawFileDiffData)
 from reviewboard.diffviewer.myersdiff import MyersDiffer
 from reviewboard.diffviewer.opcode_generator import get_diff_opcode_generator
+from reviewboard.diffviewer.patcher import UnsupportedPatchError, apply_patch
+from reviewboard.diffviewer.prewarm import prewarm_queue
 from reviewboard.diffviewer.renderers import DiffRenderer
 from reviewboard.diffviewer.processors import (filter_interdiff_opcodes,
                                                post_process_filtered_equals)
@@ -64,6 +89,105 @@ class MyersDifferTest(TestCase):
         self.assertEqual(opcodes, expected)
 
 
+class FastMyersDifferTests(TestCase):
+    """Unit tests for reviewboard.diffviewer.fastmyersdiff.FastMyersDiffer."""
+
+    def test_get_differ(self):
+        """Testing get_differ returns FastMyersDiffer for Myers compat
+        versions
+        """
+        for compat_version in DiffCompatVersion.MYERS_VERSIONS:
+            self.assertIsInstance(
+                get_differ([], [], compat_version=compat_version),
+                FastMyersDiffer)
+
+    def test_opcodes_match_myers_differ(self):
+        """Testing FastMyersDiffer opcodes match MyersDiffer"""
+        for seed in range(50):
+            rand = random.Random(seed)
+            num_lines = rand.choice([0, 1, 10, 100, 1000])
+            a = [
+                'line %d\n' % rand.randint(0, num_lines // 4)
+                for i in range(num_lines)
+            ]
+            b = self._make_changes(rand, a)
+
+            self._check_matches_myers_differ(a, b)
+
+    def test_opcodes_match_myers_differ_with_long_runs(self):
+        """Testing FastMyersDiffer opcodes match MyersDiffer with long runs
+        of unchanged lines
+        """
+        a = ['line %d\n' % i for i in range(5000)]
+
+        for seed in range(10):
+            b = self._make_changes(random.Random(seed), a)
+
+            self._check_matches_myers_differ(a, b)
+
+    def test_opcodes_match_myers_differ_with_headers(self):
+        """Testing FastMyersDiffer opcodes and interesting lines match
+        MyersDiffer
+        """
+        for seed in range(50):
+            rand = random.Random(seed)
+            a = [
+                rand.choice([
+                    'def func%d():\n' % rand.randint(0, 9),
+                    '    class Foo%d:\n' % rand.randint(0, 5),
+                    '    x = %d\n' % rand.randint(0, 30),
+                    '\n',
+                    '    \n',
+                ])
+                for i in range(200)
+            ]
+            b = self._make_changes(rand, a)
+
+            self._check_matches_myers_differ(a, b, filename='test.py')
+
+    def _make_changes(self, rand, lines):
+        """Return a copy of a list of lines with random changes."""
+        lines = list(lines)
+
+        for change_num in range(rand.randint(0, 20)):
+            change = rand.randint(0, 2)
+            i = rand.randint(0, len(lines))
+
+            if change == 0:
+                del lines[i:i + rand.randint(1, 20)]
+            elif change == 1:
+                lines[i:i] = [
+                    'new line %d\n' % rand.randint(0, 50)
+                    for j in range(rand.randint(1, 20))
+                ]
+            else:
+                # Common lines like these are what make diffs ambiguous.
+                lines[i:i] = ['}\n', '\n', '    return None\n']
+
+        return lines
+
+    def _check_matches_myers_differ(self, a, b, filename=None):
+        """Check that both differs produce the same results."""
+        for compat_version in DiffCompatVersion.MYERS_VERSIONS:
+            for ignore_space in (False, True):
+                results = []
+
+                for differ_cls in (MyersDiffer, FastMyersDiffer):
+                    differ = differ_cls(a, b, ignore_space=ignore_space,
+                                        compat_version=compat_version)
+
+                    if filename:
+                        differ.add_interesting_lines_for_headers(filename)
+
+                    results.append((
+                        list(differ.get_opcodes()),
+                        differ.get_interesting_lines('header', False),
+                        differ.get_interesting_lines('header', True),
+                    ))
+
+                self.assertEqual(results[0], results[1])
+
+
 class InterestingLinesTest(TestCase):
     def test_csharp(self):
         """Testing interesting lines scanner with a C# file"""
@@ -351,6 +475,37 @@ class InterestingLinesTest(TestCase):
 
 
 class DiffParserTest(TestCase):
+    fixtures = ['test_scmtools']
+
+    def test_iter_raw_diff(self):
+        """Testing DiffParser.iter_raw_diff"""
+        diff1 = (
+            b'--- README\trevision 123\n'
+            b'+++ README\trevision 123\n'
+            b'@@ -1 +1 @@\n'
+            b'-Hello, world!\n'
+            b'+Hello, everybody!\n'
+        )
+        diff2 = (
+            b'--- NEWS\trevision 123\n'
+            b'+++ NEWS\trevision 123\n'
+            b'@@ -1 +1 @@\n'
+            b'-Old news\n'
+            b'+New news\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        self.create_filediff(diffset, diff=diff1)
+        self.create_filediff(diffset, source_file='/NEWS', dest_file='/NEWS',
+                             diff=diff2)
+
+        parser = diffparser.DiffParser(b'')
+
+        self.assertEqual(b''.join(parser.iter_raw_diff(diffset)),
+                         diff1 + diff2)
+        self.assertEqual(parser.raw_diff(diffset), diff1 + diff2)
+
     def test_form_feed(self):
         """Testing DiffParser.parse with a form feed in the file"""
         data = (
@@ -950,6 +1105,46 @@ class DiffParserTest(TestCase):
         self.assertEqual(files[0].insert_count, 3)
         self.assertEqual(files[0].delete_count, 4)
 
+    def test_preamble_and_multiple_files(self):
+        """Testing DiffParser.parse keeps the preamble and each file's
+        content
+        """
+        file1 = (
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@@ -1,1 +1,1 @@\n'
+            b'-blah\n'
+            b'+blah!\n')
+        file2 = (
+            b'--- NEWS  456\n'
+            b'+++ NEWS  (new)\n'
+            b'@@ -1,1 +1,2 @@\n'
+            b' news\n'
+            b'+more news\n')
+        preamble = b'This is a preamble\nwith two lines\n'
+
+        files = diffparser.DiffParser(preamble + file1 + file2).parse()
+
+        self.assertEqual(len(files), 2)
+        self.assertEqual(files[0].data, preamble + file1)
+        self.assertEqual(files[1].data, file2)
+
+    def test_file_append_data(self):
+        """Testing File.append_data and File.prepend_data"""
+        f = diffparser.File()
+        self.assertIsNone(f.data)
+
+        f.append_data(b'line 2\n')
+        f.append_data(b'line 3\n')
+        f.prepend_data(b'line 1\n')
+        self.assertEqual(f.data, b'line 1\nline 2\nline 3\n')
+
+        f.append_data(b'line 4\n')
+        self.assertEqual(f.data, b'line 1\nline 2\nline 3\nline 4\n')
+
+        f.data = b'new\n'
+        self.assertEqual(f.data, b'new\n')
+
     def _test_move_detection(self, a, b, expected_i_moves, expected_r_moves):
         differ = MyersDiffer(a, b)
         opcode_generator = get_diff_opcode_generator(differ)
@@ -970,6 +1165,198 @@ class DiffParserTest(TestCase):
         self.assertEqual(r_moves, expected_r_moves)
 
 
+class PatcherTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.patcher."""
+
+    ORIG = (
+        b'line 1\n'
+        b'line 2\n'
+        b'line 3\n'
+        b'line 4\n'
+        b'line 5\n'
+        b'line 6\n'
+        b'line 7\n'
+        b'line 8\n'
+        b'line 9\n'
+        b'line 10\n'
+    )
+
+    def test_apply_patch(self):
+        """Testing apply_patch with multiple hunks"""
+        diff = (
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -1,3 +1,3 @@\n'
+            b' line 1\n'
+            b'-line 2\n'
+            b'+line two\n'
+            b' line 3\n'
+            b'@@ -8,3 +8,4 @@\n'
+            b' line 8\n'
+            b' line 9\n'
+            b' line 10\n'
+            b'+line 11\n'
+        )
+
+        self.assertEqual(
+            apply_patch(diff, self.ORIG, 'README'),
+            self.ORIG.replace(b'line 2\n', b'line two\n') + b'line 11\n')
+
+    def test_apply_patch_with_offset(self):
+        """Testing apply_patch with hunks at an offset"""
+        diff = (
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -2,3 +2,2 @@\n'
+            b' line 5\n'
+            b'-line 6\n'
+            b' line 7\n'
+        )
+
+        self.assertEqual(apply_patch(diff, self.ORIG, 'README'),
+                         self.ORIG.replace(b'line 6\n', b''))
+
+    def test_apply_patch_with_fuzz(self):
+        """Testing apply_patch with mismatched context lines"""
+        diff = (
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -4,5 +4,5 @@\n'
+            b' changed 4\n'
+            b' line 5\n'
+            b'-line 6\n'
+            b'+line six\n'
+            b' line 7\n'
+            b' changed 8\n'
+        )
+
+        self.assertEqual(apply_patch(diff, self.ORIG, 'README'),
+                         self.ORIG.replace(b'line 6\n', b'line six\n'))
+
+    def test_apply_patch_with_no_newline(self):
+        """Testing apply_patch with "No newline at end of file" markers"""
+        diff = (
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -9,2 +9,2 @@\n'
+            b' line 9\n'
+            b'-line 10\n'
+            b'+line 10\n'
+            b'\\ No newline at end of file\n'
+        )
+
+        self.assertEqual(apply_patch(diff, self.ORIG, 'README'),
+                         self.ORIG[:-1])
+        self.assertEqual(
+            apply_patch(
+                diff.replace(b'-line 10\n', b'-line 10\n\\ No newline\n')
+                    .replace(b'\\ No newline at end of file\n', b''),
+                self.ORIG[:-1], 'README'),
+            self.ORIG)
+
+    def test_apply_patch_with_new_file(self):
+        """Testing apply_patch with a newly-added file"""
+        diff = (
+            b'--- /dev/null\n'
+            b'+++ README\n'
+            b'@@ -0,0 +1,2 @@\n'
+            b'+line 1\n'
+            b'+line 2\n'
+        )
+
+        self.assertEqual(apply_patch(diff, b'', 'README'),
+                         b'line 1\nline 2\n')
+
+    def test_apply_patch_with_rejects(self):
+        """Testing apply_patch with hunks that fail to apply"""
+        diff = (
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -1,2 +1,2 @@\n'
+            b'-line 1\n'
+            b'+line one\n'
+            b' line 2\n'
+            b'@@ -5,2 +5,2 @@\n'
+            b'-line five\n'
+            b'+line 5\n'
+            b' line 6\n'
+        )
+
+        with self.assertRaises(PatchError) as cm:
+            apply_patch(diff, self.ORIG, 'README')
+
+        e = cm.exception
+        self.assertEqual(e.filename, 'README')
+        self.assertEqual(
+            e.error_output,
+            'patching file README\n'
+            'Hunk #2 FAILED at 5.\n'
+            '1 out of 2 hunks FAILED -- saving rejects to file README.rej')
+        self.assertEqual(e.new_file,
+                         self.ORIG.replace(b'line 1\n', b'line one\n'))
+        self.assertEqual(
+            e.rejects,
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -5,2 +5,2 @@\n'
+            b'-line five\n'
+            b'+line 5\n'
+            b' line 6\n')
+
+    def test_apply_patch_with_context_diff(self):
+        """Testing apply_patch with a context diff"""
+        diff = (
+            b'*** README\n'
+            b'--- README\n'
+            b'***************\n'
+            b'*** 1 ****\n'
+            b'! line 1\n'
+            b'--- 1 ----\n'
+            b'! line one\n'
+        )
+
+        with self.assertRaises(UnsupportedPatchError):
+            apply_patch(diff, self.ORIG, 'README')
+
+    def test_patch_in_process(self):
+        """Testing diffutils.patch applies unified diffs in-process"""
+        self.spy_on(diffutils._patch_with_subprocess)
+
+        diff = (
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -1,2 +1,2 @@\n'
+            b'-line 1\n'
+            b'+line one\n'
+            b' line 2\n'
+        )
+
+        self.assertEqual(diffutils.patch(diff, self.ORIG, 'README'),
+                         self.ORIG.replace(b'line 1\n', b'line one\n'))
+        self.assertFalse(diffutils._patch_with_subprocess.spy.called)
+
+    def test_patch_falls_back_on_subprocess(self):
+        """Testing diffutils.patch falls back on patch for unsupported diffs
+        """
+        self.spy_on(diffutils._patch_with_subprocess)
+
+        diff = (
+            b'*** README\n'
+            b'--- README\n'
+            b'***************\n'
+            b'*** 1,2 ****\n'
+            b'! line 1\n'
+            b'  line 2\n'
+            b'--- 1,2 ----\n'
+            b'! line one\n'
+            b'  line 2\n'
+        )
+
+        self.assertEqual(diffutils.patch(diff, self.ORIG, 'README'),
+                         self.ORIG.replace(b'line 1\n', b'line one\n'))
+        self.assertTrue(diffutils._patch_with_subprocess.spy.called)
+
+
 class FileDiffTests(TestCase):
     """Unit tests for FileDiff."""
     fixtures = ['test_scmtools']
@@ -1088,14 +1475,145 @@ class RawFileDiffDataManagerTests(TestCase):
 
     def test_process_diff_data_large_diff_compressed(self):
         """Testing RawFileDiffDataManager.process_diff_data with large diff
-        results in bzip2-compressed storage
+        results in zlib-compressed storage by default
         """
         data, compression = \
             RawFileDiffData.objects.process_diff_data(self.large_diff)
 
+        self.assertEqual(data, zlib.compress(self.large_diff, 9))
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_process_diff_data_large_diff_compressed_bzip2(self):
+        """Testing RawFileDiffDataManager.process_diff_data with large diff
+        and diffviewer_diff_compression=bzip2 results in bzip2-compressed
+        storage
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_diff_compression', 'bzip2')
+        siteconfig.save()
+
+        try:
+            data, compression = \
+                RawFileDiffData.objects.process_diff_data(self.large_diff)
+        finally:
+            siteconfig.set('diffviewer_diff_compression', 'zlib')
+            siteconfig.save()
+
         self.assertEqual(data, bz2.compress(self.large_diff, 9))
         self.assertEqual(compression, RawFileDiffData.COMPRESSION_BZIP2)
 
+    def test_process_diff_data_unavailable_compression(self):
+        """Testing RawFileDiffDataManager.process_diff_data with unknown
+        diffviewer_diff_compression falls back on zlib
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_diff_compression', 'unknown')
+        siteconfig.save()
+
+        try:
+            data, compression = \
+                RawFileDiffData.objects.process_diff_data(self.large_diff)
+        finally:
+            siteconfig.set('diffviewer_diff_compression', 'zlib')
+            siteconfig.save()
+
+        self.assertEqual(data, zlib.compress(self.large_diff, 9))
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_content_with_compression_methods(self):
+        """Testing RawFileDiffData.content with each available compression
+        method
+        """
+        for compression_method in get_compression_methods():
+            data, compression = RawFileDiffData.objects.process_diff_data(
+                self.large_diff, compression_method)
+            self.assertEqual(compression, compression_method.flag)
+
+            raw_fdd = RawFileDiffData.objects.create(
+                binary_hash='hash-%s' % compression_method.name,
+                binary=data,
+                compression=compression)
+            raw_fdd = RawFileDiffData.objects.get(pk=raw_fdd.pk)
+
+            self.assertEqual(raw_fdd.content, self.large_diff)
+
+    def test_iter_content_with_compression_methods(self):
+        """Testing RawFileDiffData.iter_content with each available
+        compression method
+        """
+        for compression_method in get_compression_methods():
+            raw_fdd = RawFileDiffData(
+                binary=compression_method.compress(self.large_diff),
+                compression=compression_method.flag)
+
+            # Decompress a few bytes at a time, to check that the pieces
+            # are put back together correctly.
+            compression_method.DECOMPRESS_CHUNK_SIZE = 8
+
+            try:
+                pieces = list(raw_fdd.iter_content())
+            finally:
+                del compression_method.DECOMPRESS_CHUNK_SIZE
+
+            self.assertGreater(len(pieces), 1)
+            self.assertEqual(b''.join(pieces), self.large_diff)
+
+    def test_iter_content_uncompressed(self):
+        """Testing RawFileDiffData.iter_content with uncompressed content"""
+        raw_fdd = RawFileDiffData(binary=self.small_diff, compression=None)
+
+        self.assertEqual(list(raw_fdd.iter_content()), [self.small_diff])
+
+    def test_content_with_unknown_compression(self):
+        """Testing RawFileDiffData.content with unknown compression method"""
+        raw_fdd = RawFileDiffData(binary=self.large_diff, compression='X')
+
+        with self.assertRaises(NotImplementedError):
+            raw_fdd.content
+
+    def test_recompress_all(self):
+        """Testing RawFileDiffDataManager.recompress_all"""
+        bzip2_method = get_compression_method('bzip2')
+        zlib_method = get_compression_method('zlib')
+
+        for i in range(3):
+            data, compression = RawFileDiffData.objects.process_diff_data(
+                self.large_diff, bzip2_method)
+            RawFileDiffData.objects.create(binary_hash='bzip2-%d' % i,
+                                           binary=data,
+                                           compression=compression)
+
+        RawFileDiffData.objects.create(binary_hash='small',
+                                       binary=self.small_diff,
+                                       compression=None)
+
+        self.assertEqual(
+            RawFileDiffData.objects.get_recompress_count(zlib_method), 3)
+
+        batches = []
+        info = RawFileDiffData.objects.recompress_all(
+            compression_method=zlib_method,
+            batch_size=2,
+            batch_done_cb=lambda *args: batches.append(args))
+
+        self.assertEqual(batches, [(2, 3), (3, 3)])
+        self.assertEqual(info['diffs_recompressed'], 3)
+        self.assertEqual(info['old_diff_size'],
+                         3 * len(bz2.compress(self.large_diff, 9)))
+        self.assertEqual(info['new_diff_size'],
+                         3 * len(zlib.compress(self.large_diff, 9)))
+        self.assertEqual(
+            RawFileDiffData.objects.get_recompress_count(zlib_method), 0)
+
+        for raw_fdd in RawFileDiffData.objects.exclude(binary_hash='small'):
+            self.assertEqual(raw_fdd.compression,
+                             RawFileDiffData.COMPRESSION_ZLIB)
+            self.assertEqual(raw_fdd.content, self.large_diff)
+
+        raw_fdd = RawFileDiffData.objects.get(binary_hash='small')
+        self.assertIsNone(raw_fdd.compression)
+        self.assertEqual(raw_fdd.content, self.small_diff)
+
 
 class FileDiffMigrationTests(TestCase):
     fixtures = ['test_scmtools']
@@ -1401,6 +1919,74 @@ class FileDiffMigrationTests(TestCase):
         self.assertEqual(filediff2.parent_diff_hash.content, self.parent_diff)
 
 
+    def test_migrate_all(self):
+        """Testing FileDiffManager.migrate_all"""
+        filediffs = self._create_unmigrated_filediffs(3)
+        batches = []
+        checkpoints = []
+
+        self.assertEqual(FileDiff.objects.get_migration_counts(), {
+            'filediffs': 3,
+            'legacy_file_diff_data': 0,
+            'total_count': 3,
+        })
+
+        # The size of the diffs is measured in their stored form.
+        diff_size = len(filediffs[0].get_diff64_base64())
+
+        FileDiff.objects.MIGRATE_PK_RANGE_SIZE = 2
+
+        try:
+            info = FileDiff.objects.migrate_all(
+                batch_done_cb=lambda *args: batches.append(args),
+                checkpoint_cb=checkpoints.append)
+        finally:
+            del FileDiff.objects.MIGRATE_PK_RANGE_SIZE
+
+        self.assertEqual(info['diffs_migrated'], 3)
+        self.assertEqual(info['old_diff_size'], 3 * diff_size)
+        self.assertEqual(info['bytes_saved'], 2 * diff_size)
+        self.assertEqual(batches, [
+            (2, 3, diff_size),
+            (3, 3, 2 * diff_size),
+        ])
+        self.assertEqual(checkpoints, [filediffs[0].pk + 2,
+                                       filediffs[0].pk + 4])
+        self.assertEqual(FileDiff.objects.unmigrated().count(), 0)
+
+    def test_migrate_all_with_start_pk(self):
+        """Testing FileDiffManager.migrate_all with start_pk skips earlier
+        FileDiffs
+        """
+        filediffs = self._create_unmigrated_filediffs(3)
+
+        info = FileDiff.objects.migrate_all(start_pk=filediffs[1].pk)
+
+        self.assertEqual(info['diffs_migrated'], 2)
+        self.assertEqual(list(FileDiff.objects.unmigrated()),
+                         [filediffs[0]])
+
+    def _create_unmigrated_filediffs(self, count):
+        """Create FileDiffs that store their own diff content.
+
+        Args:
+            count (int):
+                The number of FileDiffs to create.
+
+        Returns:
+            list of reviewboard.diffviewer.models.FileDiff:
+            The new FileDiffs.
+        """
+        return [
+            FileDiff.objects.create(source_file='README',
+                                    dest_file='README',
+                                    diffset=self.filediff.diffset,
+                                    diff64=self.DEFAULT_GIT_FILEDIFF_DATA,
+                                    parent_diff64='')
+            for i in range(count)
+        ]
+
+
 class HighlightRegionTest(TestCase):
     def setUp(self):
         super(HighlightRegionTest, self).setUp()
@@ -1527,6 +2113,37 @@ class DiffSetTests(TestCase):
 
     fixtures = ['test_scmtools']
 
+    def test_get_raw_line_counts(self):
+        """Testing DiffSet.get_raw_line_counts computes and stores missing
+        counts
+        """
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+
+        # The Test tool parses diffs as Git diffs, which the counts are
+        # recalculated from.
+        self.create_filediff(diffset, diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+        self.create_filediff(diffset, source_file='/test-file-2',
+                             dest_file='/test-file-2',
+                             diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+
+        self.assertIsNone(diffset.raw_insert_count)
+        self.assertIsNone(diffset.raw_delete_count)
+        self.assertEqual(diffset.get_raw_line_counts(), {
+            'raw_insert_count': 2,
+            'raw_delete_count': 2,
+        })
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+        self.assertEqual(diffset.raw_insert_count, 2)
+        self.assertEqual(diffset.raw_delete_count, 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(diffset.get_raw_line_counts(), {
+                'raw_insert_count': 2,
+                'raw_delete_count': 2,
+            })
+
     def test_update_revision_from_history_with_diffsets(self):
         """Testing DiffSet.update_revision_from_history with existing diffsets
         """
@@ -1570,8 +2187,9 @@ class DiffSetManagerTests(SpyAgency, TestCase):
         """Test creating a DiffSet from diff file data"""
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
 
         diffset = DiffSet.objects.create_from_data(
             repository, 'diff', self.DEFAULT_GIT_FILEDIFF_DATA, None, None,
@@ -1579,14 +2197,19 @@ class DiffSetManagerTests(SpyAgency, TestCase):
 
         self.assertEqual(diffset.files.count(), 1)
 
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+        self.assertEqual(diffset.raw_insert_count, 1)
+        self.assertEqual(diffset.raw_delete_count, 1)
+
     def test_creating_with_diff_data_with_basedir_no_slash(self):
         """Test creating a DiffSet from diff file data with basedir without
         leading slash
         """
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
 
         diffset = DiffSet.objects.create_from_data(
             repository, 'diff', self.DEFAULT_GIT_FILEDIFF_DATA, None, None,
@@ -1604,8 +2227,9 @@ class DiffSetManagerTests(SpyAgency, TestCase):
         """
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
 
         diffset = DiffSet.objects.create_from_data(
             repository, 'diff', self.DEFAULT_GIT_FILEDIFF_DATA, None, None,
@@ -1617,6 +2241,61 @@ class DiffSetManagerTests(SpyAgency, TestCase):
         self.assertEqual(filediff.source_file, 'trunk/README')
         self.assertEqual(filediff.dest_file, 'trunk/README')
 
+    def test_creating_with_diff_data_with_full_blob_ids(self):
+        """Testing creating a DiffSet from diff file data with full blob IDs
+        stores the patched content IDs
+        """
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index 94bdd3e8f6c4b1a9d5e6c3f2a1b0c9d8e7f6a5b4..'
+            b'197009f3c2b1a0f9e8d7c6b5a4f3e2d1c0b9a8f7 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@@ -2 +2 @@\n'
+            b'-blah blah\n'
+            b'+blah!\n'
+            b'diff --git a/OLD b/OLD\n'
+            b'deleted file mode 100644\n'
+            b'index 5e4ab6d3c2b1a0f9e8d7c6b5a4f3e2d1c0b9a8f7..'
+            b'0000000000000000000000000000000000000000\n'
+            b'--- a/OLD\n'
+            b'+++ /dev/null\n'
+            b'@@ -1 +0,0 @@\n'
+            b'-old\n'
+        )
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, '/', None)
+
+        # Git diffs are stored without a leading "/".
+        filediff = diffset.files.get(dest_file='README')
+        self.assertEqual(filediff.patched_content_id,
+                         '197009f3c2b1a0f9e8d7c6b5a4f3e2d1c0b9a8f7')
+
+        filediff = diffset.files.get(dest_file='OLD')
+        self.assertIsNone(filediff.patched_content_id)
+
+    def test_creating_with_diff_data_with_short_blob_ids(self):
+        """Testing creating a DiffSet from diff file data with abbreviated
+        blob IDs doesn't store patched content IDs
+        """
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', self.DEFAULT_GIT_FILEDIFF_DATA, None, None,
+            None, '/', None)
+
+        self.assertIsNone(diffset.files.get().patched_content_id)
+
 
 class UploadDiffFormTests(SpyAgency, TestCase):
     """Unit tests for UploadDiffForm."""
@@ -1629,8 +2308,9 @@ class UploadDiffFormTests(SpyAgency, TestCase):
 
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
 
         form = UploadDiffForm(
             repository=repository,
@@ -1652,9 +2332,11 @@ class UploadDiffFormTests(SpyAgency, TestCase):
         """Testing UploadDiffForm and filtering parent diff files"""
         saw_file_exists = {}
 
-        def get_file_exists(repository, filename, revision, *args, **kwargs):
-            saw_file_exists[(filename, revision)] = True
-            return True
+        def get_files_exist(repository, files, *args, **kwargs):
+            for filename, revision in files:
+                saw_file_exists[(filename, revision)] = True
+
+            return [True] * len(files)
 
         parent_diff_1 = (
             b'diff --git a/README b/README\n'
@@ -1682,7 +2364,7 @@ class UploadDiffFormTests(SpyAgency, TestCase):
                                               content_type='text/x-patch')
 
         repository = self.create_repository(tool_name='Test')
-        self.spy_on(repository.get_file_exists, call_fake=get_file_exists)
+        self.spy_on(repository.get_files_exist, call_fake=get_files_exist)
 
         form = UploadDiffForm(
             repository=repository,
@@ -1790,8 +2472,9 @@ class UploadDiffFormTests(SpyAgency, TestCase):
             content_type='text/x-patch')
 
         repository = self.create_repository(tool_name='Test')
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
         # We will only be making one call to get_file and we can fake it out.
         self.spy_on(repository.get_file,
                     call_fake=lambda *args, **kwargs: b'Foo\n')
@@ -1863,8 +2546,9 @@ class UploadDiffFormTests(SpyAgency, TestCase):
             content_type='text/x-patch')
 
         repository = self.create_repository(tool_name='Test')
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
         # We will only be making one call to get_file and we can fake it out.
         self.spy_on(repository.get_file,
                     call_fake=lambda *args, **kwargs: b'Foo\n')
@@ -2310,7 +2994,7 @@ class ProcessorsTests(TestCase):
             prev_j2 = j2
 
 
-class RawDiffChunkGeneratorTests(TestCase):
+class RawDiffChunkGeneratorTests(SpyAgency, TestCase):
     """Unit tests for RawDiffChunkGenerator."""
 
     @property
@@ -2346,6 +3030,102 @@ class RawDiffChunkGeneratorTests(TestCase):
         self.assertEqual(chunks[2]['change'], 'equal')
         self.assertEqual(chunks[3]['change'], 'replace')
 
+    def test_get_chunk_outlines(self):
+        """Testing RawDiffChunkGenerator.get_chunk_outlines matches
+        get_chunks without lines
+        """
+        old, new = self._build_large_file_contents()
+        chunks = list(
+            RawDiffChunkGenerator(old, new, 'file.py', 'file.py').get_chunks())
+        outlines = list(
+            RawDiffChunkGenerator(old, new, 'file.py',
+                                  'file.py').get_chunk_outlines())
+
+        self.assertTrue(any(chunk['collapsable'] for chunk in chunks))
+        self.assertTrue(any(chunk['meta'].get('headers') for chunk in chunks))
+        self.assertEqual(len(outlines), len(chunks))
+
+        for outline, chunk in zip(outlines, chunks):
+            self.assertNotIn('lines', outline)
+
+            chunk = chunk.copy()
+            del chunk['lines']
+            self.assertEqual(outline, chunk)
+
+    def test_get_chunk_lines(self):
+        """Testing RawDiffChunkGenerator.get_chunk_lines matches the lines
+        from get_chunks
+        """
+        old, new = self._build_large_file_contents()
+        chunks = list(
+            RawDiffChunkGenerator(old, new, 'file.py', 'file.py').get_chunks())
+
+        for i, chunk in enumerate(chunks):
+            generator = RawDiffChunkGenerator(old, new, 'file.py', 'file.py')
+
+            self.assertEqual(generator.get_chunk_lines(i), chunk['lines'])
+
+    def test_get_chunks_with_cache_key(self):
+        """Testing RawDiffChunkGenerator.get_chunks with a cache key loads
+        the same chunks from the cache
+        """
+        old, new = self._build_large_file_contents()
+        chunks = list(
+            RawDiffChunkGenerator(old, new, 'file.py', 'file.py').get_chunks())
+
+        generator = RawDiffChunkGenerator(old, new, 'file.py', 'file.py')
+        self.assertEqual(list(generator.get_chunks('test-key')), chunks)
+
+        # A new generator shouldn't need to generate anything.
+        generator = RawDiffChunkGenerator(old, new, 'file.py', 'file.py')
+        generator.get_chunks_uncached = None
+
+        self.assertEqual(list(generator.get_chunks('test-key')), chunks)
+
+    def test_apply_pygments_caches_by_content(self):
+        """Testing RawDiffChunkGenerator._apply_pygments only highlights
+        the same content once
+        """
+        self.spy_on(highlight)
+
+        data = 'def test_apply_pygments_caches_by_content():\n    pass\n'
+        lines = self.generator._apply_pygments(data, 'file1.py')
+
+        self.assertEqual(len(highlight.spy.calls), 1)
+
+        # The same content with the same lexer uses the cached result.
+        self.assertEqual(self.generator._apply_pygments(data, 'file2.py'),
+                         lines)
+        self.assertEqual(len(highlight.spy.calls), 1)
+
+        # Different content or a different lexer is highlighted again.
+        self.generator._apply_pygments(data + '\n', 'file1.py')
+        self.assertEqual(len(highlight.spy.calls), 2)
+
+        self.generator._apply_pygments(data, 'file1.rb')
+        self.assertEqual(len(highlight.spy.calls), 3)
+
+    def _build_large_file_contents(self):
+        """Return the contents of a large file with a few changes.
+
+        Returns:
+            tuple:
+            A 2-tuple of the original and modified file contents.
+        """
+        old_lines = []
+
+        for i in range(20):
+            old_lines.append(b'def func%d():' % i)
+            old_lines += [b'    x = %d' % j for j in range(30)]
+
+        new_lines = list(old_lines)
+        new_lines[100] = b'    x = "changed"'
+        del new_lines[300:305]
+        new_lines[500:500] = [b'    y = %d' % j for j in range(3)]
+
+        return (b'\n'.join(old_lines) + b'\n',
+                b'\n'.join(new_lines) + b'\n')
+
     def test_indent_spaces(self):
         """Testing RawDiffChunkGenerator._serialize_indentation with spaces"""
         self.assertEqual(
@@ -2549,6 +3329,72 @@ class RawDiffChunkGeneratorTests(TestCase):
              '</span>        </span> foo', ''))
 
 
+class ChunkSerializationTests(TestCase):
+    """Unit tests for reviewboard.diffviewer.chunk_serialization."""
+
+    def test_serialize_chunks(self):
+        """Testing serialize_chunks and deserialize_chunks"""
+        meta = {
+            'whitespace_lines': [(2, 2)],
+            'moved-from': {3: 10},
+            'left_headers': [],
+            'right_headers': [(3, 'def foo():')],
+        }
+        chunks = [
+            {
+                'index': 0,
+                'numlines': 1,
+                'change': 'equal',
+                'collapsable': False,
+                'meta': {
+                    'left_headers': [],
+                    'right_headers': [],
+                },
+                'lines': [
+                    [1, 1, mark_safe('<b>a</b>'), [], 1,
+                     mark_safe('<b>a</b>'), [], False],
+                ],
+            },
+            {
+                'index': 1,
+                'numlines': 3,
+                'change': 'replace',
+                'collapsable': False,
+                'meta': meta,
+                'lines': [
+                    [2, 2, mark_safe(' b'), [], 2, mark_safe('b'), [], True],
+                    [3, 3, mark_safe('c'), [(0, 1)], 3,
+                     mark_safe('def foo():'), [(0, 3)], False,
+                     {'from': (10, True)}],
+                    [4, 4, mark_safe('d'), [], '', mark_safe(''), [],
+                     False],
+                ],
+            },
+        ]
+
+        data = serialize_chunks(chunks)
+        self.assertIsInstance(data, bytes)
+
+        new_chunks = list(deserialize_chunks(data))
+        self.assertEqual(new_chunks, chunks)
+        self.assertIsInstance(new_chunks[0]['lines'][0][2], SafeText)
+        self.assertEqual(new_chunks[1]['lines'][2][4], '')
+
+    def test_deserialize_chunks_with_invalid_data(self):
+        """Testing deserialize_chunks with data in another format"""
+        with self.assertRaises(ValueError):
+            deserialize_chunks(zlib.compress(b'chunks'))
+
+    def test_deserialize_chunks_with_other_version(self):
+        """Testing deserialize_chunks with data from another format version
+        """
+        data = serialize_chunks([])
+        data = data[:8] + b'\xff' + data[9:]
+
+        with self.assertRaises(ValueError):
+            deserialize_chunks(data)
+
+
 class DiffOpcodeGeneratorTests(TestCase):
     """Unit tests for DiffOpcodeGenerator."""
     def setUp(self):
@@ -2684,17 +3530,64 @@ class DiffOpcodeGeneratorTests(TestCase):
                 '\t        foo'),
             (False, 3, 8))
 
+    def test_moves_with_common_lines(self):
+        """Testing DiffOpcodeGenerator move detection extends moves with
+        lines over MOVE_MAX_LINE_OCCURRENCES
+        """
+        generator = self._build_move_generator()
+        generator.MOVE_MAX_LINE_OCCURRENCES = 2
+        opcodes = list(generator)
 
-class DiffChunkGeneratorTests(TestCase):
-    """Unit tests for DiffChunkGenerator."""
+        self.assertEqual(opcodes[0][-1]['moved-to'], {1: 4, 2: 5, 3: 6})
+        self.assertEqual(opcodes[2][-1]['moved-from'], {4: 1, 5: 2, 6: 3})
 
-    fixtures = ['test_scmtools']
+    def test_moves_with_work_exceeded(self):
+        """Testing DiffOpcodeGenerator move detection with MOVE_MAX_WORK
+        exceeded
+        """
+        generator = self._build_move_generator()
+        generator.MOVE_MAX_WORK = 1
 
-    def setUp(self):
-        self.repository = self.create_repository()
-        self.diffset = self.create_diffset(repository=self.repository)
-        self.filediff = self.create_filediff(diffset=self.diffset)
-        self.generator = DiffChunkGenerator(None, self.filediff)
+        for opcode in generator:
+            self.assertNotIn('moved-to', opcode[-1])
+            self.assertNotIn('moved-from', opcode[-1])
+
+    def _build_move_generator(self):
+        """Return an opcode generator for a diff with a moved function.
+
+        The last line of the moved function is also found in several
+        removed functions.
+
+        Returns:
+            reviewboard.diffviewer.opcode_generator.DiffOpcodeGenerator:
+            The opcode generator.
+        """
+        moved = [
+            'def moved_function():',
+            '    do_something_useful()',
+            '    return None',
+        ]
+        removed = []
+        unchanged = []
+
+        for i in range(3):
+            removed += ['def removed_function_%d():' % i, '    return None']
+            unchanged.append('def other_function_%d():' % i)
+
+        return get_diff_opcode_generator(
+            MyersDiffer(moved + removed + unchanged, unchanged + moved))
+
+
+class DiffChunkGeneratorTests(TestCase):
+    """Unit tests for DiffChunkGenerator."""
+
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        self.repository = self.create_repository()
+        self.diffset = self.create_diffset(repository=self.repository)
+        self.filediff = self.create_filediff(diffset=self.diffset)
+        self.generator = DiffChunkGenerator(None, self.filediff)
 
     def test_get_chunks_with_empty_added_file(self):
         """Testing DiffChunkGenerator.get_chunks with empty added file"""
@@ -2763,6 +3656,277 @@ class DiffChunkGeneratorTests(TestCase):
         self.assertEqual(line_counts, self.filediff.get_line_counts())
 
 
+class FileContentCacheTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.filecache."""
+
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(FileContentCacheTests, self).setUp()
+
+        self.tempdir = tempfile.mkdtemp(prefix='reviewboard-tests.')
+        self.cache = FileContentCache(self.tempdir, 1024 * 1024)
+
+    def tearDown(self):
+        super(FileContentCacheTests, self).tearDown()
+
+        shutil.rmtree(self.tempdir)
+
+    def test_set_and_get(self):
+        """Testing FileContentCache.set and get"""
+        data = b'This is a test.\n' * 100
+        sha1 = self.cache.set(data)
+
+        self.assertEqual(sha1, hashlib.sha1(data).hexdigest())
+        self.assertEqual(self.cache.get(sha1), data)
+
+        # The stored data should be compressed.
+        self.assertTrue(os.path.getsize(self.cache._get_filename(sha1)) <
+                        len(data))
+
+    def test_get_with_missing(self):
+        """Testing FileContentCache.get with content not in the cache"""
+        self.assertIsNone(
+            self.cache.get(hashlib.sha1(b'missing').hexdigest()))
+
+    def test_get_with_corrupt_data(self):
+        """Testing FileContentCache.get with corrupt data"""
+        sha1 = self.cache.set(b'This is a test.\n')
+        filename = self.cache._get_filename(sha1)
+
+        with open(filename, 'wb') as fp:
+            fp.write(zlib.compress(b'Something else.\n'))
+
+        self.assertIsNone(self.cache.get(sha1))
+        self.assertFalse(os.path.exists(filename))
+
+    def test_cull(self):
+        """Testing FileContentCache.cull removes least-recently-used entries
+        """
+        entries = [
+            os.urandom(100)
+            for i in range(4)
+        ]
+        sha1s = [
+            self.cache.set(data)
+            for data in entries
+        ]
+
+        # Set the access order to 2, 0, 3, 1 (oldest to newest).
+        for i, sha1 in enumerate((2, 0, 3, 1)):
+            timestamp = 1000000000 + i
+            os.utime(self.cache._get_filename(sha1s[sha1]),
+                     (timestamp, timestamp))
+
+        entry_size = os.path.getsize(self.cache._get_filename(sha1s[0]))
+        self.cache.max_size = entry_size * 3
+        self.cache.cull()
+
+        self.assertIsNone(self.cache.get(sha1s[2]))
+        self.assertIsNone(self.cache.get(sha1s[0]))
+        self.assertEqual(self.cache.get(sha1s[3]), entries[3])
+        self.assertEqual(self.cache.get(sha1s[1]), entries[1])
+
+    def test_get_original_file_with_cached_content(self):
+        """Testing get_original_file with content in the file cache"""
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset=diffset)
+        data = b'Hello, cached world!\n'
+        filediff.extra_data['orig_sha1'] = cache_file_content(data)
+
+        self.spy_on(repository.get_file)
+
+        self.assertEqual(
+            diffutils.get_original_file(filediff, None, ['ascii']),
+            data)
+        self.assertFalse(repository.get_file.spy.called)
+
+    def test_get_patched_file_with_cached_content(self):
+        """Testing get_patched_file with content in the file cache does not
+        fetch the original file
+        """
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset=diffset)
+        data = b'Hello, patched world!\n'
+        filediff.extra_data['patched_sha1'] = cache_file_content(data)
+
+        self.spy_on(repository.get_file)
+        self.spy_on(diffutils.patch)
+
+        self.assertEqual(diffutils.get_patched_file(None, filediff, None),
+                         data)
+        self.assertFalse(repository.get_file.spy.called)
+        self.assertFalse(diffutils.patch.spy.called)
+
+    def test_get_original_file_caches_content(self):
+        """Testing get_original_file stores content in the file cache"""
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset=diffset)
+
+        data = diffutils.get_original_file(filediff, None, ['ascii'])
+
+        self.assertEqual(data, b'Hello, world!\n')
+        self.assertEqual(
+            get_cached_file_content(hashlib.sha1(data).hexdigest()),
+            data)
+
+
+class ChunkPrewarmQueueTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.prewarm."""
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(ChunkPrewarmQueueTests, self).setUp()
+
+        prewarm_queue.clear()
+        self.spy_on(prewarm._generate_file_chunks, call_original=False)
+
+    def tearDown(self):
+        super(ChunkPrewarmQueueTests, self).tearDown()
+
+        prewarm_queue.clear()
+
+    def test_add_job_order(self):
+        """Testing ChunkPrewarmQueue.add_job runs jobs in priority order"""
+        queue = prewarm.ChunkPrewarmQueue()
+        order = []
+
+        for i in range(3):
+            queue.add_job(('job', i), partial(order.append, i))
+
+        queue.add_job(('job', 3), partial(order.append, 3),
+                      priority=prewarm.PRIORITY_VIEWING)
+        queue.run_pending()
+
+        self.assertEqual(order, [3, 0, 1, 2])
+
+    def test_add_job_with_queued_job(self):
+        """Testing ChunkPrewarmQueue.add_job with a job already queued"""
+        queue = prewarm.ChunkPrewarmQueue()
+        order = []
+
+        self.assertTrue(queue.add_job(('job', 1), partial(order.append, 1)))
+        self.assertTrue(queue.add_job(('job', 2), partial(order.append, 2)))
+        self.assertFalse(queue.add_job(('job', 2),
+                                       partial(order.append, 'dup'),
+                                       priority=prewarm.PRIORITY_VIEWING))
+        queue.run_pending()
+
+        self.assertEqual(order, [2, 1])
+
+    def test_prioritize(self):
+        """Testing ChunkPrewarmQueue.prioritize"""
+        queue = prewarm.ChunkPrewarmQueue()
+        order = []
+
+        for i in range(3):
+            queue.add_job(('job', i), partial(order.append, i))
+
+        queue.prioritize([('job', 2), ('job', 5)])
+        queue.run_pending()
+
+        self.assertEqual(order, [2, 0, 1])
+
+    def test_claim_file(self):
+        """Testing ChunkPrewarmQueue.claim_file with a queued file"""
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset)
+
+        prewarm_queue.queue_diffset(diffset)
+
+        # Run only the job that queues the files in the diff.
+        with prewarm_queue._cond:
+            job = prewarm_queue._pop()
+
+        prewarm_queue._run_job(*job)
+        prewarm_queue.claim_file({
+            'filediff': filediff,
+            'interfilediff': None,
+            'force_interdiff': False,
+        })
+        prewarm_queue.run_pending()
+
+        self.assertFalse(prewarm._generate_file_chunks.called)
+
+    def test_review_request_published_cb(self):
+        """Testing review_request_published_cb queues the diff and interdiff
+        """
+        review_request = self.create_review_request(
+            repository=self.create_repository(tool_name='Test'))
+        diffset1 = self.create_diffset(review_request)
+        filediff1 = self.create_filediff(diffset1)
+        diffset2 = self.create_diffset(review_request, revision=2)
+
+        # The diff must differ from the first revision's, or the file won't
+        # be in the interdiff.
+        filediff2 = self.create_filediff(
+            diffset2,
+            diff=(b'--- README\trevision 123\n'
+                  b'+++ README\trevision 123\n'
+                  b'@@ -1 +1 @@\n'
+                  b'-Hello, world!\n'
+                  b'+Hello, everybody else!\n'))
+
+        prewarm.review_request_published_cb(review_request=review_request,
+                                            changedesc=None)
+        prewarm_queue.run_pending()
+
+        calls = prewarm._generate_file_chunks.spy.calls
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0].args, (filediff2.pk, None, False))
+        self.assertEqual(calls[1].args, (filediff1.pk, filediff2.pk, True))
+
+    def test_review_request_published_cb_without_diff_change(self):
+        """Testing review_request_published_cb without a changed diff"""
+        review_request = self.create_review_request(
+            repository=self.create_repository(tool_name='Test'))
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(diffset)
+
+        changedesc = ChangeDescription(fields_changed={
+            'summary': {
+                'old': [('Old summary',)],
+                'new': [('Test Summary',)],
+            },
+        })
+
+        prewarm.review_request_published_cb(review_request=review_request,
+                                            changedesc=changedesc)
+        prewarm_queue.run_pending()
+
+        self.assertFalse(prewarm._generate_file_chunks.called)
+
+    def test_review_request_published_cb_disabled(self):
+        """Testing review_request_published_cb with
+        diffviewer_prewarm_workers=0
+        """
+        review_request = self.create_review_request(
+            repository=self.create_repository(tool_name='Test'))
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(diffset)
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_prewarm_workers', 0)
+        siteconfig.save()
+
+        try:
+            prewarm.review_request_published_cb(
+                review_request=review_request,
+                changedesc=None)
+        finally:
+            siteconfig.set('diffviewer_prewarm_workers', 2)
+            siteconfig.save()
+
+        prewarm_queue.run_pending()
+
+        self.assertFalse(prewarm._generate_file_chunks.called)
+
+
 class DiffRendererTests(SpyAgency, TestCase):
     """Unit tests for DiffRenderer."""
 
@@ -2899,6 +4063,56 @@ class DiffRendererTests(SpyAgency, TestCase):
         chunk = diff_file['chunks'][0]
         self.assertEqual(chunk['change'], 'replace')
 
+    def test_render_collapsed_chunk_headers_without_lines(self):
+        """Testing DiffRenderer.render_to_string_uncached with collapsed
+        chunks with headers that have no lines loaded
+        """
+        old_lines = []
+
+        for i in range(3):
+            old_lines.append(b'def func%d():' % i)
+            old_lines += [b'    x = %d' % j for j in range(30)]
+
+        new_lines = list(old_lines)
+        new_lines[50] = b'    x = "changed"'
+        old = b'\n'.join(old_lines) + b'\n'
+        new = b'\n'.join(new_lines) + b'\n'
+
+        chunks = list(RawDiffChunkGenerator(old, new, 'file.py',
+                                            'file.py').get_chunks())
+
+        generator = RawDiffChunkGenerator(old, new, 'file.py', 'file.py')
+        outlines = list(generator.get_chunk_outlines())
+
+        for outline in outlines:
+            if not outline['collapsable']:
+                outline['lines'] = generator.get_chunk_lines(outline['index'])
+
+        self.assertTrue(any(
+            'lines' not in outline and outline['meta'].get('headers')
+            for outline in outlines))
+
+        def _render(chunks):
+            diff_file = {
+                'chunks': chunks,
+                'chunks_loaded': True,
+                'filediff': FileDiff(),
+                'interfilediff': None,
+                'force_interdiff': False,
+                'index': 0,
+                'num_chunks': len(chunks),
+            }
+
+            return DiffRenderer(diff_file).render_to_string_uncached(None)
+
+        rendered = _render(outlines)
+        self.assertIn('rb-icon-diff-expand-header', rendered)
+        self.assertIn('def func1():', rendered)
+
+        # The headers must expand to the same lines as when the chunks'
+        # lines are loaded.
+        self.assertEqual(rendered, _render(chunks))
+
 
 class DiffUtilsTests(TestCase):
     """Unit tests for diffutils."""
@@ -3238,6 +4452,99 @@ class DiffUtilsTests(TestCase):
         self.assertFalse(diff_file['is_new_file'])
         self.assertTrue(diff_file['force_interdiff'])
 
+    @add_fixtures(['test_users', 'test_scmtools'])
+    def test_get_diff_files_with_interdiff_and_same_diff(self):
+        """Testing get_diff_files with interdiff skips files with the same
+        diff
+        """
+        repository = self.create_repository(tool_name='Git')
+        review_request = self.create_review_request(repository=repository)
+
+        diffset = self.create_diffset(review_request=review_request,
+                                      revision=1)
+        self.create_filediff(diffset=diffset,
+                             source_file='foo.txt',
+                             dest_file='foo.txt',
+                             diff=b'diff1')
+
+        interdiffset = self.create_diffset(review_request=review_request,
+                                           revision=2)
+        self.create_filediff(diffset=interdiffset,
+                             source_file='foo.txt',
+                             dest_file='foo.txt',
+                             diff=b'diff1')
+
+        diff_files = diffutils.get_diff_files(diffset=diffset,
+                                              interdiffset=interdiffset)
+        self.assertEqual(diff_files, [])
+
+    @add_fixtures(['test_users', 'test_scmtools'])
+    def test_get_diff_files_with_interdiff_and_same_patched_content_id(self):
+        """Testing get_diff_files with interdiff skips files with the same
+        patched content ID
+        """
+        repository = self.create_repository(tool_name='Git')
+        review_request = self.create_review_request(repository=repository)
+        content_id = '197009f3c2b1a0f9e8d7c6b5a4f3e2d1c0b9a8f7'
+
+        diffset = self.create_diffset(review_request=review_request,
+                                      revision=1)
+        filediff = self.create_filediff(diffset=diffset,
+                                        source_file='foo.txt',
+                                        dest_file='foo.txt',
+                                        diff=b'diff1')
+        filediff.extra_data['patched_content_id'] = content_id
+        filediff.save(update_fields=['extra_data'])
+
+        interdiffset = self.create_diffset(review_request=review_request,
+                                           revision=2)
+        interfilediff = self.create_filediff(diffset=interdiffset,
+                                             source_file='foo.txt',
+                                             dest_file='foo.txt',
+                                             diff=b'diff2')
+        interfilediff.extra_data['patched_content_id'] = content_id
+        interfilediff.save(update_fields=['extra_data'])
+
+        diff_files = diffutils.get_diff_files(diffset=diffset,
+                                              interdiffset=interdiffset)
+        self.assertEqual(diff_files, [])
+
+    @add_fixtures(['test_users', 'test_scmtools'])
+    def test_get_diff_files_with_interdiff_and_changed_diff(self):
+        """Testing get_diff_files with interdiff compares diff hashes without
+        loading the diffs
+        """
+        repository = self.create_repository(tool_name='Git')
+        review_request = self.create_review_request(repository=repository)
+
+        diffset = self.create_diffset(review_request=review_request,
+                                      revision=1)
+        filediff = self.create_filediff(diffset=diffset,
+                                        source_file='foo.txt',
+                                        dest_file='foo.txt',
+                                        diff=b'diff1')
+
+        interdiffset = self.create_diffset(review_request=review_request,
+                                           revision=2)
+        interfilediff = self.create_filediff(diffset=interdiffset,
+                                             source_file='foo.txt',
+                                             dest_file='foo.txt',
+                                             diff=b'diff2')
+
+        filediff = FileDiff.objects.get(pk=filediff.pk)
+        interfilediff = FileDiff.objects.get(pk=interfilediff.pk)
+
+        # Loading either diff would require a query.
+        with self.assertNumQueries(0):
+            self.assertFalse(diffutils._is_interdiff_file_unchanged(
+                filediff, interfilediff))
+
+        diff_files = diffutils.get_diff_files(diffset=diffset,
+                                              interdiffset=interdiffset)
+        self.assertEqual(len(diff_files), 1)
+        self.assertEqual(diff_files[0]['filediff'], filediff)
+        self.assertEqual(diff_files[0]['interfilediff'], interfilediff)
+
     @add_fixtures(['test_users', 'test_scmtools'])
     def test_get_matched_interdiff_files_simple(self):
         """Testing get_matched_interdiff_files with simple source file matches
@@ -4607,6 +5914,184 @@ class DiffUtilsTests(TestCase):
             }))
 
 
+class PopulateDiffChunksTests(SpyAgency, TestCase):
+    """Unit tests for diffutils.populate_diff_chunks."""
+
+    def setUp(self):
+        super(PopulateDiffChunksTests, self).setUp()
+
+        self.generated = []
+        self.generate_func = None
+        self.spy_on(get_diff_chunk_generator, call_fake=self._get_generator)
+
+    def test_serial(self):
+        """Testing populate_diff_chunks with max_workers=1"""
+        files = self._make_files(3)
+        diffutils.populate_diff_chunks(files, max_workers=1)
+
+        self.assertEqual(self.generated, [0, 1, 2])
+        self._check_files(files)
+
+    def test_concurrent(self):
+        """Testing populate_diff_chunks with max_workers > 1 generates files
+        concurrently
+        """
+        other_started = threading.Event()
+
+        def _generate(pk):
+            if pk == 0:
+                # This will only be set if another file is being generated
+                # while this one is still in progress.
+                other_started.wait(10)
+                self.assertTrue(other_started.is_set())
+            else:
+                other_started.set()
+
+        files = self._make_files(4, _generate)
+        diffutils.populate_diff_chunks(files, max_workers=2)
+
+        self.assertEqual(sorted(self.generated), [0, 1, 2, 3])
+        self._check_files(files)
+
+    def test_concurrent_with_error(self):
+        """Testing populate_diff_chunks with max_workers > 1 and a file that
+        fails to generate
+        """
+        def _generate(pk):
+            if pk in (1, 2):
+                raise UserVisibleError('Error in file %s' % pk)
+
+        files = self._make_files(4, _generate)
+
+        with self.assertRaises(UserVisibleError) as cm:
+            diffutils.populate_diff_chunks(files, max_workers=3)
+
+        # The first failure, in file order, is the one raised.
+        self.assertEqual(six.text_type(cm.exception), 'Error in file 1')
+
+        # The other files are still populated.
+        self.assertEqual(sorted(self.generated), [0, 1, 2, 3])
+        self._check_files([files[0], files[3]])
+        self.assertFalse(files[1].get('chunks_loaded', False))
+        self.assertFalse(files[2].get('chunks_loaded', False))
+
+    @add_fixtures(['test_scmtools'])
+    def test_prefetches_original_files(self):
+        """Testing populate_diff_chunks fetches original files in one batch
+        """
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+        filediffs = [
+            self.create_filediff(diffset, source_file='/file1',
+                                 source_revision='abc123'),
+            self.create_filediff(diffset, source_file='/file2',
+                                 source_revision='def456'),
+            self.create_filediff(diffset, source_file='/file3',
+                                 source_revision=PRE_CREATION),
+        ]
+
+        # This one has been processed before, so its original file doesn't
+        # need to be fetched again.
+        filediffs.append(self.create_filediff(diffset, source_file='/file4',
+                                              source_revision='abc123'))
+        filediffs[-1].extra_data['orig_sha1'] = '0' * 40
+
+        self.spy_on(repository.get_files)
+
+        files = [
+            {
+                'filediff': filediff,
+                'interfilediff': None,
+                'force_interdiff': False,
+            }
+            for filediff in filediffs
+        ]
+        diffutils.populate_diff_chunks(files, max_workers=1)
+
+        self.assertEqual(len(repository.get_files.spy.calls), 1)
+        self.assertEqual(repository.get_files.spy.calls[0].args[0],
+                         [('/file1', 'abc123'), ('/file2', 'def456')])
+        self._check_files(files)
+
+    def _make_files(self, count, generate_func=None):
+        """Return a list of fake diff files for populate_diff_chunks.
+
+        Args:
+            count (int):
+                The number of files to return.
+
+            generate_func (callable, optional):
+                A function called with the filediff's ID when its chunks are
+                generated.
+
+        Returns:
+            list of dict:
+            The list of diff files.
+        """
+        self.generate_func = generate_func
+
+        # These are all new files, so there's nothing to prefetch from a
+        # repository.
+        return [
+            {
+                'filediff': FileDiff(pk=i, source_revision=PRE_CREATION),
+                'interfilediff': None,
+                'force_interdiff': False,
+            }
+            for i in range(count)
+        ]
+
+    def _get_generator(self, request, filediff, interfilediff,
+                       force_interdiff, enable_syntax_highlighting):
+        """Return a fake chunk generator for a filediff."""
+        test = self
+
+        class FakeChunkGenerator(object):
+            def get_chunks(self):
+                test.generated.append(filediff.pk)
+
+                if test.generate_func:
+                    test.generate_func(filediff.pk)
+
+                return [
+                    {
+                        'change': 'equal',
+                        'lines': [],
+                        'filediff_pk': filediff.pk,
+                    },
+                    {
+                        'change': 'replace',
+                        'lines': [],
+                        'filediff_pk': filediff.pk,
+                    },
+                ]
+
+        return FakeChunkGenerator()
+
+    def _check_files(self, files):
+        """Check that diff files were populated with their own chunks.
+
+        Args:
+            files (list of dict):
+                The diff files to check.
+        """
+        for diff_file in files:
+            pk = diff_file['filediff'].pk
+
+            self.assertTrue(diff_file['chunks_loaded'])
+            self.assertEqual(diff_file['num_chunks'], 2)
+            self.assertEqual(diff_file['changed_chunk_indexes'], [1])
+            self.assertEqual(diff_file['num_changes'], 1)
+            self.assertFalse(diff_file['whitespace_only'])
+            self.assertIn('chunks_generation_time', diff_file)
+            self.assertEqual(
+                [chunk['filediff_pk'] for chunk in diff_file['chunks']],
+                [pk, pk])
+            self.assertEqual(
+                [chunk['index'] for chunk in diff_file['chunks']],
+                [0, 1])
+
+
 class DiffExpansionHeaderTests(TestCase):
     """Testing generation of diff expansion headers."""
 
@@ -4718,3 +6203,156 @@ class DiffExpansionHeaderTests(TestCase):
                 },
                 'right': None,
             })
+
+    def test_find_header_with_line_index(self):
+        """Testing finding a header in a file using a chunk line index"""
+        chunks = [
+            {
+                'change': 'equal',
+                'meta': {
+                    'left_headers': [(1, 'foo')],
+                    'right_headers': [(1, 'foo')],
+                },
+                'lines': [
+                    {
+                        0: 1,
+                        1: 1,
+                        4: 1,
+                    },
+                    {
+                        0: 2,
+                        1: 2,
+                        4: 2,
+                    },
+                ]
+            },
+            {
+                'change': 'insert',
+                'meta': {
+                    'left_headers': [],
+                    'right_headers': [(3, 'bar')],
+                },
+                'lines': [
+                    {
+                        0: 3,
+                        1: '',
+                        4: 3,
+                    },
+                    {
+                        0: 4,
+                        1: '',
+                        4: 4,
+                    },
+                ]
+            },
+            {
+                'change': 'equal',
+                'meta': {
+                    'left_headers': [(4, 'baz')],
+                    'right_headers': [(6, 'baz')],
+                },
+                'lines': [
+                    {
+                        0: 5,
+                        1: 3,
+                        4: 5,
+                    },
+                    {
+                        0: 6,
+                        1: 4,
+                        4: 6,
+                    },
+                    {
+                        0: 7,
+                        1: 5,
+                        4: 7,
+                    },
+                ]
+            },
+        ]
+        diff_file = {
+            'chunks': chunks,
+        }
+
+        line_index = diffutils.get_chunk_line_index(diff_file)
+
+        self.assertEqual(line_index['first_lines'], [1, 3, 5])
+        self.assertEqual(
+            line_index['headers'],
+            [
+                {
+                    'left': None,
+                    'right': None,
+                },
+                {
+                    'left': {
+                        'line': 1,
+                        'text': 'foo',
+                    },
+                    'right': {
+                        'line': 1,
+                        'text': 'foo',
+                    },
+                },
+                {
+                    'left': {
+                        'line': 1,
+                        'text': 'foo',
+                    },
+                    'right': {
+                        'line': 3,
+                        'text': 'bar',
+                    },
+                },
+            ])
+        self.assertIs(diffutils.get_chunk_line_index(diff_file), line_index)
+
+        for target_line in range(1, 9):
+            self.assertEqual(
+                diffutils._get_last_header_in_chunks_before_line(
+                    chunks, target_line, line_index),
+                diffutils._get_last_header_in_chunks_before_line(
+                    chunks, target_line))
+
+    def test_get_chunks_in_range_with_line_index(self):
+        """Testing get_chunks_in_range using a chunk line index"""
+        chunks = [
+            {
+                'change': 'equal',
+                'collapsable': False,
+                'meta': {},
+                'lines': [
+                    (i, i, 'line', [], i, 'line', [], False)
+                    for i in range(1, 4)
+                ],
+            },
+            {
+                'change': 'insert',
+                'collapsable': False,
+                'meta': {},
+                'lines': [
+                    (i, '', '', [], i, 'new line', [], False)
+                    for i in range(4, 7)
+                ],
+            },
+            {
+                'change': 'equal',
+                'collapsable': False,
+                'meta': {},
+                'lines': [
+                    (i, i - 3, 'line', [], i, 'line', [], False)
+                    for i in range(7, 10)
+                ],
+            },
+        ]
+        line_index = diffutils.get_chunk_line_index({
+            'chunks': chunks,
+        })
+
+        for first_line in range(1, 10):
+            for num_lines in range(1, 10):
+                self.assertEqual(
+                    list(diffutils.get_chunks_in_range(
+                        chunks, first_line, num_lines, line_index)),
+                    list(diffutils.get_chunks_in_range(
+                        chunks, first_line, num_lines)))
@@ -29,6 +29,7 @@ from reviewboard.diffviewer.diffutils import (get_diff_files,
                                               get_enable_highlighting)
 from reviewboard.diffviewer.errors import PatchError, UserVisibleError
 from reviewboard.diffviewer.models import DiffSet, FileDiff
+from reviewboard.diffviewer.prewarm import prewarm_queue
 from reviewboard.diffviewer.renderers import (get_diff_renderer,
                                               get_diff_renderer_class)
 from reviewboard.site.urlresolvers import local_site_reverse
@@ -184,6 +185,10 @@ class DiffViewerView(TemplateView):
         except InvalidPage:
             page = paginator.page(paginator.num_pages)
 
+        # If the files on this page are still waiting to be generated in the
+        # background, generate them before anything else.
+        prewarm_queue.prioritize_files(page.object_list)
+
         diff_context = {
             'revision': {
                 'revision': diffset.revision,
@@ -499,6 +504,9 @@ class DiffFragmentView(View):
                   'filediff %s')
                 % filediff.pk)
 
+        # Don't generate this file both here and in the background.
+        prewarm_queue.claim_file(diff_file)
+
         return {
             'diffset': diffset,
             'interdiffset': interdiffset,
@@ -5,8 +5,11 @@ import json
 import logging
 import mimetools
 import re
+import sys
+import threading
 
 from django.conf.urls import include, patterns, url
+from django.db import connection
 from django.dispatch import receiver
 from django.utils import six
 from django.utils.six.moves.urllib.parse import urlparse
@@ -322,6 +325,92 @@ class HostingService(object):
 
         return repository.get_scmtool().file_exists(path, revision, **kwargs)
 
+    def get_files_exist(self, repository, files, base_commit_id=None,
+                        max_workers=1):
+        """Return whether several files exist in the repository.
+
+        By default, this calls :py:meth:`get_file_exists` for each file. When
+        ``max_workers`` is greater than 1, up to that many files are checked
+        at once on a pool of threads, so that the time spent waiting on the
+        service's API overlaps. Subclasses can override this if the service
+        has an API for checking several files in one request.
+
+        Args:
+            repository (reviewboard.scmtools.models.Repository):
+                The repository the files are in.
+
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in.
+
+            max_workers (int, optional):
+                The maximum number of files to check at once.
+
+        Returns:
+            list of bool:
+            A list with an entry for each file, in the same order as
+            ``files``, indicating whether that file exists.
+
+        Raises:
+            Exception:
+                Checking one of the files failed. This is the exception
+                raised for the first file (in order) that failed, after all
+                the other files have been checked.
+        """
+        results = [False] * len(files)
+        errors = [None] * len(files)
+        work_queue = six.moves.queue.Queue()
+
+        for i, (path, revision) in enumerate(files):
+            work_queue.put((i, path, revision))
+
+        def _worker():
+            try:
+                while True:
+                    try:
+                        i, path, revision = work_queue.get_nowait()
+                    except six.moves.queue.Empty:
+                        break
+
+                    try:
+                        results[i] = self.get_file_exists(
+                            repository,
+                            path,
+                            revision,
+                            base_commit_id=base_commit_id)
+                    except Exception:
+                        errors[i] = sys.exc_info()
+            finally:
+                if threading.current_thread() is not main_thread:
+                    # Each thread has its own database connection, which
+                    # would otherwise be left open.
+                    connection.close()
+
+        main_thread = threading.current_thread()
+        num_workers = min(max_workers, len(files))
+
+        if num_workers > 1:
+            threads = [
+                threading.Thread(target=_worker)
+                for i in range(num_workers)
+            ]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+        else:
+            _worker()
+
+        for error in errors:
+            if error is not None:
+                six.reraise(*error)
+
+        return results
+
     def get_branches(self, repository):
         """Get a list of all branches in the repositories.
 
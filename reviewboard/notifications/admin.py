@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
 
 from reviewboard.notifications.forms import WebHookTargetForm
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 
 
 class WebHookTargetAdmin(admin.ModelAdmin):
@@ -40,4 +40,19 @@ class WebHookTargetAdmin(admin.ModelAdmin):
     )
 
 
+class WebHookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('url', 'event', 'status', 'attempts', 'response_status',
+                    'timestamp', 'last_attempt')
+    list_filter = ('status', 'event')
+    raw_id_fields = ('target',)
+    readonly_fields = ('target', 'event', 'url', 'headers', 'status',
+                       'attempts', 'response_status', 'error', 'timestamp',
+                       'last_attempt', 'next_attempt')
+    exclude = ('body',)
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(WebHookTarget, WebHookTargetAdmin)
+admin.site.register(WebHookDelivery, WebHookDeliveryAdmin)
@@ -1,9 +1,10 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
-from djblets.db.fields import JSONField
+from djblets.db.fields import Base64Field, JSONField
 from multiselectfield import MultiSelectField
 
 from reviewboard.notifications.managers import WebHookTargetManager
@@ -160,3 +161,61 @@ class WebHookTarget(models.Model):
         db_table = 'notifications_webhooktarget'
         verbose_name = _('Webhook')
         verbose_name_plural = _('Webhooks')
+
+
+@python_2_unicode_compatible
+class WebHookDelivery(models.Model):
+    """A queued request to a WebHook target.
+
+    Requests are queued when an event is dispatched, and sent in the
+    background. Each one is kept afterward as a log of the delivery.
+    """
+
+    STATUS_PENDING = 'P'
+    STATUS_DELIVERED = 'D'
+    STATUS_FAILED = 'F'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_DELIVERED, _('Delivered')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    target = models.ForeignKey(
+        WebHookTarget,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='deliveries')
+
+    event = models.CharField(_('event'), max_length=64)
+    url = models.URLField('URL')
+    headers = JSONField(_('headers'))
+    body = Base64Field(_('body'))
+
+    status = models.CharField(
+        _('status'),
+        max_length=1,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        db_index=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    response_status = models.IntegerField(_('response status'), blank=True,
+                                          null=True)
+    error = models.TextField(_('error'), blank=True)
+
+    timestamp = models.DateTimeField(_('timestamp'), default=timezone.now)
+    last_attempt = models.DateTimeField(_('last attempt'), blank=True,
+                                        null=True)
+    next_attempt = models.DateTimeField(_('next attempt'),
+                                        default=timezone.now,
+                                        db_index=True)
+
+    def __str__(self):
+        return '%s: %s' % (self.event, self.url)
+
+    class Meta:
+        db_table = 'notifications_webhookdelivery'
+        ordering = ['-timestamp']
+        verbose_name = _('Webhook delivery')
+        verbose_name_plural = _('Webhook deliveries')
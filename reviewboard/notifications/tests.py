@@ -1,13 +1,16 @@
 from __future__ import unicode_literals
 
 import logging
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core import mail
+from django.core.signals import request_started
 from django.template import TemplateSyntaxError
-from django.utils import six
+from django.utils import six, timezone
 from django.utils.datastructures import MultiValueDict
+from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.request import urlopen
 from djblets.mail.testing import DmarcDnsTestsMixin
 from djblets.mail.utils import (build_email_address,
@@ -23,10 +26,14 @@ from reviewboard.notifications.email import (build_recipients,
                                              get_email_addresses_for_group,
                                              recipients_to_addresses,
                                              send_review_mail)
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 from reviewboard.notifications.webhooks import (FakeHTTPRequest,
+                                                WebHookDeliveryQueue,
+                                                _on_request_started,
+                                                connect_signals,
                                                 dispatch_webhook_event,
-                                                render_custom_content)
+                                                render_custom_content,
+                                                webhook_delivery_queue)
 from reviewboard.reviews.models import (Group,
                                         Review,
                                         ReviewRequest,
@@ -1505,11 +1512,13 @@ class WebHookPayloadTests(SpyAgency, TestCase):
         review_request = self.create_review_request(create_repository=True)
         self.create_diffset(review_request)
         review_request.publish(review_request.submitter)
+        webhook_delivery_queue.deliver_pending()
 
         self.assertTrue(urlopen.spy.called)
 
         self.create_diffset(review_request, draft=True)
         review_request.publish(review_request.submitter)
+        webhook_delivery_queue.deliver_pending()
         self.assertEqual(len(urlopen.spy.calls), 2)
 
 
@@ -1751,6 +1760,7 @@ class WebHookDispatchTests(SpyAgency, TestCase):
 
         dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event',
                                None)
+        webhook_delivery_queue.deliver_pending()
 
         self.assertFalse(urlopen.spy.called)
         self.assertTrue(logging.exception.spy.called)
@@ -1771,6 +1781,7 @@ class WebHookDispatchTests(SpyAgency, TestCase):
         dispatch_webhook_event(FakeHTTPRequest(None), [handler], 'my-event', {
             'unencodable': Unencodable(),
         })
+        webhook_delivery_queue.deliver_pending()
 
         self.assertFalse(urlopen.spy.called)
         self.assertTrue(logging.exception.spy.called)
@@ -1791,6 +1802,7 @@ class WebHookDispatchTests(SpyAgency, TestCase):
         dispatch_webhook_event(FakeHTTPRequest(None), [handler, handler],
                                'my-event',
                                None)
+        webhook_delivery_queue.deliver_pending()
 
         self.assertEqual(len(urlopen.spy.calls), 2)
         self.assertTrue(len(logging.exception.spy.calls), 2)
@@ -1800,7 +1812,8 @@ class WebHookDispatchTests(SpyAgency, TestCase):
 
     def _test_dispatch(self, handler, event, payload, expected_content_type,
                        expected_data, expected_sig_header=None):
-        def _urlopen(request):
+        def _urlopen(request, timeout):
+            self.assertEqual(timeout, WebHookDeliveryQueue.TIMEOUT_SECS)
             self.assertEqual(request.get_full_url(), self.ENDPOINT_URL)
             self.assertEqual(request.headers['X-reviewboard-event'], event)
             self.assertEqual(request.headers['Content-type'],
@@ -1833,6 +1846,7 @@ class WebHookDispatchTests(SpyAgency, TestCase):
 
         request = FakeHTTPRequest(None)
         dispatch_webhook_event(request, [handler], event, payload)
+        webhook_delivery_queue.deliver_pending()
 
         # Assuming that if logging.exception is called, an assertion
         # error was raised - and should thus be raised further.
@@ -1840,6 +1854,195 @@ class WebHookDispatchTests(SpyAgency, TestCase):
             raise logging.exception.spy.calls[0].args[2]
 
 
+class WebHookDeliveryQueueTests(SpyAgency, TestCase):
+    """Unit tests for WebHookDeliveryQueue."""
+
+    ENDPOINT_URL = 'http://example.com/endpoint/'
+
+    def setUp(self):
+        super(WebHookDeliveryQueueTests, self).setUp()
+
+        self.target = WebHookTarget.objects.create(
+            events='my-event',
+            url=self.ENDPOINT_URL,
+            encoding=WebHookTarget.ENCODING_JSON)
+        self.delivery = webhook_delivery_queue.queue(
+            self.target,
+            'my-event',
+            {'Content-Type': WebHookTarget.ENCODING_JSON},
+            b'{}')
+
+    def test_deliver_pending(self):
+        """Testing WebHookDeliveryQueue.deliver_pending"""
+        class FakeResponse(object):
+            def getcode(self):
+                return 204
+
+            def close(self):
+                pass
+
+        self.spy_on(urlopen, call_fake=lambda *args, **kwargs: FakeResponse())
+
+        webhook_delivery_queue.deliver_pending()
+        self.assertEqual(len(urlopen.spy.calls), 1)
+
+        delivery = WebHookDelivery.objects.get(pk=self.delivery.pk)
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_DELIVERED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.response_status, 204)
+        self.assertEqual(delivery.target, self.target)
+
+        # It shouldn't be sent again.
+        webhook_delivery_queue.deliver_pending()
+        self.assertEqual(len(urlopen.spy.calls), 1)
+
+    def test_deliver_pending_with_error(self):
+        """Testing WebHookDeliveryQueue.deliver_pending retries after an error
+        """
+        def _urlopen(*args, **kwargs):
+            raise IOError('Connection refused')
+
+        self.spy_on(urlopen, call_fake=_urlopen)
+        self.spy_on(logging.exception, call_original=False)
+
+        webhook_delivery_queue.deliver_pending()
+        self.assertEqual(len(urlopen.spy.calls), 1)
+
+        delivery = WebHookDelivery.objects.get(pk=self.delivery.pk)
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_PENDING)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.error, 'Connection refused')
+        self.assertEqual(
+            delivery.next_attempt - delivery.last_attempt,
+            timedelta(seconds=WebHookDeliveryQueue.RETRY_DELAY_SECS))
+
+        # The retry isn't due yet.
+        webhook_delivery_queue.deliver_pending()
+        self.assertEqual(len(urlopen.spy.calls), 1)
+
+        WebHookDelivery.objects.filter(pk=delivery.pk).update(
+            next_attempt=delivery.last_attempt)
+        webhook_delivery_queue.deliver_pending()
+        self.assertEqual(len(urlopen.spy.calls), 2)
+
+        delivery = WebHookDelivery.objects.get(pk=self.delivery.pk)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertEqual(
+            delivery.next_attempt - delivery.last_attempt,
+            timedelta(seconds=WebHookDeliveryQueue.RETRY_DELAY_SECS * 2))
+
+    def test_deliver_pending_with_max_attempts(self):
+        """Testing WebHookDeliveryQueue.deliver_pending gives up after the
+        maximum number of attempts
+        """
+        def _urlopen(*args, **kwargs):
+            raise IOError('Connection refused')
+
+        self.spy_on(urlopen, call_fake=_urlopen)
+        self.spy_on(logging.exception, call_original=False)
+
+        WebHookDelivery.objects.filter(pk=self.delivery.pk).update(
+            attempts=WebHookDeliveryQueue.MAX_ATTEMPTS - 1)
+        webhook_delivery_queue.deliver_pending()
+
+        delivery = WebHookDelivery.objects.get(pk=self.delivery.pk)
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, WebHookDeliveryQueue.MAX_ATTEMPTS)
+
+    def test_deliver_pending_with_http_client_error(self):
+        """Testing WebHookDeliveryQueue.deliver_pending doesn't retry after
+        an HTTP 4xx error
+        """
+        def _urlopen(*args, **kwargs):
+            raise HTTPError(self.ENDPOINT_URL, 404, 'Not Found', {}, None)
+
+        self.spy_on(urlopen, call_fake=_urlopen)
+
+        webhook_delivery_queue.deliver_pending()
+
+        delivery = WebHookDelivery.objects.get(pk=self.delivery.pk)
+        self.assertEqual(delivery.status, WebHookDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.response_status, 404)
+
+    def test_deliver_pending_with_claimed_delivery(self):
+        """Testing WebHookDeliveryQueue.deliver_pending skips deliveries
+        claimed by another worker
+        """
+        self.spy_on(urlopen, call_fake=lambda *args, **kwargs: None)
+
+        self.assertEqual(webhook_delivery_queue._claim_next(), self.delivery)
+
+        webhook_delivery_queue.deliver_pending()
+        self.assertFalse(urlopen.spy.called)
+
+    def test_start_if_pending(self):
+        """Testing WebHookDeliveryQueue.start_if_pending with pending
+        deliveries
+        """
+        self.spy_on(webhook_delivery_queue._start_workers,
+                    call_original=False)
+
+        webhook_delivery_queue.start_if_pending()
+        self.assertTrue(webhook_delivery_queue._start_workers.spy.called)
+
+    def test_start_if_pending_without_pending(self):
+        """Testing WebHookDeliveryQueue.start_if_pending without pending
+        deliveries
+        """
+        WebHookDelivery.objects.filter(pk=self.delivery.pk).update(
+            status=WebHookDelivery.STATUS_DELIVERED)
+        self.spy_on(webhook_delivery_queue._start_workers,
+                    call_original=False)
+
+        webhook_delivery_queue.start_if_pending()
+        self.assertFalse(webhook_delivery_queue._start_workers.spy.called)
+
+    def test_start_on_first_request(self):
+        """Testing WebHookDeliveryQueue starts sending pending deliveries on
+        the first HTTP request
+        """
+        self.spy_on(webhook_delivery_queue._start_workers,
+                    call_original=False)
+
+        # Earlier requests in the test run will have already handled this.
+        connect_signals()
+        self.assertTrue(self._is_request_started_connected())
+
+        _on_request_started(signal=request_started, sender=None)
+        self.assertTrue(webhook_delivery_queue._start_workers.spy.called)
+        self.assertFalse(self._is_request_started_connected())
+
+    def _is_request_started_connected(self):
+        """Return whether pending deliveries are started on the next request.
+
+        Returns:
+            bool:
+            Whether the request_started handler is connected.
+        """
+        return any(
+            receiver() is _on_request_started
+            for key, receiver in request_started.receivers
+        )
+
+    def test_prune(self):
+        """Testing WebHookDeliveryQueue.prune"""
+        old_timestamp = timezone.now() - timedelta(
+            days=WebHookDeliveryQueue.KEEP_DELIVERIES_DAYS + 1)
+
+        WebHookDelivery.objects.filter(pk=self.delivery.pk).update(
+            status=WebHookDelivery.STATUS_DELIVERED,
+            timestamp=old_timestamp)
+        pending = webhook_delivery_queue.queue(self.target, 'my-event', {},
+                                               b'{}')
+        WebHookDelivery.objects.filter(pk=pending.pk).update(
+            timestamp=old_timestamp)
+
+        webhook_delivery_queue.prune()
+
+        self.assertEqual(list(WebHookDelivery.objects.all()), [pending])
+
+
 class WebHookTargetManagerTests(TestCase):
     """Unit tests for WebHookTargetManager."""
     ENDPOINT_URL = 'http://example.com/endpoint/'
@@ -3,9 +3,16 @@ from __future__ import unicode_literals
 import hashlib
 import hmac
 import logging
+import threading
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.signals import request_started
+from django.db import connection
 from django.http.request import HttpRequest
+from django.utils import six, timezone
+from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.parse import urlencode
 from django.utils.six.moves.urllib.request import Request, urlopen
 from django.template import Context, Template
@@ -15,7 +22,7 @@ from djblets.webapi.encoders import (JSONEncoderAdapter, ResourceAPIEncoder,
                                      XMLEncoderAdapter)
 
 from reviewboard import get_package_version
-from reviewboard.notifications.models import WebHookTarget
+from reviewboard.notifications.models import WebHookDelivery, WebHookTarget
 from reviewboard.reviews.models import Review, ReviewRequest
 from reviewboard.reviews.signals import (review_request_closed,
                                          review_request_published,
@@ -105,8 +112,324 @@ def render_custom_content(body, context_data={}):
     return template.render(Context(context_data))
 
 
+class WebHookDeliveryQueue(object):
+    """Sends queued WebHook requests on a pool of background threads.
+
+    Requests are stored as
+    :py:class:`~reviewboard.notifications.models.WebHookDelivery` rows, so
+    they aren't lost if the process exits, and can be sent by any server
+    process. Each request is claimed by a worker before it's sent, so that
+    only one worker sends it.
+
+    Failed requests are retried with an increasing delay, up to
+    :py:attr:`MAX_ATTEMPTS` times. Each delivery is kept afterward as a log
+    of the result for :py:attr:`KEEP_DELIVERIES_DAYS` days.
+    """
+
+    #: The timeout, in seconds, for each request to a WebHook target.
+    TIMEOUT_SECS = 10
+
+    #: The number of times a request is attempted before giving up.
+    MAX_ATTEMPTS = 5
+
+    #: The delay, in seconds, before the first retry of a failed request.
+    #:
+    #: This doubles for each following retry.
+    RETRY_DELAY_SECS = 60
+
+    #: The time, in seconds, that a worker has to send a request it claimed.
+    #:
+    #: After this, the request may be claimed again, in case the worker's
+    #: process exited while sending it.
+    CLAIM_SECS = 5 * 60
+
+    #: The longest time, in seconds, that idle workers wait before checking
+    #: for requests that are due to be retried or were queued by other
+    #: processes.
+    POLL_INTERVAL_SECS = 30
+
+    #: The number of days that finished deliveries are kept.
+    KEEP_DELIVERIES_DAYS = 30
+
+    # The number of requests checked when claiming the next one.
+    _CLAIM_BATCH_SIZE = 10
+
+    def __init__(self, max_workers=None):
+        """Initialize the queue.
+
+        Args:
+            max_workers (int, optional):
+                The number of worker threads to run. This defaults to the
+                ``webhooks_delivery_workers`` site configuration setting.
+        """
+        self.max_workers = max_workers
+
+        self._cond = threading.Condition()
+        self._num_workers = 0
+        self._has_new_deliveries = False
+        self._last_prune = None
+
+    def queue(self, webhook_target, event, headers, body):
+        """Queue a request to a WebHook target.
+
+        Args:
+            webhook_target (reviewboard.notifications.models.WebHookTarget):
+                The target to send the request to.
+
+            event (unicode):
+                The name of the event.
+
+            headers (dict):
+                The HTTP headers for the request, other than
+                ``Content-Length``.
+
+            body (bytes):
+                The body of the request.
+
+        Returns:
+            reviewboard.notifications.models.WebHookDelivery:
+            The queued delivery.
+        """
+        delivery = WebHookDelivery.objects.create(
+            target_id=webhook_target.pk,
+            event=event,
+            url=webhook_target.url,
+            headers=headers,
+            body=body)
+
+        with self._cond:
+            self._has_new_deliveries = True
+            self._start_workers()
+            self._cond.notify()
+
+        return delivery
+
+    def start_if_pending(self):
+        """Start the worker threads if there are requests waiting to be sent.
+
+        Workers are otherwise only started when a request is queued. This
+        lets a process that has just started send retries and requests left
+        behind by processes that have since exited, without waiting for a
+        new WebHook event.
+        """
+        if WebHookDelivery.objects.filter(
+                status=WebHookDelivery.STATUS_PENDING).exists():
+            with self._cond:
+                self._start_workers()
+
+    def deliver_pending(self):
+        """Send all requests that are due in the current thread.
+
+        This returns once there are no more requests due. Requests that
+        fail will be scheduled for a retry, rather than retried right away.
+        """
+        while self._deliver_next():
+            pass
+
+    def prune(self):
+        """Delete finished deliveries older than KEEP_DELIVERIES_DAYS."""
+        WebHookDelivery.objects.filter(
+            status__in=(WebHookDelivery.STATUS_DELIVERED,
+                        WebHookDelivery.STATUS_FAILED),
+            timestamp__lt=(timezone.now() -
+                           timedelta(days=self.KEEP_DELIVERIES_DAYS))
+        ).delete()
+
+    def _deliver_next(self):
+        """Claim and send the next request that is due.
+
+        Returns:
+            bool:
+            Whether there was a request to send.
+        """
+        delivery = self._claim_next()
+
+        if delivery is None:
+            return False
+
+        self._deliver(delivery)
+
+        return True
+
+    def _claim_next(self):
+        """Claim the next request that is due.
+
+        The request is claimed by moving its next attempt time forward by
+        :py:attr:`CLAIM_SECS`, only if no other worker has done so first.
+
+        Returns:
+            reviewboard.notifications.models.WebHookDelivery:
+            The claimed delivery, or ``None`` if there aren't any due.
+        """
+        while True:
+            now = timezone.now()
+            candidates = list(
+                WebHookDelivery.objects
+                .filter(status=WebHookDelivery.STATUS_PENDING,
+                        next_attempt__lte=now)
+                .order_by('next_attempt', 'pk')
+                .values_list('pk', 'next_attempt')
+                [:self._CLAIM_BATCH_SIZE])
+
+            if not candidates:
+                return None
+
+            claimed_until = now + timedelta(seconds=self.CLAIM_SECS)
+
+            for pk, next_attempt in candidates:
+                claimed = (
+                    WebHookDelivery.objects
+                    .filter(pk=pk,
+                            status=WebHookDelivery.STATUS_PENDING,
+                            next_attempt=next_attempt)
+                    .update(next_attempt=claimed_until))
+
+                if claimed:
+                    return WebHookDelivery.objects.get(pk=pk)
+
+    def _deliver(self, delivery):
+        """Send a request and record the result.
+
+        Args:
+            delivery (reviewboard.notifications.models.WebHookDelivery):
+                The delivery to send.
+        """
+        body = bytes(delivery.body)
+        headers = dict(
+            (key.encode('utf-8'), value.encode('utf-8'))
+            for key, value in six.iteritems(delivery.headers)
+        )
+        headers[b'Content-Length'] = len(body)
+
+        logging.info('Dispatching webhook for event %s to %s (attempt %d)',
+                     delivery.event, delivery.url, delivery.attempts + 1)
+
+        response_status = None
+        error = ''
+        delivered = False
+        can_retry = True
+
+        try:
+            response = urlopen(Request(delivery.url.encode('utf-8'), body,
+                                       headers),
+                               timeout=self.TIMEOUT_SECS)
+
+            if response is not None:
+                response_status = response.getcode()
+                response.close()
+
+            delivered = True
+        except HTTPError as e:
+            logging.error('WebHook target %s returned HTTP %s for event %s',
+                          delivery.url, e.code, delivery.event)
+            response_status = e.code
+            error = six.text_type(e)
+
+            # Only retry if the target may be able to handle the request
+            # later.
+            can_retry = (e.code >= 500 or e.code in (408, 429))
+        except Exception as e:
+            logging.exception('Could not dispatch WebHook to %s: %s',
+                              delivery.url, e)
+            error = six.text_type(e)
+
+        now = timezone.now()
+        delivery.attempts += 1
+        delivery.last_attempt = now
+        delivery.response_status = response_status
+        delivery.error = error
+
+        if delivered:
+            delivery.status = WebHookDelivery.STATUS_DELIVERED
+        elif can_retry and delivery.attempts < self.MAX_ATTEMPTS:
+            delivery.next_attempt = now + timedelta(
+                seconds=self.RETRY_DELAY_SECS * 2 ** (delivery.attempts - 1))
+        else:
+            logging.error('Giving up on WebHook to %s for event %s after '
+                          '%d attempts',
+                          delivery.url, delivery.event, delivery.attempts)
+            delivery.status = WebHookDelivery.STATUS_FAILED
+
+        delivery.save(update_fields=['attempts', 'last_attempt',
+                                     'response_status', 'error', 'status',
+                                     'next_attempt'])
+
+    def _start_workers(self):
+        """Start any worker threads that aren't yet running.
+
+        This must be called with the lock held.
+        """
+        if getattr(settings, 'RUNNING_TEST', False):
+            # Requests are sent explicitly through deliver_pending() in
+            # tests.
+            return
+
+        max_workers = self.max_workers
+
+        if max_workers is None:
+            siteconfig = SiteConfiguration.objects.get_current()
+            max_workers = siteconfig.get('webhooks_delivery_workers')
+
+        while self._num_workers < max_workers:
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self._num_workers += 1
+
+    def _worker(self):
+        """Send requests from the queue, waiting for more when it's idle."""
+        while True:
+            try:
+                delivered = self._deliver_next()
+
+                if not delivered:
+                    self._prune_if_needed()
+            except Exception as e:
+                logging.exception('Unexpected error sending WebHooks: %s', e)
+                delivered = False
+
+            if not delivered:
+                # Each thread has its own database connection, which would
+                # otherwise be left open while waiting.
+                connection.close()
+
+                with self._cond:
+                    if not self._has_new_deliveries:
+                        self._cond.wait(self.POLL_INTERVAL_SECS)
+
+                    self._has_new_deliveries = False
+
+    def _prune_if_needed(self):
+        """Prune old deliveries, if it hasn't been done in the last day."""
+        now = timezone.now()
+
+        if (self._last_prune is None or
+            now - self._last_prune >= timedelta(days=1)):
+            self._last_prune = now
+            self.prune()
+
+
 def dispatch_webhook_event(request, webhook_targets, event, payload):
-    """Dispatch the given event and payload to the given WebHook targets."""
+    """Dispatch the given event and payload to the given WebHook targets.
+
+    The payload is encoded once for each encoding, and a request to each
+    target is queued on :py:data:`webhook_delivery_queue` to be sent in the
+    background.
+
+    Args:
+        request (django.http.HttpRequest):
+            The request used to serialize the payload.
+
+        webhook_targets (list of
+                         reviewboard.notifications.models.WebHookTarget):
+            The targets to send the event to.
+
+        event (unicode):
+            The name of the event.
+
+        payload (dict):
+            The payload for the event.
+    """
     encoder = ResourceAPIEncoder()
     bodies = {}
 
@@ -155,28 +478,17 @@ def dispatch_webhook_event(request, webhook_targets, event, payload):
                 body = bodies[encoding]
 
         headers = {
-            b'X-ReviewBoard-Event': event.encode('utf-8'),
-            b'Content-Type': webhook_target.encoding.encode('utf-8'),
-            b'Content-Length': len(body),
-            b'User-Agent':
-                ('ReviewBoard-WebHook/%s' % get_package_version())
-                .encode('utf-8'),
+            'X-ReviewBoard-Event': event,
+            'Content-Type': webhook_target.encoding,
+            'User-Agent': 'ReviewBoard-WebHook/%s' % get_package_version(),
         }
 
         if webhook_target.secret:
             signer = hmac.new(webhook_target.secret.encode('utf-8'), body,
                               hashlib.sha1)
-            headers[b'X-Hub-Signature'] = \
-                ('sha1=%s' % signer.hexdigest()).encode('utf-8')
+            headers['X-Hub-Signature'] = 'sha1=%s' % signer.hexdigest()
 
-        logging.info('Dispatching webhook for event %s to %s',
-                     event, webhook_target.url)
-        try:
-            url = webhook_target.url.encode('utf-8')
-            urlopen(Request(url, body, headers))
-        except Exception as e:
-            logging.exception('Could not dispatch WebHook to %s: %s',
-                              webhook_target.url, e)
+        webhook_delivery_queue.queue(webhook_target, event, headers, body)
 
 
 def _serialize_review(review, request):
@@ -363,7 +675,26 @@ def reply_published_cb(user, reply, **kwargs):
         dispatch_webhook_event(request, webhook_targets, event, payload)
 
 
+def _on_request_started(**kwargs):
+    """Start sending pending WebHook requests on the first HTTP request.
+
+    This is only done once for each process.
+
+    Args:
+        **kwargs (dict):
+            Keyword arguments provided by the signal.
+    """
+    request_started.disconnect(_on_request_started)
+
+    try:
+        webhook_delivery_queue.start_if_pending()
+    except Exception as e:
+        logging.exception('Unable to start sending pending WebHooks: %s', e)
+
+
 def connect_signals():
+    request_started.connect(_on_request_started)
+
     review_request_closed.connect(review_request_closed_cb,
                                   sender=ReviewRequest)
     review_request_published.connect(review_request_published_cb,
@@ -373,3 +704,7 @@ def connect_signals():
 
     review_published.connect(review_published_cb, sender=Review)
     reply_published.connect(reply_published_cb, sender=Review)
+
+
+#: The queue used for sending WebHook requests.
+webhook_delivery_queue = WebHookDeliveryQueue()
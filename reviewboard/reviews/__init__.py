@@ -0,0 +1,24 @@
+from __future__ import unicode_literals
+
+from django.dispatch import receiver
+
+from reviewboard.signals import initializing
+
+
+@receiver(initializing)
+def _on_initializing(*args, **kwargs):
+    """Handler for when Review Board is initializing.
+
+    This will begin listening for activity on review requests, in order to
+    keep their activity versions and last updates up to date, and for
+    changes to default reviewers.
+
+    We do this during the initializing process instead of when the module
+    is loaded in order to avoid any circular imports caused by
+    reviewboard.reviews.models.
+    """
+    from reviewboard.reviews import activity, default_reviewers, updates
+
+    activity.connect_signals()
+    default_reviewers.connect_signals()
+    updates.connect_signals()
@@ -0,0 +1,108 @@
+"""Tracking of public activity on review requests.
+
+Each review request has an
+:py:attr:`~reviewboard.reviews.models.ReviewRequest.activity_version`, which
+is incremented whenever something is published, closed, reopened, or
+reported on it. The review request page includes this in its ETag, so that
+it can tell whether a cached copy of the page is still valid by looking at
+the review request alone, instead of loading every review and change on it.
+"""
+
+from __future__ import unicode_literals
+
+from django.db.models.signals import post_delete, post_save
+
+
+def increment_activity_version(review_request_id):
+    """Increment the activity version of a review request.
+
+    The version is incremented in the database, without loading or saving
+    the review request. Any loaded copies of the review request will keep
+    their old version, so this must not be used when one of them may be
+    saved afterward.
+
+    Args:
+        review_request_id (int):
+            The ID of the review request.
+    """
+    from reviewboard.reviews.models import ReviewRequest
+
+    ReviewRequest.activity_version.increment(
+        ReviewRequest.objects.filter(pk=review_request_id))
+
+
+def _on_review_request_changed(review_request, **kwargs):
+    """Handle a review request being published, closed, or reopened.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request that changed.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    # The instance's copy of the version is updated along with the
+    # database, since other handlers for this signal (such as the one that
+    # sends e-mail) may save the review request afterward, and would
+    # otherwise write back the old version.
+    review_request.increment_activity_version()
+
+
+def _on_review_published(review, **kwargs):
+    """Handle a review being published.
+
+    Args:
+        review (reviewboard.reviews.models.Review):
+            The review that was published.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    increment_activity_version(review.review_request_id)
+
+
+def _on_reply_published(reply, **kwargs):
+    """Handle a reply being published.
+
+    Args:
+        reply (reviewboard.reviews.models.Review):
+            The reply that was published.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    increment_activity_version(reply.review_request_id)
+
+
+def _on_status_update_changed(instance, **kwargs):
+    """Handle a status update being saved or deleted.
+
+    Args:
+        instance (reviewboard.reviews.models.StatusUpdate):
+            The status update that was saved or deleted.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    increment_activity_version(instance.review_request_id)
+
+
+def connect_signals():
+    """Connect the activity tracking callbacks to signals."""
+    from reviewboard.reviews.models import Review, ReviewRequest, StatusUpdate
+    from reviewboard.reviews.signals import (reply_published,
+                                             review_published,
+                                             review_request_closed,
+                                             review_request_published,
+                                             review_request_reopened)
+
+    review_request_published.connect(_on_review_request_changed,
+                                     sender=ReviewRequest)
+    review_request_closed.connect(_on_review_request_changed,
+                                  sender=ReviewRequest)
+    review_request_reopened.connect(_on_review_request_changed,
+                                    sender=ReviewRequest)
+    review_published.connect(_on_review_published, sender=Review)
+    reply_published.connect(_on_reply_published, sender=Review)
+    post_save.connect(_on_status_update_changed, sender=StatusUpdate)
+    post_delete.connect(_on_status_update_changed, sender=StatusUpdate)
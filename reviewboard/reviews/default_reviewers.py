@@ -0,0 +1,195 @@
+"""Matching of files in diffs against default reviewers.
+
+Each :py:class:`~reviewboard.reviews.models.DefaultReviewer` has a regular
+expression that's matched against the files in a diff. Rather than loading
+and compiling these every time a diff is uploaded, a
+:py:class:`DefaultReviewerMatcher` is built once for each repository and
+Local Site, and kept in memory until the default reviewers change.
+
+Since the matchers are kept separately in each server process, changes are
+tracked through a generation stored in the cache. Changing a default reviewer
+stores a new generation, and matchers built for an older one are rebuilt the
+next time they're used.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import re
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import six
+from djblets.cache.backend import make_cache_key
+
+
+_GENERATION_CACHE_KEY = 'default-reviewers-generation'
+
+# The time, in seconds, that the generation is kept in the cache. If it
+# expires, matchers are simply rebuilt.
+_GENERATION_EXPIRATION_SECS = 60 * 60 * 24 * 30
+
+_matchers = {}
+
+
+class DefaultReviewerMatcher(object):
+    """Matches files against the default reviewers for a repository.
+
+    Default reviewers that share the same regular expression are combined,
+    so each expression is only compiled and tested once.
+    """
+
+    def __init__(self, default_reviewers):
+        """Initialize the matcher.
+
+        Args:
+            default_reviewers (list of
+                               reviewboard.reviews.models.DefaultReviewer):
+                The default reviewers to match against, with their people and
+                groups prefetched.
+        """
+        rules = {}
+
+        for default in default_reviewers:
+            try:
+                rule = rules[default.file_regex]
+            except KeyError:
+                try:
+                    regex = re.compile(default.file_regex)
+                except re.error as e:
+                    logging.warning('Skipping default reviewer %s with '
+                                    'invalid file regex "%s": %s',
+                                    default.pk, default.file_regex, e)
+                    continue
+
+                rule = (regex, set(), set())
+                rules[default.file_regex] = rule
+
+            rule[1].update(person.pk for person in default.people.all())
+            rule[2].update(group.pk for group in default.groups.all())
+
+        self.rules = [
+            matcher_rule
+            for matcher_rule in six.itervalues(rules)
+            if matcher_rule[1] or matcher_rule[2]
+        ]
+
+    def get_reviewer_ids(self, paths):
+        """Return the IDs of the reviewers for a list of files.
+
+        Args:
+            paths (list of unicode):
+                The paths of the files in the diff.
+
+        Returns:
+            tuple:
+            A 2-tuple containing the set of user IDs and the set of group IDs
+            to add as reviewers.
+        """
+        user_ids = set()
+        group_ids = set()
+
+        for regex, rule_user_ids, rule_group_ids in self.rules:
+            for path in paths:
+                if regex.match(path):
+                    user_ids.update(rule_user_ids)
+                    group_ids.update(rule_group_ids)
+                    break
+
+        return user_ids, group_ids
+
+
+def get_default_reviewer_matcher(repository, local_site):
+    """Return the default reviewer matcher for a repository.
+
+    Args:
+        repository (reviewboard.scmtools.models.Repository):
+            The repository. This may be ``None``.
+
+        local_site (reviewboard.site.models.LocalSite):
+            The Local Site. This may be ``None``.
+
+    Returns:
+        DefaultReviewerMatcher:
+        The matcher for the repository.
+    """
+    from reviewboard.reviews.models import DefaultReviewer
+
+    key = (repository and repository.pk, local_site and local_site.pk)
+    generation = _get_generation()
+
+    try:
+        matcher_generation, matcher = _matchers[key]
+
+        if matcher_generation == generation:
+            return matcher
+    except KeyError:
+        pass
+
+    matcher = DefaultReviewerMatcher(
+        DefaultReviewer.objects
+        .for_repository(repository, local_site)
+        .prefetch_related('people', 'groups'))
+    _matchers[key] = (generation, matcher)
+
+    return matcher
+
+
+def invalidate_default_reviewer_matchers():
+    """Cause all default reviewer matchers to be rebuilt on next use.
+
+    This applies to all server processes sharing the cache.
+    """
+    cache.set(make_cache_key(_GENERATION_CACHE_KEY), uuid.uuid4().hex,
+              _GENERATION_EXPIRATION_SECS)
+    _matchers.clear()
+
+
+def _get_generation():
+    """Return the current generation of the default reviewers.
+
+    Returns:
+        unicode:
+        The generation.
+    """
+    cache_key = make_cache_key(_GENERATION_CACHE_KEY)
+    generation = cache.get(cache_key)
+
+    if generation is None:
+        # Another process may be storing a generation at the same time, so
+        # only store this one if there isn't one yet.
+        generation = uuid.uuid4().hex
+        cache.add(cache_key, generation, _GENERATION_EXPIRATION_SECS)
+        generation = cache.get(cache_key, generation)
+
+    return generation
+
+
+def _on_default_reviewers_changed(**kwargs):
+    """Handle a change to default reviewers or their people and groups.
+
+    Args:
+        **kwargs (dict):
+            Keyword arguments provided by the signal.
+    """
+    invalidate_default_reviewer_matchers()
+
+
+def connect_signals():
+    """Connect the matcher invalidation callbacks to signals."""
+    from reviewboard.reviews.models import DefaultReviewer, Group
+
+    post_save.connect(_on_default_reviewers_changed, sender=DefaultReviewer)
+    post_delete.connect(_on_default_reviewers_changed, sender=DefaultReviewer)
+
+    for field in (DefaultReviewer.people, DefaultReviewer.groups,
+                  DefaultReviewer.repository):
+        m2m_changed.connect(_on_default_reviewers_changed,
+                            sender=field.through)
+
+    # Deleting a user or group removes it from default reviewers without
+    # sending m2m_changed.
+    post_delete.connect(_on_default_reviewers_changed, sender=User)
+    post_delete.connect(_on_default_reviewers_changed, sender=Group)
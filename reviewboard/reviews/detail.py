@@ -5,15 +5,20 @@ from __future__ import unicode_literals
 from collections import Counter, defaultdict
 from datetime import datetime
 
-from django.db.models import Q
-from django.template.loader import render_to_string
-from django.utils import six
+from django.conf import settings
+from django.db.models import Max, Q
+from django.template.loader import get_template, render_to_string
+from django.utils import six, timezone
+from django.utils.safestring import mark_safe
 from django.utils.timezone import utc
-from django.utils.translation import ugettext as _
+from django.utils.translation import get_language, ugettext as _
+from djblets.cache.backend import cache_memoize
+from djblets.siteconfig.models import SiteConfiguration
 
 from reviewboard.reviews.builtin_fields import ReviewRequestPageDataMixin
 from reviewboard.reviews.features import status_updates_feature
 from reviewboard.reviews.fields import get_review_request_fieldsets
+from reviewboard.reviews.markdown_utils import is_rich_text_default_for_user
 from reviewboard.reviews.models import (BaseComment,
                                         Comment,
                                         FileAttachmentComment,
@@ -67,6 +72,10 @@ class ReviewRequestPageData(object):
         draft (reviewboard.reviews.models.ReviewRequestDraft):
             The active draft of the review request, if any. May be ``None``.
 
+        draft_reply_review_ids (set of int):
+            The IDs of the top-level reviews that the requesting user has
+            draft replies to.
+
         active file_attachments (list of reviewboard.attachments.models.FileAttachment):
             All the active file attachments associated with the review request.
 
@@ -87,6 +96,10 @@ class ReviewRequestPageData(object):
         latest_changedesc_timestamp (datetime.datetime):
             The timestamp of the most recent change description on the page.
 
+        latest_draft_review_timestamp (datetime.datetime):
+            The timestamp of the most recent draft review or reply owned by
+            the requesting user. May be ``None``.
+
         latest_review_timestamp (datetime.datetime):
             The timestamp of the most recent review on the page.
 
@@ -142,6 +155,30 @@ class ReviewRequestPageData(object):
         avoid everything else until later so as to do the minimum amount
         possible before reporting to the client that they can just use their
         cached copy.
+
+        Anything shown to all users is covered by the review request's
+        :py:attr:`~reviewboard.reviews.models.ReviewRequest.activity_version`,
+        so this only needs to look up what's specific to the requesting user.
+        """
+        # Get the active draft (if any).
+        self.draft = self.review_request.get_draft(self.request.user)
+
+        # Draft reviews and replies are only shown to their owner, so they
+        # aren't part of the activity version.
+        if self.request.user.is_authenticated():
+            self.latest_draft_review_timestamp = (
+                self.review_request.reviews
+                .filter(user_id=self.request.user.pk, public=False)
+                .aggregate(timestamp=Max('timestamp'))['timestamp'])
+        else:
+            self.latest_draft_review_timestamp = None
+
+    def query_data_post_etag(self):
+        """Perform remaining queries for the page.
+
+        This method will populate everything else needed for the display of the
+        review request page other than that which was required to compute the
+        ETag.
         """
         # Query for all the reviews that should be shown on the page (either
         # ones which are public or draft reviews owned by the current user).
@@ -171,25 +208,16 @@ class ReviewRequestPageData(object):
         else:
             self.latest_changedesc_timestamp = self.changedescs[0].timestamp
 
-        # Get the active draft (if any).
-        self.draft = self.review_request.get_draft(self.request.user)
-
         # Get diffsets.
         self.diffsets = self.review_request.get_diffsets()
         self.diffsets_by_id = self._build_id_map(self.diffsets)
 
-    def query_data_post_etag(self):
-        """Perform remaining queries for the page.
-
-        This method will populate everything else needed for the display of the
-        review request page other than that which was required to compute the
-        ETag.
-        """
         self.reviews_by_id = self._build_id_map(self.reviews)
 
         self.body_top_replies = defaultdict(list)
         self.body_bottom_replies = defaultdict(list)
         self.latest_timestamps_by_review_id = {}
+        self.draft_reply_review_ids = set()
 
         for r in self.reviews:
             r._body_top_replies = []
@@ -218,6 +246,9 @@ class ReviewRequestPageData(object):
                     self.latest_timestamps_by_review_id[parent_id] = \
                         new_timestamp
 
+                if not r.public:
+                    self.draft_reply_review_ids.add(parent_id)
+
         # Link up all the review body replies.
         for reply_id, replies in six.iteritems(self.body_top_replies):
             self.reviews_by_id[reply_id]._body_top_replies = reversed(replies)
@@ -405,6 +436,45 @@ class BaseReviewRequestPageEntry(object):
         """Perform final computations after all comments have been added."""
         pass
 
+    def render_to_string(self, context):
+        """Render the HTML for the entry.
+
+        Args:
+            context (django.template.Context):
+                The context for the review request page.
+
+        Returns:
+            django.utils.safestring.SafeText:
+            The rendered HTML.
+        """
+        context.push()
+        context['entry'] = self
+
+        try:
+            return mark_safe(get_template(self.template_name).render(context))
+        finally:
+            context.pop()
+
+    def render_js_to_string(self, context):
+        """Render the JavaScript for the entry.
+
+        Args:
+            context (django.template.Context):
+                The context for the review request page.
+
+        Returns:
+            django.utils.safestring.SafeText:
+            The rendered JavaScript.
+        """
+        context.push()
+        context['entry'] = self
+
+        try:
+            return mark_safe(
+                get_template(self.js_template_name).render(context))
+        finally:
+            context.pop()
+
 
 class StatusUpdatesEntryMixin(object):
     """A mixin for any entries which can include status updates.
@@ -619,6 +689,7 @@ class ReviewEntry(BaseReviewRequestPageEntry):
         self.request = request
         self.review_request = review_request
         self.review = review
+        self.data = data
         self.issue_open_count = 0
         self.has_issues = False
         self.comments = {
@@ -650,6 +721,152 @@ class ReviewEntry(BaseReviewRequestPageEntry):
                 if self.review_request.submitter == self.request.user:
                     self.collapsed = False
 
+    def render_to_string(self, context):
+        """Render the HTML for the entry.
+
+        Published reviews don't change, other than through new replies and
+        changes to issue statuses, so the HTML is cached. Each of these
+        changes results in a new cache key, so old HTML is never used.
+
+        Args:
+            context (django.template.Context):
+                The context for the review request page.
+
+        Returns:
+            django.utils.safestring.SafeText:
+            The rendered HTML.
+        """
+        rendered = self._get_cached_render(context)
+
+        if rendered is None:
+            return super(ReviewEntry, self).render_to_string(context)
+        else:
+            return mark_safe(rendered[0])
+
+    def render_js_to_string(self, context):
+        """Render the JavaScript for the entry.
+
+        The JavaScript holds the review's model data, so it's cached along
+        with the HTML, in order for the two to always match.
+
+        Args:
+            context (django.template.Context):
+                The context for the review request page.
+
+        Returns:
+            django.utils.safestring.SafeText:
+            The rendered JavaScript.
+        """
+        rendered = self._get_cached_render(context)
+
+        if rendered is None:
+            return super(ReviewEntry, self).render_js_to_string(context)
+        else:
+            return mark_safe(rendered[1])
+
+    def _get_cached_render(self, context):
+        """Return the cached HTML and JavaScript for the entry.
+
+        Both are rendered and cached together the first time this is
+        called, so that they come from the same copy of the review.
+
+        Args:
+            context (django.template.Context):
+                The context for the review request page.
+
+        Returns:
+            tuple:
+            A 2-tuple of the HTML and the JavaScript, or ``None`` if the entry
+            can't be cached.
+        """
+        if not hasattr(self, '_cached_render'):
+            cache_key = self.make_cache_key(context)
+
+            if cache_key is None:
+                self._cached_render = None
+            else:
+                base = super(ReviewEntry, self)
+                self._cached_render = cache_memoize(
+                    cache_key,
+                    lambda: (base.render_to_string(context),
+                             base.render_js_to_string(context)))
+
+        return self._cached_render
+
+    def make_cache_key(self, context):
+        """Return the cache key for the entry's HTML and JavaScript.
+
+        The key covers the review, the latest reply and comment timestamps,
+        and anything about the page or the requesting user that changes the
+        output.
+
+        Args:
+            context (django.template.Context):
+                The context for the review request page.
+
+        Returns:
+            unicode:
+            The cache key, or ``None`` if the entry can't be cached.
+        """
+        from djblets.extensions.hooks import TemplateHook
+        from reviewboard.extensions.hooks import CommentDetailDisplayHook
+
+        review = self.review
+
+        # Draft replies are only shown to their owner, and extension hooks
+        # may render anything at all, so neither can be cached.
+        if (not review.public or
+            review.pk in self.data.draft_reply_review_ids or
+            CommentDetailDisplayHook.hooks or
+            TemplateHook.by_name('review-summary-header-pre') or
+            TemplateHook.by_name('review-summary-header-post')):
+            return None
+
+        user = self.request.user
+        latest_comment_timestamp = None
+        issue_comment = None
+
+        for comments in six.itervalues(self.comments):
+            for comment in comments:
+                # Changing an issue status saves the comment, which updates
+                # its timestamp.
+                if (latest_comment_timestamp is None or
+                    comment.timestamp > latest_comment_timestamp):
+                    latest_comment_timestamp = comment.timestamp
+
+                if issue_comment is None and comment.issue_opened:
+                    issue_comment = comment
+
+        # All the issues in a review can be changed by the same users.
+        can_change_issue_status = (
+            issue_comment is not None and
+            issue_comment.can_change_issue_status(user))
+
+        latest_reply_timestamp = \
+            self.data.latest_timestamps_by_review_id.get(review.pk)
+        forloop = context.get('forloop') or {}
+        siteconfig = SiteConfiguration.objects.get_current()
+
+        return 'review-entry-%s' % '-'.join(
+            six.text_type(value)
+            for value in (
+                review.pk,
+                review.timestamp.isoformat(),
+                latest_reply_timestamp and latest_reply_timestamp.isoformat(),
+                (latest_comment_timestamp and
+                 latest_comment_timestamp.isoformat()),
+                self.collapsed,
+                forloop.get('last', False),
+                user.is_authenticated(),
+                can_change_issue_status,
+                is_rich_text_default_for_user(user),
+                siteconfig.get('avatars_enabled'),
+                context.get('send_email'),
+                get_language(),
+                timezone.get_current_timezone_name(),
+                settings.TEMPLATE_SERIAL,
+            ))
+
 
 class ChangeEntry(StatusUpdatesEntryMixin, BaseReviewRequestPageEntry):
     """A change description box.
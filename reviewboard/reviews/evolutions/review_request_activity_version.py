@@ -0,0 +1,10 @@
+from __future__ import unicode_literals
+
+from django_evolution.mutations import AddField
+from djblets.db.fields import CounterField
+
+
+MUTATIONS = [
+    AddField('ReviewRequest', 'activity_version', CounterField, initial=0,
+             null=True),
+]
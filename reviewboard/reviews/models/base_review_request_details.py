@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 import re
 
+from django.contrib.auth.models import User
 from django.db import models
 from django.utils import six
 from django.utils.encoding import python_2_unicode_compatible
@@ -9,7 +10,7 @@ from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import JSONField
 
 from reviewboard.attachments.models import FileAttachmentHistory
-from reviewboard.reviews.models.default_reviewer import DefaultReviewer
+from reviewboard.reviews.default_reviewers import get_default_reviewer_matcher
 
 
 @python_2_unicode_compatible
@@ -157,44 +158,30 @@ class BaseReviewRequestDetails(models.Model):
         if not diffset:
             return
 
-        people = set()
-        groups = set()
+        matcher = get_default_reviewer_matcher(self.repository,
+                                               self.local_site)
 
-        # TODO: This is kind of inefficient, and could maybe be optimized in
-        # some fancy way.  Certainly the most superficial optimization that
-        # could be made would be to cache the compiled regexes somewhere.
-        files = diffset.files.all()
-        reviewers = DefaultReviewer.objects.for_repository(self.repository,
-                                                           self.local_site)
-
-        for default in reviewers:
-            try:
-                regex = re.compile(default.file_regex)
-            except:
-                continue
-
-            for filediff in files:
-                if regex.match(filediff.source_file or filediff.dest_file):
-                    for person in default.people.all():
-                        if person.is_active:
-                            people.add(person)
-
-                    for group in default.groups.all():
-                        groups.add(group)
-
-                    break
-
-        existing_people = self.target_people.all()
-
-        for person in people:
-            if person not in existing_people:
-                self.target_people.add(person)
-
-        existing_groups = self.target_groups.all()
+        if not matcher.rules:
+            return
 
-        for group in groups:
-            if group not in existing_groups:
-                self.target_groups.add(group)
+        paths = [
+            source_file or dest_file
+            for source_file, dest_file in diffset.files.values_list(
+                'source_file', 'dest_file')
+        ]
+        user_ids, group_ids = matcher.get_reviewer_ids(paths)
+
+        # add() only inserts the rows that don't already exist, in a single
+        # query.
+        if user_ids:
+            self.target_people.add(*(
+                User.objects
+                .filter(pk__in=user_ids, is_active=True)
+                .values_list('pk', flat=True)
+            ))
+
+        if group_ids:
+            self.target_groups.add(*group_ids)
 
     def save(self, **kwargs):
         self.bugs_closed = self.bugs_closed.strip()
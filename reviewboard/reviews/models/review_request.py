@@ -256,6 +256,12 @@ class ReviewRequest(BaseReviewRequestDetails):
         _('dropped issue count'),
         initializer=_initialize_issue_counts)
 
+    # A version number for the public activity on the review request. This
+    # is incremented whenever something shown on the review request page
+    # changes, and is used to compute the page's ETag without querying for
+    # all the reviews and changes. See reviewboard.reviews.activity.
+    activity_version = CounterField(_('activity version'), default=0)
+
     local_site = models.ForeignKey(LocalSite, blank=True, null=True,
                                    related_name='review_requests')
     local_id = models.IntegerField('site-local ID', blank=True, null=True)
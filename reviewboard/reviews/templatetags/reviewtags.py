@@ -317,6 +317,40 @@ def reviewer_list(review_request):
                           for user in review_request.target_people.all()])
 
 
+@register.simple_tag(takes_context=True)
+def review_request_entry(context, entry):
+    """Render an entry on the review request page.
+
+    Args:
+        context (django.template.Context):
+            The collection of key-value pairs available in the template.
+
+        entry (reviewboard.reviews.detail.BaseReviewRequestPageEntry):
+            The entry to render.
+
+    Returns:
+        unicode: The HTML content to be rendered.
+    """
+    return entry.render_to_string(context)
+
+
+@register.simple_tag(takes_context=True)
+def review_request_entry_js(context, entry):
+    """Render the JavaScript for an entry on the review request page.
+
+    Args:
+        context (django.template.Context):
+            The collection of key-value pairs available in the template.
+
+        entry (reviewboard.reviews.detail.BaseReviewRequestPageEntry):
+            The entry to render.
+
+    Returns:
+        unicode: The JavaScript content to be rendered.
+    """
+    return entry.render_js_to_string(context)
+
+
 @register.simple_tag(takes_context=True)
 def review_request_actions(context):
     """Render all registered review request actions.
@@ -2,6 +2,8 @@ from __future__ import unicode_literals
 
 from django.contrib.auth.models import User
 
+from reviewboard.reviews.default_reviewers import \
+    get_default_reviewer_matcher
 from reviewboard.reviews.models import DefaultReviewer
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.site.models import LocalSite
@@ -87,3 +89,103 @@ class DefaultReviewerTests(TestCase):
         review_request.add_default_reviewers()
         self.assertIn(user1, review_request.target_people.all())
         self.assertNotIn(user2, review_request.target_people.all())
+
+    def test_review_request_add_default_reviewers_with_groups(self):
+        """Testing adding default reviewers with groups to review request"""
+        tool = Tool.objects.get(name='CVS')
+        repo = Repository.objects.create(name='Test1',
+                                         path='path1',
+                                         tool=tool)
+
+        group1 = self.create_review_group(name='group1')
+        group2 = self.create_review_group(name='group2')
+        group3 = self.create_review_group(name='group3')
+
+        default_reviewer1 = DefaultReviewer.objects.create(
+            name='Test1',
+            file_regex='/src/.*')
+        default_reviewer1.groups.add(group1)
+
+        default_reviewer2 = DefaultReviewer.objects.create(
+            name='Test2',
+            file_regex='/docs/.*')
+        default_reviewer2.groups.add(group2)
+
+        default_reviewer3 = DefaultReviewer.objects.create(
+            name='Test3',
+            file_regex='/src/.*')
+        default_reviewer3.groups.add(group3)
+
+        review_request = self.create_review_request(repository=repo)
+        review_request.target_groups.add(group3)
+
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(diffset, source_file='/src/main.c',
+                             dest_file='/src/main.c')
+        review_request.add_default_reviewers()
+
+        self.assertEqual(
+            set(review_request.target_groups.all()),
+            set([group1, group3]))
+
+
+class DefaultReviewerMatcherTests(TestCase):
+    """Unit tests for reviewboard.reviews.default_reviewers."""
+
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(DefaultReviewerMatcherTests, self).setUp()
+
+        self.user = User.objects.get(username='doc')
+        self.default_reviewer = DefaultReviewer.objects.create(
+            name='Test',
+            file_regex='/src/.*')
+        self.default_reviewer.people.add(self.user)
+
+    def test_get_reviewer_ids(self):
+        """Testing DefaultReviewerMatcher.get_reviewer_ids"""
+        matcher = get_default_reviewer_matcher(None, None)
+
+        self.assertEqual(matcher.get_reviewer_ids(['/src/main.c']),
+                         (set([self.user.pk]), set()))
+        self.assertEqual(matcher.get_reviewer_ids(['/docs/index.rst']),
+                         (set(), set()))
+
+    def test_get_reviewer_ids_with_invalid_regex(self):
+        """Testing DefaultReviewerMatcher.get_reviewer_ids with an invalid
+        file regex
+        """
+        default_reviewer = DefaultReviewer.objects.create(name='Bad',
+                                                          file_regex='(')
+        default_reviewer.people.add(User.objects.get(username='grumpy'))
+
+        matcher = get_default_reviewer_matcher(None, None)
+        self.assertEqual(matcher.get_reviewer_ids(['/src/main.c']),
+                         (set([self.user.pk]), set()))
+
+    def test_get_matcher_cached(self):
+        """Testing get_default_reviewer_matcher returns a cached matcher"""
+        matcher = get_default_reviewer_matcher(None, None)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_default_reviewer_matcher(None, None), matcher)
+
+    def test_get_matcher_after_change(self):
+        """Testing get_default_reviewer_matcher rebuilds the matcher after
+        default reviewers change
+        """
+        matcher = get_default_reviewer_matcher(None, None)
+
+        user = User.objects.get(username='grumpy')
+        self.default_reviewer.people.add(user)
+
+        new_matcher = get_default_reviewer_matcher(None, None)
+        self.assertIsNot(new_matcher, matcher)
+        self.assertEqual(new_matcher.get_reviewer_ids(['/src/main.c']),
+                         (set([self.user.pk, user.pk]), set()))
+
+        self.default_reviewer.delete()
+
+        self.assertEqual(
+            get_default_reviewer_matcher(None, None).rules, [])
@@ -1,7 +1,9 @@
 from __future__ import unicode_literals
 
 from django.contrib.auth.models import User
+from django.core import mail
 from django.utils import six
+from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
 
@@ -230,6 +232,100 @@ class ReviewRequestTests(SpyAgency, TestCase):
         self.assertEqual(change4.user, grumpy)
 
 
+class ActivityVersionTests(TestCase):
+    """Tests for ReviewRequest.activity_version."""
+
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(ActivityVersionTests, self).setUp()
+
+        self.review_request = self.create_review_request(publish=True)
+        self.version = self._get_activity_version()
+
+    def test_close_and_reopen(self):
+        """Testing ReviewRequest.activity_version after closing and
+        reopening
+        """
+        self.review_request.close(ReviewRequest.SUBMITTED)
+        self.assertEqual(self._get_activity_version(), self.version + 1)
+
+        self.review_request.reopen()
+        self.assertEqual(self._get_activity_version(), self.version + 2)
+
+    def test_publish(self):
+        """Testing ReviewRequest.activity_version after publishing a draft"""
+        draft = ReviewRequestDraft.create(self.review_request)
+        draft.summary = 'New summary'
+        draft.save()
+
+        self.review_request.publish(self.review_request.submitter)
+        self.assertEqual(self._get_activity_version(), self.version + 1)
+
+    def test_publish_with_email(self):
+        """Testing ReviewRequest.activity_version after publishing a draft
+        and closing with e-mail enabled
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('mail_send_review_mail', True)
+        siteconfig.set('mail_send_review_close_mail', True)
+        siteconfig.save()
+
+        try:
+            draft = ReviewRequestDraft.create(self.review_request)
+            draft.summary = 'New summary'
+            draft.save()
+
+            # Sending the e-mail saves the review request, which must not
+            # undo the new version.
+            self.review_request.publish(self.review_request.submitter)
+            self.assertEqual(len(mail.outbox), 1)
+            self.assertEqual(self._get_activity_version(), self.version + 1)
+
+            self.review_request.close(ReviewRequest.SUBMITTED,
+                                      self.review_request.submitter)
+            self.assertEqual(len(mail.outbox), 2)
+            self.assertEqual(self._get_activity_version(), self.version + 2)
+        finally:
+            siteconfig.set('mail_send_review_mail', False)
+            siteconfig.set('mail_send_review_close_mail', False)
+            siteconfig.save()
+
+    def test_review_and_reply(self):
+        """Testing ReviewRequest.activity_version after publishing a review
+        and a reply
+        """
+        review = self.create_review(self.review_request)
+        self.assertEqual(self._get_activity_version(), self.version)
+
+        review.publish()
+        self.assertEqual(self._get_activity_version(), self.version + 1)
+
+        reply = self.create_reply(review)
+        reply.publish()
+        self.assertEqual(self._get_activity_version(), self.version + 2)
+
+    def test_status_update(self):
+        """Testing ReviewRequest.activity_version after saving and deleting
+        a status update
+        """
+        status_update = self.create_status_update(self.review_request)
+        self.assertEqual(self._get_activity_version(), self.version + 1)
+
+        status_update.delete()
+        self.assertEqual(self._get_activity_version(), self.version + 2)
+
+    def _get_activity_version(self):
+        """Return the activity version stored for the review request.
+
+        Returns:
+            int:
+            The activity version.
+        """
+        return ReviewRequest.objects.get(
+            pk=self.review_request.pk).activity_version
+
+
 class IssueCounterTests(TestCase):
     """Unit tests for review request issue counters."""
 
@@ -163,17 +163,20 @@ class PostCommitTests(SpyAgency, TestCase):
 
             return commit
 
-        def get_file_exists(repository, path, revision, base_commit_id=None,
+        def get_files_exist(repository, files, base_commit_id=None,
                             request=None):
-            return (path, revision) in [('/readme', 'd6613f5')]
+            return [
+                (path, revision) in [('/readme', 'd6613f5')]
+                for path, revision in files
+            ]
 
         review_request = ReviewRequest.objects.create(self.user,
                                                       self.repository)
         draft = ReviewRequestDraft.create(review_request)
 
         self.spy_on(draft.repository.get_change, call_fake=get_change)
-        self.spy_on(draft.repository.get_file_exists,
-                    call_fake=get_file_exists)
+        self.spy_on(draft.repository.get_files_exist,
+                    call_fake=get_files_exist)
 
         draft.update_from_commit_id(commit_id)
 
@@ -205,17 +208,20 @@ class PostCommitTests(SpyAgency, TestCase):
 
             return commit
 
-        def get_file_exists(repository, path, revision, base_commit_id=None,
+        def get_files_exist(repository, files, base_commit_id=None,
                             request=None):
-            return (path, revision) in [('/readme', 'd6613f5')]
+            return [
+                (path, revision) in [('/readme', 'd6613f5')]
+                for path, revision in files
+            ]
 
         review_request = ReviewRequest.objects.create(self.user,
                                                       self.repository)
         draft = ReviewRequestDraft.create(review_request)
 
         self.spy_on(draft.repository.get_change, call_fake=get_change)
-        self.spy_on(draft.repository.get_file_exists,
-                    call_fake=get_file_exists)
+        self.spy_on(draft.repository.get_files_exist,
+                    call_fake=get_files_exist)
 
         draft.description_rich_text = True
         draft.update_from_commit_id('4')
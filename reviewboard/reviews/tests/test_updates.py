@@ -0,0 +1,126 @@
+from __future__ import unicode_literals
+
+from reviewboard.reviews.models import ReviewRequest
+from reviewboard.reviews.updates import get_last_update, update_broker
+from reviewboard.testing import TestCase
+
+
+class ReviewRequestUpdateBrokerTests(TestCase):
+    """Tests for reviewboard.reviews.updates.ReviewRequestUpdateBroker."""
+
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(ReviewRequestUpdateBrokerTests, self).setUp()
+
+        self.review_request = self.create_review_request(publish=True)
+
+    def test_get_last_update(self):
+        """Testing ReviewRequestUpdateBroker.get_last_update"""
+        update = update_broker.get_last_update(self.review_request)
+        self.assertEqual(update['type'], 'review-request')
+        self.assertEqual(update['user_id'],
+                         self.review_request.submitter_id)
+        self.assertEqual(update['status'], ReviewRequest.PENDING_REVIEW)
+
+        with self.assertNumQueries(0):
+            cached_update = update_broker.get_last_update(self.review_request)
+
+        self.assertEqual(cached_update, update)
+
+    def test_get_last_update_after_review_published(self):
+        """Testing ReviewRequestUpdateBroker.get_last_update after publishing
+        a review
+        """
+        update = update_broker.get_last_update(self.review_request)
+
+        review = self.create_review(self.review_request, publish=True)
+
+        new_update = update_broker.get_last_update(self.review_request)
+        self.assertNotEqual(new_update['id'], update['id'])
+        self.assertEqual(new_update['type'], 'review')
+        self.assertEqual(new_update['user_id'], review.user_id)
+
+    def test_get_last_update_after_close(self):
+        """Testing ReviewRequestUpdateBroker.get_last_update after closing
+        the review request
+        """
+        update_broker.get_last_update(self.review_request)
+
+        self.review_request.close(ReviewRequest.DISCARDED)
+
+        update = update_broker.get_last_update(self.review_request)
+        self.assertEqual(update['type'], 'review-request')
+        self.assertEqual(update['status'], ReviewRequest.DISCARDED)
+
+    def test_get_last_update_after_close_with_review(self):
+        """Testing ReviewRequestUpdateBroker.get_last_update after closing
+        a review request with a review
+        """
+        self.create_review(self.review_request, publish=True)
+        update_broker.get_last_update(self.review_request)
+
+        self.review_request.close(ReviewRequest.SUBMITTED)
+
+        update = update_broker.get_last_update(self.review_request)
+        self.assertEqual(update['type'], 'review-request')
+        self.assertEqual(update['status'], ReviewRequest.SUBMITTED)
+
+    def test_get_last_update_after_save(self):
+        """Testing ReviewRequestUpdateBroker.get_last_update after the review
+        request is saved again
+        """
+        update_broker.get_last_update(self.review_request)
+
+        # Saving the review request (as is done when sending e-mail) moves
+        # its last updated time forward, which the page will show.
+        review_request = ReviewRequest.objects.get(pk=self.review_request.pk)
+        review_request.save()
+
+        review_request = ReviewRequest.objects.get(pk=self.review_request.pk)
+        update = update_broker.get_last_update(review_request)
+        self.assertEqual(update['timestamp'], review_request.last_updated)
+        self.assertEqual(update, get_last_update(review_request))
+
+    def test_wait_for_update_with_new_update(self):
+        """Testing ReviewRequestUpdateBroker.wait_for_update with an update
+        published since the client's last update
+        """
+        update = update_broker.get_last_update(self.review_request)
+
+        review = self.create_review(self.review_request, publish=True)
+        reply = self.create_reply(review, publish=True)
+
+        new_update = update_broker.wait_for_update(self.review_request,
+                                                   update['id'], 10)
+        self.assertNotEqual(new_update['id'], update['id'])
+        self.assertEqual(new_update['type'], 'reply')
+        self.assertEqual(new_update['user_id'], reply.user_id)
+
+    def test_wait_for_update_with_stale_review_request(self):
+        """Testing ReviewRequestUpdateBroker.wait_for_update with a review
+        request saved since it was loaded
+        """
+        update = update_broker.get_last_update(self.review_request)
+
+        ReviewRequest.objects.get(pk=self.review_request.pk).save()
+
+        # The update must be looked up from the database, since the loaded
+        # review request has the old last updated time.
+        new_update = update_broker.wait_for_update(self.review_request,
+                                                   update['id'], 10)
+        self.assertNotEqual(new_update['id'], update['id'])
+        self.assertEqual(
+            new_update['timestamp'],
+            ReviewRequest.objects.get(pk=self.review_request.pk).last_updated)
+
+    def test_wait_for_update_with_timeout(self):
+        """Testing ReviewRequestUpdateBroker.wait_for_update with no new
+        update before the timeout
+        """
+        update = update_broker.get_last_update(self.review_request)
+
+        self.assertEqual(
+            update_broker.wait_for_update(self.review_request, update['id'],
+                                          0.1),
+            update)
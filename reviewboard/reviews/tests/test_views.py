@@ -5,7 +5,9 @@ from datetime import timedelta
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from djblets.siteconfig.models import SiteConfiguration
+from kgb import SpyAgency
 
+from reviewboard.diffviewer import diffutils
 from reviewboard.extensions.tests import TestService
 from reviewboard.hostingsvcs.service import (register_hosting_service,
                                              unregister_hosting_service)
@@ -13,6 +15,7 @@ from reviewboard.hostingsvcs.models import HostingServiceAccount
 from reviewboard.reviews.models import (Comment,
                                         GeneralComment,
                                         Review)
+from reviewboard.reviews.views import build_diff_comment_fragments
 from reviewboard.site.urlresolvers import local_site_reverse
 from reviewboard.testing import TestCase
 
@@ -587,6 +590,81 @@ class ViewTests(TestCase):
         # Make sure they're not equal
         self.assertNotEqual(etag1, etag2)
 
+    def test_review_request_etag_with_status_update(self):
+        """Testing review request ETags with a new status update"""
+        review_request = self.create_review_request(publish=True)
+
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        etag1 = response['ETag']
+        self.assertNotEqual(etag1, '')
+
+        response = self.client.get(review_request.get_absolute_url(),
+                                   HTTP_IF_NONE_MATCH=etag1)
+        self.assertEqual(response.status_code, 304)
+
+        self.create_status_update(review_request)
+
+        response = self.client.get(review_request.get_absolute_url(),
+                                   HTTP_IF_NONE_MATCH=etag1)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag1)
+
+    def test_review_detail_caches_review_entries(self):
+        """Testing review_detail caches the HTML for published reviews"""
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request, body_top='Old body',
+                                    publish=True)
+
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Old body', response.content)
+
+        # Updating the review without changing its timestamp should leave
+        # the cached HTML in place.
+        Review.objects.filter(pk=review.pk).update(body_top='New body')
+
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Old body', response.content)
+        self.assertNotIn('New body', response.content)
+
+    def test_review_detail_caches_review_entries_with_new_reply(self):
+        """Testing review_detail re-renders cached reviews with new replies"""
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request, publish=True)
+
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+
+        reply = self.create_reply(review, body_top='My reply')
+        reply.body_top_reply_to = review
+        reply.save()
+        reply.publish()
+
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('My reply', response.content)
+
+    def test_review_detail_with_draft_reply_not_cached(self):
+        """Testing review_detail doesn't cache reviews with draft replies"""
+        review_request = self.create_review_request(publish=True)
+        review = self.create_review(review_request, publish=True)
+        reply = self.create_reply(review, user='grumpy',
+                                  body_top='My draft reply')
+        reply.body_top_reply_to = review
+        reply.save()
+
+        self.client.login(username='grumpy', password='grumpy')
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('My draft reply', response.content)
+
+        self.client.logout()
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('My draft reply', response.content)
+
     # Bug #3384
     def test_diff_raw_content_disposition_attachment(self):
         """Testing /diff/raw/ Content-Disposition: attachment; ..."""
@@ -600,6 +678,25 @@ class ViewTests(TestCase):
         self.assertEqual(response['Content-Disposition'],
                          'attachment; filename=diffset')
 
+    def test_diff_raw_content(self):
+        """Testing /diff/raw/ streams the diffs of all files"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+
+        diffset = self.create_diffset(review_request=review_request)
+        self.create_filediff(diffset, source_file='/README',
+                             dest_file='/README',
+                             diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+        self.create_filediff(diffset, source_file='/README2',
+                             dest_file='/README2',
+                             diff=self.DEFAULT_GIT_FILEDIFF_DATA)
+
+        response = self.client.get('/r/%d/diff/raw/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.DEFAULT_GIT_FILEDIFF_DATA * 2)
+
     # Bug #3704
     def test_diff_raw_multiple_content_disposition(self):
         """Testing /diff/raw/ multiple Content-Disposition issue"""
@@ -1230,6 +1327,103 @@ class DownloadFileTests(TestCase):
         self.assertEquals(rsp.status_code, 404)
 
 
+class BuildDiffCommentFragmentsTests(SpyAgency, TestCase):
+    """Tests for reviewboard.reviews.views.build_diff_comment_fragments."""
+
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(BuildDiffCommentFragmentsTests, self).setUp()
+
+        repository = self.create_repository(tool_name='Test')
+        self.review_request = self.create_review_request(
+            repository=repository, publish=True)
+        diffset = self.create_diffset(self.review_request)
+        self.filediff1 = self.create_filediff(diffset,
+                                              source_file='/file1',
+                                              dest_file='/file1')
+        self.filediff2 = self.create_filediff(diffset,
+                                              source_file='/file2',
+                                              dest_file='/file2')
+
+        review = self.create_review(self.review_request, publish=True)
+        self.comments = [
+            self.create_diff_comment(review, self.filediff1),
+            self.create_diff_comment(review, self.filediff2),
+            self.create_diff_comment(review, self.filediff1),
+        ]
+
+    def test_groups_by_file(self):
+        """Testing build_diff_comment_fragments loads each file once"""
+        self.spy_on(diffutils.get_diff_files)
+
+        had_error, entries = build_diff_comment_fragments(
+            Comment.objects.filter(pk__in=[
+                comment.pk
+                for comment in self.comments
+            ]).order_by('pk'),
+            {
+                'user': self.review_request.submitter,
+            })
+
+        self.assertFalse(had_error)
+        self.assertEqual(
+            [entry['comment'] for entry in entries],
+            self.comments)
+        self.assertEqual(len(diffutils.get_diff_files.spy.calls), 2)
+        self.assertIs(entries[0]['comment'].filediff,
+                      entries[2]['comment'].filediff)
+
+        for entry in entries:
+            self.assertNotEqual(entry['chunks'], [])
+
+    def test_with_file_error(self):
+        """Testing build_diff_comment_fragments with an error loading a
+        file
+        """
+        filediff = self.create_filediff(
+            self.filediff1.diffset,
+            source_file='/file3',
+            dest_file='/file3',
+            diff=(
+                b'--- README\trevision 123\n'
+                b'+++ README\trevision 123\n'
+                b'@@ -1 +1 @@\n'
+                b'-Goodbye, world!\n'
+                b'+Hello, everybody!\n'
+            ))
+
+        review = self.create_review(self.review_request, publish=True)
+        comments = [
+            self.create_diff_comment(review, filediff),
+            self.create_diff_comment(review, self.filediff2),
+            self.create_diff_comment(review, filediff),
+        ]
+
+        self.spy_on(diffutils.get_diff_files)
+
+        had_error, entries = build_diff_comment_fragments(
+            comments,
+            {
+                'user': self.review_request.submitter,
+            })
+
+        self.assertTrue(had_error)
+        self.assertEqual(
+            [entry['comment'] for entry in entries],
+            comments)
+
+        # The file that failed should only have been attempted once.
+        self.assertEqual(len(diffutils.get_diff_files.spy.calls), 2)
+        self.assertEqual(entries[0]['chunks'], [])
+        self.assertNotEqual(entries[1]['chunks'], [])
+        self.assertEqual(entries[2]['chunks'], [])
+        self.assertIn('There was an error displaying this diff.',
+                      entries[0]['html'])
+        self.assertIn('There was an error displaying this diff.',
+                      entries[2]['html'])
+
+
 class UserInfoboxTests(TestCase):
     def test_unicode(self):
         """Testing user_infobox with a user with non-ascii characters"""
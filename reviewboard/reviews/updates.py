@@ -0,0 +1,317 @@
+"""Delivery of review request updates to waiting clients.
+
+Review request pages check for new updates through the
+:py:class:`~reviewboard.webapi.resources.review_request_last_update.
+ReviewRequestLastUpdateResource`. Rather than working out the last update from
+the database for every check, the last update for each review request is
+kept in the cache. It's removed from the cache whenever the review request is
+saved or something is published on it, and looked up again from the database
+on the next check.
+
+Clients can also ask to wait for the next update. Clients waiting in the same
+server process are woken up as soon as an update is published. Since the
+cache is shared between processes, clients waiting in other processes see the
+update the next time they check the cache, every
+:py:attr:`ReviewRequestUpdateBroker.CHECK_INTERVAL_SECS` seconds.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from djblets.cache.backend import make_cache_key
+
+
+def get_last_update(review_request):
+    """Return information on the last public update to a review request.
+
+    This looks up the last update in the database.
+
+    Publishing a review or reply saves the review request afterward, which
+    moves its last updated time past the review's own timestamp. When that's
+    the latest change, the update is reported as coming from the review or
+    reply, since that's what clients need to show.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request.
+
+    Returns:
+        dict:
+        Information on the update. This contains the following keys:
+
+        ``id`` (:py:class:`unicode`):
+            A string uniquely identifying the update.
+
+        ``timestamp`` (:py:class:`datetime.datetime`):
+            The time of the update.
+
+        ``type`` (:py:class:`unicode`):
+            The type of the update. This is one of ``review-request``,
+            ``diff``, ``reply``, or ``review``.
+
+        ``user_id`` (:py:class:`int`):
+            The ID of the user who made the update, if known.
+
+        ``status`` (:py:class:`unicode`):
+            The status of the review request.
+    """
+    from reviewboard.diffviewer.models import DiffSet
+    from reviewboard.reviews.models import Review
+
+    try:
+        reviews = [review_request.reviews.filter(public=True).latest()]
+    except Review.DoesNotExist:
+        reviews = []
+
+    timestamp, updated_object = review_request.get_last_activity(
+        reviews=reviews)
+
+    if updated_object is review_request and reviews:
+        # The review request is only credited with the update if it was
+        # published, closed, or reopened after the latest review or reply.
+        review = reviews[0]
+
+        if (review.timestamp ==
+                review_request.last_review_activity_timestamp and
+            not review_request.changedescs.filter(
+                public=True, timestamp__gt=review.timestamp).exists()):
+            updated_object = review
+
+    if isinstance(updated_object, DiffSet):
+        update_type = 'diff'
+        user_id = None
+    elif isinstance(updated_object, Review):
+        if updated_object.is_reply():
+            update_type = 'reply'
+        else:
+            update_type = 'review'
+
+        user_id = updated_object.user_id
+    else:
+        update_type = 'review-request'
+        user_id = updated_object.submitter_id
+
+    return {
+        'id': '%s:%s' % (timestamp, updated_object.pk),
+        'timestamp': timestamp,
+        'type': update_type,
+        'user_id': user_id,
+        'status': review_request.status,
+    }
+
+
+class ReviewRequestUpdateBroker(object):
+    """Caches the last updates to review requests and wakes waiting clients.
+
+    The last update to each review request is kept in the cache, so that it
+    only needs to be looked up in the database when it's first requested or
+    after the review request changes.
+    """
+
+    #: The longest time, in seconds, between checks of the cache for an
+    #: update published in another process.
+    CHECK_INTERVAL_SECS = 5
+
+    #: The time, in seconds, that updates are kept in the cache.
+    #:
+    #: Updates are removed from the cache whenever the review request
+    #: changes, so this only limits how long a missed change could go
+    #: unnoticed.
+    CACHE_EXPIRATION_SECS = 60 * 60
+
+    def __init__(self):
+        """Initialize the broker."""
+        self._cond = threading.Condition()
+        self._generation = 0
+
+    def get_last_update(self, review_request):
+        """Return the last update to a review request.
+
+        Args:
+            review_request (reviewboard.reviews.models.ReviewRequest):
+                The review request. This is only used to look up the update
+                if it isn't in the cache, so it must be up to date.
+
+        Returns:
+            dict:
+            Information on the update, as returned by
+            :py:func:`get_last_update`.
+        """
+        cache_key = self._make_cache_key(review_request.pk)
+        update = cache.get(cache_key)
+
+        if update is None:
+            update = get_last_update(review_request)
+            cache.set(cache_key, update, self.CACHE_EXPIRATION_SECS)
+
+        return update
+
+    def invalidate(self, review_request_id):
+        """Remove the last update to a review request and wake waiting clients.
+
+        The update will be looked up from the database the next time it's
+        needed. It's never built from the instance that triggered the change,
+        since other handlers may still change and save that review request.
+
+        Args:
+            review_request_id (int):
+                The ID of the review request that changed.
+        """
+        with self._cond:
+            cache.delete(self._make_cache_key(review_request_id))
+            self._generation += 1
+            self._cond.notify_all()
+
+    def wait_for_update(self, review_request, update_id, timeout):
+        """Wait for a review request to be updated.
+
+        Args:
+            review_request (reviewboard.reviews.models.ReviewRequest):
+                The review request.
+
+            update_id (unicode):
+                The ID of the last update the client knows about.
+
+            timeout (float):
+                The longest time, in seconds, to wait.
+
+        Returns:
+            dict:
+            Information on the last update, as returned by
+            :py:func:`get_last_update`. This will have the same ID as
+            ``update_id`` if there wasn't a new update before the timeout.
+        """
+        from reviewboard.reviews.models import ReviewRequest
+
+        cache_key = self._make_cache_key(review_request.pk)
+        deadline = time.time() + timeout
+        update = None
+
+        while True:
+            with self._cond:
+                generation = self._generation
+
+            new_update = cache.get(cache_key)
+
+            if new_update is None:
+                # The review request may have changed since it was loaded,
+                # so the update must be looked up from a fresh copy.
+                try:
+                    review_request = ReviewRequest.objects.get(
+                        pk=review_request.pk)
+                except ReviewRequest.DoesNotExist:
+                    return update
+
+                new_update = self.get_last_update(review_request)
+
+            update = new_update
+
+            if update['id'] != update_id:
+                return update
+
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                return update
+
+            with self._cond:
+                # Don't wait if the review request changed while checking.
+                if self._generation == generation:
+                    self._cond.wait(min(remaining, self.CHECK_INTERVAL_SECS))
+
+    def _make_cache_key(self, review_request_id):
+        """Return the cache key for the last update to a review request.
+
+        Args:
+            review_request_id (int):
+                The ID of the review request.
+
+        Returns:
+            unicode:
+            The cache key.
+        """
+        return make_cache_key('review-request-last-update-%s'
+                              % review_request_id)
+
+
+def _on_review_request_changed(review_request, **kwargs):
+    """Handle a review request being published, closed, or reopened.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request that changed.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    update_broker.invalidate(review_request.pk)
+
+
+def _on_review_request_saved(instance, **kwargs):
+    """Handle a review request being saved.
+
+    This covers saves made after the review request was published or closed,
+    such as when sending e-mail, which change its last updated time.
+
+    Args:
+        instance (reviewboard.reviews.models.ReviewRequest):
+            The review request that was saved.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    update_broker.invalidate(instance.pk)
+
+
+def _on_review_published(review, **kwargs):
+    """Handle a review being published.
+
+    Args:
+        review (reviewboard.reviews.models.Review):
+            The review that was published.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    update_broker.invalidate(review.review_request_id)
+
+
+def _on_reply_published(reply, **kwargs):
+    """Handle a reply being published.
+
+    Args:
+        reply (reviewboard.reviews.models.Review):
+            The reply that was published.
+
+        **kwargs (dict):
+            Additional keyword arguments provided by the signal.
+    """
+    update_broker.invalidate(reply.review_request_id)
+
+
+def connect_signals():
+    """Connect the update callbacks to signals."""
+    from reviewboard.reviews.models import Review, ReviewRequest
+    from reviewboard.reviews.signals import (reply_published,
+                                             review_published,
+                                             review_request_closed,
+                                             review_request_published,
+                                             review_request_reopened)
+
+    review_request_published.connect(_on_review_request_changed,
+                                     sender=ReviewRequest)
+    review_request_closed.connect(_on_review_request_changed,
+                                  sender=ReviewRequest)
+    review_request_reopened.connect(_on_review_request_changed,
+                                    sender=ReviewRequest)
+    review_published.connect(_on_review_published, sender=Review)
+    reply_published.connect(_on_reply_published, sender=Review)
+    post_save.connect(_on_review_request_saved, sender=ReviewRequest)
+
+
+#: The broker used for review request updates.
+update_broker = ReviewRequestUpdateBroker()
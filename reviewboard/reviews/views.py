@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 import logging
 import time
+from collections import OrderedDict
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
@@ -13,11 +14,12 @@ from django.http import (Http404,
                          HttpResponse,
                          HttpResponseNotFound,
                          HttpResponseNotModified,
-                         HttpResponseRedirect)
+                         HttpResponseRedirect,
+                         StreamingHttpResponse)
 from django.shortcuts import (get_object_or_404, get_list_or_404,
                               render_to_response)
-from django.template.context import RequestContext
-from django.template.loader import render_to_string
+from django.template.context import Context, RequestContext
+from django.template.loader import get_template, render_to_string
 from django.utils import six, timezone
 from django.utils.decorators import method_decorator
 from django.utils.html import escape
@@ -175,76 +177,182 @@ def _get_social_page_image_url(file_attachments):
     return None
 
 
+def _render_diff_comment_fragment_error(comment, e, error_template_name,
+                                        domain, domain_method):
+    """Render the error shown in place of a comment's diff fragment.
+
+    This must be called while handling the exception, so that the traceback
+    can be included.
+
+    Args:
+        comment (reviewboard.reviews.models.Comment):
+            The comment whose fragment failed to render.
+
+        e (Exception):
+            The exception raised.
+
+        error_template_name (unicode):
+            The name of the template used to render the error.
+
+        domain (unicode):
+            The domain of the server.
+
+        domain_method (unicode):
+            The URL scheme used to access the server.
+
+    Returns:
+        django.utils.safestring.SafeText:
+        The rendered error.
+    """
+    return exception_traceback_string(
+        None, e, error_template_name, {
+            'comment': comment,
+            'file': {
+                'depot_filename': comment.filediff.source_file,
+                'index': None,
+                'filediff': comment.filediff,
+            },
+            'domain': domain,
+            'domain_method': domain_method,
+        })
+
+
 def build_diff_comment_fragments(
     comments, context,
     comment_template_name='reviews/diff_comment_fragment.html',
     error_template_name='diffviewer/diff_fragment_error.html',
     lines_of_context=None,
     show_controls=False):
+    """Render the diff fragments for a list of comments.
+
+    Comments are grouped by the file (and interdiff file) they were made on.
+    The chunks for each file are loaded or generated once and shared by all
+    the comments on that file, along with the file's
+    :py:class:`~reviewboard.diffviewer.models.FileDiff` instances. The
+    fragment template is loaded once and used to render every fragment.
+
+    Args:
+        comments (list of reviewboard.reviews.models.Comment):
+            The comments to render fragments for.
+
+        context (dict):
+            The template context. This is used to cache the files for the
+            comments, and must contain ``user``.
+
+        comment_template_name (unicode, optional):
+            The name of the template used to render each fragment.
 
-    comment_entries = []
+        error_template_name (unicode, optional):
+            The name of the template used to render a fragment that failed.
+
+        lines_of_context (list of int, optional):
+            The number of lines of context to show above and below each
+            comment.
+
+        show_controls (bool, optional):
+            Whether to show controls for expanding the fragments.
+
+    Returns:
+        tuple:
+        A 2-tuple of:
+
+        * Whether any fragments failed to render (:py:class:`bool`).
+        * A list of dictionaries for each comment, in the order of
+          ``comments``, containing the ``comment``, the rendered ``html``,
+          and the ``chunks`` shown.
+    """
     had_error = False
     siteconfig = SiteConfiguration.objects.get_current()
+    domain = Site.objects.get_current().domain
+    domain_method = siteconfig.get('site_domain_method')
+    comment_template = get_template(comment_template_name)
 
     if lines_of_context is None:
         lines_of_context = [0, 0]
 
-    for comment in comments:
-        try:
-            max_line = get_last_line_number_in_diff(context, comment.filediff,
-                                                    comment.interfilediff)
+    comments = list(comments)
+    comment_entries = [None] * len(comments)
+    comments_by_file = OrderedDict()
 
-            first_line = max(1, comment.first_line - lines_of_context[0])
-            last_line = min(comment.last_line + lines_of_context[1], max_line)
-            num_lines = last_line - first_line + 1
+    for i, comment in enumerate(comments):
+        comments_by_file.setdefault(
+            (comment.filediff_id, comment.interfilediff_id),
+            []).append((i, comment))
 
-            chunks = list(get_file_chunks_in_range(context,
-                                                   comment.filediff,
-                                                   comment.interfilediff,
-                                                   first_line,
-                                                   num_lines))
+    for file_comments in six.itervalues(comments_by_file):
+        filediff = file_comments[0][1].filediff
+        interfilediff = file_comments[0][1].interfilediff
 
-            content = render_to_string(comment_template_name, {
-                'comment': comment,
-                'header': get_last_header_before_line(context,
-                                                      comment.filediff,
-                                                      comment.interfilediff,
-                                                      first_line),
-                'chunks': chunks,
-                'domain': Site.objects.get_current().domain,
-                'domain_method': siteconfig.get('site_domain_method'),
-                'lines_of_context': lines_of_context,
-                'expandable_above': show_controls and first_line != 1,
-                'expandable_below': show_controls and last_line != max_line,
-                'collapsible': lines_of_context != [0, 0],
-                'lines_above': first_line - 1,
-                'lines_below': max_line - last_line,
-                'first_line': first_line,
-            })
+        # Share the same instances between all comments on the file, so
+        # that they (and their diffsets) are only fetched once.
+        for i, comment in file_comments:
+            comment.filediff = filediff
+            comment.interfilediff = interfilediff
+
+        try:
+            max_line = get_last_line_number_in_diff(context, filediff,
+                                                    interfilediff)
         except Exception as e:
-            content = exception_traceback_string(
-                None, e, error_template_name, {
+            # None of the comments on this file can be rendered.
+            had_error = True
+
+            for i, comment in file_comments:
+                comment_entries[i] = {
                     'comment': comment,
-                    'file': {
-                        'depot_filename': comment.filediff.source_file,
-                        'index': None,
-                        'filediff': comment.filediff,
-                    },
-                    'domain': Site.objects.get_current().domain,
-                    'domain_method': siteconfig.get("site_domain_method"),
-                })
+                    'html': _render_diff_comment_fragment_error(
+                        comment, e, error_template_name, domain,
+                        domain_method),
+                    'chunks': [],
+                }
 
-            # It's bad that we failed, and we'll return a 500, but we'll
-            # still return content for anything we have. This will prevent any
-            # caching.
-            had_error = True
-            chunks = []
+            continue
 
-        comment_entries.append({
-            'comment': comment,
-            'html': content,
-            'chunks': chunks,
-        })
+        for i, comment in file_comments:
+            try:
+                first_line = max(1, comment.first_line - lines_of_context[0])
+                last_line = min(comment.last_line + lines_of_context[1],
+                                max_line)
+                num_lines = last_line - first_line + 1
+
+                chunks = list(get_file_chunks_in_range(context,
+                                                       filediff,
+                                                       interfilediff,
+                                                       first_line,
+                                                       num_lines))
+
+                content = comment_template.render(Context({
+                    'comment': comment,
+                    'header': get_last_header_before_line(context,
+                                                          filediff,
+                                                          interfilediff,
+                                                          first_line),
+                    'chunks': chunks,
+                    'domain': domain,
+                    'domain_method': domain_method,
+                    'lines_of_context': lines_of_context,
+                    'expandable_above': show_controls and first_line != 1,
+                    'expandable_below': (show_controls and
+                                         last_line != max_line),
+                    'collapsible': lines_of_context != [0, 0],
+                    'lines_above': first_line - 1,
+                    'lines_below': max_line - last_line,
+                    'first_line': first_line,
+                }))
+            except Exception as e:
+                content = _render_diff_comment_fragment_error(
+                    comment, e, error_template_name, domain, domain_method)
+
+                # It's bad that we failed, and we'll return a 500, but we'll
+                # still return content for anything we have. This will
+                # prevent any caching.
+                had_error = True
+                chunks = []
+
+            comment_entries[i] = {
+                'comment': comment,
+                'html': content,
+                'chunks': chunks,
+            }
 
     return had_error, comment_entries
 
@@ -375,9 +483,6 @@ def review_detail(request,
         except Profile.DoesNotExist:
             pass
 
-    last_activity_time, updated_object = \
-        review_request.get_last_activity(data.diffsets, data.reviews)
-
     if data.draft:
         draft_timestamp = data.draft.last_updated
     else:
@@ -386,10 +491,15 @@ def review_detail(request,
     blocks = review_request.get_blocks()
 
     # Find out if we can bail early. Generate an ETag for this.
+    #
+    # Everything shown to all users is covered by the activity version and
+    # the timestamps on the review request, so this doesn't need to look at
+    # any of the reviews or changes.
     etag = encode_etag(
-       '%s:%s:%s:%s:%s:%s:%s:%s:%s:%s' %
-       (request.user, last_activity_time, draft_timestamp,
-        data.latest_review_timestamp,
+       '%s:%s:%s:%s:%s:%s:%s:%s:%s:%s:%s' %
+       (request.user, review_request.activity_version,
+        review_request.last_updated, draft_timestamp,
+        data.latest_draft_review_timestamp,
         review_request.last_review_activity_timestamp,
         is_rich_text_default_for_user(request.user),
         [r.pk for r in blocks],
@@ -400,6 +510,9 @@ def review_detail(request,
 
     data.query_data_post_etag()
 
+    last_activity_time, updated_object = \
+        review_request.get_last_activity(data.diffsets, data.reviews)
+
     entries = []
     reviews_entry_map = {}
     changedescs_entry_map = {}
@@ -765,10 +878,11 @@ def raw_diff(request, review_request_id, revision=None, local_site=None):
     draft = review_request.get_draft(request.user)
     diffset = _query_for_diff(review_request, request.user, revision, draft)
 
+    # Stream the diff one file at a time, so that large diffs don't have to
+    # be held in memory.
     tool = review_request.repository.get_scmtool()
-    data = tool.get_parser('').raw_diff(diffset)
-
-    resp = HttpResponse(data, content_type='text/x-patch')
+    resp = StreamingHttpResponse(tool.get_parser('').iter_raw_diff(diffset),
+                                 content_type='text/x-patch')
 
     if diffset.name == 'diff':
         filename = "rb%d.patch" % review_request.display_id
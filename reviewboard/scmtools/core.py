@@ -589,6 +589,97 @@ class SCMTool(object):
         except FileNotFoundError:
             return False
 
+    def get_files(self, files, base_commit_id=None, **kwargs):
+        """Return the contents of several files from a repository.
+
+        This fetches a list of files in one operation, which can be much
+        faster than calling :py:meth:`get_file` for each one when the
+        repository is able to share a process, connection, or session
+        between them.
+
+        Each file is fetched independently. If one of them can't be fetched,
+        the exception raised for it is returned in its place, and the others
+        are still returned.
+
+        By default, this calls :py:meth:`get_file` for each file. Subclasses
+        should override this if they have a more efficient way of fetching
+        several files at once.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in. This may
+                not be provided, and is dependent on the type of repository.
+
+            **kwargs (dict):
+                Additional keyword arguments. This is not currently used, but
+                is available for future expansion.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        argspec = inspect.getargspec(self.get_file)
+        results = []
+
+        for path, revision in files:
+            try:
+                if argspec.keywords is None:
+                    data = self.get_file(path, revision)
+                else:
+                    data = self.get_file(path, revision,
+                                         base_commit_id=base_commit_id)
+            except Exception as e:
+                data = e
+
+            results.append(data)
+
+        return results
+
+    def files_exist(self, files, base_commit_id=None, **kwargs):
+        """Return whether several files exist in a repository.
+
+        This is the batched equivalent of :py:meth:`file_exists`. By default,
+        it calls :py:meth:`file_exists` for each file. Subclasses should
+        override this if they have a more efficient way of checking several
+        files at once.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in. This may
+                not be provided, and is dependent on the type of repository.
+
+            **kwargs (dict):
+                Additional keyword arguments. This is not currently used, but
+                is available for future expansion.
+
+        Returns:
+            list of bool:
+            A list with an entry for each file, in the same order as
+            ``files``, indicating whether that file exists.
+        """
+        argspec = inspect.getargspec(self.file_exists)
+        results = []
+
+        for path, revision in files:
+            if argspec.keywords is None:
+                exists = self.file_exists(path, revision)
+            else:
+                exists = self.file_exists(path, revision,
+                                          base_commit_id=base_commit_id)
+
+            results.append(exists)
+
+        return results
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, **kwargs):
         """Return a parsed filename and revision as represented in a diff.
@@ -835,7 +926,8 @@ class SCMTool(object):
         return patch
 
     @classmethod
-    def popen(cls, command, local_site_name=None):
+    def popen(cls, command, local_site_name=None, stdin=None,
+              stderr=subprocess.PIPE):
         """Launch an application and return its output.
 
         This wraps :py:func:`subprocess.Popen` to provide some common
@@ -851,6 +943,16 @@ class SCMTool(object):
             local_site_name (unicode, optional):
                 The name of the Local Site being used, if any.
 
+            stdin (int, optional):
+                The standard input for the command. Pass
+                :py:data:`subprocess.PIPE` in order to write to it.
+
+            stderr (int or file, optional):
+                The standard error for the command. This defaults to
+                :py:data:`subprocess.PIPE`. Long-running commands whose
+                error output isn't read should pass something else, so that
+                they can't block on a full pipe.
+
         Returns:
             bytes:
             The combined output (stdout and stderr) from the command.
@@ -869,7 +971,8 @@ class SCMTool(object):
 
         return subprocess.Popen(command,
                                 env=env,
-                                stderr=subprocess.PIPE,
+                                stdin=stdin,
+                                stderr=stderr,
                                 stdout=subprocess.PIPE,
                                 close_fds=(os.name != 'nt'))
 
@@ -1,9 +1,14 @@
 from __future__ import unicode_literals
 
+import atexit
+import io
 import logging
 import os
 import re
 import platform
+import subprocess
+import threading
+import time
 
 from django.utils import six
 from django.utils.six.moves.urllib.parse import (quote as urlquote,
@@ -101,6 +106,73 @@ class GitTool(SCMTool):
         except (FileNotFoundError, InvalidRevisionFormatError):
             return False
 
+    def get_files(self, files, **kwargs):
+        """Return the contents of several files from the repository.
+
+        For local repositories, all files are read through the repository's
+        long-lived :command:`git cat-file --batch` workers.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+            **kwargs (dict):
+                Additional keyword arguments. These are ignored.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        results = [b''] * len(files)
+        to_fetch = []
+
+        for i, (path, revision) in enumerate(files):
+            if revision != PRE_CREATION:
+                to_fetch.append(i)
+
+        fetched = self.client.get_files([files[i] for i in to_fetch])
+
+        for i, data in zip(to_fetch, fetched):
+            results[i] = data
+
+        return results
+
+    def files_exist(self, files, **kwargs):
+        """Return whether several files exist in the repository.
+
+        For local repositories, all files are checked through the
+        repository's long-lived :command:`git cat-file --batch-check`
+        workers.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            **kwargs (dict):
+                Additional keyword arguments. These are ignored.
+
+        Returns:
+            list of bool:
+            A list with an entry for each file, in the same order as
+            ``files``, indicating whether that file exists.
+        """
+        results = [False] * len(files)
+        to_check = []
+
+        for i, (path, revision) in enumerate(files):
+            if revision != PRE_CREATION:
+                to_check.append(i)
+
+        checked = self.client.get_files_exist([files[i] for i in to_check])
+
+        for i, exists in zip(to_check, checked):
+            results[i] = exists
+
+        return results
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, *args, **kwargs):
         revision = revision_str
@@ -149,6 +221,7 @@ class GitDiffParser(DiffParser):
     This class is able to parse diffs created with Git
     """
     pre_creation_regexp = re.compile(b"^0+$")
+    full_blob_id_regexp = re.compile(b"^[0-9a-f]{40}$")
 
     DIFF_GIT_LINE_RES = [
         # Match with a/ and b/ prefixes. Common case.
@@ -219,7 +292,7 @@ class GitDiffParser(DiffParser):
         """
         self.files = []
         i = 0
-        preamble = b''
+        preamble = []
 
         while i < len(self.lines):
             next_i, file_info, new_diff = self._parse_diff(i)
@@ -228,20 +301,20 @@ class GitDiffParser(DiffParser):
                 self._ensure_file_has_required_fields(file_info)
 
                 if preamble:
-                    file_info.data = preamble + file_info.data
-                    preamble = b''
+                    file_info.prepend_data(b''.join(preamble))
+                    preamble = []
 
                 self.files.append(file_info)
             elif new_diff:
                 # We found a diff, but it was empty and has no file entry.
                 # Reset the preamble.
-                preamble = b''
+                preamble = []
             else:
-                preamble += self.lines[i] + b'\n'
+                preamble.append(self.lines[i] + b'\n')
 
             i = next_i
 
-        if not self.files and preamble.strip() != b'':
+        if not self.files and b''.join(preamble).strip() != b'':
             # This is probably not an actual git diff file.
             raise DiffParserError('This does not appear to be a git diff', 0)
 
@@ -288,14 +361,14 @@ class GitDiffParser(DiffParser):
         headers, linenum = self._parse_extended_headers(linenum)
 
         if self._is_new_file(headers):
-            file_info.data += headers[b'new file mode'][1]
+            file_info.append_data(headers[b'new file mode'][1])
             file_info.origInfo = PRE_CREATION
         elif self._is_deleted_file(headers):
-            file_info.data += headers[b'deleted file mode'][1]
+            file_info.append_data(headers[b'deleted file mode'][1])
             file_info.deleted = True
         elif self._is_mode_change(headers):
-            file_info.data += headers[b'old mode'][1]
-            file_info.data += headers[b'new mode'][1]
+            file_info.append_data(headers[b'old mode'][1])
+            file_info.append_data(headers[b'new mode'][1])
 
         if self._is_moved_file(headers):
             file_info.origFile = headers[b'rename from'][0]
@@ -303,20 +376,20 @@ class GitDiffParser(DiffParser):
             file_info.moved = True
 
             if b'similarity index' in headers:
-                file_info.data += headers[b'similarity index'][1]
+                file_info.append_data(headers[b'similarity index'][1])
 
-            file_info.data += headers[b'rename from'][1]
-            file_info.data += headers[b'rename to'][1]
+            file_info.append_data(headers[b'rename from'][1])
+            file_info.append_data(headers[b'rename to'][1])
         elif self._is_copied_file(headers):
             file_info.origFile = headers[b'copy from'][0]
             file_info.newFile = headers[b'copy to'][0]
             file_info.copied = True
 
             if b'similarity index' in headers:
-                file_info.data += headers[b'similarity index'][1]
+                file_info.append_data(headers[b'similarity index'][1])
 
-            file_info.data += headers[b'copy from'][1]
-            file_info.data += headers[b'copy to'][1]
+            file_info.append_data(headers[b'copy from'][1])
+            file_info.append_data(headers[b'copy to'][1])
 
         # Assume by default that the change is empty. If we find content
         # later, we'll clear this.
@@ -328,10 +401,18 @@ class GitDiffParser(DiffParser):
             if '..' in index_range:
                 file_info.origInfo, file_info.newInfo = index_range.split("..")
 
+                # A full blob ID identifies the content of the file after
+                # the change, which lets interdiffs skip files that end up
+                # the same without fetching them. Abbreviated IDs could
+                # collide, so they aren't used.
+                if (self.full_blob_id_regexp.match(file_info.newInfo) and
+                    not self.pre_creation_regexp.match(file_info.newInfo)):
+                    file_info.patched_content_id = file_info.newInfo
+
             if self.pre_creation_regexp.match(file_info.origInfo):
                 file_info.origInfo = PRE_CREATION
 
-            file_info.data += headers[b'index'][1]
+            file_info.append_data(headers[b'index'][1])
 
         # Get the changes
         while linenum < len(self.lines):
@@ -339,7 +420,7 @@ class GitDiffParser(DiffParser):
                 break
             elif self._is_binary_patch(linenum):
                 file_info.binary = True
-                file_info.data += self.lines[linenum] + b"\n"
+                file_info.append_data(self.lines[linenum] + b"\n")
                 empty_change = False
                 linenum += 1
                 break
@@ -380,8 +461,8 @@ class GitDiffParser(DiffParser):
                 else:
                     file_info.newFile = new_filename
 
-                file_info.data += orig_line + b'\n'
-                file_info.data += new_line + b'\n'
+                file_info.append_data(orig_line + b'\n')
+                file_info.append_data(new_line + b'\n')
                 linenum += 2
             else:
                 empty_change = False
@@ -488,6 +569,411 @@ class GitDiffParser(DiffParser):
                 setattr(file_info, attr, b'')
 
 
+class GitCatFileWorker(object):
+    """A long-lived git-cat-file(1) process.
+
+    The process is started in ``--batch`` or ``--batch-check`` mode, and
+    object names are written to it one at a time, with the results read
+    back before the next one is written. This lets any number of objects be
+    looked up without starting a new process for each.
+    """
+
+    def __init__(self, git_dir, option, local_site_name=None):
+        """Start the worker.
+
+        Args:
+            git_dir (unicode):
+                The path to the Git repository.
+
+            option (unicode):
+                Either ``--batch`` (to fetch object contents) or
+                ``--batch-check`` (to only fetch object types).
+
+            local_site_name (unicode, optional):
+                The name of the Local Site the repository belongs to.
+        """
+        self.option = option
+        self.last_used = time.time()
+
+        # Nothing reads the error output of this long-lived process, so it's
+        # discarded. Otherwise, warnings (such as for ambiguous refnames)
+        # could fill the pipe and leave git, and the lookup, blocked.
+        with open(os.devnull, 'wb') as devnull:
+            self.process = SCMTool.popen(
+                ['git', '--git-dir=%s' % git_dir, 'cat-file', option],
+                local_site_name=local_site_name,
+                stdin=subprocess.PIPE,
+                stderr=devnull)
+
+        # The pipes returned by SCMTool.popen are unbuffered, which would
+        # make reading each header a byte at a time.
+        self._stdout = io.open(self.process.stdout.fileno(), 'rb',
+                               closefd=False)
+
+    @property
+    def is_alive(self):
+        """Whether the git-cat-file(1) process is still running."""
+        return self.process.poll() is None
+
+    def lookup(self, commit):
+        """Look up an object.
+
+        Args:
+            commit (unicode):
+                The name of the object to look up.
+
+        Returns:
+            tuple:
+            ``None`` if the object doesn't exist, or a ``(type, contents)``
+            tuple otherwise, where ``contents`` is ``None`` for
+            ``--batch-check``.
+
+        Raises:
+            IOError:
+                The process couldn't be communicated with, or it exited
+                unexpectedly.
+        """
+        self.process.stdin.write(commit.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+
+        header = self._stdout.readline()
+
+        if not header.endswith(b'\n'):
+            raise IOError('git cat-file exited unexpectedly')
+
+        header = header[:-1]
+
+        if header.endswith((b' missing', b' ambiguous')):
+            return None
+
+        parts = header.split(b' ')
+
+        if len(parts) != 3:
+            raise IOError('Unexpected output from git cat-file: %r' % header)
+
+        if self.option == '--batch':
+            size = int(parts[2])
+            contents = self._stdout.read(size + 1)
+
+            if len(contents) != size + 1:
+                raise IOError('git cat-file exited unexpectedly')
+
+            contents = contents[:-1]
+        else:
+            contents = None
+
+        return parts[1], contents
+
+    def close(self):
+        """Stop the worker.
+
+        git-cat-file(1) exits once its input is closed.
+        """
+        try:
+            self._stdout.close()
+            self.process.stdin.close()
+            self.process.stdout.close()
+        except (IOError, OSError):
+            pass
+
+        try:
+            self.process.wait()
+        except OSError:
+            pass
+
+
+class GitCatFilePool(object):
+    """A pool of long-lived git-cat-file(1) workers for a repository.
+
+    Workers are started as needed, up to :py:attr:`max_workers` at once.
+    Callers beyond that wait for a worker to be returned to the pool. Workers
+    that have been idle for longer than :py:attr:`idle_timeout` seconds are
+    stopped, and workers that crash are replaced.
+
+    Pools are shared between all :py:class:`GitClient` instances for a
+    repository. Use :py:func:`get_git_cat_file_pool` to retrieve one.
+    """
+
+    #: The default maximum number of workers running at once.
+    DEFAULT_MAX_WORKERS = 4
+
+    #: The default number of seconds a worker can be idle before it's stopped.
+    DEFAULT_IDLE_TIMEOUT = 60
+
+    def __init__(self, git_dir, option, local_site_name=None,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """Initialize the pool.
+
+        Args:
+            git_dir (unicode):
+                The path to the Git repository.
+
+            option (unicode):
+                Either ``--batch`` or ``--batch-check``.
+
+            local_site_name (unicode, optional):
+                The name of the Local Site the repository belongs to.
+
+            max_workers (int, optional):
+                The maximum number of workers running at once.
+
+            idle_timeout (int, optional):
+                The number of seconds a worker can be idle before it's
+                stopped.
+        """
+        self.git_dir = git_dir
+        self.option = option
+        self.local_site_name = local_site_name
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.pid = os.getpid()
+
+        self._idle_workers = []
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_workers)
+        self._reap_timer = None
+
+    def lookup(self, commits):
+        """Look up several objects.
+
+        Args:
+            commits (list of unicode):
+                The names of the objects to look up.
+
+        Returns:
+            list:
+            A list with an entry for each object, in order. Each entry is
+            ``None`` if the object doesn't exist, or a ``(type, contents)``
+            tuple otherwise, where ``contents`` is ``None`` for
+            ``--batch-check``.
+
+        Raises:
+            reviewboard.scmtools.errors.SCMError:
+                git-cat-file(1) failed, even after restarting it.
+        """
+        worker = self._acquire()
+        results = []
+
+        try:
+            for commit in commits:
+                try:
+                    result = worker.lookup(commit)
+                except (IOError, OSError, ValueError) as e:
+                    # The worker has crashed or gotten out of sync. Replace
+                    # it and try once more.
+                    logging.warning('git cat-file worker for %s failed '
+                                    '(%s); restarting it',
+                                    self.git_dir, e)
+                    worker.close()
+                    worker = None
+                    worker = self._start_worker()
+
+                    try:
+                        result = worker.lookup(commit)
+                    except (IOError, OSError, ValueError) as e:
+                        worker.close()
+                        worker = None
+
+                        raise SCMError('Unable to read %s from %s: %s'
+                                       % (commit, self.git_dir, e))
+
+                results.append(result)
+        finally:
+            self._release(worker)
+
+        return results
+
+    def close(self):
+        """Stop all idle workers."""
+        with self._lock:
+            workers = self._idle_workers
+            self._idle_workers = []
+
+            if self._reap_timer is not None:
+                self._reap_timer.cancel()
+                self._reap_timer = None
+
+        for worker in workers:
+            worker.close()
+
+    def _start_worker(self):
+        """Start a new worker.
+
+        Returns:
+            GitCatFileWorker:
+            The new worker.
+
+        Raises:
+            reviewboard.scmtools.errors.SCMError:
+                The worker could not be started.
+        """
+        try:
+            return GitCatFileWorker(self.git_dir, self.option,
+                                    self.local_site_name)
+        except OSError as e:
+            raise SCMError('Unable to run git cat-file: %s' % e)
+
+    def _acquire(self):
+        """Return a worker from the pool, starting one if needed.
+
+        This will wait if :py:attr:`max_workers` workers are already in use.
+
+        Returns:
+            GitCatFileWorker:
+            The worker.
+        """
+        self._semaphore.acquire()
+
+        try:
+            with self._lock:
+                expired = self._pop_expired_workers()
+                worker = None
+
+                while self._idle_workers:
+                    candidate = self._idle_workers.pop()
+
+                    if candidate.is_alive:
+                        worker = candidate
+                        break
+
+                    expired.append(candidate)
+
+            for expired_worker in expired:
+                expired_worker.close()
+
+            if worker is None:
+                worker = self._start_worker()
+
+            return worker
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    def _release(self, worker):
+        """Return a worker to the pool.
+
+        Args:
+            worker (GitCatFileWorker):
+                The worker to return. This may be ``None`` if the worker
+                failed and was closed.
+        """
+        try:
+            if worker is not None:
+                worker.last_used = time.time()
+
+                with self._lock:
+                    self._idle_workers.append(worker)
+                    self._schedule_reap()
+        finally:
+            self._semaphore.release()
+
+    def _pop_expired_workers(self):
+        """Remove and return idle workers that have timed out.
+
+        This must be called with the lock held.
+
+        Returns:
+            list of GitCatFileWorker:
+            The workers that have timed out. These must be closed by the
+            caller.
+        """
+        cutoff = time.time() - self.idle_timeout
+        expired = [
+            worker
+            for worker in self._idle_workers
+            if worker.last_used <= cutoff
+        ]
+
+        if expired:
+            self._idle_workers = [
+                worker
+                for worker in self._idle_workers
+                if worker.last_used > cutoff
+            ]
+
+        return expired
+
+    def _schedule_reap(self):
+        """Schedule stopping idle workers once they time out.
+
+        This must be called with the lock held.
+        """
+        if self._reap_timer is None and self._idle_workers:
+            self._reap_timer = threading.Timer(self.idle_timeout,
+                                               self._reap)
+            self._reap_timer.daemon = True
+            self._reap_timer.start()
+
+    def _reap(self):
+        """Stop idle workers that have timed out."""
+        with self._lock:
+            self._reap_timer = None
+            expired = self._pop_expired_workers()
+            self._schedule_reap()
+
+        for worker in expired:
+            worker.close()
+
+
+_cat_file_pools = {}
+_cat_file_pools_lock = threading.Lock()
+
+
+def get_git_cat_file_pool(git_dir, option, local_site_name=None):
+    """Return the git-cat-file(1) worker pool for a repository.
+
+    Pools are created on first use. If the process has forked since a pool
+    was created, the pool's workers belong to the parent process, so a new
+    pool is created.
+
+    Args:
+        git_dir (unicode):
+            The path to the Git repository.
+
+        option (unicode):
+            Either ``--batch`` (to fetch object contents) or
+            ``--batch-check`` (to only fetch object types).
+
+        local_site_name (unicode, optional):
+            The name of the Local Site the repository belongs to.
+
+    Returns:
+        GitCatFilePool:
+        The pool for the repository.
+    """
+    key = (git_dir, option, local_site_name)
+
+    with _cat_file_pools_lock:
+        pool = _cat_file_pools.get(key)
+
+        if pool is None or pool.pid != os.getpid():
+            pool = GitCatFilePool(git_dir, option, local_site_name)
+            _cat_file_pools[key] = pool
+
+    return pool
+
+
+def close_git_cat_file_pools():
+    """Stop the idle workers in all git-cat-file(1) worker pools.
+
+    This is called automatically when the process exits.
+    """
+    with _cat_file_pools_lock:
+        pools = [
+            pool
+            for pool in six.itervalues(_cat_file_pools)
+            if pool.pid == os.getpid()
+        ]
+        _cat_file_pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_git_cat_file_pools)
+
+
 class GitClient(SCMClient):
     FULL_SHA1_LENGTH = 40
 
@@ -573,7 +1059,12 @@ class GitClient(SCMClient):
             return self.get_file_http(self._build_raw_url(path, revision),
                                       path, revision)
         else:
-            return self._cat_file(path, revision, "blob")
+            data = self.get_files([(path, revision)])[0]
+
+            if isinstance(data, Exception):
+                raise data
+
+            return data
 
     def get_file_exists(self, path, revision):
         if self.raw_file_url:
@@ -588,8 +1079,97 @@ class GitClient(SCMClient):
             except Exception:
                 return False
         else:
-            contents = self._cat_file(path, revision, "-t")
-            return contents and contents.strip() == "blob"
+            return self.get_files_exist([(path, revision)])[0]
+
+    def get_files(self, files):
+        """Return the contents of several files.
+
+        Local repositories read all the files through a long-lived
+        :command:`git cat-file --batch` worker. Files in remote repositories
+        are fetched one at a time from the raw file URL.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        if self.raw_file_url:
+            results = []
+
+            for path, revision in files:
+                try:
+                    data = self.get_file(path, revision)
+                except Exception as e:
+                    data = e
+
+                results.append(data)
+
+            return results
+
+        results = self._resolve_heads(files)
+        to_fetch = [
+            i
+            for i, commit in enumerate(results)
+            if not isinstance(commit, Exception)
+        ]
+        infos = self._cat_file_batch([results[i] for i in to_fetch],
+                                     '--batch')
+
+        for i, info in zip(to_fetch, infos):
+            commit = results[i]
+
+            if info is None:
+                results[i] = FileNotFoundError(commit)
+            elif info[0] != b'blob':
+                results[i] = SCMError('fatal: git cat-file %s: bad file'
+                                      % commit)
+            else:
+                results[i] = info[1]
+
+        return results
+
+    def get_files_exist(self, files):
+        """Return whether several files exist.
+
+        Local repositories check all the files through a long-lived
+        :command:`git cat-file --batch-check` worker. Files in remote
+        repositories are checked one at a time through the raw file URL.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+        Returns:
+            list of bool:
+            A list with an entry for each file, in the same order as
+            ``files``, indicating whether that file exists.
+        """
+        if self.raw_file_url:
+            return [
+                self.get_file_exists(path, revision)
+                for path, revision in files
+            ]
+
+        commits = self._resolve_heads(files)
+        to_check = [
+            i
+            for i, commit in enumerate(commits)
+            if not isinstance(commit, Exception)
+        ]
+        infos = self._cat_file_batch([commits[i] for i in to_check],
+                                     '--batch-check')
+        results = [False] * len(files)
+
+        for i, info in zip(to_check, infos):
+            results[i] = info is not None and info[0] == b'blob'
+
+        return results
 
     def validate_sha1_format(self, path, sha1):
         """Validates that a SHA1 is of the right length for this repository."""
@@ -607,32 +1187,65 @@ class GitClient(SCMClient):
         url = url.replace("<filename>", urlquote(path))
         return url
 
-    def _cat_file(self, path, revision, option):
+    def _cat_file_batch(self, commits, option):
+        """Look up several objects through git-cat-file(1).
+
+        The objects are looked up through the repository's pool of
+        long-lived git-cat-file(1) workers.
+
+        Args:
+            commits (list of unicode):
+                The names of the objects to look up.
+
+            option (unicode):
+                Either ``--batch`` (to fetch object contents) or
+                ``--batch-check`` (to only fetch object types).
+
+        Returns:
+            list:
+            A list with an entry for each object, in order. Each entry is
+            ``None`` if the object doesn't exist, or a ``(type, contents)``
+            tuple otherwise, where ``contents`` is ``None`` for
+            ``--batch-check``.
+
+        Raises:
+            reviewboard.scmtools.errors.SCMError:
+                git-cat-file(1) failed.
         """
-        Call git-cat-file(1) to get content or type information for a
-        repository object.
+        if not commits:
+            return []
 
-        If called with just "commit", gets the content of a blob (or
-        raises an exception if the commit is not a blob).
+        pool = get_git_cat_file_pool(self.git_dir, option,
+                                     self.local_site_name)
 
-        Otherwise, "option" can be used to pass a switch to git-cat-file,
-        e.g. to test or existence or get the type of "commit".
+        return pool.lookup(commits)
+
+    def _resolve_heads(self, files):
+        """Return the object names for several files.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples.
+
+        Returns:
+            list:
+            A list with an entry for each file, in order. Each entry is either
+            the object name, or the exception raised when resolving it.
         """
-        commit = self._resolve_head(revision, path)
+        commits = []
 
-        p = self._run_git(['--git-dir=%s' % self.git_dir, 'cat-file',
-                           option, commit])
-        contents = p.stdout.read()
-        errmsg = six.text_type(p.stderr.read())
-        failure = p.wait()
+        for path, revision in files:
+            try:
+                commit = self._resolve_head(revision, path)
 
-        if failure:
-            if errmsg.startswith("fatal: Not a valid object name"):
-                raise FileNotFoundError(commit)
-            else:
-                raise SCMError(errmsg)
+                if '\n' in commit:
+                    raise FileNotFoundError(path, revision)
+            except SCMError as e:
+                commit = e
+
+            commits.append(commit)
 
-        return contents
+        return commits
 
     def _resolve_head(self, revision, path):
         if revision == HEAD:
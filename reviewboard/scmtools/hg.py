@@ -2,6 +2,10 @@ from __future__ import unicode_literals
 
 import json
 import logging
+import os
+import posixpath
+import shutil
+import tempfile
 from datetime import datetime
 
 from django.utils import six
@@ -50,6 +54,39 @@ class HgTool(SCMTool):
             six.text_type(revision),
             base_commit_id=base_commit_id)
 
+    def get_files(self, files, base_commit_id=None, **kwargs):
+        """Return the contents of several files from the repository.
+
+        For local repositories, this runs one :command:`hg cat` for each
+        distinct revision, rather than one for each file.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in.
+
+            **kwargs (dict):
+                Additional keyword arguments. These are ignored.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        if base_commit_id is not None:
+            base_commit_id = six.text_type(base_commit_id)
+
+        return self.client.cat_files(
+            [
+                (path, six.text_type(revision))
+                for path, revision in files
+            ],
+            base_commit_id=base_commit_id)
+
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         revision = revision_str
         if file_str == "/dev/null":
@@ -291,6 +328,38 @@ class HgWebClient(SCMClient):
 
         raise FileNotFoundError(path, rev)
 
+    def cat_files(self, files, base_commit_id=None):
+        """Return the contents of several files.
+
+        hgweb has no way of returning several files at once, so this fetches
+        each one in turn.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        results = []
+
+        for path, rev in files:
+            try:
+                data = self.cat_file(path, rev, base_commit_id=base_commit_id)
+            except Exception as e:
+                data = e
+
+            results.append(data)
+
+        return results
+
     def get_branches(self):
         """Return open/inactive branches from hgweb in JSON.
 
@@ -464,6 +533,99 @@ class HgClient(SCMClient):
 
         raise FileNotFoundError(path, rev)
 
+    def cat_files(self, files, base_commit_id=None):
+        """Return the contents of several files.
+
+        Files are grouped by revision, and each group is written out by a
+        single :command:`hg cat` into a temporary directory.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in. If
+                provided, this overrides the revisions of all files.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        results = [None] * len(files)
+        files_by_rev = {}
+
+        for i, (path, rev) in enumerate(files):
+            # If the base commit id is provided it should override anything
+            # that was parsed from the diffs.
+            if rev != PRE_CREATION and base_commit_id is not None:
+                rev = base_commit_id
+
+            if rev == HEAD:
+                rev = 'tip'
+            elif rev == PRE_CREATION:
+                rev = ''
+
+            if path:
+                files_by_rev.setdefault(rev, []).append(i)
+            else:
+                results[i] = FileNotFoundError(path, rev)
+
+        if not files_by_rev:
+            return results
+
+        tempdir = tempfile.mkdtemp(prefix='reviewboard-hg.')
+
+        try:
+            for rev_num, (rev, indexes) in \
+                    enumerate(six.iteritems(files_by_rev)):
+                rev_dir = os.path.join(tempdir, '%d' % rev_num)
+                filenames = {}
+
+                for i in indexes:
+                    path = files[i][0]
+                    norm_path = posixpath.normpath(path.lstrip('/'))
+
+                    if norm_path == '..' or norm_path.startswith('../'):
+                        results[i] = FileNotFoundError(path, rev)
+                        continue
+
+                    # Older versions of hg cat don't create directories for
+                    # --output, so they have to exist beforehand.
+                    filename = os.path.join(rev_dir, norm_path)
+                    dirname = os.path.dirname(filename)
+
+                    if not os.path.isdir(dirname):
+                        os.makedirs(dirname)
+
+                    filenames[i] = filename
+
+                if not filenames:
+                    continue
+
+                # hg cat exits with an error if any of the files are missing,
+                # but still writes out the rest, so the exit code is ignored.
+                # Missing files are found below instead.
+                p = self._run_hg(
+                    ['cat', '--rev', rev,
+                     '--output', os.path.join(rev_dir, '%p'),
+                     '--'] +
+                    [files[i][0] for i in filenames])
+                p.communicate()
+
+                for i, filename in six.iteritems(filenames):
+                    try:
+                        with open(filename, 'rb') as fp:
+                            results[i] = fp.read()
+                    except IOError:
+                        results[i] = FileNotFoundError(files[i][0], rev)
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+        return results
+
     def get_branches(self):
         """Return open/inactive branches from repository in JSON.
 
@@ -20,6 +20,7 @@ from django.utils.translation import ugettext_lazy as _
 from djblets.cache.backend import cache_memoize, make_cache_key
 from djblets.db.fields import JSONField
 from djblets.log import log_timed
+from djblets.siteconfig.models import SiteConfiguration
 
 from reviewboard.hostingsvcs.models import HostingServiceAccount
 from reviewboard.hostingsvcs.service import get_hosting_service
@@ -364,6 +365,71 @@ class Repository(models.Model):
                                              request)],
             large_data=True)[0]
 
+    def get_files(self, files, base_commit_id=None, request=None):
+        """Return several files from the repository.
+
+        This is the batched equivalent of :py:meth:`get_file`. Files that are
+        already in the cache are returned from there, and the rest are
+        fetched in one operation through
+        :py:meth:`SCMTool.get_files() <reviewboard.scmtools.core.SCMTool.
+        get_files>` (or one at a time, if the repository is backed by a
+        hosting service). Fetched files are then cached just as they would be
+        by :py:meth:`get_file`.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to fetch.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client, for use in logging.
+
+        Returns:
+            list:
+            A list with an entry for each file, in the same order as
+            ``files``. Each entry is either the file contents (as
+            :py:class:`bytes`) or the exception raised when fetching that
+            file.
+        """
+        results = [None] * len(files)
+        uncached = []
+
+        for i, (path, revision) in enumerate(files):
+            key = self._make_file_cache_key(path, revision, base_commit_id)
+
+            if make_cache_key(key) in cache:
+                try:
+                    results[i] = self.get_file(path, revision,
+                                               base_commit_id=base_commit_id,
+                                               request=request)
+                except Exception as e:
+                    results[i] = e
+            else:
+                uncached.append(i)
+
+        if uncached:
+            fetched = self._get_files_uncached(
+                [files[i] for i in uncached],
+                base_commit_id,
+                request)
+
+            for i, data in zip(uncached, fetched):
+                if not isinstance(data, Exception):
+                    path, revision = files[i]
+
+                    # See get_file for why this is wrapped in a list.
+                    cache_memoize(
+                        self._make_file_cache_key(path, revision,
+                                                  base_commit_id),
+                        lambda: [data],
+                        large_data=True)
+
+                results[i] = data
+
+        return results
+
     def get_file_exists(self, path, revision, base_commit_id=None,
                         request=None):
         """Returns whether or not a file exists in the repository.
@@ -388,6 +454,72 @@ class Repository(models.Model):
 
         return exists
 
+    def get_files_exist(self, files, base_commit_id=None, request=None):
+        """Return whether several files exist in the repository.
+
+        This is the batched equivalent of :py:meth:`get_file_exists`. Files
+        already known to exist are looked up in the cache, and the rest are
+        checked in one operation through
+        :py:meth:`SCMTool.files_exist() <reviewboard.scmtools.core.SCMTool.
+        files_exist>`. If the repository is backed by a hosting service, the
+        files are checked through :py:meth:`HostingService.get_files_exist()
+        <reviewboard.hostingsvcs.service.HostingService.get_files_exist>`,
+        several at a time, up to the ``diffviewer_file_exists_workers`` site
+        configuration setting. Each distinct file is only checked once.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit that the files were changed in.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client, for use in logging.
+
+        Returns:
+            list of bool:
+            A list with an entry for each file, in the same order as
+            ``files``, indicating whether that file exists.
+        """
+        results = [False] * len(files)
+        unchecked = []
+        unchecked_indexes = {}
+
+        for i, (path, revision) in enumerate(files):
+            exists_key = make_cache_key(
+                self._make_file_exists_cache_key(path, revision,
+                                                 base_commit_id))
+            file_key = make_cache_key(
+                self._make_file_cache_key(path, revision, base_commit_id))
+
+            if cache.get(exists_key) == '1' or file_key in cache:
+                results[i] = True
+            elif (path, revision) in unchecked_indexes:
+                # The same file may appear more than once (for instance, in
+                # both a diff and its parent diff). Only check it once.
+                unchecked_indexes[(path, revision)].append(i)
+            else:
+                unchecked.append((path, revision))
+                unchecked_indexes[(path, revision)] = [i]
+
+        if unchecked:
+            checked = self._get_files_exist_uncached(unchecked,
+                                                     base_commit_id,
+                                                     request)
+
+            for (path, revision), exists in zip(unchecked, checked):
+                if exists:
+                    cache_memoize(
+                        self._make_file_exists_cache_key(path, revision,
+                                                         base_commit_id),
+                        lambda: '1')
+
+                for i in unchecked_indexes[(path, revision)]:
+                    results[i] = exists
+
+        return results
+
     def get_branches(self):
         """Returns a list of branches."""
         hosting_service = self.hosting_service
@@ -568,6 +700,94 @@ class Repository(models.Model):
 
         return data
 
+    def _get_files_uncached(self, files, base_commit_id, request):
+        """Internal function for fetching several uncached files.
+
+        This is called by get_files for the files that aren't already in the
+        cache.
+        """
+        for path, revision in files:
+            fetching_file.send(sender=self,
+                               path=path,
+                               revision=revision,
+                               base_commit_id=base_commit_id,
+                               request=request)
+
+        log_timer = log_timed('Fetching %d files from %s'
+                              % (len(files), self),
+                              request=request)
+
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            results = []
+
+            for path, revision in files:
+                try:
+                    data = hosting_service.get_file(
+                        self,
+                        path,
+                        revision,
+                        base_commit_id=base_commit_id)
+                except Exception as e:
+                    data = e
+
+                results.append(data)
+        else:
+            results = self.get_scmtool().get_files(
+                files,
+                base_commit_id=base_commit_id)
+
+        log_timer.done()
+
+        for (path, revision), data in zip(files, results):
+            if not isinstance(data, Exception):
+                fetched_file.send(sender=self,
+                                  path=path,
+                                  revision=revision,
+                                  base_commit_id=base_commit_id,
+                                  request=request,
+                                  data=data)
+
+        return results
+
+    def _get_files_exist_uncached(self, files, base_commit_id, request):
+        """Internal function for checking that several files exist.
+
+        This is called by get_files_exist for the files that aren't already
+        known to exist.
+        """
+        for path, revision in files:
+            checking_file_exists.send(sender=self,
+                                      path=path,
+                                      revision=revision,
+                                      base_commit_id=base_commit_id,
+                                      request=request)
+
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            siteconfig = SiteConfiguration.objects.get_current()
+            results = hosting_service.get_files_exist(
+                self,
+                files,
+                base_commit_id=base_commit_id,
+                max_workers=siteconfig.get('diffviewer_file_exists_workers'))
+        else:
+            results = self.get_scmtool().files_exist(
+                files,
+                base_commit_id=base_commit_id)
+
+        for (path, revision), exists in zip(files, results):
+            checked_file_exists.send(sender=self,
+                                     path=path,
+                                     revision=revision,
+                                     base_commit_id=base_commit_id,
+                                     request=request,
+                                     exists=exists)
+
+        return results
+
     def _get_file_exists_uncached(self, path, revision, base_commit_id,
                                   request):
         """Internal function for checking that a file exists.
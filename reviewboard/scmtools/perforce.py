@@ -310,6 +310,34 @@ class PerforceClient(object):
         """
         return self._run_worker(lambda: self._get_file(path, revision))
 
+    def _get_files(self, files):
+        from P4 import P4Exception
+
+        results = []
+
+        for path, revision in files:
+            try:
+                try:
+                    data = self._get_file(path, revision)
+                except P4Exception as e:
+                    self._convert_p4exception_to_scmexception(e)
+            except Exception as e:
+                data = e
+
+            results.append(data)
+
+        return results
+
+    def get_files(self, files):
+        """
+        Get the contents of several files over a single connection.
+
+        The result is a list with an entry for each (path, revision) tuple in
+        files, containing either the file contents or the exception raised
+        when fetching that file.
+        """
+        return self._run_worker(lambda: self._get_files(files))
+
     def _get_files_at_revision(self, revision_str):
         return self.p4.run_files(revision_str)
 
@@ -439,6 +467,9 @@ class PerforceTool(SCMTool):
     def get_file(self, path, revision=HEAD, **kwargs):
         return self.client.get_file(path, revision)
 
+    def get_files(self, files, **kwargs):
+        return self.client.get_files(files)
+
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         # Perforce has this lovely idiosyncracy that diffs show revision #1
         # both for pre-creation and when there's an actual revision.
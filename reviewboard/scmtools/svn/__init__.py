@@ -157,6 +157,9 @@ class SVNTool(SCMTool):
     def get_file(self, path, revision=HEAD, **kwargs):
         return self.client.get_file(path, revision)
 
+    def get_files(self, files, **kwargs):
+        return self.client.get_files(files)
+
     def get_keywords(self, path, revision=HEAD):
         return self.client.get_keywords(path, revision)
 
@@ -47,6 +47,28 @@ class Client(object):
         """Returns the contents of a given file at the given revision."""
         raise NotImplementedError
 
+    def get_files(self, files):
+        """Returns the contents of several files.
+
+        ``files`` is a list of ``(path, revision)`` tuples. The result is a
+        list with an entry for each file, in the same order, containing
+        either the file contents or the exception raised when fetching that
+        file.
+
+        By default, this fetches each file in turn using the same client.
+        """
+        results = []
+
+        for path, revision in files:
+            try:
+                data = self.get_file(path, revision)
+            except Exception as e:
+                data = e
+
+            results.append(data)
+
+        return results
+
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
         raise NotImplementedError
@@ -83,6 +83,59 @@ class Client(base.Client):
             contents = self.collapse_keywords(contents, keywords)
         return contents
 
+    def get_files(self, files):
+        """Returns the contents of several files.
+
+        All files are fetched over a single RA session, which also returns
+        each file's properties, so keywords don't need to be looked up
+        separately.
+        """
+        try:
+            session = ra.RemoteAccess(self.repopath, auth=self.auth)
+        except SubversionException as e:
+            logging.debug('SVN: Unable to open an RA session for %s, '
+                          'fetching files individually: %s',
+                          self.repopath, e)
+            return super(Client, self).get_files(files)
+
+        results = []
+
+        for path, revision in files:
+            try:
+                results.append(self._get_file_from_session(session, path,
+                                                           revision))
+            except Exception as e:
+                results.append(e)
+
+        return results
+
+    def _get_file_from_session(self, session, path, revision):
+        """Returns the contents of a file using an existing RA session."""
+        if not path:
+            raise FileNotFoundError(path, revision)
+
+        if revision == HEAD:
+            revnum = -1
+        else:
+            revnum = self._normalize_revision(revision)
+
+        normpath = B(self.normalize_path(path))
+        relpath = normpath[len(self.repopath):].lstrip(B('/'))
+        data = six.BytesIO()
+
+        try:
+            fetched_rev, props = session.get_file(relpath, data, revnum)
+        except SubversionException as e:
+            raise FileNotFoundError(path, revision, detail=six.text_type(e))
+
+        contents = data.getvalue()
+        keywords = props.get(SVN_KEYWORDS)
+
+        if keywords:
+            contents = self.collapse_keywords(contents, keywords)
+
+        return contents
+
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
         revnum = self._normalize_revision(revision, negatives_allowed=False)
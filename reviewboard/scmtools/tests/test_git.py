@@ -2,15 +2,21 @@
 from __future__ import unicode_literals
 
 import os
+import threading
+import time
 
 import nose
 from django.utils import six
+from djblets.util.filesystem import is_exe_in_path
 from kgb import SpyAgency
 
 from reviewboard.diffviewer.parser import DiffParserError
-from reviewboard.scmtools.core import PRE_CREATION
+from reviewboard.scmtools.core import HEAD, PRE_CREATION
 from reviewboard.scmtools.errors import SCMError, FileNotFoundError
-from reviewboard.scmtools.git import ShortSHA1Error, GitClient
+from reviewboard.scmtools.git import (GitCatFilePool, GitClient,
+                                      ShortSHA1Error,
+                                      close_git_cat_file_pools,
+                                      get_git_cat_file_pool)
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.tests.testcases import SCMTestCase
 
@@ -47,6 +53,11 @@ class GitTests(SpyAgency, SCMTestCase):
         except ImportError:
             raise nose.SkipTest('git binary not found')
 
+    def tearDown(self):
+        super(GitTests, self).tearDown()
+
+        close_git_cat_file_pools()
+
     def _read_fixture(self, filename):
         filename = os.path.join(os.path.dirname(__file__),
                                 '..', 'testdata', filename)
@@ -803,6 +814,49 @@ class GitTests(SpyAgency, SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('readme', '0000000'))
 
+    def test_get_files(self):
+        """Testing GitTool.get_files"""
+        results = self.tool.get_files([
+            ('readme', 'e965047'),
+            ('readme', PRE_CREATION),
+            ('readme', 'd6613f5'),
+            ('readme', '0000000'),
+            ('readme', 'a62df6c'),
+            ('', HEAD),
+            ('readme', HEAD),
+        ])
+
+        self.assertEqual(len(results), 7)
+        self.assertEqual(results[0], b'Hello\n')
+        self.assertEqual(results[1], b'')
+        self.assertEqual(results[2], b'Hello there\n')
+        self.assertIsInstance(results[3], FileNotFoundError)
+        self.assertIsInstance(results[4], SCMError)
+        self.assertIsInstance(results[5], SCMError)
+        self.assertEqual(results[6], b'Hello there\n')
+
+        # Everything should have been read through one worker.
+        pool = get_git_cat_file_pool(self.tool.client.git_dir, '--batch')
+        self.assertEqual(len(pool._idle_workers), 1)
+
+    def test_files_exist(self):
+        """Testing GitTool.files_exist"""
+        self.assertEqual(
+            self.tool.files_exist([
+                ('readme', 'e965047'),
+                ('readme', PRE_CREATION),
+                ('readme', 'fffffff'),
+                ('readme', 'd6613f5'),
+                ('readme', 'a62df6c'),
+                ('readme2', 'ccffbb4'),
+            ]),
+            [True, False, False, True, False, False])
+
+        # Everything should have been checked through one worker.
+        pool = get_git_cat_file_pool(self.tool.client.git_dir,
+                                     '--batch-check')
+        self.assertEqual(len(pool._idle_workers), 1)
+
     def test_parse_diff_revision_with_remote_and_short_SHA1_error(self):
         """Testing GitTool.parse_diff_revision with remote files and short
         SHA1 error
@@ -872,3 +926,132 @@ class GitTests(SpyAgency, SCMTestCase):
         # Does not exist when raw_file_url changed because it is not cached.
         self.assertFalse(self.remote_repository.get_file_exists('PATH',
                                                                 'd7e96b3'))
+
+
+class GitCatFilePoolTests(SCMTestCase):
+    """Unit tests for reviewboard.scmtools.git.GitCatFilePool."""
+
+    def setUp(self):
+        super(GitCatFilePoolTests, self).setUp()
+
+        if not is_exe_in_path('git'):
+            raise nose.SkipTest('git binary not found')
+
+        self.git_dir = os.path.join(os.path.dirname(__file__), '..',
+                                    'testdata', 'git_repo')
+
+    def tearDown(self):
+        super(GitCatFilePoolTests, self).tearDown()
+
+        close_git_cat_file_pools()
+
+    def test_lookup(self):
+        """Testing GitCatFilePool.lookup"""
+        pool = GitCatFilePool(self.git_dir, '--batch')
+
+        self.assertEqual(
+            pool.lookup(['e965047', '0000000', 'HEAD:readme']),
+            [(b'blob', b'Hello\n'), None, (b'blob', b'Hello there\n')])
+
+        pool.close()
+
+    def test_lookup_with_batch_check(self):
+        """Testing GitCatFilePool.lookup with --batch-check"""
+        pool = GitCatFilePool(self.git_dir, '--batch-check')
+
+        self.assertEqual(
+            pool.lookup(['e965047', 'HEAD:missing file', 'a62df6c']),
+            [(b'blob', None), None, (b'commit', None)])
+
+        pool.close()
+
+    def test_reuses_workers(self):
+        """Testing GitCatFilePool reuses workers between lookups"""
+        pool = GitCatFilePool(self.git_dir, '--batch')
+
+        pool.lookup(['e965047'])
+        self.assertEqual(len(pool._idle_workers), 1)
+        worker = pool._idle_workers[0]
+
+        pool.lookup(['d6613f5'])
+        self.assertEqual(pool._idle_workers, [worker])
+        self.assertTrue(worker.is_alive)
+
+        pool.close()
+        self.assertFalse(worker.is_alive)
+
+    def test_discards_worker_errors(self):
+        """Testing GitCatFilePool doesn't leave worker error output unread"""
+        pool = GitCatFilePool(self.git_dir, '--batch')
+
+        pool.lookup(['e965047'])
+        worker = pool._idle_workers[0]
+
+        # Unread error output could fill the pipe and block the worker.
+        self.assertIsNone(worker.process.stderr)
+
+        pool.close()
+
+    def test_restarts_crashed_workers(self):
+        """Testing GitCatFilePool replaces workers that have crashed"""
+        pool = GitCatFilePool(self.git_dir, '--batch')
+
+        pool.lookup(['e965047'])
+        worker = pool._idle_workers[0]
+        worker.process.kill()
+        worker.process.wait()
+
+        self.assertEqual(pool.lookup(['e965047']), [(b'blob', b'Hello\n')])
+        self.assertEqual(len(pool._idle_workers), 1)
+        self.assertIsNot(pool._idle_workers[0], worker)
+
+        pool.close()
+
+    def test_idle_timeout(self):
+        """Testing GitCatFilePool stops idle workers"""
+        pool = GitCatFilePool(self.git_dir, '--batch', idle_timeout=0.1)
+
+        pool.lookup(['e965047'])
+        worker = pool._idle_workers[0]
+
+        for i in range(50):
+            if not pool._idle_workers:
+                break
+
+            time.sleep(0.1)
+
+        self.assertEqual(pool._idle_workers, [])
+        self.assertFalse(worker.is_alive)
+
+    def test_max_workers(self):
+        """Testing GitCatFilePool limits the number of workers in use"""
+        pool = GitCatFilePool(self.git_dir, '--batch', max_workers=1)
+        results = []
+
+        worker = pool._acquire()
+
+        thread = threading.Thread(
+            target=lambda: results.append(pool.lookup(['e965047'])))
+        thread.start()
+
+        # The lookup must wait for the worker to be released.
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(results, [])
+
+        pool._release(worker)
+        thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [[(b'blob', b'Hello\n')]])
+        self.assertEqual(pool._idle_workers, [worker])
+
+        pool.close()
+
+    def test_get_git_cat_file_pool(self):
+        """Testing get_git_cat_file_pool shares pools"""
+        pool = get_git_cat_file_pool(self.git_dir, '--batch')
+
+        self.assertIs(get_git_cat_file_pool(self.git_dir, '--batch'), pool)
+        self.assertIsNot(get_git_cat_file_pool(self.git_dir, '--batch-check'),
+                         pool)
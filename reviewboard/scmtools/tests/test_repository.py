@@ -1,10 +1,16 @@
 from __future__ import unicode_literals
 
 import os
+import threading
+import time
 
 from django.core.cache import cache
+from djblets.siteconfig.models import SiteConfiguration
 
+from reviewboard.hostingsvcs.models import HostingServiceAccount
+from reviewboard.hostingsvcs.service import HostingService
 from reviewboard.scmtools.core import HEAD
+from reviewboard.scmtools.errors import FileNotFoundError
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.signals import (checked_file_exists,
                                           checking_file_exists,
@@ -30,6 +36,8 @@ class RepositoryTests(TestCase):
         self.scmtool_cls = self.repository.get_scmtool().__class__
         self.old_get_file = self.scmtool_cls.get_file
         self.old_file_exists = self.scmtool_cls.file_exists
+        self.old_get_files = self.scmtool_cls.get_files
+        self.old_files_exist = self.scmtool_cls.files_exist
 
     def tearDown(self):
         super(RepositoryTests, self).tearDown()
@@ -38,6 +46,8 @@ class RepositoryTests(TestCase):
 
         self.scmtool_cls.get_file = self.old_get_file
         self.scmtool_cls.file_exists = self.old_file_exists
+        self.scmtool_cls.get_files = self.old_get_files
+        self.scmtool_cls.files_exist = self.old_files_exist
 
     def test_archive(self):
         """Testing Repository.archive"""
@@ -117,6 +127,80 @@ class RepositoryTests(TestCase):
         self.assertEqual(found_signals[1],
                          ('fetched_file', path, revision, request))
 
+    def test_get_files(self):
+        """Testing Repository.get_files"""
+        results = self.repository.get_files([
+            ('readme', 'e965047'),
+            ('readme', '0000000'),
+            ('readme', 'd6613f5'),
+        ])
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], b'Hello\n')
+        self.assertIsInstance(results[1], FileNotFoundError)
+        self.assertEqual(results[2], b'Hello there\n')
+
+    def test_get_files_caching(self):
+        """Testing Repository.get_files caches results"""
+        def get_files(self, files, **kwargs):
+            fetched.append(files)
+
+            return [
+                b'data for %s' % path.encode('utf-8')
+                for path, revision in files
+            ]
+
+        fetched = []
+        self.scmtool_cls.get_files = get_files
+
+        data = self.repository.get_file('file1', 'e965047')
+        self.assertEqual(data, b'Hello\n')
+
+        results = self.repository.get_files([
+            ('file1', 'e965047'),
+            ('file2', 'e965047'),
+            ('file3', 'e965047'),
+        ])
+
+        self.assertEqual(results,
+                         [b'Hello\n', b'data for file2', b'data for file3'])
+        self.assertEqual(fetched, [[('file2', 'e965047'),
+                                    ('file3', 'e965047')]])
+
+        # Everything is now cached, for both get_file and get_files.
+        self.assertEqual(self.repository.get_file('file2', 'e965047'),
+                         b'data for file2')
+        self.assertEqual(
+            self.repository.get_files([('file3', 'e965047'),
+                                       ('file1', 'e965047')]),
+            [b'data for file3', b'Hello\n'])
+        self.assertEqual(len(fetched), 1)
+
+    def test_get_files_signals(self):
+        """Testing Repository.get_files emits signals"""
+        def on_fetching_file(sender, path, revision, request, **kwargs):
+            found_signals.append(('fetching_file', path, revision, request))
+
+        def on_fetched_file(sender, path, revision, request, **kwargs):
+            found_signals.append(('fetched_file', path, revision, request))
+
+        found_signals = []
+
+        fetching_file.connect(on_fetching_file, sender=self.repository)
+        fetched_file.connect(on_fetched_file, sender=self.repository)
+
+        request = {}
+
+        self.repository.get_files([('readme', 'e965047'),
+                                   ('readme', '0000000')],
+                                  request=request)
+
+        self.assertEqual(found_signals, [
+            ('fetching_file', 'readme', 'e965047', request),
+            ('fetching_file', 'readme', '0000000', request),
+            ('fetched_file', 'readme', 'e965047', request),
+        ])
+
     def test_get_file_exists_caching_when_exists(self):
         """Testing Repository.get_file_exists caches result when exists"""
         def file_exists(self, path, revision, **kwargs):
@@ -202,6 +286,131 @@ class RepositoryTests(TestCase):
         self.assertEqual(num_calls['get_file'], 1)
         self.assertEqual(num_calls['get_file_exists'], 0)
 
+    def test_get_files_exist_caching(self):
+        """Testing Repository.get_files_exist caches results when files exist
+        """
+        def files_exist(self, files, **kwargs):
+            checked.append(files)
+
+            return [
+                path != 'missing'
+                for path, revision in files
+            ]
+
+        checked = []
+        self.scmtool_cls.files_exist = files_exist
+
+        files = [
+            ('file1', 'e965047'),
+            ('missing', 'e965047'),
+            ('file2', 'e965047'),
+        ]
+
+        self.assertEqual(self.repository.get_files_exist(files),
+                         [True, False, True])
+        self.assertEqual(self.repository.get_files_exist(files),
+                         [True, False, True])
+        self.assertTrue(self.repository.get_file_exists('file2', 'e965047'))
+
+        # Only the missing file should have been checked again.
+        self.assertEqual(checked, [files, [('missing', 'e965047')]])
+
+    def test_get_files_exist_with_duplicates(self):
+        """Testing Repository.get_files_exist only checks each file once"""
+        def files_exist(self, files, **kwargs):
+            checked.append(files)
+
+            return [True] * len(files)
+
+        checked = []
+        self.scmtool_cls.files_exist = files_exist
+
+        self.assertEqual(
+            self.repository.get_files_exist([
+                ('file1', 'e965047'),
+                ('file2', 'e965047'),
+                ('file1', 'e965047'),
+            ]),
+            [True, True, True])
+        self.assertEqual(checked, [[('file1', 'e965047'),
+                                    ('file2', 'e965047')]])
+
+    def test_get_files_exist_with_hosting_service(self):
+        """Testing Repository.get_files_exist with a hosting service checks
+        files concurrently
+        """
+        class TestService(HostingService):
+            name = 'Test Service'
+            supports_repositories = True
+
+            def get_file_exists(service, repository, path, revision,
+                                *args, **kwargs):
+                with lock:
+                    active[0] += 1
+                    max_active[0] = max(max_active[0], active[0])
+                    checked.append(path)
+
+                time.sleep(0.05)
+
+                with lock:
+                    active[0] -= 1
+
+                return path != 'missing'
+
+        lock = threading.Lock()
+        active = [0]
+        max_active = [0]
+        checked = []
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        siteconfig.set('diffviewer_file_exists_workers', 3)
+        siteconfig.save()
+
+        self.repository.hosting_service = TestService(
+            HostingServiceAccount(service_name='test', username='test'))
+
+        self.assertEqual(
+            self.repository.get_files_exist([
+                ('file%d' % i, 'e965047')
+                for i in range(5)
+            ] + [('missing', 'e965047')]),
+            [True, True, True, True, True, False])
+        self.assertEqual(sorted(checked),
+                         ['file0', 'file1', 'file2', 'file3', 'file4',
+                          'missing'])
+        self.assertTrue(1 < max_active[0] <= 3)
+
+    def test_get_files_exist_with_hosting_service_error(self):
+        """Testing Repository.get_files_exist with a hosting service raises
+        the first error after checking all files
+        """
+        class TestService(HostingService):
+            name = 'Test Service'
+            supports_repositories = True
+
+            def get_file_exists(service, repository, path, revision,
+                                *args, **kwargs):
+                checked.append(path)
+
+                if path.startswith('bad'):
+                    raise FileNotFoundError(path, revision)
+
+                return True
+
+        checked = []
+        self.repository.hosting_service = TestService(
+            HostingServiceAccount(service_name='test', username='test'))
+
+        with self.assertRaises(FileNotFoundError) as cm:
+            self.repository.get_files_exist([
+                ('file1', 'e965047'),
+                ('bad1', 'e965047'),
+                ('bad2', 'e965047'),
+            ])
+
+        self.assertEqual(cm.exception.path, 'bad1')
+        self.assertEqual(sorted(checked), ['bad1', 'bad2', 'file1'])
+
     def test_get_file_exists_signals(self):
         """Testing Repository.get_file_exists emits signals"""
         def on_checking(sender, path, revision, request, **kwargs):
@@ -421,24 +421,52 @@ RB.ReviewRequest = RB.BaseResource.extend({
      * This is called periodically after an initial call to
      * beginCheckForUpdates. It will see if there's a new update yet on the
      * server, and if there is, trigger the 'updated' event.
+     *
+     * Once the last update is known, the server is asked to wait for the
+     * next one before responding. If it did, the next check is made right
+     * away. Otherwise, it's made after RB.ReviewRequest.CHECK_UPDATES_MSECS,
+     * so that servers that don't wait aren't checked any more often.
      */
     _checkForUpdates() {
+        const headers = {};
+
+        if (this._lastUpdateETag) {
+            headers['If-None-Match'] = this._lastUpdateETag;
+            headers.Prefer = 'wait=' + RB.ReviewRequest.WAIT_UPDATES_SECS;
+        }
+
         RB.apiCall({
             type: 'GET',
             prefix: this.get('sitePrefix'),
             noActivityIndicator: true,
             url: this.get('links').last_update.href,
-            success: rsp => {
-                const lastUpdate = rsp.last_update;
+            headers: headers,
+            success: (rsp, status, xhr) => {
+                /*
+                 * Only check again right away if the server waited for this
+                 * update, so the next check is another wait.
+                 */
+                const checkNow = !!(
+                    xhr && xhr.getResponseHeader('Preference-Applied'));
+
+                if (rsp && rsp.last_update) {
+                    const lastUpdate = rsp.last_update;
+
+                    if ((this._checkUpdatesType === undefined ||
+                         this._checkUpdatesType === lastUpdate.type) &&
+                        this._lastUpdateTimestamp !== lastUpdate.timestamp) {
+                        this.trigger('updated', lastUpdate);
+                    }
 
-                if ((this._checkUpdatesType === undefined ||
-                     this._checkUpdatesType === lastUpdate.type) &&
-                    this._lastUpdateTimestamp !== lastUpdate.timestamp) {
-                    this.trigger('updated', lastUpdate);
+                    this._lastUpdateTimestamp = lastUpdate.timestamp;
+                    this._lastUpdateETag = xhr.getResponseHeader('ETag');
                 }
 
-                this._lastUpdateTimestamp = lastUpdate.timestamp;
-
+                setTimeout(
+                    this._checkForUpdates.bind(this),
+                    checkNow ? 0 : RB.ReviewRequest.CHECK_UPDATES_MSECS);
+            },
+            error: () => {
                 setTimeout(this._checkForUpdates.bind(this),
                            RB.ReviewRequest.CHECK_UPDATES_MSECS);
             }
@@ -518,6 +546,7 @@ RB.ReviewRequest = RB.BaseResource.extend({
     }
 }, {
     CHECK_UPDATES_MSECS: 5 * 60 * 1000, // Every 5 minutes
+    WAIT_UPDATES_SECS: 60,
 
     CLOSE_DISCARDED: 1,
     CLOSE_SUBMITTED: 2,
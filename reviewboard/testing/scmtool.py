@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 from django.utils import six
 from django.utils.six.moves import range
 
-from reviewboard.scmtools.core import Branch, Commit, ChangeSet
+from reviewboard.scmtools.core import Branch, Commit, ChangeSet, SCMTool
 from reviewboard.scmtools.git import GitTool
 
 
@@ -61,6 +61,12 @@ class TestTool(GitTool):
 
         return super(TestTool, self).file_exists(path, revision, **kwargs)
 
+    def get_files(self, files, **kwargs):
+        return SCMTool.get_files(self, files, **kwargs)
+
+    def files_exist(self, files, **kwargs):
+        return SCMTool.files_exist(self, files, **kwargs)
+
     @classmethod
     def check_repository(cls, path, *args, **kwargs):
         pass
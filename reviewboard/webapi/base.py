@@ -2,6 +2,8 @@ from __future__ import unicode_literals
 
 import copy
 
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from django.utils import six
 from django.utils.encoding import force_unicode
 from django.utils.six.moves.urllib.parse import quote as urllib_quote
@@ -30,6 +32,35 @@ EXTRA_DATA_LEN = len('extra_data.')
 PRIVATE_KEY_PREFIX = '__'
 
 
+class WebAPIStreamingResponse(StreamingHttpResponse, HttpResponse):
+    """A streaming response that can be returned from an API resource.
+
+    API resources can only return instances of
+    :py:class:`~django.http.HttpResponse`, which
+    :py:class:`~django.http.StreamingHttpResponse` isn't. This behaves
+    exactly like a :py:class:`~django.http.StreamingHttpResponse`, but
+    passes that check.
+    """
+
+    def __init__(self, streaming_content=(), *args, **kwargs):
+        """Initialize the response.
+
+        Args:
+            streaming_content (iterable):
+                The content to stream.
+
+            *args (tuple):
+                Positional arguments for the response.
+
+            **kwargs (dict):
+                Keyword arguments for the response.
+        """
+        # HttpResponse.__init__ would try to set non-streaming content, so
+        # skip it.
+        HttpResponseBase.__init__(self, *args, **kwargs)
+        self.streaming_content = streaming_content
+
+
 class ExtraDataAccessLevel(object):
     """Various access levels for ``extra_data`` fields.
 
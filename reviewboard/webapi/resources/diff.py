@@ -3,7 +3,6 @@ from __future__ import unicode_literals
 import logging
 
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
-from django.http import HttpResponse
 from django.utils import six
 from djblets.util.http import get_http_requested_mimetype, set_last_modified
 from djblets.webapi.decorators import (webapi_login_required,
@@ -18,7 +17,7 @@ from reviewboard.diffviewer.models import DiffSet
 from reviewboard.reviews.forms import UploadDiffForm
 from reviewboard.reviews.models import ReviewRequest, ReviewRequestDraft
 from reviewboard.scmtools.errors import FileNotFoundError
-from reviewboard.webapi.base import WebAPIResource
+from reviewboard.webapi.base import WebAPIResource, WebAPIStreamingResponse
 from reviewboard.webapi.decorators import (webapi_check_login_required,
                                            webapi_check_local_site)
 from reviewboard.webapi.errors import (DIFF_EMPTY,
@@ -84,6 +83,18 @@ class DiffResource(WebAPIResource):
                            'diff was uploaded.',
             'added_in': '1.7.13',
         },
+        'insert_count': {
+            'type': int,
+            'description': 'The total number of lines inserted in all files '
+                           'in the diff.',
+            'added_in': '3.0',
+        },
+        'delete_count': {
+            'type': int,
+            'description': 'The total number of lines deleted in all files '
+                           'in the diff.',
+            'added_in': '3.0',
+        },
     }
     item_child_resources = [
         resources.filediff,
@@ -100,6 +111,12 @@ class DiffResource(WebAPIResource):
         {'item': 'text/x-patch'},
     ]
 
+    def serialize_insert_count_field(self, diffset, **kwargs):
+        return diffset.get_raw_line_counts()['raw_insert_count']
+
+    def serialize_delete_count_field(self, diffset, **kwargs):
+        return diffset.get_raw_line_counts()['raw_delete_count']
+
     def get_queryset(self, request, *args, **kwargs):
         try:
             review_request = \
@@ -172,9 +189,9 @@ class DiffResource(WebAPIResource):
             return DOES_NOT_EXIST
 
         tool = review_request.repository.get_scmtool()
-        data = tool.get_parser('').raw_diff(diffset)
-
-        resp = HttpResponse(data, content_type='text/x-patch')
+        resp = WebAPIStreamingResponse(
+            tool.get_parser('').iter_raw_diff(diffset),
+            content_type='text/x-patch')
 
         if diffset.name == 'diff':
             filename = 'bug%s.patch' % \
@@ -1,7 +1,6 @@
 from __future__ import unicode_literals
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse
 from django.utils import six
 from django.utils.six.moves.urllib.parse import quote as urllib_quote
 from djblets.util.decorators import augment_method_from
@@ -17,7 +16,8 @@ from reviewboard.attachments.models import FileAttachment
 from reviewboard.diffviewer.diffutils import (get_diff_files,
                                               populate_diff_chunks)
 from reviewboard.diffviewer.models import FileDiff
-from reviewboard.webapi.base import CUSTOM_MIMETYPE_BASE, WebAPIResource
+from reviewboard.webapi.base import (CUSTOM_MIMETYPE_BASE, WebAPIResource,
+                                     WebAPIStreamingResponse)
 from reviewboard.webapi.decorators import (webapi_check_login_required,
                                            webapi_check_local_site)
 from reviewboard.webapi.resources import resources
@@ -395,7 +395,8 @@ class FileDiffResource(WebAPIResource):
         except ObjectDoesNotExist:
             return DOES_NOT_EXIST
 
-        resp = HttpResponse(filediff.diff, content_type='text/x-patch')
+        resp = WebAPIStreamingResponse(filediff.iter_diff(),
+                                       content_type='text/x-patch')
         filename = '%s.patch' % urllib_quote(filediff.source_file)
         resp['Content-Disposition'] = 'inline; filename=%s' % filename
         set_last_modified(resp, filediff.diffset.timestamp)
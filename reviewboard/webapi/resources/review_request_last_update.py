@@ -1,13 +1,17 @@
 from __future__ import unicode_literals
 
+import re
+
+from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponseNotModified
 from django.utils import six
 from django.utils.translation import ugettext as _
+from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.http import encode_etag, etag_if_none_match
 from djblets.webapi.errors import DOES_NOT_EXIST
-from reviewboard.diffviewer.models import DiffSet
-from reviewboard.reviews.models import Review, ReviewRequest
+from reviewboard.reviews.models import ReviewRequest
+from reviewboard.reviews.updates import update_broker
 from reviewboard.webapi.base import WebAPIResource
 from reviewboard.webapi.decorators import (webapi_check_local_site,
                                            webapi_check_login_required)
@@ -18,13 +22,15 @@ class ReviewRequestLastUpdateResource(WebAPIResource):
     """Provides information on the last update made to a review request.
 
     Clients can periodically poll this to see if any new updates have been
-    made.
+    made, or wait for the next update.
     """
     name = 'last_update'
     policy_id = 'review_request_last_update'
     singleton = True
     allowed_methods = ('GET',)
 
+    PREFER_WAIT_RE = re.compile(r'(?:^|[\s,;])wait\s*=\s*(\d+)')
+
     fields = {
         'summary': {
             'type': six.text_type,
@@ -65,6 +71,12 @@ class ReviewRequestLastUpdateResource(WebAPIResource):
         This does not take into account changes to a draft review request, as
         that's generally not update information that the owner of the draft is
         interested in. Only public updates are represented.
+
+        Rather than polling, clients can wait for the next update by sending
+        the ETag of the last update they know about in ``If-None-Match`` and
+        a ``Prefer: wait=<seconds>`` header. If the server waited, the
+        response will include a ``Preference-Applied`` header, and will be
+        an HTTP 304 if there was no new update in that time.
         """
         try:
             review_request = \
@@ -76,55 +88,88 @@ class ReviewRequestLastUpdateResource(WebAPIResource):
                                                                review_request):
             return self.get_no_access_error(request)
 
-        timestamp, updated_object = review_request.get_last_activity()
+        last_update = update_broker.get_last_update(review_request)
+        headers = {}
+
+        if etag_if_none_match(request, encode_etag(last_update['id'])):
+            wait_secs = self._get_wait_secs(request)
+
+            if not wait_secs:
+                return HttpResponseNotModified()
 
-        etag = encode_etag('%s:%s' % (timestamp, updated_object.pk))
+            update_id = last_update['id']
+            last_update = update_broker.wait_for_update(
+                review_request, update_id, wait_secs)
+            preference_applied = 'wait=%d' % wait_secs
 
-        if etag_if_none_match(request, etag):
-            return HttpResponseNotModified()
+            if last_update['id'] == update_id:
+                response = HttpResponseNotModified()
+                response['Preference-Applied'] = preference_applied
 
-        user = None
-        summary = None
-        update_type = None
+                return response
 
-        if isinstance(updated_object, ReviewRequest):
-            user = updated_object.submitter
+            headers['Preference-Applied'] = preference_applied
 
-            if updated_object.status == ReviewRequest.SUBMITTED:
+        headers['ETag'] = encode_etag(last_update['id'])
+
+        update_type = last_update['type']
+        user_id = last_update['user_id']
+
+        if user_id is None:
+            user = None
+        else:
+            user = User.objects.filter(pk=user_id).first()
+
+        if update_type == 'review-request':
+            if last_update['status'] == ReviewRequest.SUBMITTED:
                 summary = _("Review request submitted")
-            elif updated_object.status == ReviewRequest.DISCARDED:
+            elif last_update['status'] == ReviewRequest.DISCARDED:
                 summary = _("Review request discarded")
             else:
                 summary = _("Review request updated")
-
-            update_type = "review-request"
-        elif isinstance(updated_object, DiffSet):
+        elif update_type == 'diff':
             summary = _("Diff updated")
-            update_type = "diff"
-        elif isinstance(updated_object, Review):
-            user = updated_object.user
-
-            if updated_object.is_reply():
-                summary = _("New reply")
-                update_type = "reply"
-            else:
-                summary = _("New review")
-                update_type = "review"
+        elif update_type == 'reply':
+            summary = _("New reply")
+        elif update_type == 'review':
+            summary = _("New review")
         else:
-            # Should never be able to happen. The object will always at least
-            # be a ReviewRequest.
+            # Should never be able to happen.
             assert False
 
         return 200, {
             self.item_result_key: {
-                'timestamp': timestamp,
+                'timestamp': last_update['timestamp'],
                 'user': user,
                 'summary': summary,
                 'type': update_type,
             }
-        }, {
-            'ETag': etag,
-        }
+        }, headers
+
+    def _get_wait_secs(self, request):
+        """Return the number of seconds to wait for a new update.
+
+        This is based on the ``Prefer: wait=<seconds>`` header sent by the
+        client, capped by the ``reviews_last_update_max_wait_secs`` site
+        configuration setting.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            int:
+            The number of seconds to wait, or 0 to not wait.
+        """
+        m = self.PREFER_WAIT_RE.search(request.META.get('HTTP_PREFER', ''))
+
+        if not m:
+            return 0
+
+        siteconfig = SiteConfiguration.objects.get_current()
+
+        return max(0, min(int(m.group(1)),
+                          siteconfig.get('reviews_last_update_max_wait_secs')))
 
 
 review_request_last_update_resource = ReviewRequestLastUpdateResource()
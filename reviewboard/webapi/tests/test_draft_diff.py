@@ -33,6 +33,10 @@ class ResourceListTests(ExtraDataListMixin, BaseWebAPITestCase):
         self.assertEqual(item_rsp['basedir'], diffset.basedir)
         self.assertEqual(item_rsp['base_commit_id'], diffset.base_commit_id)
         self.assertEqual(item_rsp['extra_data'], diffset.extra_data)
+        self.assertEqual(item_rsp['insert_count'],
+                         diffset.get_raw_line_counts()['raw_insert_count'])
+        self.assertEqual(item_rsp['delete_count'],
+                         diffset.get_raw_line_counts()['raw_delete_count'])
 
     #
     # HTTP GET tests
@@ -190,6 +194,10 @@ class ResourceItemTests(ExtraDataItemMixin, BaseWebAPITestCase):
         self.assertEqual(item_rsp['basedir'], diffset.basedir)
         self.assertEqual(item_rsp['base_commit_id'], diffset.base_commit_id)
         self.assertEqual(item_rsp['extra_data'], diffset.extra_data)
+        self.assertEqual(item_rsp['insert_count'],
+                         diffset.get_raw_line_counts()['raw_insert_count'])
+        self.assertEqual(item_rsp['delete_count'],
+                         diffset.get_raw_line_counts()['raw_delete_count'])
 
     #
     # HTTP GET tests